@@ -11,6 +11,9 @@ from .models import TransfertArgent
 from agent_chine_app.models import Lot, Colis
 from agent_mali_app.models import Depense
 from authentication.models import CustomUser
+from reporting_app.aggregations import compter_requetes, histogramme, serie_temporelle
+from reporting_app.daily_stats import total
+from reporting_app.models import DailyStats
 
 
 def admin_mali_required(view_func):
@@ -28,6 +31,7 @@ def admin_mali_required(view_func):
 
 
 @admin_mali_required
+@compter_requetes
 def dashboard(request):
     """
     Dashboard principal de l'admin Mali avec statistiques complètes
@@ -40,151 +44,124 @@ def dashboard(request):
     current_month = today.replace(day=1)
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     
+    # Les compteurs et montants sont lus dans DailyStats (agrégats journaliers
+    # maintenus par les signaux de reporting_app) : une requête par source
     # === STATISTIQUES DES TRANSFERTS D'ARGENT ===
-    transferts_stats = {
-        'total': TransfertArgent.objects.count(),
-        'aujourd_hui': TransfertArgent.objects.filter(date_initiation__date=today).count(),
-        'hier': TransfertArgent.objects.filter(date_initiation__date=yesterday).count(),
-        '7_derniers_jours': TransfertArgent.objects.filter(date_initiation__date__gte=last_7_days).count(),
-        'ce_mois': TransfertArgent.objects.filter(date_initiation__gte=current_month).count(),
-        'mois_precedent': TransfertArgent.objects.filter(
-            date_initiation__gte=last_month,
-            date_initiation__lt=current_month
-        ).count(),
+    transferts_stats = DailyStats.objects.filter(source='transfert').aggregate(
+        total=total(),
+        aujourd_hui=total(jour=today),
+        hier=total(jour=yesterday),
+        ce_mois=total(jour__gte=current_month),
+        mois_precedent=total(jour__gte=last_month, jour__lt=current_month),
+        **{'7_derniers_jours': total(jour__gte=last_7_days)},
         
         # Par statut
-        'en_attente': TransfertArgent.objects.filter(statut='initie').count(),
-        'envoyes': TransfertArgent.objects.filter(statut='envoye').count(),
-        'confirmes': TransfertArgent.objects.filter(statut='confirme_chine').count(),
-        'annules': TransfertArgent.objects.filter(statut='annule').count(),
-    }
-    
-    # === MONTANTS FINANCIERS ===
-    montants_transferts = TransfertArgent.objects.aggregate(
-        # Montants totaux
-        total_fcfa=Sum('montant_fcfa'),
-        total_frais=Sum('frais_transfert'),
+        en_attente=total(statut='initie'),
+        envoyes=total(statut='envoye'),
+        confirmes=total(statut='confirme_chine'),
+        annules=total(statut='annule'),
         
-        # Montants journaliers
-        aujourd_hui_fcfa=Sum('montant_fcfa', filter=Q(date_initiation__date=today)),
-        aujourd_hui_frais=Sum('frais_transfert', filter=Q(date_initiation__date=today)),
-        hier_fcfa=Sum('montant_fcfa', filter=Q(date_initiation__date=yesterday)),
-        hier_frais=Sum('frais_transfert', filter=Q(date_initiation__date=yesterday)),
-        
-        # Montants mensuels
-        ce_mois_fcfa=Sum('montant_fcfa', filter=Q(date_initiation__gte=current_month)),
-        ce_mois_frais=Sum('frais_transfert', filter=Q(date_initiation__gte=current_month)),
-        mois_precedent_fcfa=Sum('montant_fcfa', filter=Q(
-            date_initiation__gte=last_month,
-            date_initiation__lt=current_month
-        )),
-        mois_precedent_frais=Sum('frais_transfert', filter=Q(
-            date_initiation__gte=last_month,
-            date_initiation__lt=current_month
-        ))
+        # === MONTANTS FINANCIERS ===
+        total_fcfa=total('montant'),
+        total_frais=total('montant_secondaire'),
+        aujourd_hui_fcfa=total('montant', jour=today),
+        aujourd_hui_frais=total('montant_secondaire', jour=today),
+        hier_fcfa=total('montant', jour=yesterday),
+        hier_frais=total('montant_secondaire', jour=yesterday),
+        ce_mois_fcfa=total('montant', jour__gte=current_month),
+        ce_mois_frais=total('montant_secondaire', jour__gte=current_month),
+        mois_precedent_fcfa=total('montant', jour__gte=last_month, jour__lt=current_month),
+        mois_precedent_frais=total('montant_secondaire', jour__gte=last_month, jour__lt=current_month),
     )
+    montants_transferts = {
+        cle: transferts_stats.pop(cle) for cle in list(transferts_stats)
+        if cle.endswith(('_fcfa', '_frais'))
+    }
     
-    # === STATISTIQUES COMPLÈTES DES COLIS ET LOTS ===
-    colis_stats = {
+    # === STATISTIQUES COMPLÈTES DES COLIS ===
+    colis_stats = DailyStats.objects.filter(source='colis').aggregate(
         # Colis par statut
-        'total_colis': Colis.objects.count(),
-        'en_attente': Colis.objects.filter(statut='en_attente').count(),
-        'receptionnes_chine': Colis.objects.filter(statut='receptionne_chine').count(),
-        'en_transit': Colis.objects.filter(statut='en_transit').count(),
-        'arrives_mali': Colis.objects.filter(statut='arrive').count(),
-        'livres': Colis.objects.filter(statut='livre').count(),
-        'perdus': Colis.objects.filter(statut='perdu').count(),
+        total_colis=total(),
+        en_attente=total(statut='en_attente'),
+        receptionnes_chine=total(statut='receptionne_chine'),
+        en_transit=total(statut='en_transit'),
+        arrives_mali=total(statut='arrive'),
+        livres=total(statut='livre'),
+        perdus=total(statut='perdu'),
         
         # Colis par mode de paiement
-        'payes_chine': Colis.objects.filter(mode_paiement='paye_chine').count(),
-        'payes_mali': Colis.objects.filter(mode_paiement='paye_mali').count(),
-        'non_payes': Colis.objects.filter(mode_paiement='non_paye').count(),
+        payes_chine=total(mode_paiement='paye_chine'),
+        payes_mali=total(mode_paiement='paye_mali'),
+        non_payes=total(mode_paiement='non_paye'),
         
         # Colis par type de transport
-        'cargo': Colis.objects.filter(type_transport='cargo').count(),
-        'express': Colis.objects.filter(type_transport='express').count(),
-        'bateau': Colis.objects.filter(type_transport='bateau').count(),
+        cargo=total(type_transport='cargo'),
+        express=total(type_transport='express'),
+        bateau=total(type_transport='bateau'),
+        
+        # === VALEURS FINANCIÈRES DES COLIS ===
+        valeur_totale=total('montant'),
+        valeur_stock_chine=total('montant', statut__in=['en_attente', 'receptionne_chine']),
+        valeur_transit=total('montant', statut='en_transit'),
+        valeur_arrives_mali=total('montant', statut='arrive'),
+        valeur_livres=total('montant', statut='livre'),
+        valeur_payes_chine=total('montant', mode_paiement='paye_chine'),
+        valeur_a_collecter=total('montant', mode_paiement='paye_mali'),
+    )
+    valeurs_colis = {
+        cle: colis_stats.pop(cle) for cle in list(colis_stats)
+        if cle.startswith('valeur_')
     }
     
     # === STATISTIQUES DES LOTS ===
-    lots_stats = {
-        'total_lots': Lot.objects.count(),
-        'ouverts': Lot.objects.filter(statut='ouvert').count(),
-        'fermes': Lot.objects.filter(statut='ferme').count(),
-        'expedies': Lot.objects.filter(statut='expedie').count(),
-        'en_transit': Lot.objects.filter(statut='en_transit').count(),
-        'arrives': Lot.objects.filter(statut='arrive').count(),
-        'livres': Lot.objects.filter(statut='livre').count(),
-    }
-    
-    # === VALEURS FINANCIÈRES DES COLIS ===
-    valeurs_colis = Colis.objects.aggregate(
-        # Valeur totale de tous les colis
-        valeur_totale=Sum('prix_calcule'),
-        
-        # Valeur des colis en Chine (stock)
-        valeur_stock_chine=Sum('prix_calcule', filter=Q(
-            statut__in=['en_attente', 'receptionne_chine']
-        )),
-        
-        # Valeur des colis en transit
-        valeur_transit=Sum('prix_calcule', filter=Q(statut='en_transit')),
-        
-        # Valeur des colis arrivés au Mali
-        valeur_arrives_mali=Sum('prix_calcule', filter=Q(statut='arrive')),
-        
-        # Valeur des colis livrés (chiffre d'affaires réalisé)
-        valeur_livres=Sum('prix_calcule', filter=Q(statut='livre')),
-        
-        # Valeur des colis payés en Chine
-        valeur_payes_chine=Sum('prix_calcule', filter=Q(mode_paiement='paye_chine')),
+    lots_stats = DailyStats.objects.filter(source='lot').aggregate(
+        total_lots=total(),
+        ouverts=total(statut='ouvert'),
+        fermes=total(statut='ferme'),
+        expedies=total(statut='expedie'),
+        en_transit=total(statut='en_transit'),
+        arrives=total(statut='arrive'),
+        livres=total(statut='livre'),
         
-        # Valeur des colis à collecter au Mali
-        valeur_a_collecter=Sum('prix_calcule', filter=Q(mode_paiement='paye_mali')),
-    )
-    
-    # === STATISTIQUES DES PRIX DE TRANSPORT DES LOTS ===
-    prix_lots = Lot.objects.aggregate(
-        prix_transport_total=Sum('prix_transport'),
-        prix_lots_en_transit=Sum('prix_transport', filter=Q(statut='en_transit')),
-        prix_lots_expedies=Sum('prix_transport', filter=Q(statut='expedie')),
+        # === PRIX DE TRANSPORT DES LOTS ===
+        prix_transport_total=total('montant'),
+        prix_lots_en_transit=total('montant', statut='en_transit'),
+        prix_lots_expedies=total('montant', statut='expedie'),
     )
+    prix_lots = {
+        cle: lots_stats.pop(cle) for cle in list(lots_stats)
+        if cle.startswith('prix_')
+    }
     
     # === STATISTIQUES DES DÉPENSES ===
-    try:
-        depenses_stats = Depense.objects.aggregate(
-            depenses_totales=Sum('montant'),
-            depenses_ce_mois=Sum('montant', filter=Q(date_depense__gte=current_month)),
-            depenses_hier=Sum('montant', filter=Q(date_depense=yesterday)),
-            depenses_aujourd_hui=Sum('montant', filter=Q(date_depense=today)),
-        )
-        
-        # Dépenses par type
-        depenses_par_type = {}
-        for type_dep, _ in Depense.TYPE_DEPENSE_CHOICES:
-            depenses_par_type[type_dep] = Depense.objects.filter(
-                type_depense=type_dep
-            ).aggregate(total=Sum('montant'))['total'] or 0
-    except:
-        depenses_stats = {
-            'depenses_totales': 0,
-            'depenses_ce_mois': 0,
-            'depenses_hier': 0,
-            'depenses_aujourd_hui': 0,
+    # La dimension statut porte le type de dépense
+    depenses_stats = DailyStats.objects.filter(source='depense').aggregate(
+        depenses_totales=total('montant'),
+        depenses_ce_mois=total('montant', jour__gte=current_month),
+        depenses_hier=total('montant', jour=yesterday),
+        depenses_aujourd_hui=total('montant', jour=today),
+        **{
+            f'type_{type_dep}': total('montant', statut=type_dep)
+            for type_dep, _ in Depense.TYPE_DEPENSE_CHOICES
         }
-        depenses_par_type = {}
+    )
+    depenses_par_type = {
+        cle[len('type_'):]: depenses_stats.pop(cle) for cle in list(depenses_stats)
+        if cle.startswith('type_')
+    }
     
     # === STATISTIQUES DES AGENTS ===
-    agents_stats = {
-        'total_agents_chine': CustomUser.objects.filter(is_agent_chine=True).count(),
-        'agents_chine_actifs': CustomUser.objects.filter(is_agent_chine=True, is_active=True).count(),
-        'total_agents_mali': CustomUser.objects.filter(is_agent_mali=True).count(),
-        'agents_mali_actifs': CustomUser.objects.filter(is_agent_mali=True, is_active=True).count(),
-        'total_clients': CustomUser.objects.filter(is_client=True).count(),
-        'clients_actifs': CustomUser.objects.filter(is_client=True, is_active=True).count(),
-        'admins_chine': CustomUser.objects.filter(is_admin_chine=True).count(),
-        'admins_mali': CustomUser.objects.filter(is_admin_mali=True).count(),
-    }
+    agents_stats = histogramme(
+        CustomUser.objects.all(),
+        total_agents_chine=Q(is_agent_chine=True),
+        agents_chine_actifs=Q(is_agent_chine=True, is_active=True),
+        total_agents_mali=Q(is_agent_mali=True),
+        agents_mali_actifs=Q(is_agent_mali=True, is_active=True),
+        total_clients=Q(is_client=True),
+        clients_actifs=Q(is_client=True, is_active=True),
+        admins_chine=Q(is_admin_chine=True),
+        admins_mali=Q(is_admin_mali=True),
+    )
     
     # === MÉTRIQUES DE PERFORMANCE ===
     # Calculs de ratios et indicateurs de performance
@@ -222,39 +199,21 @@ def dashboard(request):
         statut='livre'
     ).select_related('client__user').order_by('-date_modification')[:5]
     
-    # Données pour graphiques (évolution des montants sur 6 mois)
-    graphique_transferts = []
-    graphique_colis = []
-    
-    for i in range(6):
-        mois = today.replace(day=1) - timedelta(days=i*30)
-        mois_suivant = mois.replace(day=28) + timedelta(days=4)
-        mois_suivant = mois_suivant.replace(day=1)
-        
-        # Données transferts
-        montant_transferts_mois = TransfertArgent.objects.filter(
-            date_initiation__gte=mois,
-            date_initiation__lt=mois_suivant
-        ).aggregate(total=Sum('montant_fcfa'))['total'] or 0
-        
-        # Données colis
-        valeur_colis_mois = Colis.objects.filter(
-            date_creation__gte=mois,
-            date_creation__lt=mois_suivant
-        ).aggregate(total=Sum('prix_calcule'))['total'] or 0
-        
-        graphique_transferts.append({
-            'mois': mois.strftime('%b %Y'),
-            'montant': float(montant_transferts_mois)
-        })
-        
-        graphique_colis.append({
-            'mois': mois.strftime('%b %Y'),
-            'valeur': float(valeur_colis_mois)
-        })
-    
-    graphique_transferts.reverse()
-    graphique_colis.reverse()
+    # Données pour graphiques (évolution des montants sur 6 mois calendaires)
+    transferts_par_mois = serie_temporelle(
+        DailyStats.objects.filter(source='transfert'), 'jour', 6, montant=Sum('montant')
+    )
+    colis_par_mois = serie_temporelle(
+        DailyStats.objects.filter(source='colis'), 'jour', 6, valeur=Sum('montant')
+    )
+    graphique_transferts = [
+        {'mois': point['periode'].strftime('%b %Y'), 'montant': float(point['montant'])}
+        for point in transferts_par_mois
+    ]
+    graphique_colis = [
+        {'mois': point['periode'].strftime('%b %Y'), 'valeur': float(point['valeur'])}
+        for point in colis_par_mois
+    ]
     
     context = {
         'title': 'Dashboard Admin Mali',
@@ -380,16 +339,17 @@ def dashboard_admin_view(request):
     )
     
     # === STATISTIQUES UTILISATEURS ===
-    users_stats = {
-        'agents_chine_total': CustomUser.objects.filter(is_agent_chine=True).count(),
-        'agents_chine_actifs': CustomUser.objects.filter(is_agent_chine=True, is_active=True).count(),
-        'agents_mali_total': CustomUser.objects.filter(is_agent_mali=True).count(),
-        'agents_mali_actifs': CustomUser.objects.filter(is_agent_mali=True, is_active=True).count(),
-        'admins_chine': CustomUser.objects.filter(is_admin_chine=True).count(),
-        'admins_mali': CustomUser.objects.filter(is_admin_mali=True).count(),
-        'clients_total': CustomUser.objects.filter(is_client=True).count(),
-        'clients_actifs': CustomUser.objects.filter(is_client=True, is_active=True).count(),
-    }
+    users_stats = histogramme(
+        CustomUser.objects.all(),
+        agents_chine_total=Q(is_agent_chine=True),
+        agents_chine_actifs=Q(is_agent_chine=True, is_active=True),
+        agents_mali_total=Q(is_agent_mali=True),
+        agents_mali_actifs=Q(is_agent_mali=True, is_active=True),
+        admins_chine=Q(is_admin_chine=True),
+        admins_mali=Q(is_admin_mali=True),
+        clients_total=Q(is_client=True),
+        clients_actifs=Q(is_client=True, is_active=True),
+    )
     
     # === MÉTRIQUES DE PERFORMANCE ===
     performance = {
@@ -432,54 +392,32 @@ def dashboard_admin_view(request):
         statut__in=['expedie', 'en_transit']
     ).select_related('agent_createur').order_by('-date_expedition')[:10]
     
-    # === GRAPHIQUES - Evolution sur 6 mois ===
+    # === GRAPHIQUES - Evolution sur 6 mois calendaires ===
+    # Une requête GROUP BY par série (colis créés, transferts, colis livrés)
+    colis_par_mois = serie_temporelle(
+        DailyStats.objects.filter(source='colis'), 'jour', 6, count=Sum('nombre')
+    )
+    transferts_par_mois = serie_temporelle(
+        DailyStats.objects.filter(source='transfert'), 'jour', 6, count=Sum('nombre')
+    )
+    revenus_par_mois = serie_temporelle(
+        Colis.objects.filter(statut='livre'), 'date_modification', 6, montant=Sum('prix_calcule')
+    )
     graphique_data = {
-        'colis_par_mois': [],
-        'transferts_par_mois': [],
-        'revenus_par_mois': [],
+        'colis_par_mois': [
+            {'mois': point['periode'].strftime('%b %Y'), 'count': point['count']}
+            for point in colis_par_mois
+        ],
+        'transferts_par_mois': [
+            {'mois': point['periode'].strftime('%b %Y'), 'count': point['count']}
+            for point in transferts_par_mois
+        ],
+        'revenus_par_mois': [
+            {'mois': point['periode'].strftime('%b %Y'), 'montant': float(point['montant'])}
+            for point in revenus_par_mois
+        ],
     }
     
-    for i in range(6):
-        mois = today.replace(day=1) - timedelta(days=i*30)
-        mois_suivant = mois.replace(day=28) + timedelta(days=4)
-        mois_suivant = mois_suivant.replace(day=1)
-        
-        # Colis créés dans le mois
-        colis_mois = Colis.objects.filter(
-            date_creation__gte=mois,
-            date_creation__lt=mois_suivant
-        ).count()
-        
-        # Transferts dans le mois
-        transferts_mois = TransfertArgent.objects.filter(
-            date_initiation__gte=mois,
-            date_initiation__lt=mois_suivant
-        ).count()
-        
-        # Revenus (colis livrés) dans le mois
-        revenus_mois = Colis.objects.filter(
-            statut='livre',
-            date_modification__gte=mois,
-            date_modification__lt=mois_suivant
-        ).aggregate(total=Sum('prix_calcule'))['total'] or 0
-        
-        graphique_data['colis_par_mois'].append({
-            'mois': mois.strftime('%b %Y'),
-            'count': colis_mois
-        })
-        graphique_data['transferts_par_mois'].append({
-            'mois': mois.strftime('%b %Y'),
-            'count': transferts_mois
-        })
-        graphique_data['revenus_par_mois'].append({
-            'mois': mois.strftime('%b %Y'),
-            'montant': float(revenus_mois)
-        })
-    
-    # Inverser pour avoir l'ordre chronologique
-    for key in graphique_data:
-        graphique_data[key].reverse()
-    
     context = {
         'title': 'Dashboard Admin - Monitoring Complet',
         'colis_stats_chine': colis_stats_chine,
@@ -868,36 +806,12 @@ def generate_financial_report(date_debut, date_fin):
     couts_transport = revenus_total * Decimal('0.3')  # 30% des revenus en coûts
     benefice_net = revenus_realises - couts_transport
     
-    # Données mensuelles pour le graphique
-    mois_data = []
-    revenus_mensuels = []
-    
-    # Générer les données des 6 derniers mois
-    current_date = date_fin
-    for i in range(6):
-        mois_debut = current_date.replace(day=1)
-        if mois_debut.month == 1:
-            mois_fin = mois_debut.replace(year=mois_debut.year, month=12, day=31)
-        else:
-            next_month = mois_debut.replace(month=mois_debut.month - 1)
-            mois_fin = (next_month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-        
-        revenus_mois = Colis.objects.filter(
-            date_creation__date__gte=mois_debut,
-            date_creation__date__lte=mois_fin
-        ).aggregate(total=Sum('prix_calcule'))['total'] or 0
-        
-        mois_data.append(calendar.month_name[mois_debut.month])
-        revenus_mensuels.append(float(revenus_mois))
-        
-        # Passer au mois précédent
-        if current_date.month == 1:
-            current_date = current_date.replace(year=current_date.year - 1, month=12)
-        else:
-            current_date = current_date.replace(month=current_date.month - 1)
-    
-    mois_data.reverse()
-    revenus_mensuels.reverse()
+    # Données mensuelles pour le graphique (6 derniers mois calendaires)
+    revenus_par_mois = serie_temporelle(
+        Colis.objects.all(), 'date_creation', 6, fin=date_fin, revenus=Sum('prix_calcule')
+    )
+    mois_data = [calendar.month_name[point['periode'].month] for point in revenus_par_mois]
+    revenus_mensuels = [float(point['revenus']) for point in revenus_par_mois]
     
     # Statistiques supplémentaires pour les colis
     total_colis = colis.count()
@@ -1700,14 +1614,15 @@ def parametres(request):
     )
     
     # Statistiques des agents et utilisateurs
-    users_stats = {
-        'agents_mali_actifs': CustomUser.objects.filter(is_agent_mali=True, is_active=True).count(),
-        'agents_chine_actifs': CustomUser.objects.filter(is_agent_chine=True, is_active=True).count(),
-        'admins_mali': CustomUser.objects.filter(is_admin_mali=True).count(),
-        'admins_chine': CustomUser.objects.filter(is_admin_chine=True).count(),
-        'clients_actifs': CustomUser.objects.filter(is_client=True, is_active=True).count(),
-        'total_users': CustomUser.objects.filter(is_active=True).count(),
-    }
+    users_stats = histogramme(
+        CustomUser.objects.all(),
+        agents_mali_actifs=Q(is_agent_mali=True, is_active=True),
+        agents_chine_actifs=Q(is_agent_chine=True, is_active=True),
+        admins_mali=Q(is_admin_mali=True),
+        admins_chine=Q(is_admin_chine=True),
+        clients_actifs=Q(is_client=True, is_active=True),
+        total_users=Q(is_active=True),
+    )
     
     # Calcul de l'espace disque (approximatif)
     try:
@@ -1959,15 +1874,12 @@ def export_depenses_excel(request):
     return response
 
 
-@admin_mali_required
-def export_rapport_cargo_excel(request):
+def _export_transferts_excel(request, methodes, libelle, prefixe_fichier):
     """
-    Exporter les rapports cargo en format Excel
+    Export Excel en flux des transferts d'un groupe de méthodes
     """
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
     from datetime import datetime
+    from reporting_app.exports import Colonne, ExportXlsx, lignes_depuis_queryset
     
     # Récupération des filtres
     date_debut = request.GET.get('date_debut')
@@ -1991,45 +1903,55 @@ def export_rapport_cargo_excel(request):
         except ValueError:
             date_fin = today
     
-    # Récupération des transferts comme données cargo
-    transferts_cargo = TransfertArgent.objects.filter(
+    transferts = TransfertArgent.objects.filter(
         date_initiation__date__gte=date_debut,
         date_initiation__date__lte=date_fin,
-        methode_transfert__in=['western_union', 'moneygram']  # Méthodes considérées comme cargo
-    ).select_related('admin_mali').order_by('-date_initiation')
-    
-    # Création du workbook Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Rapport Cargo"
-    
-    # En-tête
-    ws['A1'] = 'RAPPORT CARGO - TS AIR CARGO MALI'
-    ws.merge_cells('A1:G1')
-    
-    # En-têtes des colonnes
-    headers = ['Date', 'N° Transfert', 'Destinataire', 'Montant', 'Méthode', 'Statut', 'Agent']
-    for col_idx, header in enumerate(headers, start=1):
-        ws.cell(row=3, column=col_idx, value=header)
-    
-    # Données
-    for row_idx, transfert in enumerate(transferts_cargo, start=4):
-        ws.cell(row=row_idx, column=1, value=transfert.date_initiation.strftime('%d/%m/%Y'))
-        ws.cell(row=row_idx, column=2, value=transfert.numero_transfert)
-        ws.cell(row=row_idx, column=3, value=transfert.destinataire_nom)
-        ws.cell(row=row_idx, column=4, value=float(transfert.montant_fcfa))
-        ws.cell(row=row_idx, column=5, value=transfert.get_methode_transfert_display())
-        ws.cell(row=row_idx, column=6, value=transfert.get_statut_display())
-        ws.cell(row=row_idx, column=7, value=f"{transfert.admin_mali.first_name} {transfert.admin_mali.last_name}" if transfert.admin_mali else "N/A")
+        methode_transfert__in=methodes
+    ).order_by('-date_initiation').values(
+        'date_initiation', 'numero_transfert', 'destinataire_nom', 'montant_fcfa',
+        'methode_transfert', 'statut', 'admin_mali__first_name', 'admin_mali__last_name',
+    )
+    methodes_display = dict(TransfertArgent.METHODE_CHOICES)
+    statuts_display = dict(TransfertArgent.STATUS_CHOICES)
+    
+    def ligne(row):
+        agent = f"{row['admin_mali__first_name'] or ''} {row['admin_mali__last_name'] or ''}".strip() or "N/A"
+        return [
+            row['date_initiation'],
+            row['numero_transfert'],
+            row['destinataire_nom'],
+            row['montant_fcfa'],
+            methodes_display.get(row['methode_transfert'], row['methode_transfert']),
+            statuts_display.get(row['statut'], row['statut']),
+            agent,
+        ]
     
-    # Préparation de la réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    export = ExportXlsx()
+    feuille = export.feuille(
+        f"Rapport {libelle}",
+        [
+            Colonne('Date', 'date', 12),
+            Colonne('N° Transfert', largeur=18),
+            Colonne('Destinataire', largeur=28),
+            Colonne('Montant', 'entier', 15),
+            Colonne('Méthode', largeur=18),
+            Colonne('Statut', largeur=18),
+            Colonne('Agent', largeur=24),
+        ],
+        titre=f"RAPPORT {libelle.upper()} - TS AIR CARGO MALI",
     )
-    response['Content-Disposition'] = f'attachment; filename="cargo_{date_debut}_{date_fin}.xlsx"'
+    feuille.ajouter_lignes(lignes_depuis_queryset(transferts, ligne))
     
-    wb.save(response)
-    return response
+    return export.reponse(f"{prefixe_fichier}_{date_debut}_{date_fin}.xlsx")
+
+
+@admin_mali_required
+def export_rapport_cargo_excel(request):
+    """
+    Exporter les rapports cargo en format Excel
+    """
+    # Méthodes considérées comme cargo
+    return _export_transferts_excel(request, ['western_union', 'moneygram'], 'Cargo', 'cargo')
 
 
 @admin_mali_required
@@ -2037,68 +1959,5 @@ def export_rapport_express_excel(request):
     """
     Exporter les rapports express en format Excel
     """
-    import openpyxl
-    from django.http import HttpResponse
-    from datetime import datetime
-    
-    # Récupération des filtres
-    date_debut = request.GET.get('date_debut')
-    date_fin = request.GET.get('date_fin')
-    
-    # Dates par défaut
-    today = timezone.now().date()
-    if not date_debut:
-        date_debut = today - timedelta(days=30)
-    else:
-        try:
-            date_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
-        except ValueError:
-            date_debut = today - timedelta(days=30)
-    
-    if not date_fin:
-        date_fin = today
-    else:
-        try:
-            date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date()
-        except ValueError:
-            date_fin = today
-    
-    # Récupération des transferts comme données express
-    transferts_express = TransfertArgent.objects.filter(
-        date_initiation__date__gte=date_debut,
-        date_initiation__date__lte=date_fin,
-        methode_transfert__in=['orange_money', 'moov_money']  # Méthodes considérées comme express
-    ).select_related('admin_mali').order_by('-date_initiation')
-    
-    # Création du workbook Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Rapport Express"
-    
-    # En-tête
-    ws['A1'] = 'RAPPORT EXPRESS - TS AIR CARGO MALI'
-    ws.merge_cells('A1:G1')
-    
-    # En-têtes des colonnes
-    headers = ['Date', 'N° Transfert', 'Destinataire', 'Montant', 'Méthode', 'Statut', 'Agent']
-    for col_idx, header in enumerate(headers, start=1):
-        ws.cell(row=3, column=col_idx, value=header)
-    
-    # Données
-    for row_idx, transfert in enumerate(transferts_express, start=4):
-        ws.cell(row=row_idx, column=1, value=transfert.date_initiation.strftime('%d/%m/%Y'))
-        ws.cell(row=row_idx, column=2, value=transfert.numero_transfert)
-        ws.cell(row=row_idx, column=3, value=transfert.destinataire_nom)
-        ws.cell(row=row_idx, column=4, value=float(transfert.montant_fcfa))
-        ws.cell(row=row_idx, column=5, value=transfert.get_methode_transfert_display())
-        ws.cell(row=row_idx, column=6, value=transfert.get_statut_display())
-        ws.cell(row=row_idx, column=7, value=f"{transfert.admin_mali.first_name} {transfert.admin_mali.last_name}" if transfert.admin_mali else "N/A")
-    
-    # Préparation de la réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="express_{date_debut}_{date_fin}.xlsx"'
-    
-    wb.save(response)
-    return response
+    # Méthodes considérées comme express
+    return _export_transferts_excel(request, ['orange_money', 'moov_money'], 'Express', 'express')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgentChineAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent_chine_app'
+
+    def ready(self):
+        # Import des signals (invalidation de l'index des tarifs)
+        from . import signals
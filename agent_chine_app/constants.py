@@ -12,6 +12,9 @@ COLIS_STATUS_CHOICES = [
     ('perdu', 'Perdu'),
 ]
 
+# Statuts finaux : un colis livré ou perdu n'est plus modifié ni recalculé
+COLIS_FINAL_STATUSES = ['livre', 'perdu']
+
 # Choix de modes de paiement pour les colis
 COLIS_PAYMENT_CHOICES = [
     ('paye_chine', 'Payé en Chine'),
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0013_add_type_colis_pieces'),
+        ('reporting_app', '0003_add_tarifs_piece'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColisRepricingTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(help_text='Identifiant unique de la tâche', max_length=50, unique=True)),
+                ('celery_task_id', models.CharField(blank=True, help_text='ID de la tâche Celery', max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('completed', 'Terminé'), ('failed', 'Échec')], default='pending', help_text='État actuel de la tâche', max_length=20)),
+                ('progress_percentage', models.IntegerField(default=0, help_text='Pourcentage de progression (0-100)')),
+                ('total_colis', models.IntegerField(default=0, help_text='Nombre de colis ouverts à recalculer')),
+                ('colis_traites', models.IntegerField(default=0, help_text='Nombre de colis recalculés')),
+                ('colis_modifies', models.IntegerField(default=0, help_text='Nombre de colis dont le prix a changé')),
+                ('error_message', models.TextField(blank=True, help_text="Message d'erreur en cas d'échec")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('tarif', models.ForeignKey(blank=True, help_text='Tarif dont la modification a déclenché le recalcul', null=True, on_delete=django.db.models.deletion.SET_NULL, to='reporting_app.shippingprice')),
+            ],
+            options={
+                'verbose_name': 'Tâche de Recalcul des Prix',
+                'verbose_name_plural': 'Tâches de Recalcul des Prix',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='agent_chine_status_fbddb9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def remplir_total_colis_effectif(apps, schema_editor):
+    Lot = apps.get_model('agent_chine_app', 'Lot')
+    Colis = apps.get_model('agent_chine_app', 'Colis')
+
+    prix_effectif = Case(
+        When(prix_transport_manuel__isnull=False, prix_transport_manuel__gt=0,
+             then=F('prix_transport_manuel')),
+        default=F('prix_calcule'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+    total = Subquery(
+        Colis.objects.filter(lot=OuterRef('pk'))
+        .order_by()
+        .values('lot')
+        .annotate(total=Sum(prix_effectif))
+        .values('total')[:1]
+    )
+    Lot.objects.update(
+        total_colis_effectif=Coalesce(
+            total,
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0014_colisrepricingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='total_colis_effectif',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Somme des prix effectifs des colis du lot (maintenue par signaux)', max_digits=14),
+        ),
+        migrations.RunPython(remplir_total_colis_effectif, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:22
+
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def initialiser_sequences(apps, schema_editor):
+    """
+    Reprend le dernier numéro attribué par (type, jour) depuis les lots existants
+    """
+    Lot = apps.get_model('agent_chine_app', 'Lot')
+    LotSequence = apps.get_model('agent_chine_app', 'LotSequence')
+
+    derniers = {}
+    for numero_lot in Lot.objects.values_list('numero_lot', flat=True).iterator():
+        try:
+            prefix, jour, seq = numero_lot.split('-')
+            key = (prefix.lower(), datetime.strptime(jour, '%Y%m%d').date())
+            derniers[key] = max(derniers.get(key, 0), int(seq))
+        except ValueError:
+            continue
+
+    LotSequence.objects.bulk_create([
+        LotSequence(type_lot=type_lot, jour=jour, dernier_numero=seq)
+        for (type_lot, jour), seq in derniers.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0015_lot_total_colis_effectif'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_lot', models.CharField(help_text='Type de transport du lot (cargo, express, bateau)', max_length=20)),
+                ('jour', models.DateField(help_text='Jour de création des lots')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, help_text='Dernier numéro de séquence attribué')),
+            ],
+            options={
+                'verbose_name': 'Séquence de Lots',
+                'verbose_name_plural': 'Séquences de Lots',
+                'constraints': [models.UniqueConstraint(fields=('type_lot', 'jour'), name='unique_lot_sequence_type_jour')],
+            },
+        ),
+        migrations.RunPython(initialiser_sequences, migrations.RunPython.noop),
+    ]
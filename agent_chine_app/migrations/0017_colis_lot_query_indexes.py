@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0016_lotsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['date_creation'], name='agent_chine_date_cr_d182da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['statut', 'date_creation'], name='agent_chine_statut_805da3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['lot', 'statut'], name='agent_chine_lot_id_0ac117_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['client', 'date_creation'], name='agent_chine_client__7b9509_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['type_transport', 'date_creation'], name='agent_chine_type_tr_1330ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['mode_paiement', 'date_creation'], name='agent_chine_mode_pa_383f39_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(fields=['statut', 'date_creation'], name='agent_chine_statut_1b7b43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(fields=['statut', 'date_expedition'], name='agent_chine_statut_7a268c_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+def abandonner_recalculs_en_attente(apps, schema_editor):
+    """
+    Les recalculs restés 'pending' (jamais démarrés) bloqueraient la contrainte
+    """
+    ColisRepricingTask = apps.get_model('agent_chine_app', 'ColisRepricingTask')
+    ColisRepricingTask.objects.filter(status='pending').update(
+        status='failed', error_message="Recalcul jamais démarré"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0017_colis_lot_query_indexes'),
+        ('reporting_app', '0006_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(abandonner_recalculs_en_attente, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='colisrepricingtask',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('status',), name='unique_pending_colis_repricing'),
+        ),
+    ]
@@ -1,9 +1,54 @@
-from django.db import models
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 import uuid
 from ts_air_cargo.validators import validate_colis_image, validate_filename_security
 
+def prix_effectif_expression(prefix=''):
+    """
+    Expression SQL du prix effectif d'un colis (manuel prioritaire sur calculé)
+    Équivalent de Colis.get_prix_effectif, utilisable dans annotate/aggregate
+    
+    Args:
+        prefix: Chemin vers le colis depuis le modèle interrogé (ex: 'colis__')
+    """
+    return Case(
+        When(**{
+            f'{prefix}prix_transport_manuel__isnull': False,
+            f'{prefix}prix_transport_manuel__gt': 0,
+        }, then=F(f'{prefix}prix_transport_manuel')),
+        default=F(f'{prefix}prix_calcule'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def stats_portefeuille_client(prefix='colis__'):
+    """
+    Statistiques du portefeuille d'un client en une requête : nombre de colis,
+    colis livrés et valeur effective (prix manuel prioritaire)
+    
+    Args:
+        prefix: Chemin vers les colis ('colis__' pour annoter des clients,
+            '' pour agréger directement un queryset de colis)
+    
+    Returns:
+        dict: Expressions nb_colis, nb_colis_livres et valeur_totale pour
+            annotate() ou aggregate()
+    """
+    return {
+        'nb_colis': Count(f'{prefix}id'),
+        'nb_colis_livres': Count(f'{prefix}id', filter=Q(**{f'{prefix}statut': 'livre'})),
+        'valeur_totale': Coalesce(
+            Sum(prix_effectif_expression(prefix)),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+    }
+
+
 class Client(models.Model):
     """
     Modèle Client selon les spécifications du DEVBOOK
@@ -101,6 +146,13 @@ class Lot(models.Model):
         editable=False,
         help_text="Bénéfice calculé (prix transport + frais douane - total colis)"
     )
+    total_colis_effectif = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        help_text="Somme des prix effectifs des colis du lot (maintenue par signaux)"
+    )
     
     agent_createur = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -112,54 +164,88 @@ class Lot(models.Model):
     class Meta:
         verbose_name_plural = "Lots"
         ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation']),
+            models.Index(fields=['statut', 'date_expedition']),
+        ]
         
     def save(self, *args, **kwargs):
-        if not self.numero_lot:
-            # Générer le numéro de lot si c'est une nouvelle instance
-            prefix = self.type_lot.upper()
-            today = timezone.now().strftime('%Y%m%d')
-            
-            # Trouver le prochain numéro de séquence
-            last_lot = Lot.objects.filter(
-                numero_lot__startswith=f"{prefix}-{today}"
-            ).order_by('-numero_lot').first()
+        # Allocation du numéro et insertion dans la même transaction : ni trou ni doublon
+        with transaction.atomic():
+            if not self.numero_lot:
+                # Générer le numéro de lot si c'est une nouvelle instance
+                jour = timezone.now().date()
+                seq = LotSequence.allouer(self.type_lot, jour)
+                self.numero_lot = f"{self.type_lot.upper()}-{jour.strftime('%Y%m%d')}-{seq:03d}"
             
-            if last_lot:
-                try:
-                    seq = int(last_lot.numero_lot.split('-')[-1]) + 1
-                except (IndexError, ValueError):
-                    seq = 1
-            else:
-                seq = 1
+            # Inutile de recalculer si la sauvegarde ne porte pas sur le bénéfice
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or {'benefice', 'total_colis_effectif'} & set(update_fields):
+                # Total des colis en une agrégation SQL (aucun colis pour un nouveau lot)
+                if self.pk:
+                    self.total_colis_effectif = self.calculer_total_colis_effectif()
                 
-            self.numero_lot = f"{prefix}-{today}-{seq:03d}"
-        
-        # Calculer le bénéfice si le prix de transport est défini
-        # Les frais de douane peuvent être None (seront traités comme 0)
-        if self.prix_transport is not None:
-            total_colis = sum(float(colis.get_prix_effectif()) for colis in self.colis.all())
-            frais_douane = float(self.frais_douane) if self.frais_douane is not None else 0.0
-            # Bénéfice = Revenus (prix colis) - Coûts (transport + douane)
-            self.benefice = total_colis - (float(self.prix_transport) + frais_douane)
-        else:
-            self.benefice = None
-            
-        super().save(*args, **kwargs)
+                # Calculer le bénéfice si le prix de transport est défini
+                # Les frais de douane peuvent être None (seront traités comme 0)
+                self.benefice = self._calculer_benefice(self.total_colis_effectif)
+                
+            super().save(*args, **kwargs)
         
+    def calculer_total_colis_effectif(self):
+        """
+        Somme des prix effectifs des colis du lot (une seule requête)
+        """
+        total = self.colis.aggregate(total=Sum(prix_effectif_expression()))['total']
+        return total or Decimal('0')
+    
+    def _calculer_benefice(self, total_colis):
+        if self.prix_transport is None:
+            return None
+        frais_douane = float(self.frais_douane) if self.frais_douane is not None else 0.0
+        # Bénéfice = Revenus (prix colis) - Coûts (transport + douane)
+        return float(total_colis or 0) - (float(self.prix_transport) + frais_douane)
+    
     def recalculer_benefice(self):
         """
         Recalcule le bénéfice et sauvegarde le lot
         Utile après mise à jour des frais de douane par l'agent Mali
         """
         if self.prix_transport is not None:
-            total_colis = sum(float(colis.get_prix_effectif()) for colis in self.colis.all())
-            frais_douane = float(self.frais_douane) if self.frais_douane is not None else 0.0
-            # Bénéfice = Revenus (prix colis) - Coûts (transport + douane)
-            self.benefice = total_colis - (float(self.prix_transport) + frais_douane)
-            self.save(update_fields=['benefice'])
+            self.save(update_fields=['benefice', 'total_colis_effectif'])
             return True
         return False
     
+    @classmethod
+    def actualiser_totaux(cls, lot_ids):
+        """
+        Met à jour total_colis_effectif et benefice des lots en une requête UPDATE
+        Appelé par les signaux des colis et après les mises à jour en masse
+        """
+        lot_ids = [lot_id for lot_id in set(lot_ids) if lot_id]
+        if not lot_ids:
+            return 0
+        
+        total = Coalesce(
+            Subquery(
+                Colis.objects.filter(lot=OuterRef('pk'))
+                .order_by()
+                .values('lot')
+                .annotate(total=Sum(prix_effectif_expression()))
+                .values('total')[:1]
+            ),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        )
+        benefice = Case(
+            When(prix_transport__isnull=True, then=Value(None)),
+            default=total - F('prix_transport') - Coalesce(F('frais_douane'), Value(Decimal('0'))),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+        return cls.objects.filter(pk__in=lot_ids).update(
+            total_colis_effectif=total,
+            benefice=benefice,
+        )
+    
     def get_benefice_percentage(self):
         """
         Calcule le pourcentage de marge bénéficiaire par rapport au coût total
@@ -167,7 +253,7 @@ class Lot(models.Model):
         if self.benefice is None or not self.prix_transport:
             return 0.0
             
-        total_cout = sum(float(colis.get_prix_effectif()) for colis in self.colis.all())
+        total_cout = float(self.total_colis_effectif or 0)
         if total_cout == 0:
             return 0.0
             
@@ -176,6 +262,55 @@ class Lot(models.Model):
     def __str__(self):
         return f"Lot {self.numero_lot} - {self.statut}"
 
+class LotSequence(models.Model):
+    """
+    Compteur de numéros de lot par (type de lot, jour)
+    Remplace la recherche du dernier numéro par une incrémentation atomique
+    """
+    type_lot = models.CharField(
+        max_length=20,
+        help_text="Type de transport du lot (cargo, express, bateau)"
+    )
+    jour = models.DateField(
+        help_text="Jour de création des lots"
+    )
+    dernier_numero = models.PositiveIntegerField(
+        default=0,
+        help_text="Dernier numéro de séquence attribué"
+    )
+    
+    class Meta:
+        verbose_name = "Séquence de Lots"
+        verbose_name_plural = "Séquences de Lots"
+        constraints = [
+            models.UniqueConstraint(fields=['type_lot', 'jour'], name='unique_lot_sequence_type_jour'),
+        ]
+        
+    def __str__(self):
+        return f"{self.type_lot} {self.jour} - {self.dernier_numero}"
+    
+    @classmethod
+    def allouer(cls, type_lot, jour):
+        """
+        Réserve le prochain numéro de séquence pour (type_lot, jour)
+        
+        L'UPDATE ... SET dernier_numero = dernier_numero + 1 verrouille la ligne
+        (verrou de ligne PostgreSQL, verrou d'écriture SQLite) jusqu'à la fin de
+        la transaction : deux agents ne peuvent pas obtenir le même numéro.
+        """
+        compteur = cls.objects.filter(type_lot=type_lot, jour=jour)
+        with transaction.atomic():
+            if not compteur.update(dernier_numero=F('dernier_numero') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(type_lot=type_lot, jour=jour, dernier_numero=1)
+                    return 1
+                except IntegrityError:
+                    # Compteur créé entre-temps par une autre transaction
+                    compteur.update(dernier_numero=F('dernier_numero') + 1)
+            return compteur.values_list('dernier_numero', flat=True).get()
+
+
 class Colis(models.Model):
     """
     Modèle Colis selon les spécifications du DEVBOOK
@@ -319,6 +454,14 @@ class Colis(models.Model):
         verbose_name = "Colis"
         verbose_name_plural = "Colis"
         ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['date_creation']),
+            models.Index(fields=['statut', 'date_creation']),
+            models.Index(fields=['lot', 'statut']),
+            models.Index(fields=['client', 'date_creation']),
+            models.Index(fields=['type_transport', 'date_creation']),
+            models.Index(fields=['mode_paiement', 'date_creation']),
+        ]
         
     def save(self, *args, **kwargs):
         if not self.numero_suivi:
@@ -356,67 +499,53 @@ class Colis(models.Model):
             return 'manuel'
         return 'automatique'
     
+    def get_pays_destination(self):
+        """
+        Pays du client sans requête supplémentaire si le client est déjà chargé
+        """
+        from .services.tariff_index import get_tariff_index
+
+        if Colis.client.is_cached(self):
+            return self.client.pays
+        return get_tariff_index().pays_client(self.client_id)
+
     def calculer_prix_automatique(self):
         """
         Calculer le prix automatiquement selon les tarifs configurés
         Support : Poids (Cargo/Express), Volume (Bateau), Pièce (Téléphone/Électronique)
+        Les tarifs sont lus depuis l'index compilé en mémoire (aucune requête SQL)
         """
         try:
-            from reporting_app.models import ShippingPrice
+            from .services.tariff_index import get_tariff_index
             
-            volume_m3 = self.volume_m3()
+            index = get_tariff_index()
+            pays = self.get_pays_destination()
+            poids = float(self.poids)
+            volume_m3 = float(self.volume_m3())
             
             # PRIORITÉ 1 : Tarif à la pièce (téléphone/électronique)
             if self.type_transport in ['cargo', 'express'] and self.type_colis != 'standard':
                 # Chercher tarif spécifique pour ce type de colis
-                tarif_piece = ShippingPrice.objects.filter(
-                    actif=True,
-                    methode_calcul='par_piece',
-                    type_transport__in=[self.type_transport, 'all'],
-                    type_colis__in=[self.type_colis, 'all'],
-                    pays_destination__in=[self.client.pays, 'ALL']
-                ).first()
+                tarif_piece = index.premier('par_piece', self.type_transport, pays, self.type_colis)
                 
                 if tarif_piece and tarif_piece.prix_par_piece:
-                    prix = float(tarif_piece.prix_par_piece) * self.quantite_pieces
+                    prix = tarif_piece.prix_par_piece * self.quantite_pieces
                     return max(prix, 1000)  # Minimum 1000 FCFA
             
             # PRIORITÉ 2 : Tarif au kilo (standard)
             if self.type_transport in ['cargo', 'express']:
-                tarifs = ShippingPrice.objects.filter(
-                    actif=True,
-                    methode_calcul='par_kilo',
-                    type_transport__in=[self.type_transport, 'all'],
-                    pays_destination__in=[self.client.pays, 'ALL']
-                )
-                
-                prix_max = 0
-                for tarif in tarifs:
-                    prix_calcule = tarif.calculer_prix(float(self.poids), volume_m3)
-                    if prix_calcule > prix_max:
-                        prix_max = prix_calcule
+                prix_max = index.prix_max('par_kilo', self.type_transport, pays, poids, volume_m3)
                 
                 if prix_max > 0:
                     return max(prix_max, 1000)
                 
                 # Prix par défaut si aucun tarif
                 multiplier = 12000 if self.type_transport == 'express' else 10000
-                return float(self.poids) * multiplier
+                return poids * multiplier
             
             # PRIORITÉ 3 : Tarif au volume (bateau)
             else:  # bateau
-                tarifs = ShippingPrice.objects.filter(
-                    actif=True,
-                    methode_calcul='par_metre_cube',
-                    type_transport__in=['bateau', 'all'],
-                    pays_destination__in=[self.client.pays, 'ALL']
-                )
-                
-                prix_max = 0
-                for tarif in tarifs:
-                    prix_calcule = tarif.calculer_prix(float(self.poids), volume_m3)
-                    if prix_calcule > prix_max:
-                        prix_max = prix_calcule
+                prix_max = index.prix_max('par_metre_cube', 'bateau', pays, poids, volume_m3)
                 
                 if prix_max > 0:
                     return max(prix_max, 1000)
@@ -909,3 +1038,150 @@ class ColisCreationTask(models.Model):
                 self.task_id = f"TASK_{timestamp}_{unique_part}"
                 
         super().save(*args, **kwargs)
+
+
+class ColisRepricingTask(models.Model):
+    """
+    Tâche de recalcul en masse des prix des colis ouverts
+    Lancée après la création, la modification ou la suppression d'un tarif
+    """
+    TASK_STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En traitement'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    
+    # Identification de la tâche
+    task_id = models.CharField(
+        max_length=50,
+        unique=True,
+        help_text="Identifiant unique de la tâche"
+    )
+    celery_task_id = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        help_text="ID de la tâche Celery"
+    )
+    
+    # État de la tâche
+    status = models.CharField(
+        max_length=20,
+        choices=TASK_STATUS_CHOICES,
+        default='pending',
+        help_text="État actuel de la tâche"
+    )
+    progress_percentage = models.IntegerField(
+        default=0,
+        help_text="Pourcentage de progression (0-100)"
+    )
+    
+    # Tarif à l'origine du recalcul (null si supprimé)
+    tarif = models.ForeignKey(
+        'reporting_app.ShippingPrice',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Tarif dont la modification a déclenché le recalcul"
+    )
+    
+    # Statistiques d'exécution
+    total_colis = models.IntegerField(
+        default=0,
+        help_text="Nombre de colis ouverts à recalculer"
+    )
+    colis_traites = models.IntegerField(
+        default=0,
+        help_text="Nombre de colis recalculés"
+    )
+    colis_modifies = models.IntegerField(
+        default=0,
+        help_text="Nombre de colis dont le prix a changé"
+    )
+    
+    error_message = models.TextField(
+        blank=True,
+        help_text="Message d'erreur en cas d'échec"
+    )
+    
+    # Métadonnées temporelles
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Tâche de Recalcul des Prix"
+        verbose_name_plural = "Tâches de Recalcul des Prix"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # Un seul recalcul en attente : les modifications rapprochées sont regroupées
+            models.UniqueConstraint(
+                fields=['status'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_colis_repricing',
+            ),
+        ]
+        
+    def __str__(self):
+        return f"Recalcul {self.task_id} - {self.get_status_display()}"
+    
+    def get_duration(self):
+        """
+        Calcule la durée de traitement si la tâche est terminée
+        """
+        if self.started_at and self.completed_at:
+            return self.completed_at - self.started_at
+        return None
+    
+    def mark_as_started(self, total_colis):
+        """
+        Marque la tâche comme démarrée
+        """
+        self.status = 'processing'
+        self.started_at = timezone.now()
+        self.total_colis = total_colis
+        self.save(update_fields=['status', 'started_at', 'total_colis'])
+    
+    def update_progress(self, colis_traites, colis_modifies):
+        """
+        Met à jour la progression après chaque lot de colis
+        """
+        self.colis_traites = colis_traites
+        self.colis_modifies = colis_modifies
+        if self.total_colis:
+            self.progress_percentage = min(int(colis_traites * 100 / self.total_colis), 100)
+        self.save(update_fields=['colis_traites', 'colis_modifies', 'progress_percentage'])
+    
+    def mark_as_completed(self):
+        """
+        Marque la tâche comme terminée avec succès
+        """
+        self.status = 'completed'
+        self.completed_at = timezone.now()
+        self.progress_percentage = 100
+        self.save(update_fields=['status', 'completed_at', 'progress_percentage'])
+    
+    def mark_as_failed(self, error_message):
+        """
+        Marque la tâche comme échouée
+        """
+        self.status = 'failed'
+        self.completed_at = timezone.now()
+        self.error_message = error_message
+        self.save(update_fields=['status', 'completed_at', 'error_message'])
+    
+    def save(self, *args, **kwargs):
+        """
+        Génère automatiquement un task_id unique si non fourni
+        """
+        if not self.task_id:
+            import time
+            timestamp = str(int(time.time() * 1000))
+            unique_part = str(uuid.uuid4())[:8].upper()
+            self.task_id = f"REPRICE_{timestamp}_{unique_part}"
+            
+        super().save(*args, **kwargs)
@@ -0,0 +1,192 @@
+"""
+Cache des statistiques globales du tableau de bord Agent Chine
+
+Les chiffres ne dépendent pas de l'agent connecté : une seule entrée de
+cache partagée, servie selon le principe stale-while-revalidate.
+
+- Une entrée fraîche (moins de DASHBOARD_STATS_FRAICHEUR secondes et non
+  invalidée) est servie telle quelle.
+- Une entrée périmée est servie immédiatement et un recalcul est programmé
+  en arrière-plan (au plus un toutes les DASHBOARD_STATS_THROTTLE secondes).
+- Sans entrée (cache vide), le calcul est fait dans la requête.
+
+La tâche périodique refresh_dashboard_stats (Celery beat) garde l'entrée
+chaude ; les signaux de changement de statut des lots et colis appellent
+invalider_dashboard_stats().
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_STATS_KEY = 'agent_chine_dashboard_stats'
+DASHBOARD_STATS_INVALIDE_KEY = 'agent_chine_dashboard_stats_invalide'
+DASHBOARD_STATS_REFRESH_KEY = 'agent_chine_dashboard_stats_refresh'
+
+DASHBOARD_STATS_FRAICHEUR = 300  # secondes
+DASHBOARD_STATS_TTL = 3600  # durée maximale de conservation d'une entrée périmée
+DASHBOARD_STATS_THROTTLE = 30  # délai minimal entre deux recalculs programmés
+
+
+def calculer_dashboard_stats():
+    """
+    Calcule les statistiques globales du tableau de bord
+
+    Returns:
+        dict: Statistiques (mêmes clés que le contexte 'stats' de la vue)
+    """
+    from reporting_app.aggregations import histogramme, serie_temporelle
+
+    from ..models import Client, Colis, Lot
+
+    lots = histogramme(Lot.objects.all(), ['statut'])
+    colis = histogramme(Colis.objects.all(), ['statut'])
+    total_clients = Client.objects.count()
+
+    # Revenus : prix de transport des lots fermés/expédiés
+    debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    debut_mois_precedent = (debut_mois - timedelta(days=1)).replace(day=1)
+    revenus = Lot.objects.filter(statut__in=['ferme', 'expedie']).aggregate(
+        mois=Sum('prix_transport', filter=Q(date_fermeture__gte=debut_mois)),
+        mois_precedent=Sum('prix_transport', filter=Q(
+            date_fermeture__gte=debut_mois_precedent,
+            date_fermeture__lt=debut_mois,
+        )),
+        total=Sum('prix_transport'),
+    )
+    revenus_mois = float(revenus['mois'] or 0)
+    revenus_mois_precedent = float(revenus['mois_precedent'] or 0)
+    evolution_revenus = 0
+    if revenus_mois_precedent > 0:
+        evolution_revenus = ((revenus_mois - revenus_mois_precedent) / revenus_mois_precedent) * 100
+
+    # Les 12 derniers mois calendaires complets
+    revenus_par_mois = [
+        {'mois': point['periode'].strftime('%b %Y'), 'revenu': float(point['revenu'])}
+        for point in serie_temporelle(
+            Lot.objects.filter(statut__in=['ferme', 'expedie']), 'date_fermeture', 12,
+            fin=debut_mois.date() - timedelta(days=1), revenu=Sum('prix_transport'),
+        )
+    ]
+
+    # Croissance des clients par rapport au mois précédent
+    clients = Client.objects.aggregate(
+        ce_mois=Count('pk', filter=Q(date_creation__gte=debut_mois)),
+        mois_precedent=Count('pk', filter=Q(
+            date_creation__gte=debut_mois_precedent,
+            date_creation__lt=debut_mois,
+        )),
+    )
+    if clients['mois_precedent'] > 0:
+        croissance_clients = ((clients['ce_mois'] - clients['mois_precedent']) / clients['mois_precedent']) * 100
+    else:
+        croissance_clients = 100 if clients['ce_mois'] > 0 else 0
+
+    # Indicateurs de performance
+    try:
+        # Taux de remplissage moyen des lots
+        taux_remplissage = Lot.objects.annotate(
+            taux_remplissage=(Count('colis') * 100) / F('nombre_colis_prevus')
+        ).aggregate(avg=Avg('taux_remplissage'))['avg'] or 0
+
+        # Taux de conversion clients (clients avec au moins un colis / total clients)
+        clients_actifs = Client.objects.filter(colis__isnull=False).distinct().count()
+        taux_conversion = (clients_actifs / total_clients * 100) if total_clients > 0 else 0
+
+        # Temps moyen de traitement des colis (en jours)
+        temps_traitement = Colis.objects.filter(
+            date_reception__isnull=False,
+            date_expedition__isnull=False
+        ).annotate(
+            duree=F('date_expedition') - F('date_reception')
+        ).aggregate(avg=Avg('duree'))['avg']
+        temps_traitement = temps_traitement.days if temps_traitement else 0
+    except Exception:
+        taux_remplissage = 0
+        taux_conversion = 0
+        temps_traitement = 0
+
+    return {
+        'total_clients': total_clients,
+        'total_lots': lots['total'],
+        'total_colis': colis['total'],
+        'lots_ouverts': lots['statut']['ouvert'],
+        'lots_fermes': lots['statut']['ferme'],
+        'lots_expedies': lots['statut']['expedie'],
+        'colis_recus': colis['statut']['receptionne_chine'],
+        'colis_en_transit': colis['statut']['en_transit'],
+        'colis_en_attente': colis['statut']['en_attente'],
+        'revenus_mois': revenus_mois,
+        'revenus_mois_precedent': revenus_mois_precedent,
+        'evolution_revenus': evolution_revenus,
+        'total_revenus': float(revenus['total'] or 0),
+        'revenus_par_mois': revenus_par_mois,
+        'croissance_clients': croissance_clients,
+        'taux_remplissage': taux_remplissage,
+        'taux_conversion': taux_conversion,
+        'temps_traitement': temps_traitement,
+    }
+
+
+def rafraichir_dashboard_stats():
+    """
+    Recalcule et enregistre les statistiques (appelé par la tâche Celery)
+    """
+    # Horodatage pris avant le calcul : une invalidation concurrente
+    # laissera l'entrée périmée
+    calcule_le = time.time()
+    stats = calculer_dashboard_stats()
+    cache.set(DASHBOARD_STATS_KEY, {'stats': stats, 'calcule_le': calcule_le}, DASHBOARD_STATS_TTL)
+    return stats
+
+
+def _est_fraiche(entree):
+    age = time.time() - entree['calcule_le']
+    invalide_le = cache.get(DASHBOARD_STATS_INVALIDE_KEY) or 0
+    return age < DASHBOARD_STATS_FRAICHEUR and invalide_le < entree['calcule_le']
+
+
+def programmer_rafraichissement():
+    """
+    Programme un recalcul en arrière-plan (au plus un par fenêtre de throttle)
+    """
+    if not cache.add(DASHBOARD_STATS_REFRESH_KEY, True, DASHBOARD_STATS_THROTTLE):
+        return None
+
+    from ..tasks import refresh_dashboard_stats
+
+    try:
+        return refresh_dashboard_stats.delay()
+    except Exception as e:
+        logger.warning(f"⚠️ Impossible de programmer le recalcul des statistiques: {e}")
+        cache.delete(DASHBOARD_STATS_REFRESH_KEY)
+        return None
+
+
+def get_dashboard_stats():
+    """
+    Statistiques du tableau de bord (stale-while-revalidate)
+    """
+    entree = cache.get(DASHBOARD_STATS_KEY)
+    if entree is None:
+        return rafraichir_dashboard_stats()
+    if not _est_fraiche(entree):
+        programmer_rafraichissement()
+    return entree['stats']
+
+
+def invalider_dashboard_stats():
+    """
+    Marque l'entrée comme périmée et programme son recalcul après le commit
+    """
+    def apres_commit():
+        cache.set(DASHBOARD_STATS_INVALIDE_KEY, time.time(), DASHBOARD_STATS_TTL)
+        programmer_rafraichissement()
+
+    transaction.on_commit(apres_commit)
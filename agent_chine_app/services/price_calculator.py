@@ -3,7 +3,10 @@ Service de calcul de prix pour les colis
 Centralise toute la logique de calcul de prix
 """
 from decimal import Decimal
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
 from ..constants import DEFAULT_PRICES, MIN_COLIS_PRICE
 
 
@@ -153,3 +156,128 @@ class PriceCalculator:
         if prix_transport_manuel and prix_transport_manuel > 0:
             return 'manuel'
         return 'automatique'
+    
+    @staticmethod
+    def price_batch(
+        poids: Sequence[float],
+        longueurs: Sequence[float],
+        largeurs: Sequence[float],
+        hauteurs: Sequence[float],
+        types_transport: Sequence[str],
+        types_colis: Sequence[str],
+        pays: Sequence[str],
+        quantites_pieces: Optional[Sequence[int]] = None,
+        index=None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Calcule en une passe le prix automatique de nombreux colis
+        
+        Applique les mêmes règles que Colis.calculer_prix_automatique
+        (pièce > kilo > volume, minimum 1000 FCFA, prix par défaut) mais
+        évalue chaque tarif applicable sur tout le groupe de colis avec NumPy.
+        
+        Args:
+            poids: Poids en kg
+            longueurs, largeurs, hauteurs: Dimensions en cm
+            types_transport: Type de transport de chaque colis
+            types_colis: Type de colis (standard, telephone, electronique)
+            pays: Code pays de destination de chaque colis
+            quantites_pieces: Nombre de pièces (1 par défaut)
+            index: Index des tarifs (index compilé du processus par défaut)
+            
+        Returns:
+            Dict avec 'prix' (float64) et 'tarif_id' (int64, 0 si prix par défaut)
+        """
+        from .tariff_index import get_tariff_index
+        
+        if index is None:
+            index = get_tariff_index()
+        
+        poids_arr = np.asarray(poids, dtype=np.float64)
+        volumes = (
+            np.asarray(longueurs, dtype=np.float64)
+            * np.asarray(largeurs, dtype=np.float64)
+            * np.asarray(hauteurs, dtype=np.float64)
+        ) / 1000000
+        n = poids_arr.shape[0]
+        if quantites_pieces is None:
+            quantites = np.ones(n, dtype=np.float64)
+        else:
+            quantites = np.asarray(quantites_pieces, dtype=np.float64)
+        transports = np.asarray(types_transport, dtype=object)
+        types_c = np.asarray(types_colis, dtype=object)
+        pays_arr = np.asarray(pays, dtype=object)
+        
+        prix = np.zeros(n, dtype=np.float64)
+        tarif_ids = np.zeros(n, dtype=np.int64)
+        
+        # Regrouper les colis partageant les mêmes tarifs applicables
+        groupes = {}
+        for i, key in enumerate(zip(transports, types_c, pays_arr)):
+            groupes.setdefault(key, []).append(i)
+        
+        for (type_transport, type_colis, pays_destination), positions in groupes.items():
+            idx = np.asarray(positions, dtype=np.int64)
+            p = poids_arr[idx]
+            v = volumes[idx]
+            
+            # PRIORITÉ 1 : Tarif à la pièce (téléphone/électronique)
+            if type_transport in ['cargo', 'express'] and type_colis != 'standard':
+                tarif_piece = index.premier('par_piece', type_transport, pays_destination, type_colis)
+                if tarif_piece and tarif_piece.prix_par_piece:
+                    prix[idx] = np.maximum(tarif_piece.prix_par_piece * quantites[idx], MIN_COLIS_PRICE)
+                    tarif_ids[idx] = tarif_piece.id
+                    continue
+            
+            # PRIORITÉ 2 : au kilo (cargo/express), PRIORITÉ 3 : au volume (bateau)
+            if type_transport in ['cargo', 'express']:
+                tarifs = index.candidats('par_kilo', type_transport, pays_destination)
+                defaut = p * DEFAULT_PRICES.get(type_transport, DEFAULT_PRICES['cargo'])
+            else:
+                tarifs = index.candidats('par_metre_cube', 'bateau', pays_destination)
+                defaut = v * DEFAULT_PRICES['bateau']
+            
+            if not tarifs:
+                prix[idx] = defaut
+                continue
+            
+            matrice = np.vstack([PriceCalculator._evaluer_tarif(tarif, p, v) for tarif in tarifs])
+            meilleur = np.argmax(matrice, axis=0)
+            prix_max = matrice[meilleur, np.arange(len(positions))]
+            ids = np.asarray([tarif.id for tarif in tarifs], dtype=np.int64)[meilleur]
+            
+            avec_tarif = prix_max > 0
+            prix[idx] = np.where(avec_tarif, np.maximum(prix_max, MIN_COLIS_PRICE), defaut)
+            tarif_ids[idx] = np.where(avec_tarif, ids, 0)
+        
+        return {
+            'prix': prix,
+            'tarif_id': tarif_ids,
+        }
+    
+    @staticmethod
+    def _evaluer_tarif(tarif, poids: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+        """
+        Version vectorisée de ShippingPrice.calculer_prix pour un tarif compilé
+        """
+        valide = (poids >= tarif.poids_minimum) & (volumes >= tarif.volume_minimum)
+        if tarif.poids_maximum:
+            valide &= poids <= tarif.poids_maximum
+        if tarif.volume_maximum:
+            valide &= volumes <= tarif.volume_maximum
+        
+        prix_kilo = poids * (tarif.prix_par_kilo or 0)
+        prix_m3 = volumes * (tarif.prix_par_m3 or 0)
+        
+        if tarif.methode_calcul == 'par_kilo':
+            prix = prix_kilo
+        elif tarif.methode_calcul == 'par_metre_cube':
+            prix = prix_m3
+        elif tarif.methode_calcul == 'forfaitaire':
+            prix = np.full(poids.shape, tarif.prix_forfaitaire or 0, dtype=np.float64)
+        elif tarif.methode_calcul == 'mixte':
+            prix = np.maximum(prix_kilo, prix_m3)
+        else:
+            prix = np.zeros(poids.shape, dtype=np.float64)
+        
+        return np.where(valide, prix, 0.0)
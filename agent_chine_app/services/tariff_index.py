@@ -0,0 +1,274 @@
+"""
+Index compilé des tarifs de transport
+Garde en mémoire (par processus) les ShippingPrice actifs pour que le calcul
+automatique du prix d'un colis ne déclenche aucune requête SQL.
+
+La version de l'index est une signature lue en base (nombre de tarifs, plus
+grand id, dernière date_modification) : chaque processus (gunicorn, workers
+Celery) la relit au plus toutes les TARIFF_INDEX_CHECK_INTERVAL secondes et
+se reconstruit si elle a changé, sans dépendre d'un cache partagé. Les
+signaux de ShippingPrice invalident en plus l'index du processus courant.
+
+Le pays des clients est mémorisé avec l'index et oublié quand la dernière
+date_modification des clients change.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal avant qu'un processus voie une modification faite ailleurs
+TARIFF_INDEX_CHECK_INTERVAL = getattr(settings, 'TARIFF_INDEX_CHECK_INTERVAL', 5)
+
+
+class CompiledTariff:
+    """
+    Représentation figée d'un ShippingPrice (valeurs converties en float)
+    Reproduit ShippingPrice.calculer_prix sans accès à la base
+    """
+
+    __slots__ = (
+        'rang', 'id', 'nom_tarif', 'methode_calcul', 'type_transport', 'type_colis',
+        'pays_destination', 'prix_par_kilo', 'prix_par_m3', 'prix_forfaitaire',
+        'prix_par_piece', 'poids_minimum', 'poids_maximum', 'volume_minimum',
+        'volume_maximum',
+    )
+
+    def __init__(self, tarif, rang=0):
+        self.rang = rang
+        self.id = tarif.id
+        self.nom_tarif = tarif.nom_tarif
+        self.methode_calcul = tarif.methode_calcul
+        self.type_transport = tarif.type_transport
+        self.type_colis = tarif.type_colis
+        self.pays_destination = tarif.pays_destination
+        self.prix_par_kilo = _to_float(tarif.prix_par_kilo)
+        self.prix_par_m3 = _to_float(tarif.prix_par_m3)
+        self.prix_forfaitaire = _to_float(tarif.prix_forfaitaire)
+        self.prix_par_piece = _to_float(tarif.prix_par_piece)
+        self.poids_minimum = _to_float(tarif.poids_minimum) or 0.0
+        self.poids_maximum = _to_float(tarif.poids_maximum)
+        self.volume_minimum = _to_float(tarif.volume_minimum) or 0.0
+        self.volume_maximum = _to_float(tarif.volume_maximum)
+
+    def calculer_prix(self, poids_kg, volume_m3, quantite_pieces=1):
+        """
+        Calculer le prix selon la méthode définie (même règles que le modèle)
+        """
+        if self.methode_calcul != 'par_piece':
+            if poids_kg < self.poids_minimum:
+                return 0
+            if self.poids_maximum and poids_kg > self.poids_maximum:
+                return 0
+            if volume_m3 < self.volume_minimum:
+                return 0
+            if self.volume_maximum and volume_m3 > self.volume_maximum:
+                return 0
+
+        if self.methode_calcul == 'par_kilo':
+            return poids_kg * self.prix_par_kilo if self.prix_par_kilo else 0
+
+        elif self.methode_calcul == 'par_metre_cube':
+            return volume_m3 * self.prix_par_m3 if self.prix_par_m3 else 0
+
+        elif self.methode_calcul == 'par_piece':
+            return quantite_pieces * self.prix_par_piece if self.prix_par_piece else 0
+
+        elif self.methode_calcul == 'forfaitaire':
+            return self.prix_forfaitaire if self.prix_forfaitaire else 0
+
+        elif self.methode_calcul == 'mixte':
+            prix_poids = poids_kg * self.prix_par_kilo if self.prix_par_kilo else 0
+            prix_volume = volume_m3 * self.prix_par_m3 if self.prix_par_m3 else 0
+            return max(prix_poids, prix_volume)
+
+        return 0
+
+
+class TariffIndex:
+    """
+    Tarifs actifs indexés par (methode_calcul, type_transport, type_colis, pays)
+    """
+
+    def __init__(self, version, tarifs):
+        self.version = version
+        self.tarifs = tarifs
+        self.verifie_le = time.monotonic()
+        self.version_clients = None
+        self._buckets: Dict[Tuple[str, str, str, str], List[CompiledTariff]] = {}
+        self._resolved: Dict[tuple, Tuple[CompiledTariff, ...]] = {}
+        self._client_pays: Dict[int, str] = {}
+        self._types_colis = set()
+
+        # Les tarifs arrivent triés par -date_creation : chaque bucket conserve cet ordre
+        for tarif in tarifs:
+            key = (tarif.methode_calcul, tarif.type_transport, tarif.type_colis, tarif.pays_destination)
+            self._buckets.setdefault(key, []).append(tarif)
+            self._types_colis.add(tarif.type_colis)
+
+    def candidats(self, methode_calcul, type_transport, pays, type_colis=None):
+        """
+        Tarifs applicables, dans l'ordre du modèle (plus récent d'abord)
+
+        Équivaut à filter(type_transport__in=[type_transport, 'all'],
+        pays_destination__in=[pays, 'ALL'], type_colis__in=[type_colis, 'all']).
+        Si type_colis vaut None, le type de colis n'est pas filtré.
+        """
+        lookup = (methode_calcul, type_transport, pays, type_colis)
+        resolved = self._resolved.get(lookup)
+        if resolved is None:
+            types_colis = self._types_colis if type_colis is None else {type_colis, 'all'}
+            matches = {}
+            for transport in {type_transport, 'all'}:
+                for type_c in types_colis:
+                    for pays_destination in {pays, 'ALL'}:
+                        for tarif in self._buckets.get((methode_calcul, transport, type_c, pays_destination), ()):
+                            matches[tarif.rang] = tarif
+            resolved = tuple(matches[rang] for rang in sorted(matches))
+            self._resolved[lookup] = resolved
+        return resolved
+
+    def premier(self, methode_calcul, type_transport, pays, type_colis=None) -> Optional[CompiledTariff]:
+        """
+        Premier tarif applicable (équivalent de .first() sur le queryset)
+        """
+        tarifs = self.candidats(methode_calcul, type_transport, pays, type_colis)
+        return tarifs[0] if tarifs else None
+
+    def prix_max(self, methode_calcul, type_transport, pays, poids_kg, volume_m3):
+        """
+        Prix le plus élevé parmi les tarifs applicables (0 si aucun)
+        """
+        prix_max = 0
+        for tarif in self.candidats(methode_calcul, type_transport, pays):
+            prix = tarif.calculer_prix(poids_kg, volume_m3)
+            if prix > prix_max:
+                prix_max = prix
+        return prix_max
+
+    def pays_client(self, client_id):
+        """
+        Pays du client, mémorisé pour la durée de vie de l'index
+        """
+        pays = self._client_pays.get(client_id)
+        if pays is None:
+            from agent_chine_app.models import Client
+
+            pays = Client.objects.filter(id=client_id).values_list('pays', flat=True).first() or 'ML'
+            self._client_pays[client_id] = pays
+        return pays
+
+    def oublier_clients(self, client_ids=None):
+        """
+        Oublie le pays mémorisé de certains clients (tous si None)
+        """
+        if client_ids is None:
+            self._client_pays.clear()
+            return
+        for client_id in client_ids:
+            self._client_pays.pop(client_id, None)
+
+
+_lock = threading.Lock()
+_index: Optional[TariffIndex] = None
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+def _signature_tarifs():
+    """
+    Version de l'index lue en base : change à chaque création, modification
+    ou suppression d'un tarif
+    """
+    from reporting_app.models import ShippingPrice
+
+    signature = ShippingPrice.objects.aggregate(
+        nombre=Count('id'), dernier=Max('id'), maj=Max('date_modification')
+    )
+    return (signature['nombre'], signature['dernier'], signature['maj'])
+
+
+def _signature_clients():
+    from agent_chine_app.models import Client
+
+    return Client.objects.aggregate(maj=Max('date_modification'))['maj']
+
+
+def _build_index(version=None):
+    """
+    Construit un index à partir de la base (signature relue si absente)
+    """
+    from reporting_app.models import ShippingPrice
+
+    if version is None:
+        version = _signature_tarifs()
+    tarifs = [
+        CompiledTariff(tarif, rang)
+        for rang, tarif in enumerate(ShippingPrice.objects.filter(actif=True))
+    ]
+    index = TariffIndex(version, tarifs)
+    index.version_clients = _signature_clients()
+    logger.debug(f"Index des tarifs reconstruit ({len(tarifs)} tarifs actifs, version {version})")
+    return index
+
+
+def _verifier(index):
+    """
+    Index à jour : reconstruit si les tarifs ont changé, pays des clients
+    oubliés si un client a été modifié
+    """
+    version = _signature_tarifs()
+    if index is None or index.version != version:
+        return _build_index(version)
+
+    if index._client_pays:
+        version_clients = _signature_clients()
+        if version_clients != index.version_clients:
+            index.oublier_clients()
+            index.version_clients = version_clients
+    index.verifie_le = time.monotonic()
+    return index
+
+
+def get_tariff_index() -> TariffIndex:
+    """
+    Retourne l'index du processus, revérifié en base au plus toutes les
+    TARIFF_INDEX_CHECK_INTERVAL secondes
+    """
+    global _index
+
+    index = _index
+    if index is not None and time.monotonic() - index.verifie_le < TARIFF_INDEX_CHECK_INTERVAL:
+        return index
+
+    with _lock:
+        if _index is None or time.monotonic() - _index.verifie_le >= TARIFF_INDEX_CHECK_INTERVAL:
+            _index = _verifier(_index)
+        return _index
+
+
+def invalidate_tariff_index():
+    """
+    Invalide l'index du processus courant ; les autres processus voient la
+    nouvelle signature à leur prochaine vérification
+    """
+    global _index
+
+    with _lock:
+        _index = None
+
+
+def oublier_pays_clients(client_ids):
+    """
+    Oublie le pays mémorisé de clients dont le pays a changé (processus courant)
+    """
+    index = _index
+    if index is not None:
+        index.oublier_clients(client_ids)
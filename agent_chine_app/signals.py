@@ -0,0 +1,84 @@
+"""
+Signaux de l'application Agent Chine
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from reporting_app.models import ShippingPrice
+
+from .models import Client, Colis, Lot
+from .services.dashboard_stats import invalider_dashboard_stats
+from .services.tariff_index import invalidate_tariff_index, oublier_pays_clients
+
+
+@receiver(post_save, sender=ShippingPrice)
+@receiver(post_delete, sender=ShippingPrice)
+def invalider_index_tarifs(sender, instance, **kwargs):
+    """
+    Toute modification d'un tarif invalide l'index compilé de tous les processus
+    et programme le recalcul des prix des colis ouverts
+    """
+    from .tasks import schedule_colis_repricing
+
+    tarif_id = instance.id
+
+    def apres_commit():
+        invalidate_tariff_index()
+        schedule_colis_repricing(tarif_id)
+
+    transaction.on_commit(apres_commit)
+
+
+@receiver(post_init, sender=Client)
+def memoriser_pays(sender, instance, **kwargs):
+    instance._pays_initial = instance.__dict__.get('pays')
+
+
+@receiver(post_save, sender=Client)
+def invalider_pays_client(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Le pays des clients existants est mémorisé dans l'index des tarifs :
+    seul ce client est oublié, et seulement si son pays a changé
+    """
+    if created or (update_fields and 'pays' not in update_fields):
+        return
+    if instance.pays == getattr(instance, '_pays_initial', None):
+        return
+    instance._pays_initial = instance.pays
+    client_id = instance.id
+    transaction.on_commit(lambda: oublier_pays_clients([client_id]))
+
+
+@receiver(post_save, sender=Colis)
+@receiver(post_delete, sender=Colis)
+def actualiser_total_lot(sender, instance, **kwargs):
+    """
+    Garde total_colis_effectif et benefice du lot synchronisés avec ses colis
+    """
+    Lot.actualiser_totaux([instance.lot_id])
+
+
+@receiver(post_init, sender=Colis)
+@receiver(post_init, sender=Lot)
+def memoriser_statut(sender, instance, **kwargs):
+    instance._statut_initial = instance.__dict__.get('statut')
+
+
+@receiver(post_save, sender=Colis)
+@receiver(post_save, sender=Lot)
+def invalider_stats_statut(sender, instance, created, raw=False, **kwargs):
+    """
+    Un lot ou colis créé ou changeant de statut périme les statistiques du tableau de bord
+    """
+    if raw:
+        return
+    if created or instance.statut != getattr(instance, '_statut_initial', None):
+        invalider_dashboard_stats()
+    instance._statut_initial = instance.statut
+
+
+@receiver(post_delete, sender=Colis)
+@receiver(post_delete, sender=Lot)
+def invalider_stats_suppression(sender, instance, **kwargs):
+    invalider_dashboard_stats()
@@ -13,11 +13,18 @@ from django.utils import timezone
 from django.conf import settings
 from PIL import Image
 import tempfile
+from decimal import Decimal
 
-from .models import ColisCreationTask, Colis, Client, Lot
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import ColisCreationTask, ColisRepricingTask, Colis, Client, Lot
+from .constants import COLIS_FINAL_STATUSES
 from .client_management import ClientAccountManager
 from notifications_app.tasks import notify_colis_created, notify_colis_updated
 from whatsapp_monitoring_app.tasks import send_whatsapp_async
+from reporting_app.daily_stats import mise_a_jour_en_masse
 
 logger = logging.getLogger(__name__)
 
@@ -678,3 +685,170 @@ def create_client_account_async(self, task_id):
             'celery_task_id': self.request.id,
             'retries_exhausted': True
         }
+
+
+# Un recalcul resté en attente au-delà de ce délai est considéré perdu (message Celery perdu)
+REPRICING_PENDING_TIMEOUT = timedelta(hours=1)
+
+
+def schedule_colis_repricing(tarif_id=None, countdown=10):
+    """
+    Programme un recalcul des prix des colis ouverts (une seule tâche en attente)
+    
+    Le regroupement passe par la base : une ligne ColisRepricingTask 'pending'
+    (unique) existe tant que la tâche n'a pas démarré. Au démarrage, la tâche
+    la passe en 'processing' puis relit les tarifs : toute modification
+    ultérieure programme donc un nouveau recalcul.
+    """
+    from reporting_app.models import ShippingPrice
+    
+    ColisRepricingTask.objects.filter(
+        status='pending', created_at__lt=timezone.now() - REPRICING_PENDING_TIMEOUT
+    ).update(status='failed', completed_at=timezone.now(), error_message="Recalcul jamais démarré")
+    
+    try:
+        with transaction.atomic():
+            repricing = ColisRepricingTask.objects.create(
+                tarif=ShippingPrice.objects.filter(id=tarif_id).first() if tarif_id else None,
+            )
+    except IntegrityError:
+        logger.debug("Recalcul des prix déjà programmé")
+        return None
+    
+    resultat = reprice_open_colis_async.apply_async(
+        kwargs={'repricing_task_id': repricing.id}, countdown=countdown
+    )
+    ColisRepricingTask.objects.filter(id=repricing.id).update(celery_task_id=resultat.id)
+    return resultat
+
+
+@shared_task(bind=True, max_retries=2)
+def reprice_open_colis_async(self, repricing_task_id=None, tarif_id=None, chunk_size=2000):
+    """
+    Recalcule le prix_calcule des colis non finalisés sans prix manuel
+    
+    Les colis sont lus par tranches (pagination par clé primaire), tarifés en
+    lot via PriceCalculator.price_batch et seuls les prix modifiés sont écrits
+    avec bulk_update.
+    
+    Args:
+        repricing_task_id (int): ColisRepricingTask créée par schedule_colis_repricing
+            (une nouvelle est créée si absent)
+        tarif_id (int): Tarif à l'origine du recalcul (lancement manuel, optionnel)
+        chunk_size (int): Nombre de colis traités par tranche
+        
+    Returns:
+        dict: Résultat de l'opération avec statistiques
+    """
+    from .services.price_calculator import PriceCalculator
+    from .services.tariff_index import _build_index
+    from reporting_app.models import ShippingPrice
+    
+    task = None
+    try:
+        task = ColisRepricingTask.objects.filter(id=repricing_task_id).first() if repricing_task_id else None
+        if task is None:
+            task = ColisRepricingTask.objects.create(
+                celery_task_id=self.request.id,
+                tarif=ShippingPrice.objects.filter(id=tarif_id).first() if tarif_id else None,
+            )
+        
+        colis_ouverts = Colis.objects.exclude(
+            statut__in=COLIS_FINAL_STATUSES
+        ).filter(
+            Q(prix_transport_manuel__isnull=True) | Q(prix_transport_manuel__lte=0)
+        )
+        # Libère la place 'pending' : une modification de tarif à partir d'ici reprogramme un recalcul
+        task.mark_as_started(colis_ouverts.count())
+        logger.info(f"💰 Recalcul des prix de {task.total_colis} colis ouverts - Tâche {task.task_id}")
+        
+        # Index construit depuis la base : celui du processus peut dater d'avant la modification
+        index = _build_index()
+        dernier_id = 0
+        traites = 0
+        modifies = 0
+        
+        while True:
+            rows = list(
+                colis_ouverts.filter(id__gt=dernier_id).order_by('id').values(
+                    'id', 'lot_id', 'poids', 'longueur', 'largeur', 'hauteur', 'type_transport',
+                    'type_colis', 'quantite_pieces', 'client__pays', 'prix_calcule'
+                )[:chunk_size]
+            )
+            if not rows:
+                break
+            
+            resultat = PriceCalculator.price_batch(
+                poids=[row['poids'] for row in rows],
+                longueurs=[row['longueur'] for row in rows],
+                largeurs=[row['largeur'] for row in rows],
+                hauteurs=[row['hauteur'] for row in rows],
+                types_transport=[row['type_transport'] for row in rows],
+                types_colis=[row['type_colis'] for row in rows],
+                pays=[row['client__pays'] for row in rows],
+                quantites_pieces=[row['quantite_pieces'] for row in rows],
+                index=index,
+            )
+            
+            a_modifier = []
+            lots_modifies = set()
+            for row, prix in zip(rows, resultat['prix']):
+                nouveau_prix = Decimal(str(round(float(prix), 2))).quantize(Decimal('0.01'))
+                if nouveau_prix != row['prix_calcule']:
+                    a_modifier.append(Colis(id=row['id'], prix_calcule=nouveau_prix))
+                    lots_modifies.add(row['lot_id'])
+            
+            if a_modifier:
+                # bulk_update ne déclenche pas les signaux : actualiser les totaux des lots
+                # et les jours DailyStats concernés
+                ids = [colis.id for colis in a_modifier]
+                with mise_a_jour_en_masse('colis', Colis.objects.filter(id__in=ids)):
+                    Colis.objects.bulk_update(a_modifier, ['prix_calcule'], batch_size=500)
+                Lot.actualiser_totaux(lots_modifies)
+            
+            traites += len(rows)
+            modifies += len(a_modifier)
+            dernier_id = rows[-1]['id']
+            task.update_progress(traites, modifies)
+        
+        task.mark_as_completed()
+        logger.info(f"✅ Recalcul terminé: {modifies}/{traites} colis mis à jour - Tâche {task.task_id}")
+        
+        return {
+            'success': True,
+            'task_id': task.task_id,
+            'colis_traites': traites,
+            'colis_modifies': modifies,
+            'duration': task.get_duration().total_seconds() if task.get_duration() else None
+        }
+        
+    except Exception as e:
+        error_msg = f"Erreur recalcul des prix: {str(e)}"
+        logger.error(f"❌ {error_msg}", exc_info=True)
+        
+        if task:
+            task.mark_as_failed(error_msg)
+        
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=60 * (2 ** self.request.retries))
+        
+        return {
+            'success': False,
+            'error': error_msg,
+            'task_id': task.task_id if task else None
+        }
+
+
+@shared_task(ignore_result=True, time_limit=120, soft_time_limit=100)
+def refresh_dashboard_stats():
+    """
+    Recalcule les statistiques globales du tableau de bord Agent Chine
+    (Celery beat + recalculs programmés par invalidation)
+    """
+    from .services.dashboard_stats import rafraichir_dashboard_stats
+    
+    try:
+        stats = rafraichir_dashboard_stats()
+        logger.debug(f"📊 Statistiques du tableau de bord recalculées ({stats['total_colis']} colis)")
+    except Exception as e:
+        logger.error(f"❌ Erreur recalcul statistiques tableau de bord: {str(e)}", exc_info=True)
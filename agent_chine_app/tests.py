@@ -1,3 +1,461 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from reporting_app.models import ShippingPrice
+
+from .models import Client, Colis, ColisRepricingTask, Lot, LotSequence, stats_portefeuille_client
+from .services.price_calculator import PriceCalculator
+from .services.tariff_index import get_tariff_index, invalidate_tariff_index
+from .tasks import reprice_open_colis_async, schedule_colis_repricing
+
+User = get_user_model()
+
+
+class DonneesColisMixin:
+    """
+    Clients, lot et tarifs communs aux tests des colis
+    """
+
+    @classmethod
+    def creer_client(cls, telephone, pays='ML', prenom='Client'):
+        user = User.objects.create_user(
+            telephone=telephone, email=f'{telephone.strip("+")}@example.com',
+            password='secret', role='client', first_name=prenom,
+        )
+        return Client.objects.create(user=user, adresse='Bamako', pays=pays)
+
+    @classmethod
+    def creer_colis(cls, client, lot, **champs):
+        valeurs = {
+            'type_transport': 'cargo', 'type_colis': 'standard',
+            'longueur': Decimal('40'), 'largeur': Decimal('30'), 'hauteur': Decimal('20'),
+            'poids': Decimal('2.5'),
+        }
+        valeurs.update(champs)
+        return Colis.objects.create(client=client, lot=lot, **valeurs)
+
+    @classmethod
+    def setUpTestData(cls):
+        invalidate_tariff_index()
+        cls.agent = User.objects.create_user(
+            telephone='+8613800000000', email='agent@example.com', password='secret', role='agent_chine',
+        )
+        cls.lot = Lot.objects.create(type_lot='cargo', agent_createur=cls.agent)
+        cls.client_mali = cls.creer_client('+22370000001', 'ML')
+        cls.client_senegal = cls.creer_client('+22170000002', 'SN')
+
+        cls.tarif_kilo = ShippingPrice.objects.create(
+            nom_tarif='Cargo Mali', methode_calcul='par_kilo', type_transport='cargo',
+            pays_destination='ML', prix_par_kilo=Decimal('8000'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Téléphones', methode_calcul='par_piece', type_transport='cargo',
+            type_colis='telephone', pays_destination='ML', prix_par_piece=Decimal('6000'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Bateau', methode_calcul='par_metre_cube', type_transport='bateau',
+            pays_destination='ALL', prix_par_m3=Decimal('250000'),
+        )
+
+    def setUp(self):
+        invalidate_tariff_index()
+
+
+class TariffIndexTests(DonneesColisMixin, TestCase):
+    """
+    Index compilé des tarifs comparé aux requêtes ShippingPrice
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ShippingPrice.objects.create(
+            nom_tarif='Kilo toutes destinations', methode_calcul='par_kilo', type_transport='all',
+            pays_destination='ALL', prix_par_kilo=Decimal('7000'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Express Sénégal', methode_calcul='par_kilo', type_transport='express',
+            pays_destination='SN', prix_par_kilo=Decimal('11000'), poids_maximum=Decimal('1'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Ancien cargo', methode_calcul='par_kilo', type_transport='cargo',
+            pays_destination='ML', prix_par_kilo=Decimal('99999'), actif=False,
+        )
+
+    def tarifs(self, methode_calcul, type_transport, pays, type_colis=None):
+        tarifs = ShippingPrice.objects.filter(
+            actif=True, methode_calcul=methode_calcul,
+            type_transport__in=[type_transport, 'all'], pays_destination__in=[pays, 'ALL'],
+        )
+        if type_colis is not None:
+            tarifs = tarifs.filter(type_colis__in=[type_colis, 'all'])
+        return tarifs
+
+    def test_premier_et_prix_max_egalent_le_queryset(self):
+        index = get_tariff_index()
+        for methode_calcul in ['par_kilo', 'par_metre_cube', 'par_piece']:
+            for type_transport in ['cargo', 'express', 'bateau']:
+                for pays in ['ML', 'SN', 'CI']:
+                    for type_colis in [None, 'standard', 'telephone']:
+                        cas = (methode_calcul, type_transport, pays, type_colis)
+                        attendu = self.tarifs(*cas).first()
+                        premier = index.premier(*cas)
+                        self.assertEqual(premier and premier.id, attendu and attendu.id, msg=cas)
+
+                    for poids, volume in [(0.5, 0.01), (2.5, 0.024), (30, 0.5)]:
+                        cas = (methode_calcul, type_transport, pays)
+                        attendu = max(
+                            [float(t.calculer_prix(Decimal(str(poids)), Decimal(str(volume)))) for t in self.tarifs(*cas)],
+                            default=0,
+                        )
+                        self.assertAlmostEqual(index.prix_max(*cas, poids, volume), attendu, places=2, msg=cas)
+
+    def test_jokers_all(self):
+        index = get_tariff_index()
+        # Pays sans tarif dédié : seuls les tarifs 'ALL' et type_transport 'all' s'appliquent
+        self.assertEqual(index.premier('par_kilo', 'cargo', 'CI').nom_tarif, 'Kilo toutes destinations')
+        self.assertEqual(index.premier('par_metre_cube', 'bateau', 'CI').nom_tarif, 'Bateau')
+        self.assertIsNone(index.premier('par_metre_cube', 'cargo', 'CI'))
+        self.assertIsNone(index.premier('par_piece', 'cargo', 'ML', type_colis='standard'))
+        self.assertNotIn('Ancien cargo', [t.nom_tarif for t in index.candidats('par_kilo', 'cargo', 'ML')])
+
+    def test_modification_change_la_signature(self):
+        index = get_tariff_index()
+        version = index.version
+
+        # Modification sans signal : l'index n'est pas invalidé dans ce processus
+        ShippingPrice.objects.filter(pk=self.tarif_kilo.pk).update(
+            prix_par_kilo=Decimal('9500'), date_modification=timezone.now()
+        )
+        self.assertIs(get_tariff_index(), index)
+        with mock.patch('agent_chine_app.services.tariff_index.TARIFF_INDEX_CHECK_INTERVAL', 0):
+            nouvel_index = get_tariff_index()
+        self.assertNotEqual(nouvel_index.version, version)
+        tarif = next(t for t in nouvel_index.candidats('par_kilo', 'cargo', 'ML') if t.id == self.tarif_kilo.id)
+        self.assertEqual(tarif.prix_par_kilo, 9500.0)
+
+        version = nouvel_index.version
+        ShippingPrice.objects.filter(nom_tarif='Express Sénégal').delete()
+        with mock.patch('agent_chine_app.services.tariff_index.TARIFF_INDEX_CHECK_INTERVAL', 0):
+            index = get_tariff_index()
+        self.assertNotEqual(index.version, version)
+        self.assertNotIn('Express Sénégal', [t.nom_tarif for t in index.candidats('par_kilo', 'express', 'SN')])
+
+
+class PriceBatchTests(DonneesColisMixin, TestCase):
+    """
+    price_batch comparé ligne à ligne à calculer_prix_automatique
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_ci = cls.creer_client('+22570000004', 'CI')
+        ShippingPrice.objects.create(
+            nom_tarif='Express Sénégal léger', methode_calcul='par_kilo', type_transport='express',
+            pays_destination='SN', prix_par_kilo=Decimal('11000'), poids_maximum=Decimal('5'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Kilo mixte', methode_calcul='par_kilo', type_transport='all',
+            pays_destination='ALL', prix_par_kilo=Decimal('7500'), poids_minimum=Decimal('10'),
+        )
+        ShippingPrice.objects.create(
+            nom_tarif='Électronique', methode_calcul='par_piece', type_transport='express',
+            type_colis='electronique', pays_destination='ALL', prix_par_piece=Decimal('150'),
+        )
+
+    def test_prix_identiques_ligne_a_ligne(self):
+        colis = []
+        for client in [self.client_mali, self.client_senegal, self.client_ci]:
+            for type_transport in ['cargo', 'express', 'bateau']:
+                for type_colis in ['standard', 'telephone', 'electronique']:
+                    for poids, cote in [(Decimal('0.05'), Decimal('5')), (Decimal('2.5'), Decimal('30')),
+                                        (Decimal('40'), Decimal('120'))]:
+                        colis.append(Colis(
+                            client=client, lot=self.lot, type_transport=type_transport, type_colis=type_colis,
+                            poids=poids, longueur=cote, largeur=cote, hauteur=cote, quantite_pieces=3,
+                        ))
+
+        resultat = PriceCalculator.price_batch(
+            poids=[c.poids for c in colis],
+            longueurs=[c.longueur for c in colis],
+            largeurs=[c.largeur for c in colis],
+            hauteurs=[c.hauteur for c in colis],
+            types_transport=[c.type_transport for c in colis],
+            types_colis=[c.type_colis for c in colis],
+            pays=[c.client.pays for c in colis],
+            quantites_pieces=[c.quantite_pieces for c in colis],
+        )
+
+        self.assertEqual(len(resultat['prix']), len(colis))
+        for c, prix in zip(colis, resultat['prix']):
+            cas = (c.client.pays, c.type_transport, c.type_colis, c.poids)
+            self.assertAlmostEqual(float(prix), float(c.calculer_prix_automatique()), places=2, msg=cas)
+
+    def test_lot_vide(self):
+        resultat = PriceCalculator.price_batch([], [], [], [], [], [], [])
+        self.assertEqual(len(resultat['prix']), 0)
+        self.assertEqual(len(resultat['tarif_id']), 0)
+
+
+class RecalculPrixTests(DonneesColisMixin, TestCase):
+    """
+    Tarification en lot (price_batch) et recalcul des colis ouverts
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.colis = [
+            cls.creer_colis(cls.client_mali, cls.lot),
+            cls.creer_colis(cls.client_mali, cls.lot, poids=Decimal('0.05')),
+            cls.creer_colis(cls.client_mali, cls.lot, type_colis='telephone', quantite_pieces=3),
+            cls.creer_colis(cls.client_mali, cls.lot, type_transport='express'),
+            cls.creer_colis(cls.client_senegal, cls.lot),
+            cls.creer_colis(cls.client_senegal, cls.lot, type_transport='bateau'),
+        ]
+        cls.colis_manuel = cls.creer_colis(cls.client_mali, cls.lot, prix_transport_manuel=Decimal('12345'))
+        cls.colis_livre = cls.creer_colis(cls.client_mali, cls.lot, statut='livre')
+
+    def test_price_batch_egale_calcul_unitaire(self):
+        colis = Colis.objects.select_related('client').order_by('id')
+        resultat = PriceCalculator.price_batch(
+            poids=[c.poids for c in colis],
+            longueurs=[c.longueur for c in colis],
+            largeurs=[c.largeur for c in colis],
+            hauteurs=[c.hauteur for c in colis],
+            types_transport=[c.type_transport for c in colis],
+            types_colis=[c.type_colis for c in colis],
+            pays=[c.client.pays for c in colis],
+            quantites_pieces=[c.quantite_pieces for c in colis],
+        )
+        for c, prix in zip(colis, resultat['prix']):
+            self.assertAlmostEqual(float(prix), float(c.calculer_prix_automatique()), places=2, msg=c.numero_suivi)
+
+    def test_recalcul_aligne_les_prix_effectifs(self):
+        # Modification sans signal : seul le recalcul peut corriger les prix
+        ShippingPrice.objects.filter(pk=self.tarif_kilo.pk).update(prix_par_kilo=Decimal('9500'))
+        invalidate_tariff_index()
+
+        resultat = reprice_open_colis_async.apply(kwargs={'chunk_size': 4}).get()
+
+        self.assertTrue(resultat['success'])
+        self.assertEqual(resultat['colis_traites'], len(self.colis))
+        for c in Colis.objects.filter(pk__in=[c.pk for c in self.colis]):
+            attendu = Decimal(str(round(float(c.calculer_prix_automatique()), 2)))
+            self.assertEqual(Decimal(str(c.get_prix_effectif())), attendu, msg=c.numero_suivi)
+
+        self.colis_manuel.refresh_from_db()
+        self.assertEqual(self.colis_manuel.get_prix_effectif(), 12345.0)
+        prix_livre = self.colis_livre.prix_calcule
+        self.colis_livre.refresh_from_db()
+        self.assertEqual(self.colis_livre.prix_calcule, prix_livre)
+
+    def test_total_du_lot_suit_le_recalcul(self):
+        ShippingPrice.objects.filter(pk=self.tarif_kilo.pk).update(prix_par_kilo=Decimal('9500'))
+        reprice_open_colis_async.apply()
+
+        self.lot.refresh_from_db()
+        total = sum(Decimal(str(c.get_prix_effectif())) for c in self.lot.colis.all())
+        self.assertEqual(self.lot.total_colis_effectif, total)
+
+    def test_programmation_regroupee_en_base(self):
+        with mock.patch.object(reprice_open_colis_async, 'apply_async') as apply_async:
+            apply_async.return_value.id = 'celery-1'
+            self.assertIsNotNone(schedule_colis_repricing(self.tarif_kilo.id))
+            self.assertIsNone(schedule_colis_repricing(self.tarif_kilo.id))
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(ColisRepricingTask.objects.filter(status='pending').count(), 1)
+
+        # Une fois la tâche démarrée, une nouvelle modification reprogramme
+        ColisRepricingTask.objects.get(status='pending').mark_as_started(total_colis=0)
+        with mock.patch.object(reprice_open_colis_async, 'apply_async') as apply_async:
+            apply_async.return_value.id = 'celery-2'
+            self.assertIsNotNone(schedule_colis_repricing(self.tarif_kilo.id))
+
+
+class TotauxLotTests(DonneesColisMixin, TestCase):
+    """
+    Total et bénéfice des lots : UPDATE groupé (actualiser_totaux) et calcul Python
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.lots = {
+            'complet': Lot.objects.create(
+                type_lot='cargo', agent_createur=cls.agent,
+                prix_transport=Decimal('15000'), frais_douane=Decimal('2500'),
+            ),
+            'sans_douane': Lot.objects.create(type_lot='cargo', agent_createur=cls.agent, prix_transport=Decimal('8000')),
+            'sans_transport': Lot.objects.create(type_lot='cargo', agent_createur=cls.agent),
+            'vide': Lot.objects.create(type_lot='cargo', agent_createur=cls.agent, prix_transport=Decimal('1000')),
+        }
+        for cle in ['complet', 'sans_douane', 'sans_transport']:
+            lot = cls.lots[cle]
+            cls.creer_colis(cls.client_mali, lot)
+            cls.creer_colis(cls.client_mali, lot, type_colis='telephone', quantite_pieces=2)
+            cls.creer_colis(cls.client_senegal, lot, prix_transport_manuel=Decimal('12345.50'))
+
+    def attendu(self, lot):
+        total = sum((Decimal(str(c.get_prix_effectif())) for c in lot.colis.all()), Decimal('0'))
+        benefice = lot._calculer_benefice(total)
+        return total, None if benefice is None else Decimal(str(round(benefice, 2)))
+
+    def test_actualiser_totaux_egale_le_calcul_python(self):
+        ids = [lot.pk for lot in self.lots.values()]
+        Lot.objects.filter(pk__in=ids).update(total_colis_effectif=Decimal('1'), benefice=Decimal('1'))
+
+        self.assertEqual(Lot.actualiser_totaux(ids + [None]), len(ids))
+
+        for cle, lot in self.lots.items():
+            lot.refresh_from_db()
+            self.assertEqual((lot.total_colis_effectif, lot.benefice), self.attendu(lot), msg=cle)
+        self.assertIsNone(self.lots['sans_transport'].benefice)
+        self.assertEqual(self.lots['vide'].benefice, Decimal('-1000'))
+
+    def test_recalculer_benefice_et_signaux(self):
+        lot = self.lots['complet']
+        # Frais de douane saisis par l'agent Mali sans recalcul
+        Lot.objects.filter(pk=lot.pk).update(frais_douane=Decimal('4000'))
+        lot.refresh_from_db()
+        self.assertTrue(lot.recalculer_benefice())
+        lot.refresh_from_db()
+        self.assertEqual((lot.total_colis_effectif, lot.benefice), self.attendu(lot))
+
+        # Les signaux des colis tiennent le total à jour
+        colis = self.creer_colis(self.client_mali, lot, poids=Decimal('7'))
+        lot.refresh_from_db()
+        self.assertEqual((lot.total_colis_effectif, lot.benefice), self.attendu(lot))
+        colis.delete()
+        lot.refresh_from_db()
+        self.assertEqual((lot.total_colis_effectif, lot.benefice), self.attendu(lot))
+        self.assertFalse(self.lots['sans_transport'].recalculer_benefice())
+
+
+class LotSequenceTests(TestCase):
+    """
+    Numérotation des lots par compteur (type de lot, jour)
+    """
+
+    def test_numeros_consecutifs_par_type_et_par_jour(self):
+        jour = date(2026, 3, 14)
+        self.assertEqual([LotSequence.allouer('cargo', jour) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(LotSequence.allouer('express', jour), 1)
+        self.assertEqual(LotSequence.allouer('cargo', date(2026, 3, 15)), 1)
+        self.assertEqual(LotSequence.objects.get(type_lot='cargo', jour=jour).dernier_numero, 3)
+
+    def test_compteur_cree_par_une_autre_transaction(self):
+        jour = date(2026, 3, 14)
+        # Compteur créé (et validé) par une autre transaction après notre UPDATE
+        LotSequence.objects.create(type_lot='cargo', jour=jour, dernier_numero=1)
+        update = QuerySet.update
+        appels = []
+
+        def update_avant_creation(queryset, **champs):
+            appels.append(champs)
+            return 0 if len(appels) == 1 else update(queryset, **champs)
+
+        with mock.patch.object(QuerySet, 'update', update_avant_creation):
+            self.assertEqual(LotSequence.allouer('cargo', jour), 2)
+        self.assertEqual(len(appels), 2)
+        self.assertEqual(LotSequence.allouer('cargo', jour), 3)
+
+    def test_numeros_de_lot_uniques(self):
+        agent = User.objects.create_user(
+            telephone='+8613800000001', email='agent-lots@example.com', password='secret', role='agent_chine',
+        )
+        lots = [Lot.objects.create(type_lot=type_lot, agent_createur=agent)
+                for type_lot in ['cargo', 'cargo', 'express', 'cargo', 'bateau']]
+
+        numeros = [lot.numero_lot for lot in lots]
+        self.assertEqual(len(set(numeros)), len(numeros))
+        prefixe = f"CARGO-{timezone.now().date():%Y%m%d}"
+        self.assertEqual(
+            sorted(numero for numero in numeros if numero.startswith('CARGO')),
+            [f'{prefixe}-001', f'{prefixe}-002', f'{prefixe}-003'],
+        )
+
+
+class StatsPortefeuilleTests(DonneesColisMixin, TestCase):
+    """
+    Statistiques des clients en une requête (stats_portefeuille_client)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.client_sans_colis = cls.creer_client('+22370000003', 'ML')
+        cls.creer_colis(cls.client_mali, cls.lot)
+        cls.creer_colis(cls.client_mali, cls.lot, statut='livre')
+        cls.creer_colis(cls.client_mali, cls.lot, statut='livre', prix_transport_manuel=Decimal('12345.50'))
+        cls.creer_colis(cls.client_mali, cls.lot, type_colis='telephone', quantite_pieces=2)
+        cls.creer_colis(cls.client_senegal, cls.lot, type_transport='bateau')
+
+    def stats_par_boucle(self, client):
+        colis = client.colis.all()
+        return {
+            'nb_colis': colis.count(),
+            'nb_colis_livres': colis.filter(statut='livre').count(),
+            'valeur_totale': sum(Decimal(str(c.get_prix_effectif())) for c in colis),
+        }
+
+    def test_annotation_egale_la_boucle_par_client(self):
+        clients = Client.objects.annotate(**stats_portefeuille_client())
+        self.assertEqual(len(clients), 3)
+        with self.assertNumQueries(1):
+            list(Client.objects.annotate(**stats_portefeuille_client()))
+
+        for client in clients:
+            attendu = self.stats_par_boucle(client)
+            self.assertEqual(client.nb_colis, attendu['nb_colis'], msg=client)
+            self.assertEqual(client.nb_colis_livres, attendu['nb_colis_livres'], msg=client)
+            self.assertEqual(client.valeur_totale, attendu['valeur_totale'], msg=client)
+
+        sans_colis = clients.get(pk=self.client_sans_colis.pk)
+        self.assertEqual((sans_colis.nb_colis, sans_colis.valeur_totale), (0, Decimal('0')))
+
+    def test_agregat_des_colis(self):
+        stats = self.client_mali.colis.aggregate(**stats_portefeuille_client(prefix=''))
+        self.assertEqual(stats, self.stats_par_boucle(self.client_mali))
+        self.assertEqual(stats['nb_colis_livres'], 2)
+
+        vide = self.client_sans_colis.colis.aggregate(**stats_portefeuille_client(prefix=''))
+        self.assertEqual(vide, {'nb_colis': 0, 'nb_colis_livres': 0, 'valeur_totale': Decimal('0')})
+
+
+class ColisListViewTests(DonneesColisMixin, TestCase):
+    """
+    Liste des colis : statistiques en un seul agrégat
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.creer_colis(cls.client_mali, cls.lot)
+        cls.creer_colis(cls.client_mali, cls.lot, statut='livre', prix_transport_manuel=Decimal('12345'))
+        cls.creer_colis(cls.client_senegal, cls.lot, poids=Decimal('4'))
+
+    def test_statistiques_des_colis_filtres(self):
+        self.client.force_login(self.agent)
+        response = self.client.get(reverse('agent_chine:colis_list'))
+
+        self.assertEqual(response.status_code, 200)
+        stats = response.context['stats']
+        colis = list(Colis.objects.all())
+        prix = [Decimal(str(c.get_prix_effectif())) for c in colis]
+        self.assertEqual(stats['total_colis'], 3)
+        self.assertEqual(stats['total_poids'], sum(c.poids for c in colis))
+        self.assertEqual(stats['total_prix'], sum(prix))
+        self.assertAlmostEqual(float(stats['prix_moyen']), float(sum(prix)) / 3, places=2)
 
-# Create your tests here.
+        response = self.client.get(reverse('agent_chine:colis_list'), {'statut': 'livre'})
+        self.assertEqual(response.context['stats']['total_colis'], 1)
+        self.assertEqual(response.context['stats']['total_prix'], Decimal('12345'))
@@ -15,8 +15,12 @@ import os
 import uuid
 import json
 
-from .models import Client, Lot, Colis, ClientCreationTask
+from .models import Client, Lot, Colis, ClientCreationTask, prix_effectif_expression, stats_portefeuille_client
+from .services.dashboard_stats import get_dashboard_stats
 from reporting_app.models import ShippingPrice
+from reporting_app.daily_stats import mise_a_jour_en_masse
+from reporting_app.pagination import KeysetPaginator
+from reporting_app.search import filtre
 from notifications_app.models import Notification
 from .client_management import ClientAccountManager
 from .client_async_utils import create_client_async
@@ -39,140 +43,10 @@ def agent_chine_required(view_func):
 def dashboard_view(request):
     """
     Tableau de bord pour Agent Chine avec statistiques dynamiques et indicateurs de performance
-    Utilise le cache Django pour optimiser les performances (timeout: 5 min)
+    Les statistiques globales viennent du cache partagé (stale-while-revalidate),
+    rafraîchi par Celery beat et invalidé aux changements de statut
     """
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Avg, Count, F, Q
-    from django.db.models.functions import TruncMonth
-    from django.core.cache import cache
-    
-    # Clé de cache unique par utilisateur
-    cache_key = f'dashboard_stats_{request.user.id}'
-    
-    # Essayer de récupérer les stats du cache
-    cached_stats = cache.get(cache_key)
-    
-    if cached_stats:
-        # Utiliser les stats en cache
-        total_clients = cached_stats['total_clients']
-        total_lots = cached_stats['total_lots']
-        total_colis = cached_stats['total_colis']
-        lots_ouverts = cached_stats['lots_ouverts']
-        lots_fermes = cached_stats['lots_fermes']
-        lots_expedies = cached_stats['lots_expedies']
-        colis_recus = cached_stats['colis_recus']
-        colis_en_transit = cached_stats['colis_en_transit']
-        colis_en_attente = cached_stats['colis_en_attente']
-        revenus_mois = cached_stats['revenus_mois']
-        revenus_mois_precedent = cached_stats['revenus_mois_precedent']
-        evolution_revenus = cached_stats['evolution_revenus']
-        total_revenus = cached_stats['total_revenus']
-        revenus_par_mois = cached_stats['revenus_par_mois']
-        croissance_clients = cached_stats['croissance_clients']
-        taux_remplissage = cached_stats['taux_remplissage']
-        taux_conversion = cached_stats['taux_conversion']
-        temps_traitement = cached_stats['temps_traitement']
-    else:
-        # Calculer les statistiques
-        # Statistiques générales
-        total_clients = Client.objects.count()
-        total_lots = Lot.objects.count()
-        total_colis = Colis.objects.count()
-    
-    # Lots par statut
-    lots_ouverts = Lot.objects.filter(statut='ouvert').count()
-    lots_fermes = Lot.objects.filter(statut='ferme').count()
-    lots_expedies = Lot.objects.filter(statut='expedie').count()
-    
-    # Colis par statut
-    colis_recus = Colis.objects.filter(statut='receptionne_chine').count()
-    colis_en_transit = Colis.objects.filter(statut='en_transit').count()
-    colis_en_attente = Colis.objects.filter(statut='en_attente').count()
-    
-    # Calculs de revenus
-    debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    debut_annee = debut_mois.replace(month=1)
-    
-    # Revenus du mois courant
-    revenus_mois = 0
-    revenus_mois_precedent = 0
-    total_revenus = 0
-    evolution_revenus = 0
-    
-    try:
-        # Revenus du mois courant (prix de transport des lots fermés/expédiés)
-        lots_facturable_mois = Lot.objects.filter(
-            Q(statut='ferme') | Q(statut='expedie'),
-            date_fermeture__gte=debut_mois
-        )
-        revenus_mois = sum(float(lot.prix_transport or 0) for lot in lots_facturable_mois)
-        
-        # Revenus du mois précédent
-        fin_mois_precedent = debut_mois - timedelta(days=1)
-        debut_mois_precedent = fin_mois_precedent.replace(day=1)
-        
-        lots_mois_precedent = Lot.objects.filter(
-            Q(statut='ferme') | Q(statut='expedie'),
-            date_fermeture__gte=debut_mois_precedent,
-            date_fermeture__lt=debut_mois
-        )
-        revenus_mois_precedent = sum(float(lot.prix_transport or 0) for lot in lots_mois_precedent)
-        
-        # Calcul de l'évolution des revenus
-        if revenus_mois_precedent > 0:
-            evolution_revenus = ((revenus_mois - revenus_mois_precedent) / revenus_mois_precedent) * 100
-        
-        # Total revenus de tous les lots fermés/expédiés
-        lots_facturable_total = Lot.objects.filter(Q(statut='ferme') | Q(statut='expedie'))
-        total_revenus = sum(float(lot.prix_transport or 0) for lot in lots_facturable_total)
-        
-    except Exception as e:
-        # En cas d'erreur, on continue avec les valeurs par défaut
-        pass
-    
-    # Statistiques mensuelles pour le graphique
-    revenus_par_mois = []
-    try:
-        # Récupérer les 12 derniers mois
-        for i in range(12, 0, -1):
-            mois = timezone.now() - timedelta(days=30*i)
-            mois_debut = mois.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            mois_fin = (mois_debut + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            revenu = Lot.objects.filter(
-                Q(statut='ferme') | Q(statut='expedie'),
-                date_fermeture__gte=mois_debut,
-                date_fermeture__lte=mois_fin
-            ).aggregate(total=Sum('prix_transport'))['total'] or 0
-            
-            revenus_par_mois.append({
-                'mois': mois_debut.strftime('%b %Y'),
-                'revenu': float(revenu or 0)
-            })
-    except Exception as e:
-        # En cas d'erreur, on crée des données vides
-        revenus_par_mois = [{'mois': '', 'revenu': 0} for _ in range(12)]
-    
-    # Statistiques de croissance (simulation basée sur l'activité récente)
-    try:
-        # Comparer avec le mois précédent
-        debut_mois_precedent = (debut_mois - timedelta(days=30)).replace(day=1)
-        fin_mois_precedent = debut_mois - timedelta(days=1)
-        
-        clients_mois_precedent = Client.objects.filter(
-            date_creation__gte=debut_mois_precedent,
-            date_creation__lte=fin_mois_precedent
-        ).count()
-        
-        clients_ce_mois = Client.objects.filter(date_creation__gte=debut_mois).count()
-        
-        # Calcul pourcentage croissance clients
-        if clients_mois_precedent > 0:
-            croissance_clients = ((clients_ce_mois - clients_mois_precedent) / clients_mois_precedent) * 100
-        else:
-            croissance_clients = 100 if clients_ce_mois > 0 else 0
-    except:
-        croissance_clients = 5.8  # Valeur par défaut
+    stats = get_dashboard_stats()
     
     # Derniers lots créés (optimisé)
     derniers_lots = Lot.objects.select_related('agent_createur').prefetch_related(
@@ -200,90 +74,14 @@ def dashboard_view(request):
     # Puis récupérer les 10 dernières tâches pour l'affichage
     taches_creation_client = taches_creation_client.order_by('-created_at')[:10]
     
-    # Calcul des indicateurs de performance
-    try:
-        # Taux de remplissage moyen des lots
-        taux_remplissage = Lot.objects.annotate(
-            taux_remplissage=(Count('colis') * 100) / F('nombre_colis_prevus')
-        ).aggregate(avg=Avg('taux_remplissage'))['avg'] or 0
-        
-        # Taux de conversion clients (clients avec au moins un colis / total clients)
-        clients_actifs = Client.objects.filter(colis__isnull=False).distinct().count()
-        taux_conversion = (clients_actifs / total_clients * 100) if total_clients > 0 else 0
-        
-        # Temps moyen de traitement des colis (en jours)
-        temps_traitement = Colis.objects.filter(
-            date_reception__isnull=False,
-            date_expedition__isnull=False
-        ).annotate(
-            duree=F('date_expedition') - F('date_reception')
-        ).aggregate(avg=Avg('duree'))['avg']
-        
-        # Convertir en jours si nécessaire
-        if temps_traitement:
-            temps_traitement = temps_traitement.days
-        else:
-            temps_traitement = 0
-            
-    except Exception as e:
-        taux_remplissage = 0
-        taux_conversion = 0
-        temps_traitement = 0
-        
-        # Sauvegarder les statistiques en cache (5 minutes)
-        cache_data = {
-            'total_clients': total_clients,
-            'total_lots': total_lots,
-            'total_colis': total_colis,
-            'lots_ouverts': lots_ouverts,
-            'lots_fermes': lots_fermes,
-            'lots_expedies': lots_expedies,
-            'colis_recus': colis_recus,
-            'colis_en_transit': colis_en_transit,
-            'colis_en_attente': colis_en_attente,
-            'revenus_mois': revenus_mois,
-            'revenus_mois_precedent': revenus_mois_precedent,
-            'evolution_revenus': evolution_revenus,
-            'total_revenus': total_revenus,
-            'revenus_par_mois': revenus_par_mois,
-            'croissance_clients': croissance_clients,
-            'taux_remplissage': taux_remplissage,
-            'taux_conversion': taux_conversion,
-            'temps_traitement': temps_traitement,
-        }
-        cache.set(cache_key, cache_data, 300)  # 300 secondes = 5 minutes
-    
     context = {
         'stats': {
-            # Totaux
-            'total_clients': total_clients,
-            'total_lots': total_lots,
-            'total_colis': total_colis,
-            
-            # Répartition des lots
-            'lots_ouverts': lots_ouverts,
-            'lots_fermes': lots_fermes,
-            'lots_expedies': lots_expedies,
-            
-            # Répartition des colis
-            'colis_recus': colis_recus,
-            'colis_en_transit': colis_en_transit,
-            'colis_en_attente': colis_en_attente,
-            
-            # Revenus
-            'revenus_mois': revenus_mois,
-            'revenus_mois_precedent': revenus_mois_precedent,
-            'evolution_revenus': evolution_revenus,
-            'total_revenus': total_revenus,
-            'revenus_par_mois': revenus_par_mois,
-            
-            # Croissance
-            'croissance_clients': croissance_clients,
+            # Totaux, répartitions, revenus et croissance (globaux, en cache)
+            **stats,
             
             # Indicateurs de performance
-            'taux_remplissage': round(taux_remplissage, 1) if taux_remplissage else 0,
-            'taux_conversion': round(taux_conversion, 1) if taux_conversion else 0,
-            'temps_traitement': temps_traitement,
+            'taux_remplissage': round(stats['taux_remplissage'], 1) if stats['taux_remplissage'] else 0,
+            'taux_conversion': round(stats['taux_conversion'], 1) if stats['taux_conversion'] else 0,
             
             # Statistiques tâches client
             'taches_client_pending': taches_pending,
@@ -317,6 +115,8 @@ def client_list_view(request):
     paginator = Paginator(clients, 15)  # 15 clients par page
     page_number = request.GET.get('page')
     clients_page = paginator.get_page(page_number)
+    # Nombre de colis de chaque client de la page dans la même requête
+    clients_page.object_list = clients_page.object_list.annotate(**stats_portefeuille_client())
     
     context = {
         'clients': clients_page,
@@ -836,7 +636,8 @@ def lot_expedite_view(request, lot_id):
     lot.save()
     
     # Mettre à jour le statut des colis
-    lot.colis.update(statut='en_transit')
+    with mise_a_jour_en_masse('colis', lot.colis.all()):
+        lot.colis.update(statut='en_transit')
     
     # Envoyer des notifications d'expédition de façon asynchrone
     total_colis = lot.colis.count()
@@ -964,41 +765,30 @@ def colis_list_view(request):
     # Recherche
     search_query = request.GET.get('search', '')
     if search_query:
-        colis = colis.filter(
-            Q(numero_suivi__icontains=search_query) |
-            Q(client__user__first_name__icontains=search_query) |
-            Q(client__user__last_name__icontains=search_query) |
-            Q(client__user__telephone__icontains=search_query) |
-            Q(lot__numero_lot__icontains=search_query)
-        )
+        colis = colis.filter(pk__in=filtre('colis', search_query))
     
     # Calcul des statistiques dynamiques basées sur les colis filtrés
-    from django.db.models import Sum, Avg, Count, Case, When, F
+    from django.db.models import Sum, Avg, Count
     
     # Calcul du prix effectif : prix manuel si disponible, sinon prix calculé
-    colis_with_price = colis.annotate(
-        prix_effectif=Case(
-            When(prix_transport_manuel__isnull=False, prix_transport_manuel__gt=0, 
-                 then=F('prix_transport_manuel')),
-            default=F('prix_calcule'),
-        )
+    colis_with_price = colis.annotate(prix_effectif=prix_effectif_expression())
+    
+    # Total, sommes et moyennes en une seule requête
+    stats = colis_with_price.order_by().aggregate(
+        total_colis=Count('id'),
+        total_poids=Sum('poids'),
+        total_prix=Sum('prix_effectif'),
+        poids_moyen=Avg('poids'),
+        prix_moyen=Avg('prix_effectif'),
     )
-    
-    stats = {
-        'total_colis': colis_with_price.count(),
-        'total_poids': colis_with_price.aggregate(Sum('poids'))['poids__sum'] or 0,
-        'total_prix': colis_with_price.aggregate(Sum('prix_effectif'))['prix_effectif__sum'] or 0,
-        'poids_moyen': colis_with_price.aggregate(Avg('poids'))['poids__avg'] or 0,
-        'prix_moyen': colis_with_price.aggregate(Avg('prix_effectif'))['prix_effectif__avg'] or 0,
-    }
+    stats = {cle: valeur or 0 for cle, valeur in stats.items()}
     
     # Statistiques par statut
     stats_by_status = colis_with_price.values('statut').annotate(count=Count('id')).order_by('statut')
     
     # Pagination
-    paginator = Paginator(colis_with_price, 20)  # 20 colis par page
-    page_number = request.GET.get('page')
-    colis_page = paginator.get_page(page_number)
+    paginator = KeysetPaginator(colis_with_price, 20)  # 20 colis par page
+    colis_page = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'colis': colis_page,
@@ -6,7 +6,7 @@ Usage: python manage.py send_daily_report [--date YYYY-MM-DD]
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
 from datetime import datetime, date, timedelta
-from agent_mali_app.views import generate_daily_report_pdf
+from agent_mali_app.services.rapports_pdf import contenu_rapport_pdf
 from notifications_app.wachap_service import send_whatsapp_message
 from django.conf import settings
 import logging
@@ -62,9 +62,9 @@ class Command(BaseCommand):
         self.stdout.write(f"👤 Agent Mali: {agent_mali.get_full_name()} ({agent_mali.telephone})")
 
         try:
-            # Générer le rapport PDF
+            # Rapport PDF (réutilisé depuis le magasin des rapports si déjà généré)
             date_str = report_date.strftime('%Y-%m-%d')
-            pdf_content = generate_daily_report_pdf(date_str)
+            pdf_content = contenu_rapport_pdf('journalier', date_str, agent_mali, attente=240)
             
             self.stdout.write(f"📄 Rapport PDF généré ({len(pdf_content)} bytes)")
 
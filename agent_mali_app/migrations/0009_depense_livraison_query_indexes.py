@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_chine_app', '0017_colis_lot_query_indexes'),
+        ('agent_mali_app', '0008_merge_20251017_1550'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['agent', 'date_depense'], name='agent_mali__agent_i_385d08_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depense',
+            index=models.Index(fields=['date_depense'], name='agent_mali__date_de_227272_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livraison',
+            index=models.Index(fields=['statut', 'date_livraison_effective'], name='agent_mali__statut_73515e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livraison',
+            index=models.Index(fields=['statut_paiement', 'statut'], name='agent_mali__statut__3688fd_idx'),
+        ),
+    ]
@@ -70,6 +70,10 @@ class Depense(models.Model):
         verbose_name = "Dépense"
         verbose_name_plural = "Dépenses"
         ordering = ['-date_depense', '-date_creation']
+        indexes = [
+            models.Index(fields=['agent', 'date_depense']),
+            models.Index(fields=['date_depense']),
+        ]
         
     def __str__(self):
         return f"{self.libelle} - {self.montant} FCFA ({self.date_depense})"
@@ -244,6 +248,10 @@ class Livraison(models.Model):
         verbose_name = "Livraison"
         verbose_name_plural = "Livraisons"
         ordering = ['-date_planifiee']
+        indexes = [
+            models.Index(fields=['statut', 'date_livraison_effective']),
+            models.Index(fields=['statut_paiement', 'statut']),
+        ]
         
     def __str__(self):
         return f"Livraison {self.colis.numero_suivi} - {self.statut}"
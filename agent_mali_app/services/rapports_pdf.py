@@ -0,0 +1,266 @@
+"""
+Magasin des rapports PDF Agent Mali (journalier, mensuel, annuel)
+
+Les PDF sont générés par la tâche Celery generer_rapport_pdf et conservés
+dans RapportOperationnel.fichier_pdf, indexés par (type, période,
+empreinte des données).
+
+- Période close : le rapport stocké dont l'empreinte correspond aux données
+  actuelles est servi directement ; il n'est régénéré que si des lots, des
+  livraisons ou des dépenses de la période ont changé.
+- Période en cours : le dernier rapport est servi tant qu'il a moins de
+  RAPPORT_PDF_FRAICHEUR secondes (ou que les données n'ont pas bougé) ;
+  au plus un rendu par fenêtre.
+- Un verrou de cache (partagé, voir CACHE_REDIS_URL) évite de lancer deux
+  rendus de la même période.
+- Une requête web n'attend jamais le rendu : RapportEnCours est levé aussitôt
+  la tâche lancée, le client interroge ensuite l'URL de statut.
+"""
+import hashlib
+import logging
+import time
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+RAPPORT_PDF_FRAICHEUR = getattr(settings, 'RAPPORT_PDF_FRAICHEUR', 600)  # période en cours
+RAPPORT_PDF_VERROU = 300  # durée de vie du verrou de génération
+RAPPORT_PDF_VERROU_KEY = 'rapport_pdf_generation_{type_rapport}_{periode}'
+
+TypeRapport = namedtuple('TypeRapport', ['format_periode', 'generateur', 'libelle', 'prefixe_fichier'])
+
+TYPES_RAPPORT = {
+    'journalier': TypeRapport(
+        '%Y-%m-%d', 'agent_mali_app.views.generate_daily_report_pdf',
+        'Rapport journalier', 'rapport_quotidien',
+    ),
+    'mensuel': TypeRapport(
+        '%Y-%m', 'agent_mali_app.views.generate_monthly_report_pdf',
+        'Rapport mensuel', 'rapport_mensuel',
+    ),
+    'annuel': TypeRapport(
+        '%Y', 'agent_mali_app.views.generate_yearly_report_pdf',
+        'Rapport annuel', 'rapport_annuel',
+    ),
+}
+
+# Types utilisés par l'interface (daily/monthly/yearly)
+ALIAS_TYPES = {'daily': 'journalier', 'monthly': 'mensuel', 'yearly': 'annuel'}
+
+
+class RapportEnCours(Exception):
+    """
+    Le rapport est en cours de génération par un worker
+    """
+
+
+def bornes_periode(type_rapport, periode):
+    """
+    (début, fin, clé normalisée) d'une période
+
+    Raises:
+        ValueError: Type de rapport ou format de période invalide
+    """
+    if type_rapport not in TYPES_RAPPORT:
+        raise ValueError(f"Type de rapport non supporté: {type_rapport}")
+    format_periode = TYPES_RAPPORT[type_rapport].format_periode
+    debut = datetime.strptime(str(periode), format_periode).date()
+    if type_rapport == 'journalier':
+        fin = debut
+    elif type_rapport == 'mensuel':
+        fin = debut.replace(day=monthrange(debut.year, debut.month)[1])
+    else:
+        fin = date(debut.year, 12, 31)
+    return debut, fin, debut.strftime(format_periode)
+
+
+def empreinte_donnees(debut, fin):
+    """
+    Empreinte des données lues par les rapports sur la période (voir
+    ReportDataset) : nombre de lignes et dernière modification par table
+    source ; pour les colis arrivés, aussi la valeur lue par le rapport
+    (les mises à jour en masse ne touchent pas date_modification)
+    """
+    from agent_chine_app.models import Colis, Lot
+
+    from ..models import Depense, Livraison, ReceptionLot
+
+    arrivee = {'date_arrivee__date__gte': debut, 'date_arrivee__date__lte': fin}
+    sources = (
+        (ReceptionLot.objects.filter(date_reception__date__gte=debut, date_reception__date__lte=fin),
+         {'derniere': Max('date_derniere_maj')}),
+        (Livraison.objects.filter(date_livraison_effective__date__gte=debut, date_livraison_effective__date__lte=fin),
+         {'derniere': Max('date_modification')}),
+        (Depense.objects.filter(date_depense__gte=debut, date_depense__lte=fin),
+         {'derniere': Max('date_modification')}),
+        (Lot.objects.filter(**arrivee),
+         {'derniere': Max('date_arrivee')}),
+        (Colis.objects.filter(**{f'lot__{champ}': valeur for champ, valeur in arrivee.items()}),
+         {'derniere': Max('date_modification'),
+          'arrives': Count('pk', filter=Q(statut='arrive')),
+          'valeur': Sum('prix_calcule', filter=Q(statut='arrive'))}),
+    )
+    parties = []
+    for queryset, agregats in sources:
+        etat = queryset.order_by().aggregate(nombre=Count('pk'), **agregats)
+        parties.append(':'.join(
+            valeur.isoformat() if hasattr(valeur, 'isoformat') else str(valeur if valeur is not None else '')
+            for valeur in etat.values()
+        ))
+    return hashlib.sha256('|'.join(parties).encode()).hexdigest()
+
+
+def periode_close(fin):
+    return fin < timezone.localdate()
+
+
+def rapport_disponible(type_rapport, periode_cle, fin, empreinte=None):
+    """
+    Rapport stocké réutilisable pour la période, None s'il faut (re)générer
+    """
+    from reporting_app.models import RapportOperationnel
+
+    rapports = RapportOperationnel.objects.filter(
+        type_rapport=type_rapport, periode_cle=periode_cle,
+    ).exclude(fichier_pdf='')
+
+    if not periode_close(fin):
+        dernier = rapports.order_by('-date_generation').first()
+        if dernier and timezone.now() - dernier.date_generation < timedelta(seconds=RAPPORT_PDF_FRAICHEUR):
+            return dernier
+
+    empreinte = empreinte or empreinte_donnees(*bornes_periode(type_rapport, periode_cle)[:2])
+    return rapports.filter(empreinte_donnees=empreinte).order_by('-date_generation').first()
+
+
+def generer_et_stocker(type_rapport, periode, utilisateur_id=None):
+    """
+    Génère le PDF et l'enregistre dans RapportOperationnel (appelé par la tâche)
+
+    Returns:
+        RapportOperationnel: Rapport stocké (existant si déjà à jour)
+    """
+    from reporting_app.models import RapportOperationnel
+
+    debut, fin, periode_cle = bornes_periode(type_rapport, periode)
+    # Empreinte relevée avant le rendu : une écriture concurrente rendra
+    # le rapport obsolète au lieu d'être masquée
+    empreinte = empreinte_donnees(debut, fin)
+    existant = rapport_disponible(type_rapport, periode_cle, fin, empreinte)
+    if existant:
+        return existant
+
+    definition = TYPES_RAPPORT[type_rapport]
+    debut_rendu = time.monotonic()
+    contenu = import_string(definition.generateur)(periode_cle)
+
+    rapport = RapportOperationnel(
+        titre=f"{definition.libelle} {periode_cle}",
+        type_rapport=type_rapport,
+        periode_debut=debut,
+        periode_fin=fin,
+        periode_cle=periode_cle,
+        empreinte_donnees=empreinte,
+        contenu_json={'periode': periode_cle, 'taille': len(contenu)},
+        genere_par_id=utilisateur_id,
+    )
+    rapport.fichier_pdf.save(
+        f"{definition.prefixe_fichier}_{periode_cle}.pdf", ContentFile(contenu), save=False
+    )
+    rapport.save()
+
+    # Les versions précédentes de la période ne servent plus
+    for ancien in RapportOperationnel.objects.filter(
+        type_rapport=type_rapport, periode_cle=periode_cle,
+    ).exclude(pk=rapport.pk).exclude(fichier_pdf=''):
+        ancien.fichier_pdf.delete(save=False)
+        ancien.delete()
+
+    logger.info(
+        f"📄 {definition.libelle} {periode_cle} généré "
+        f"({len(contenu)} octets, {time.monotonic() - debut_rendu:.1f}s)"
+    )
+    return rapport
+
+
+def programmer_generation(type_rapport, periode_cle, utilisateur_id=None):
+    """
+    Lance la tâche de génération (au plus une par période à la fois)
+    """
+    from ..tasks import generer_rapport_pdf
+
+    verrou = RAPPORT_PDF_VERROU_KEY.format(type_rapport=type_rapport, periode=periode_cle)
+    if not cache.add(verrou, True, RAPPORT_PDF_VERROU):
+        return None
+    try:
+        return generer_rapport_pdf.delay(type_rapport, periode_cle, utilisateur_id)
+    except Exception:
+        cache.delete(verrou)
+        raise
+
+
+def obtenir_rapport_pdf(type_rapport, periode, utilisateur=None):
+    """
+    Rapport PDF stocké de la période, généré en arrière-plan si nécessaire
+
+    N'attend pas le worker : si le rapport n'est pas prêt, la génération est
+    lancée (une seule par période) et RapportEnCours est levé aussitôt.
+
+    Args:
+        type_rapport: 'journalier', 'mensuel', 'annuel' (ou daily/monthly/yearly)
+        periode: 'YYYY-MM-DD', 'YYYY-MM' ou 'YYYY' selon le type
+        utilisateur: Demandeur (enregistré dans genere_par)
+
+    Returns:
+        RapportOperationnel: Rapport dont fichier_pdf contient le PDF
+
+    Raises:
+        ValueError: Type ou période invalide
+        RapportEnCours: Génération en cours
+    """
+    type_rapport = ALIAS_TYPES.get(type_rapport, type_rapport)
+    _, fin, periode_cle = bornes_periode(type_rapport, periode)
+
+    rapport = rapport_disponible(type_rapport, periode_cle, fin)
+    if rapport:
+        return rapport
+
+    utilisateur_id = getattr(utilisateur, 'pk', None)
+    resultat = programmer_generation(type_rapport, periode_cle, utilisateur_id)
+    if resultat is not None and resultat.ready():
+        # Exécution immédiate (CELERY_TASK_ALWAYS_EAGER)
+        resultat.get()
+        rapport = rapport_disponible(type_rapport, periode_cle, fin)
+        if rapport:
+            return rapport
+    raise RapportEnCours(f"Rapport {periode_cle} en cours de génération")
+
+
+def contenu_rapport_pdf(type_rapport, periode, utilisateur=None, attente=0):
+    """
+    Octets du PDF (voir obtenir_rapport_pdf)
+
+    Args:
+        attente: Secondes d'attente du worker ; réservé aux commandes et
+            tâches, une vue web laisse remonter RapportEnCours (202)
+    """
+    limite = time.monotonic() + attente
+    while True:
+        try:
+            rapport = obtenir_rapport_pdf(type_rapport, periode, utilisateur)
+            break
+        except RapportEnCours:
+            if time.monotonic() >= limite:
+                raise
+            time.sleep(2)
+    with rapport.fichier_pdf.open('rb') as fichier:
+        return fichier.read()
@@ -0,0 +1,154 @@
+"""
+Jeu de données commun aux rapports Agent Mali (PDF, résumé WhatsApp)
+
+ReportDataset charge une période en un nombre fixe de requêtes GROUP BY
+(réceptions de lots, livraisons, dépenses, colis arrivés) et expose des
+DataFrames pandas indexés par jour ; les rendus ne font plus de requêtes.
+
+Usage:
+    donnees = ReportDataset(debut, fin)
+    donnees.totaux['revenus']
+    for mois, ligne in donnees.par_mois().iterrows(): ...
+"""
+import pandas as pd
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+COLONNES_JOURS = [
+    'lots_recus', 'colis_livres', 'revenus', 'depenses',
+    'colis_receptionnes', 'valeur_colis_receptionnes',
+]
+
+
+def _par_jour(queryset, champ_date, **mesures):
+    """
+    DataFrame {jour: mesures} pour un champ datetime (une requête GROUP BY)
+    """
+    lignes = queryset.order_by().annotate(_jour=TruncDate(champ_date)).values('_jour').annotate(**mesures)
+    frame = pd.DataFrame.from_records(list(lignes), columns=['_jour', *mesures])
+    frame['_jour'] = pd.to_datetime(frame['_jour'])
+    return frame.set_index('_jour').astype(float)
+
+
+class ReportDataset:
+    """
+    Données d'activité d'une période [debut, fin] (bornes incluses)
+
+    Attributs:
+        jours: DataFrame indexé par jour (tous les jours de la période,
+            complétés par des zéros), colonnes COLONNES_JOURS
+        depenses: DataFrame (jour, type_depense, total, nombre)
+    """
+
+    def __init__(self, debut, fin, detail_depenses=0):
+        self.debut = debut
+        self.fin = fin
+        self.detail_depenses = detail_depenses
+        self._charger()
+
+    @classmethod
+    def pour_periode(cls, type_rapport, periode, **kwargs):
+        """
+        Jeu de données d'une période de rapport ('journalier', 'YYYY-MM-DD'...)
+        """
+        from .rapports_pdf import bornes_periode
+
+        debut, fin, _ = bornes_periode(type_rapport, periode)
+        return cls(debut, fin, **kwargs)
+
+    def _charger(self):
+        from agent_chine_app.models import Colis
+
+        from ..models import Depense, Livraison, ReceptionLot
+
+        receptions = _par_jour(
+            ReceptionLot.objects.filter(
+                date_reception__date__gte=self.debut, date_reception__date__lte=self.fin
+            ),
+            'date_reception', lots_recus=Count('pk'),
+        )
+        livraisons = _par_jour(
+            Livraison.objects.filter(
+                date_livraison_effective__date__gte=self.debut,
+                date_livraison_effective__date__lte=self.fin,
+                statut='livree',
+            ),
+            'date_livraison_effective', colis_livres=Count('pk'), revenus=Sum('montant_collecte'),
+        )
+        colis_arrives = _par_jour(
+            Colis.objects.filter(
+                statut='arrive', lot__date_arrivee__date__gte=self.debut, lot__date_arrivee__date__lte=self.fin
+            ),
+            'lot__date_arrivee', colis_receptionnes=Count('pk'), valeur_colis_receptionnes=Sum('prix_calcule'),
+        )
+
+        # Dépenses par jour et par type : sert aux totaux journaliers et à la ventilation
+        depenses = Depense.objects.filter(
+            date_depense__gte=self.debut, date_depense__lte=self.fin
+        ).order_by().values('date_depense', 'type_depense').annotate(total=Sum('montant'), nombre=Count('pk'))
+        self.depenses = pd.DataFrame.from_records(
+            list(depenses), columns=['date_depense', 'type_depense', 'total', 'nombre']
+        ).rename(columns={'date_depense': 'jour'})
+        self.depenses['jour'] = pd.to_datetime(self.depenses['jour'])
+        self.depenses['total'] = self.depenses['total'].astype(float)
+        depenses_par_jour = self.depenses.groupby('jour')[['total']].sum().rename(columns={'total': 'depenses'})
+
+        calendrier = pd.date_range(self.debut, self.fin, freq='D', name='jour')
+        self.jours = pd.concat(
+            [receptions, livraisons, depenses_par_jour, colis_arrives], axis=1
+        ).reindex(calendrier).reindex(columns=COLONNES_JOURS).fillna(0)
+
+        self._detail_depenses = None
+        if self.detail_depenses:
+            self._detail_depenses = list(
+                Depense.objects.filter(
+                    date_depense__gte=self.debut, date_depense__lte=self.fin
+                ).values('type_depense', 'libelle', 'montant')[:self.detail_depenses]
+            )
+
+    @property
+    def totaux(self):
+        """
+        Totaux de la période (int pour les compteurs, float pour les montants)
+        """
+        sommes = self.jours.sum()
+        totaux = {
+            'lots_recus': int(sommes['lots_recus']),
+            'colis_livres': int(sommes['colis_livres']),
+            'colis_receptionnes': int(sommes['colis_receptionnes']),
+            'revenus': float(sommes['revenus']),
+            'depenses': float(sommes['depenses']),
+            'valeur_colis_receptionnes': float(sommes['valeur_colis_receptionnes']),
+        }
+        totaux['benefice'] = totaux['revenus'] - totaux['depenses']
+        return totaux
+
+    @property
+    def nombre_jours(self):
+        return len(self.jours)
+
+    @property
+    def a_des_donnees(self):
+        totaux = self.totaux
+        return any(totaux[cle] > 0 for cle in ('lots_recus', 'colis_livres', 'depenses', 'revenus'))
+
+    @property
+    def depenses_par_type(self):
+        """
+        Ventilation des dépenses : [{'type_depense', 'total', 'nombre'}], la plus forte d'abord
+        """
+        ventilation = self.depenses.groupby('type_depense', as_index=False)[['total', 'nombre']].sum()
+        return ventilation.sort_values('total', ascending=False).to_dict('records')
+
+    @property
+    def depenses_detail(self):
+        """
+        Premières dépenses de la période (detail_depenses lignes, ordre du modèle)
+        """
+        return self._detail_depenses or []
+
+    def par_mois(self):
+        """
+        DataFrame des totaux mensuels (index : premier jour du mois)
+        """
+        return self.jours.resample('MS').sum()
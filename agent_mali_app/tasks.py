@@ -0,0 +1,36 @@
+"""
+Tâches Celery pour l'app agent_mali
+Génération asynchrone des rapports PDF
+"""
+
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(time_limit=300, soft_time_limit=240)
+def generer_rapport_pdf(type_rapport, periode, utilisateur_id=None):
+    """
+    Génère un rapport PDF et le stocke dans RapportOperationnel
+
+    Args:
+        type_rapport (str): 'journalier', 'mensuel' ou 'annuel'
+        periode (str): Période normalisée (YYYY-MM-DD, YYYY-MM ou YYYY)
+        utilisateur_id (int): Demandeur du rapport
+
+    Returns:
+        int: Identifiant du RapportOperationnel
+    """
+    from .services.rapports_pdf import RAPPORT_PDF_VERROU_KEY, generer_et_stocker
+
+    try:
+        rapport = generer_et_stocker(type_rapport, periode, utilisateur_id)
+        return rapport.pk
+    except Exception as e:
+        logger.error(f"❌ Erreur génération rapport {type_rapport} {periode}: {str(e)}", exc_info=True)
+        raise
+    finally:
+        cache.delete(RAPPORT_PDF_VERROU_KEY.format(type_rapport=type_rapport, periode=periode))
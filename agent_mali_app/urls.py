@@ -50,6 +50,7 @@ urlpatterns = [
     path('api/generate-daily-report/', views.generate_daily_report_api, name='generate_daily_report_api'),
     path('api/generate-monthly-report/', views.generate_monthly_report_api, name='generate_monthly_report_api'),
     path('api/generate-yearly-report/', views.generate_yearly_report_api, name='generate_yearly_report_api'),
+    path('api/rapport-pdf/<str:type_rapport>/<str:periode>/', views.rapport_pdf_statut, name='rapport_pdf_statut'),
     path('api/send-report-whatsapp/', views.send_report_whatsapp_api, name='send_report_whatsapp_api'),
     path('api/send-report-email/', views.send_report_email_api, name='send_report_email_api'),
     path('api/schedule-auto-report/', views.schedule_auto_report_api, name='schedule_auto_report_api'),
@@ -2,13 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Count, Sum, Q, Avg, Case, When, IntegerField
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponseForbidden, HttpResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.db import transaction
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.urls import reverse
 import os
 import json
 import datetime
@@ -29,7 +30,14 @@ from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from io import BytesIO
 
 from .models import Depense, ReceptionLot, Livraison, PriceAdjustment
+from .services.rapports_pdf import ALIAS_TYPES, RapportEnCours, TYPES_RAPPORT, contenu_rapport_pdf, obtenir_rapport_pdf
+from .services.report_dataset import ReportDataset
 from agent_chine_app.models import Lot, Colis, Client
+from agent_chine_app.services.dashboard_stats import invalider_dashboard_stats
+from reporting_app.aggregations import MOIS_COURTS, compter_requetes, histogramme, serie_temporelle
+from reporting_app.daily_stats import mise_a_jour_en_masse, total
+from reporting_app.models import DailyStats
+from reporting_app.pagination import KeysetPaginator
 from notifications_app.services import NotificationService
 from django.contrib.auth import get_user_model
 
@@ -199,21 +207,40 @@ def lots_livres_view(request):
     return render(request, 'agent_mali_app/liste_lots_livres.html', context)
 
 
+@compter_requetes
 def dashboard_view(request):
     """
     Tableau de bord pour Agent Mali avec statistiques temps réel
     """
+    # Compteurs lus dans les agrégats journaliers (une requête par source)
     # Statistiques des lots - inclure les lots expédiés comme en transit pour l'agent Mali
-    lots_en_transit = Lot.objects.filter(statut__in=['expedie', 'en_transit']).count()
-    lots_receptionnes = Lot.objects.filter(statut='arrive').count()
-    lots_arrives = Lot.objects.filter(statut='arrive').count()
-    lots_expedies_total = Lot.objects.filter(statut='expedie').count()
+    lots_counts = histogramme(
+        DailyStats.objects.filter(source='lot'),
+        mesure='nombre',
+        en_transit=Q(statut__in=['expedie', 'en_transit']),
+        arrives=Q(statut='arrive'),
+        expedies=Q(statut='expedie'),
+    )
+    lots_en_transit = lots_counts['en_transit']
+    lots_receptionnes = lots_counts['arrives']
+    lots_arrives = lots_counts['arrives']
+    lots_expedies_total = lots_counts['expedies']
     
     # Statistiques des colis - inclure les colis expédiés comme en transit pour l'agent Mali
-    colis_en_transit = Colis.objects.filter(statut__in=['expedie', 'en_transit']).count()
-    colis_arrives = Colis.objects.filter(statut='arrive').count()
-    colis_livres = Colis.objects.filter(statut='livre').count()
-    colis_perdus = Colis.objects.filter(statut='perdu').count()
+    colis_counts = histogramme(
+        DailyStats.objects.filter(source='colis'),
+        mesure='nombre',
+        en_transit=Q(statut__in=['expedie', 'en_transit']),
+        arrives=Q(statut='arrive'),
+        livres=Q(statut='livre'),
+        perdus=Q(statut='perdu'),
+        valeur_stock=total('montant', statut='arrive'),
+        valeur_totale=total('montant', statut__in=['en_transit', 'expedie', 'arrive', 'livre']),
+    )
+    colis_en_transit = colis_counts['en_transit']
+    colis_arrives = colis_counts['arrives']
+    colis_livres = colis_counts['livres']
+    colis_perdus = colis_counts['perdus']
     
     # Statistiques de livraison aujourd'hui
     aujourd_hui = timezone.now().date()
@@ -240,14 +267,12 @@ def dashboard_view(request):
     ).aggregate(total=Sum('prix_calcule'))['total'] or 0
     
     # Valeur totale des colis en stock (arrivés mais pas encore livrés)
-    valeur_stock_magasin = Colis.objects.filter(
-        statut='arrive'
-    ).aggregate(total=Sum('prix_calcule'))['total'] or 0
+    valeur_stock_magasin = colis_counts['valeur_stock']
     
     # Dépenses du mois
-    depenses_mois = Depense.objects.filter(
-        date_depense__gte=debut_mois.date()
-    ).aggregate(total=Sum('montant'))['total'] or 0
+    depenses_mois = DailyStats.objects.filter(
+        source='depense', jour__gte=debut_mois.date()
+    ).aggregate(total=total('montant'))['total']
     
     # Calcul du bénéfice mensuel
     benefice_mois = float(revenus_livraison_mois) - float(depenses_mois)
@@ -263,9 +288,7 @@ def dashboard_view(request):
     ).select_related('colis__client__user').order_by('-date_livraison_effective')[:5]
     
     # Colis à livrer (priorité)
-    colis_a_livrer = Colis.objects.filter(
-        statut='arrive'
-    ).select_related('client__user', 'lot').count()
+    colis_a_livrer = colis_arrives
     
     # Colis livrés en attente de paiement
     colis_attente_paiement = Colis.objects.filter(
@@ -303,9 +326,7 @@ def dashboard_view(request):
     ).distinct().count()
     
     # Valeur totale de tous les colis (en transit + arrivés + livrés)
-    valeur_totale_colis = Colis.objects.filter(
-        statut__in=['en_transit', 'expedie', 'arrive', 'livre']
-    ).aggregate(total=Sum('prix_calcule'))['total'] or 0
+    valeur_totale_colis = colis_counts['valeur_totale']
     
     # Calcul du bénéfice total des lots réceptionnés
     lots_receptionnes_queryset = Lot.objects.filter(statut__in=['arrive', 'livre'])
@@ -691,36 +712,32 @@ def lots_en_transit_view(request):
         'numero_lot', '-numero_lot',
         '-prix_transport', 'prix_transport'
     ]
-    if tri in valid_sort_fields:
-        lots = lots.order_by(tri)
-    else:
-        lots = lots.order_by('-date_expedition')
+    if tri not in valid_sort_fields:
+        tri = '-date_expedition'
     
     # Récupérer liste des agents pour le filtre
     agents = User.objects.filter(is_agent_chine=True).order_by('first_name', 'last_name')
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(lots, 20)  # 20 lots par page
-    page_number = request.GET.get('page')
-    lots_page = paginator.get_page(page_number)
-    
-    # Calculs pour statistiques (sur tous les lots, pas seulement la page)
-    total_lots = lots.count()
-    total_colis = sum(lot.colis.count() for lot in lots)
-    valeur_transport_total = sum(float(lot.prix_transport or 0) for lot in lots)
-    
-    # Calcul de la valeur totale des colis (somme des prix des colis dans chaque lot)
-    valeur_totale_colis = 0
-    for lot in lots:
-        valeur_totale_colis += sum(float(colis.prix_calcule or 0) for colis in lot.colis.all())
+    # Pagination par curseur sur le tri choisi
+    paginator = KeysetPaginator(lots, 20, ordering=tri, compter='estime')  # 20 lots par page
+    lots_page = paginator.get_page(request.GET.get('cursor'))
+    
+    # Statistiques sur tous les lots filtrés : nombre donné par le paginateur,
+    # sommes agrégées en base
+    lots_filtres = lots.order_by().values('pk')
+    valeur_transport_total = Lot.objects.filter(pk__in=lots_filtres).aggregate(
+        total=Sum('prix_transport')
+    )['total'] or 0
+    totaux_colis = Colis.objects.filter(lot__in=lots_filtres).aggregate(
+        nombre=Count('id'), valeur=Sum('prix_calcule')
+    )
     
     context = {
         'lots': lots_page,
-        'total_lots': total_lots,
-        'total_colis': total_colis,
+        'total_lots': lots_page.count,
+        'total_colis': totaux_colis['nombre'],
         'valeur_transport_total': valeur_transport_total,
-        'valeur_totale_colis': valeur_totale_colis,
+        'valeur_totale_colis': totaux_colis['valeur'] or 0,
         'search_query': search_query,
         'type_transport': type_transport,
         'agent_filter': agent_filter,
@@ -1029,7 +1046,10 @@ def recevoir_lot_view(request, lot_id):
                 reception.ajouter_observation("Réception effectuée sans commentaire")
             
             # Mettre à jour le statut des colis reçus
-            colis_a_recevoir.update(statut='arrive')
+            with mise_a_jour_en_masse('colis', colis_a_recevoir):
+                colis_a_recevoir.update(statut='arrive')
+            # update() ne déclenche pas les signaux de changement de statut
+            invalider_dashboard_stats()
             
             # Mettre à jour le nombre de colis reçus
             reception.nombre_colis_recus = lot.colis.filter(statut='arrive').count()
@@ -1451,9 +1471,8 @@ def depenses_view(request):
     moyenne_journaliere = total_30j / 30
     
     # Pagination
-    paginator = Paginator(depenses, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(depenses, 20, ordering='-date_depense', compter='estime')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     # ==== GRAPHIQUES DYNAMIQUES ====
     # 1. Évolution des dépenses (6 derniers mois)
@@ -1461,27 +1480,13 @@ def depenses_view(request):
     import json
     from datetime import datetime
     
-    graphique_evolution = {'labels': [], 'data': []}
-    for i in range(5, -1, -1):  # 6 derniers mois
-        mois_date = aujourd_hui - timedelta(days=i*30)
-        premier_jour = mois_date.replace(day=1)
-        # Dernier jour du mois
-        if mois_date.month == 12:
-            dernier_jour = mois_date.replace(day=31)
-        else:
-            dernier_jour = mois_date.replace(day=calendar.monthrange(mois_date.year, mois_date.month)[1])
-        
-        # Total dépenses du mois
-        total = Depense.objects.filter(
-            agent=request.user,
-            date_depense__gte=premier_jour,
-            date_depense__lte=dernier_jour
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        
-        # Nom du mois en français
-        mois_names = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Jun', 'Jul', 'Aoû', 'Sep', 'Oct', 'Nov', 'Déc']
-        graphique_evolution['labels'].append(mois_names[mois_date.month - 1])
-        graphique_evolution['data'].append(float(total))
+    evolution = serie_temporelle(
+        Depense.objects.filter(agent=request.user), 'date_depense', 6, montant=Sum('montant')
+    )
+    graphique_evolution = {
+        'labels': [MOIS_COURTS[point['periode'].month - 1] for point in evolution],
+        'data': [float(point['montant']) for point in evolution],
+    }
     
     # 2. Répartition par catégorie
     categories_stats = Depense.objects.filter(
@@ -1928,14 +1933,18 @@ def rapport_journalier_view(request):
     else:
         date_rapport = date.today()
     
+    # ==== TOTAUX DU JOUR (jeu de données commun aux rapports) ====
+    donnees = ReportDataset(date_rapport, date_rapport)
+    totaux = donnees.totaux
+    
     # ==== COLIS RÉCEPTIONNÉS ====
     colis_receptionnes = Colis.objects.filter(
         statut='arrive',
         lot__date_arrivee__date=date_rapport
     ).select_related('client__user', 'lot').order_by('-lot__date_arrivee')
     
-    nb_colis_receptionnes = colis_receptionnes.count()
-    valeur_colis_receptionnes = sum(float(c.prix_calcule or 0) for c in colis_receptionnes)
+    nb_colis_receptionnes = totaux['colis_receptionnes']
+    valeur_colis_receptionnes = totaux['valeur_colis_receptionnes']
     
     # ==== COLIS LIVRÉS ====
     livraisons_jour = Livraison.objects.filter(
@@ -1943,29 +1952,26 @@ def rapport_journalier_view(request):
         statut='livree'
     ).select_related('colis__client__user', 'colis__lot', 'agent_livreur').order_by('-date_livraison_effective')
     
-    nb_colis_livres = livraisons_jour.count()
+    nb_colis_livres = totaux['colis_livres']
     
     # ==== REVENUS ====
-    revenus_jour = livraisons_jour.filter(
-        montant_collecte__isnull=False
-    ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-    revenus_jour = float(revenus_jour)
+    revenus_jour = totaux['revenus']
     
     # ==== DÉPENSES ====
     depenses_jour = Depense.objects.filter(
         date_depense=date_rapport
     ).select_related('agent').order_by('-date_creation')
     
-    total_depenses = depenses_jour.aggregate(total=Sum('montant'))['total'] or 0
-    total_depenses = float(total_depenses)
+    total_depenses = totaux['depenses']
     
     # Répartition des dépenses par type
-    depenses_par_type = depenses_jour.values('type_depense').annotate(
-        total=Sum('montant')
-    ).order_by('-total')
+    depenses_par_type = [
+        {'type_depense': dep['type_depense'], 'total': dep['total']}
+        for dep in donnees.depenses_par_type
+    ]
     
     # ==== BÉNÉFICE NET ====
-    benefice_net = revenus_jour - total_depenses
+    benefice_net = totaux['benefice']
     
     # ==== LOTS EN COURS ====
     lots_en_cours = Lot.objects.filter(
@@ -1978,36 +1984,26 @@ def rapport_journalier_view(request):
     ).distinct().count()
     
     # ==== STATISTIQUES DES 7 DERNIERS JOURS (pour graphiques) ====
+    # De J-6 à la date du rapport : une requête GROUP BY par table
+    livraisons_7_jours = serie_temporelle(
+        Livraison.objects.filter(statut='livree'), 'date_livraison_effective', 7,
+        periode='jour', fin=date_rapport,
+        livraisons=Count('pk'), revenus=Sum('montant_collecte'),
+    )
+    depenses_7_jours = serie_temporelle(
+        Depense.objects.all(), 'date_depense', 7,
+        periode='jour', fin=date_rapport, depenses=Sum('montant'),
+    )
     stats_7_jours = []
-    for i in range(6, -1, -1):  # De J-6 à aujourd'hui
-        jour = date_rapport - timedelta(days=i)
-        
-        # Livraisons du jour
-        livraisons = Livraison.objects.filter(
-            date_livraison_effective__date=jour,
-            statut='livree'
-        )
-        
-        # Dépenses du jour
-        depenses = Depense.objects.filter(
-            date_depense=jour
-        )
-        
-        # Revenus du jour
-        revenus = livraisons.filter(
-            montant_collecte__isnull=False
-        ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-        
-        # Total dépenses
-        depenses_total = depenses.aggregate(total=Sum('montant'))['total'] or 0
-        
+    for livraisons, depenses in zip(livraisons_7_jours, depenses_7_jours):
+        jour = livraisons['periode']
         stats_7_jours.append({
             'date': jour.strftime('%d/%m'),
             'date_full': jour.strftime('%Y-%m-%d'),
-            'livraisons': livraisons.count(),
-            'revenus': float(revenus),
-            'depenses': float(depenses_total),
-            'benefice': float(revenus) - float(depenses_total)
+            'livraisons': livraisons['livraisons'],
+            'revenus': float(livraisons['revenus']),
+            'depenses': float(depenses['depenses']),
+            'benefice': float(livraisons['revenus']) - float(depenses['depenses'])
         })
     
     # ==== TAUX DE PERFORMANCE ====
@@ -2041,7 +2037,7 @@ def rapport_journalier_view(request):
         
         # Données pour graphiques
         'stats_7_jours': stats_7_jours,
-        'depenses_par_type': list(depenses_par_type),
+        'depenses_par_type': depenses_par_type,
         
         'title': f'Rapport Journalier - {date_rapport.strftime("%d/%m/%Y")}',
     }
@@ -2063,36 +2059,28 @@ def generer_pdf_rapport_journalier(request):
     else:
         date_rapport = date.today()
     
-    # === RÉCUPÉRATION DES DONNÉES (même code que rapport_journalier_view) ===
+    # === RÉCUPÉRATION DES DONNÉES (jeu de données commun aux rapports) ===
+    donnees = ReportDataset(date_rapport, date_rapport)
+    totaux = donnees.totaux
+    
     colis_receptionnes = Colis.objects.filter(
         statut='arrive',
         lot__date_arrivee__date=date_rapport
     ).select_related('client__user', 'lot')
     
-    nb_colis_receptionnes = colis_receptionnes.count()
-    valeur_colis_receptionnes = sum(float(c.prix_calcule or 0) for c in colis_receptionnes)
+    nb_colis_receptionnes = totaux['colis_receptionnes']
+    valeur_colis_receptionnes = totaux['valeur_colis_receptionnes']
     
     livraisons_jour = Livraison.objects.filter(
         date_livraison_effective__date=date_rapport,
         statut='livree'
     ).select_related('colis__client__user', 'agent_livreur')
     
-    nb_colis_livres = livraisons_jour.count()
-    
-    revenus_jour = livraisons_jour.filter(
-        montant_collecte__isnull=False
-    ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-    revenus_jour = float(revenus_jour)
-    
-    depenses_jour = Depense.objects.filter(date_depense=date_rapport).select_related('agent')
-    total_depenses = depenses_jour.aggregate(total=Sum('montant'))['total'] or 0
-    total_depenses = float(total_depenses)
-    
-    depenses_par_type = depenses_jour.values('type_depense').annotate(
-        total=Sum('montant')
-    ).order_by('-total')
-    
-    benefice_net = revenus_jour - total_depenses
+    nb_colis_livres = totaux['colis_livres']
+    revenus_jour = totaux['revenus']
+    total_depenses = totaux['depenses']
+    depenses_par_type = donnees.depenses_par_type
+    benefice_net = totaux['benefice']
     
     colis_en_attente = Colis.objects.filter(statut='arrive').count()
     lots_en_cours = Lot.objects.filter(statut__in=['en_transit', 'expedie', 'arrive']).count()
@@ -2277,8 +2265,8 @@ def send_report_whatsapp_api(request):
         report_type = data.get('type')
         period = data.get('period')
         
-        # Générer le rapport PDF
-        pdf_content = generate_daily_report_pdf(period)
+        # Rapport PDF (magasin des rapports, généré par un worker si nécessaire)
+        pdf_content = contenu_rapport_pdf('journalier', period, request.user)
         
         # Message de base pour WhatsApp
         whatsapp_message = f"""
@@ -2298,6 +2286,9 @@ def send_report_whatsapp_api(request):
         # Utiliser le service de notification existant pour simplifier
         from notifications_app.services import NotificationService
         
+        # Chiffres clés : même jeu de données que le PDF
+        totaux = ReportDataset.pour_periode('journalier', period).totaux
+        
         # Créer un message détaillé pour les admins WhatsApp
         admin_whatsapp_message = f"""
 📈 RAPPORT JOURNALIER AUTOMATIQUE
@@ -2309,6 +2300,12 @@ def send_report_whatsapp_api(request):
 📆 Type: Rapport {report_type}
 🗓️ Période: {period}
 
+📦 Lots reçus: {totaux['lots_recus']}
+🚚 Colis livrés: {totaux['colis_livres']}
+💰 Revenus: {totaux['revenus']:,.0f} FCFA
+💸 Dépenses: {totaux['depenses']:,.0f} FCFA
+📊 Bénéfice net: {totaux['benefice']:,.0f} FCFA
+
 📧 Le rapport détaillé en PDF a été envoyé par email.
 
 Équipe TS Air Cargo Mali 🚀
@@ -2416,12 +2413,54 @@ Cordialement,
                 'error': 'Aucune notification n\'a pu être envoyée. Vérifiez la configuration WhatsApp et Email.'
             })
             
+    except RapportEnCours:
+        return _rapport_en_cours_response('journalier', period)
     except Exception as e:
         return JsonResponse({
             'success': False,
             'error': str(e)
         })
 
+def _rapport_en_cours_response(type_rapport, periode):
+    """
+    202 : rapport confié au worker, le client interroge status_url
+    """
+    type_rapport = ALIAS_TYPES.get(type_rapport, type_rapport)
+    return JsonResponse({
+        'success': False,
+        'pending': True,
+        'error': 'Rapport en cours de génération, réessayez dans quelques instants',
+        'status_url': reverse('agent_mali:rapport_pdf_statut', args=[type_rapport, periode]),
+    }, status=202)
+
+def _rapport_pdf_response(request, type_rapport, periode):
+    """
+    Renvoie le PDF stocké de la période, ou 202 pendant que le worker le génère
+    """
+    try:
+        rapport = obtenir_rapport_pdf(type_rapport, periode, request.user)
+    except RapportEnCours:
+        return _rapport_en_cours_response(type_rapport, periode)
+
+    nom_fichier = f"{TYPES_RAPPORT[type_rapport].prefixe_fichier}_{rapport.periode_cle}.pdf"
+    return FileResponse(
+        rapport.fichier_pdf.open('rb'),
+        as_attachment=True,
+        filename=nom_fichier,
+        content_type='application/pdf',
+    )
+
+@agent_mali_required
+@require_http_methods(["GET"])
+def rapport_pdf_statut(request, type_rapport, periode):
+    """
+    URL de statut d'un rapport : le PDF s'il est prêt, sinon 202
+    """
+    try:
+        return _rapport_pdf_response(request, type_rapport, periode)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
 @agent_mali_required
 @require_http_methods(["POST"])
 def generate_daily_report_api(request):
@@ -2436,13 +2475,7 @@ def generate_daily_report_api(request):
         if not date:
             return JsonResponse({'success': False, 'error': 'Date non fournie'}, status=400)
 
-        # Générer le PDF
-        pdf_content = generate_daily_report_pdf(date)
-
-        # Retourner le fichier PDF
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="rapport_quotidien_{date}.pdf"'
-        return response
+        return _rapport_pdf_response(request, 'journalier', date)
 
     except Exception as e:
         return JsonResponse({
@@ -2464,13 +2497,7 @@ def generate_monthly_report_api(request):
         if not month:
             return JsonResponse({'success': False, 'error': 'Mois non fourni'}, status=400)
 
-        # Générer le PDF
-        pdf_content = generate_monthly_report_pdf(month)
-
-        # Retourner le fichier PDF
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="rapport_mensuel_{month}.pdf"'
-        return response
+        return _rapport_pdf_response(request, 'mensuel', month)
 
     except Exception as e:
         return JsonResponse({
@@ -2492,13 +2519,7 @@ def generate_yearly_report_api(request):
         if not year:
             return JsonResponse({'success': False, 'error': 'Année non fournie'}, status=400)
 
-        # Générer le PDF
-        pdf_content = generate_yearly_report_pdf(year)
-
-        # Retourner le fichier PDF
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="rapport_annuel_{year}.pdf"'
-        return response
+        return _rapport_pdf_response(request, 'annuel', year)
 
     except Exception as e:
         return JsonResponse({
@@ -2523,19 +2544,19 @@ def send_report_email_api(request):
                 'error': 'Période non fournie'
             })
         
-        # Générer le PDF selon le type de rapport
+        # Rapport PDF selon le type (magasin des rapports)
+        if report_type in ALIAS_TYPES:
+            pdf_content = contenu_rapport_pdf(report_type, period, request.user)
+        
         if report_type == 'daily':
-            pdf_content = generate_daily_report_pdf(period)
             subject = f"Rapport Quotidien TS Air Cargo Mali - {datetime.strptime(period, '%Y-%m-%d').strftime('%d/%m/%Y')}"
             filename = f"rapport_quotidien_{period}.pdf"
         elif report_type == 'monthly':
-            pdf_content = generate_monthly_report_pdf(period)
             year, month = period.split('-')
             month_name = datetime(int(year), int(month), 1).strftime('%B %Y')
             subject = f"Rapport Mensuel TS Air Cargo Mali - {month_name}"
             filename = f"rapport_mensuel_{period}.pdf"
         elif report_type == 'yearly':
-            pdf_content = generate_yearly_report_pdf(period)
             subject = f"Rapport Annuel TS Air Cargo Mali - {period}"
             filename = f"rapport_annuel_{period}.pdf"
         else:
@@ -2597,6 +2618,8 @@ Cordialement,
             'message': f'Rapport {report_type} envoyé par email avec succès à {len(recipients)} destinataire(s)'
         })
         
+    except RapportEnCours:
+        return _rapport_en_cours_response(report_type, period)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -2748,32 +2771,16 @@ def generate_daily_report_pdf(date_str):
     story.append(Spacer(1, 12))
     
     # Statistiques du jour
-    # Lots reçus
-    lots_recus = ReceptionLot.objects.filter(date_reception__date=date_filter).count()
-    
-    # Colis livrés
-    colis_livres = Livraison.objects.filter(
-        date_livraison_effective__date=date_filter,
-        statut='livree'
-    ).count()
-    
-    # Dépenses
-    depenses_total = Depense.objects.filter(
-        date_depense=date_filter
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    # Revenus
-    revenus_total = Livraison.objects.filter(
-        date_livraison_effective__date=date_filter,
-        statut='livree',
-        montant_collecte__isnull=False
-    ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-    
-    # Bénéfice
-    benefice_net = revenus_total - depenses_total
+    donnees = ReportDataset(date_filter, date_filter, detail_depenses=10)
+    totaux = donnees.totaux
+    lots_recus = totaux['lots_recus']
+    colis_livres = totaux['colis_livres']
+    depenses_total = totaux['depenses']
+    revenus_total = totaux['revenus']
+    benefice_net = totaux['benefice']
     
     # Vérifier s'il y a des données
-    has_data = lots_recus > 0 or colis_livres > 0 or depenses_total > 0 or revenus_total > 0
+    has_data = donnees.a_des_donnees
     
     if has_data:
         # Section des indicateurs clés
@@ -2837,9 +2844,7 @@ def generate_daily_report_pdf(date_str):
             section_depenses = Paragraph("💸 DÉTAIL DES DÉPENSES", section_style)
             story.append(section_depenses)
             
-            depenses_detail = Depense.objects.filter(
-                date_depense=date_filter
-            ).values('type_depense', 'libelle', 'montant')[:10]  # Limiter à 10 entrées
+            depenses_detail = donnees.depenses_detail  # Limité à 10 entrées
             
             if depenses_detail:
                 depenses_data = [['🏷️ TYPE', '📝 LIBELLÉ', '💰 MONTANT']]
@@ -3053,44 +3058,22 @@ def generate_monthly_report_pdf(month_str):
     story.append(Spacer(1, 30))
     
     # Statistiques du mois
-    # Lots reçus
-    lots_recus = ReceptionLot.objects.filter(
-        date_reception__date__gte=start_date,
-        date_reception__date__lte=end_date
-    ).count()
-    
-    # Colis livrés
-    colis_livres = Livraison.objects.filter(
-        date_livraison_effective__date__gte=start_date,
-        date_livraison_effective__date__lte=end_date,
-        statut='livree'
-    ).count()
-    
-    # Dépenses
-    depenses_total = Depense.objects.filter(
-        date_depense__gte=start_date,
-        date_depense__lte=end_date
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    # Revenus
-    revenus_total = Livraison.objects.filter(
-        date_livraison_effective__date__gte=start_date,
-        date_livraison_effective__date__lte=end_date,
-        statut='livree',
-        montant_collecte__isnull=False
-    ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-    
-    # Bénéfice
-    benefice_net = revenus_total - depenses_total
+    donnees = ReportDataset(start_date, end_date)
+    totaux = donnees.totaux
+    lots_recus = totaux['lots_recus']
+    colis_livres = totaux['colis_livres']
+    depenses_total = totaux['depenses']
+    revenus_total = totaux['revenus']
+    benefice_net = totaux['benefice']
     
     # Moyennes journalières
-    nombre_jours = (end_date - start_date).days + 1
+    nombre_jours = donnees.nombre_jours
     moy_lots_jour = lots_recus / nombre_jours if nombre_jours > 0 else 0
     moy_colis_jour = colis_livres / nombre_jours if nombre_jours > 0 else 0
     moy_revenus_jour = revenus_total / nombre_jours if nombre_jours > 0 else 0
     
     # Vérifier s'il y a des données
-    has_data = lots_recus > 0 or colis_livres > 0 or depenses_total > 0 or revenus_total > 0
+    has_data = donnees.a_des_donnees
     
     if has_data:
         # Section des indicateurs clés
@@ -3153,13 +3136,7 @@ def generate_monthly_report_pdf(month_str):
             section_depenses = Paragraph("💸 ANALYSE DES DÉPENSES PAR CATÉGORIE", section_style)
             story.append(section_depenses)
             
-            depenses_par_type = Depense.objects.filter(
-                date_depense__gte=start_date,
-                date_depense__lte=end_date
-            ).values('type_depense').annotate(
-                total=Sum('montant'),
-                count=Count('id')
-            ).order_by('-total')
+            depenses_par_type = donnees.depenses_par_type
             
             if depenses_par_type:
                 depenses_data = [['🏷️ CATÉGORIE', '💰 MONTANT TOTAL', '📊 NOMBRE', '📈 % DU TOTAL']]
@@ -3168,7 +3145,7 @@ def generate_monthly_report_pdf(month_str):
                     depenses_data.append([
                         dep['type_depense'].replace('_', ' ').title(),
                         f"{dep['total']:,.0f} CFA",
-                        str(dep['count']),
+                        str(int(dep['nombre'])),
                         f"{pourcentage:.1f}%"
                     ])
                 
@@ -3361,35 +3338,13 @@ def generate_yearly_report_pdf(year_str):
     story.append(Spacer(1, 30))
     
     # Statistiques de l'année
-    # Lots reçus
-    lots_recus = ReceptionLot.objects.filter(
-        date_reception__date__gte=start_date,
-        date_reception__date__lte=end_date
-    ).count()
-    
-    # Colis livrés
-    colis_livres = Livraison.objects.filter(
-        date_livraison_effective__date__gte=start_date,
-        date_livraison_effective__date__lte=end_date,
-        statut='livree'
-    ).count()
-    
-    # Dépenses
-    depenses_total = Depense.objects.filter(
-        date_depense__gte=start_date,
-        date_depense__lte=end_date
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    # Revenus
-    revenus_total = Livraison.objects.filter(
-        date_livraison_effective__date__gte=start_date,
-        date_livraison_effective__date__lte=end_date,
-        statut='livree',
-        montant_collecte__isnull=False
-    ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-    
-    # Bénéfice
-    benefice_net = revenus_total - depenses_total
+    donnees = ReportDataset(start_date, end_date)
+    totaux = donnees.totaux
+    lots_recus = totaux['lots_recus']
+    colis_livres = totaux['colis_livres']
+    depenses_total = totaux['depenses']
+    revenus_total = totaux['revenus']
+    benefice_net = totaux['benefice']
     
     # Moyennes mensuelles
     moy_lots_mois = lots_recus / 12
@@ -3398,7 +3353,7 @@ def generate_yearly_report_pdf(year_str):
     moy_depenses_mois = depenses_total / 12
     
     # Vérifier s'il y a des données
-    has_data = lots_recus > 0 or colis_livres > 0 or depenses_total > 0 or revenus_total > 0
+    has_data = donnees.a_des_donnees
     
     if has_data:
         # Section des indicateurs clés
@@ -3463,38 +3418,14 @@ def generate_yearly_report_pdf(year_str):
         # Créer un tableau avec l'évolution mois par mois
         evolution_data = [['MOIS', 'LOTS REÇUS', 'COLIS LIVRÉS', 'REVENUS (CFA)', 'DÉPENSES (CFA)']]
         
-        for month in range(1, 13):
-            month_start = datetime(year, month, 1).date()
-            if month == 12:
-                month_end = datetime(year, 12, 31).date()
-            else:
-                month_end = datetime(year, month + 1, 1).date() - timedelta(days=1)
-            
-            # Statistiques du mois
-            lots_mois = ReceptionLot.objects.filter(
-                date_reception__date__gte=month_start,
-                date_reception__date__lte=month_end
-            ).count()
+        # Totaux mensuels calculés depuis le jeu de données (aucune requête)
+        for debut_mois, mois in donnees.par_mois().iterrows():
+            lots_mois = int(mois['lots_recus'])
+            colis_mois = int(mois['colis_livres'])
+            revenus_mois = mois['revenus']
+            depenses_mois = mois['depenses']
             
-            colis_mois = Livraison.objects.filter(
-                date_livraison_effective__date__gte=month_start,
-                date_livraison_effective__date__lte=month_end,
-                statut='livree'
-            ).count()
-            
-            revenus_mois = Livraison.objects.filter(
-                date_livraison_effective__date__gte=month_start,
-                date_livraison_effective__date__lte=month_end,
-                statut='livree',
-                montant_collecte__isnull=False
-            ).aggregate(total=Sum('montant_collecte'))['total'] or 0
-            
-            depenses_mois = Depense.objects.filter(
-                date_depense__gte=month_start,
-                date_depense__lte=month_end
-            ).aggregate(total=Sum('montant'))['total'] or 0
-            
-            month_name = datetime(year, month, 1).strftime('%B')[:3].title()
+            month_name = debut_mois.strftime('%B')[:3].title()
             evolution_data.append([
                 month_name,
                 str(lots_mois),
@@ -3729,15 +3660,14 @@ def export_depenses_excel(request):
     return response
 
 
-@agent_mali_required
-def export_rapport_cargo_excel(request):
+def _export_rapport_transport_excel(request, type_transport, libelle, couleur):
     """
-    Exporter les rapports cargo en format Excel
+    Export Excel (résumé, colis, lots) des colis d'un type de transport
+    Écrit en flux via reporting_app.exports : mémoire bornée quel que soit le volume
     """
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
     from datetime import datetime
+    from django.db.models import OuterRef, Subquery
+    from reporting_app.exports import Colonne, ExportXlsx, lignes_depuis_queryset
     
     # Récupération des filtres
     date_debut = request.GET.get('date_debut')
@@ -3761,166 +3691,159 @@ def export_rapport_cargo_excel(request):
         except ValueError:
             date_fin = today
     
-    # Récupération des colis cargo
-    colis_cargo = Colis.objects.filter(
-        type_transport='cargo',
+    avec_livraison = type_transport != 'cargo'
+    statuts_colis = dict(Colis.STATUS_CHOICES)
+    statuts_lot = dict(Lot.STATUS_CHOICES)
+    
+    colis = Colis.objects.filter(
+        type_transport=type_transport,
         date_creation__gte=date_debut,
         date_creation__lte=date_fin
-    ).select_related('client__user', 'lot').order_by('-date_creation')
+    )
     
-    # Récupération des lots avec colis cargo
-    lots_cargo = Lot.objects.filter(
-        colis__type_transport='cargo',
+    # Lots contenant des colis de ce type, avec leurs totaux calculés en SQL
+    filtre_type = Q(colis__type_transport=type_transport)
+    lots = Lot.objects.filter(
         date_creation__gte=date_debut,
         date_creation__lte=date_fin
-    ).distinct().prefetch_related('colis_set').order_by('-date_creation')
-    
-    # Création du workbook Excel
-    wb = openpyxl.Workbook()
-    
-    # Feuille 1: Résumé Cargo
-    ws1 = wb.active
-    ws1.title = "Résumé Cargo"
-    
-    # Styles
-    header_font = Font(name='Arial', size=16, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='FF6B35', end_color='FF6B35', fill_type='solid')
-    subheader_font = Font(name='Arial', size=12, bold=True, color='2D3748')
-    subheader_fill = PatternFill(start_color='F7FAFC', end_color='F7FAFC', fill_type='solid')
-    data_font = Font(name='Arial', size=10)
-    number_font = Font(name='Arial', size=10, bold=True)
-    border = Border(
-        left=Side(border_style='thin', color='E2E8F0'),
-        right=Side(border_style='thin', color='E2E8F0'),
-        top=Side(border_style='thin', color='E2E8F0'),
-        bottom=Side(border_style='thin', color='E2E8F0')
+    ).annotate(
+        nb_colis_type=Count('colis', filter=filtre_type),
+        poids_type=Sum('colis__poids', filter=filtre_type),
+    ).filter(nb_colis_type__gt=0).order_by('-date_creation')
+    
+    stats = colis.aggregate(
+        total=Count('pk'),
+        valeur=Sum('prix_calcule'),
+        poids=Sum('poids'),
+        livres=Count('pk', filter=Q(statut='livre')),
     )
     
-    # En-tête
-    ws1['A1'] = 'RAPPORT CARGO - TS AIR CARGO'
-    ws1.merge_cells('A1:F1')
-    ws1['A1'].font = header_font
-    ws1['A1'].fill = header_fill
-    ws1['A1'].alignment = Alignment(horizontal='center', vertical='center')
+    export = ExportXlsx()
     
-    # Statistiques générales
-    total_colis = colis_cargo.count()
-    valeur_totale = colis_cargo.aggregate(total=Sum('prix_calcule'))['total'] or 0
-    poids_total = colis_cargo.aggregate(total=Sum('poids'))['total'] or 0
+    # Feuille 1 : Résumé (complétée après le parcours des colis)
+    resume = export.feuille(
+        f"Résumé {libelle}",
+        [Colonne('Indicateur', largeur=32), Colonne('Valeur', largeur=20)],
+        titre=f"RAPPORT {libelle.upper()} - TS AIR CARGO",
+        couleur=couleur,
+    )
     
-    stats_data = [
-        ['Indicateur', 'Valeur'],
-        ['Total Colis Cargo', total_colis],
-        ['Valeur Totale (FCFA)', f"{valeur_totale:,.0f}"],
-        ['Poids Total (Kg)', f"{poids_total:,.1f}"],
-        ['Nombre de Lots', lots_cargo.count()],
+    # Feuille 2 : Détail des colis
+    colonnes_colis = [
+        Colonne('Code Suivi', largeur=18),
+        Colonne('Client', largeur=28),
+        Colonne('Description', largeur=40),
+        Colonne('Poids (Kg)', 'decimal', 12),
+        Colonne('Valeur (FCFA)', 'entier', 15),
+        Colonne('Statut', largeur=18),
+        Colonne('Date Création', 'date', 14),
     ]
-    
-    for row_idx, row_data in enumerate(stats_data, start=3):
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws1.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if row_idx == 3:
-                cell.font = subheader_font
-                cell.fill = subheader_fill
-            else:
-                cell.font = data_font
-    
-    # Feuille 2: Détail des Colis Cargo
-    ws2 = wb.create_sheet(title="Colis Cargo")
-    
-    # En-têtes des colis
-    colis_headers = ['Code Suivi', 'Client', 'Description', 'Poids (Kg)', 'Valeur (FCFA)', 'Statut', 'Date Création', 'Lot']
-    for col_idx, header in enumerate(colis_headers, start=1):
-        cell = ws2.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des colis
-    for row_idx, colis in enumerate(colis_cargo, start=2):
-        row_data = [
-            colis.code_suivi,
-            f"{colis.client.user.first_name} {colis.client.user.last_name}" if colis.client and colis.client.user else "N/A",
-            colis.description_contenu,
-            float(colis.poids) if colis.poids else 0,
-            float(colis.prix_calcule) if colis.prix_calcule else 0,
-            colis.get_statut_display(),
-            colis.date_creation.strftime('%d/%m/%Y'),
-            colis.lot.numero_lot if colis.lot else "Aucun"
+    champs = [
+        'numero_suivi', 'client__user__first_name', 'client__user__last_name',
+        'description', 'poids', 'prix_calcule', 'statut', 'date_creation', 'lot__numero_lot',
+    ]
+    lignes_colis = colis.order_by('-date_creation')
+    if avec_livraison:
+        colonnes_colis += [
+            Colonne('Date Livraison', largeur=14),
+            Colonne('Délai (jours)', 'entier', 12),
         ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws2.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [4, 5]:  # Colonnes numériques
-                cell.font = number_font
-                cell.number_format = '#,##0.00' if col_idx == 4 else '#,##0'
-                cell.alignment = Alignment(horizontal='right')
-            else:
-                cell.font = data_font
-    
-    # Feuille 3: Lots Cargo
-    ws3 = wb.create_sheet(title="Lots Cargo")
-    
-    # En-têtes des lots
-    lots_headers = ['Numéro Lot', 'Nb Colis', 'Poids Total (Kg)', 'Prix Transport (FCFA)', 'Statut', 'Date Création', 'Date Expédition']
-    for col_idx, header in enumerate(lots_headers, start=1):
-        cell = ws3.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des lots
-    for row_idx, lot in enumerate(lots_cargo, start=2):
-        nb_colis_cargo = lot.colis_set.filter(type_transport='cargo').count()
-        poids_lot = lot.colis_set.filter(type_transport='cargo').aggregate(total=Sum('poids'))['total'] or 0
-        
-        row_data = [
-            lot.numero_lot,
-            nb_colis_cargo,
-            float(poids_lot),
-            float(lot.prix_transport) if lot.prix_transport else 0,
-            lot.get_statut_display(),
-            lot.date_creation.strftime('%d/%m/%Y'),
-            lot.date_expedition.strftime('%d/%m/%Y') if lot.date_expedition else "Non expédié"
+        lignes_colis = lignes_colis.annotate(
+            date_livraison=Subquery(
+                Livraison.objects.filter(
+                    colis=OuterRef('pk'), statut='livree'
+                ).values('date_livraison_effective')[:1]
+            )
+        )
+        champs.append('date_livraison')
+    colonnes_colis.append(Colonne('Lot', largeur=22))
+    
+    delais = []
+    
+    def ligne_colis(row):
+        client = f"{row['client__user__first_name'] or ''} {row['client__user__last_name'] or ''}".strip() or "N/A"
+        cellules = [
+            row['numero_suivi'],
+            client,
+            row['description'],
+            row['poids'] or 0,
+            row['prix_calcule'] or 0,
+            statuts_colis.get(row['statut'], row['statut']),
+            row['date_creation'],
         ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws3.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [2, 3, 4]:  # Colonnes numériques
-                cell.font = number_font
-                if col_idx == 3:
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0'
-                cell.alignment = Alignment(horizontal='right')
+        if avec_livraison:
+            date_livraison = row['date_livraison']
+            if date_livraison:
+                delai = (timezone.localdate(date_livraison) - timezone.localdate(row['date_creation'])).days
+                if row['statut'] == 'livre':
+                    delais.append(delai)
+                cellules += [timezone.localdate(date_livraison).strftime('%d/%m/%Y'), delai]
             else:
-                cell.font = data_font
-    
-    # Ajuster les largeurs des colonnes pour toutes les feuilles
-    for ws in [ws1, ws2, ws3]:
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-    
-    # Préparation de la réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="rapport_cargo_{date_debut}_{date_fin}.xlsx"'
+                cellules += ["Non livré", "N/A"]
+        cellules.append(row['lot__numero_lot'] or "Aucun")
+        return cellules
+    
+    feuille_colis = export.feuille(f"Colis {libelle}", colonnes_colis)
+    feuille_colis.ajouter_lignes(lignes_depuis_queryset(lignes_colis.values(*champs), ligne_colis))
+    
+    # Feuille 3 : Lots
+    colonnes_lots = [
+        Colonne('Numéro Lot', largeur=22),
+        Colonne('Nb Colis', 'entier', 10),
+        Colonne('Poids Total (Kg)', 'decimal', 16),
+        Colonne('Prix Transport (FCFA)', 'entier', 20),
+    ]
+    if avec_livraison:
+        colonnes_lots.append(Colonne('Frais Douane (FCFA)', 'entier', 20))
+    colonnes_lots += [
+        Colonne('Statut', largeur=16),
+        Colonne('Date Création', 'date', 14),
+        Colonne('Date Expédition', largeur=16),
+    ]
     
-    wb.save(response)
-    return response
+    def ligne_lot(row):
+        cellules = [row['numero_lot'], row['nb_colis_type'], row['poids_type'] or 0, row['prix_transport'] or 0]
+        if avec_livraison:
+            cellules.append(row['frais_douane'] or 0)
+        cellules += [
+            statuts_lot.get(row['statut'], row['statut']),
+            row['date_creation'],
+            timezone.localdate(row['date_expedition']).strftime('%d/%m/%Y') if row['date_expedition'] else "Non expédié",
+        ]
+        return cellules
+    
+    feuille_lots = export.feuille(f"Lots {libelle}", colonnes_lots)
+    nombre_lots = feuille_lots.ajouter_lignes(lignes_depuis_queryset(
+        lots.values(
+            'numero_lot', 'nb_colis_type', 'poids_type', 'prix_transport', 'frais_douane',
+            'statut', 'date_creation', 'date_expedition',
+        ),
+        ligne_lot,
+    ))
+    
+    total_colis = stats['total']
+    resume.ajouter_lignes([
+        [f"Total Colis {libelle}", total_colis],
+        ['Valeur Totale (FCFA)', f"{stats['valeur'] or 0:,.0f}"],
+        ['Poids Total (Kg)', f"{stats['poids'] or 0:,.1f}"],
+        ['Nombre de Lots', nombre_lots],
+    ])
+    if avec_livraison:
+        delai_moyen = sum(delais) / len(delais) if delais else 0
+        resume.ajouter_lignes([
+            ['Délai Moyen Livraison (jours)', f"{delai_moyen:.1f}"],
+            ['Taux de Livraison (%)', f"{(stats['livres'] / total_colis * 100):.1f}" if total_colis > 0 else "0.0"],
+        ])
+    
+    return export.reponse(f"rapport_{type_transport}_{date_debut}_{date_fin}.xlsx")
+
+
+@agent_mali_required
+def export_rapport_cargo_excel(request):
+    """
+    Exporter les rapports cargo en format Excel
+    """
+    return _export_rapport_transport_excel(request, 'cargo', 'Cargo', '#FF6B35')
 
 
 @agent_mali_required
@@ -3928,226 +3851,7 @@ def export_rapport_express_excel(request):
     """
     Exporter les rapports express en format Excel
     """
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
-    from datetime import datetime
-    
-    # Récupération des filtres
-    date_debut = request.GET.get('date_debut')
-    date_fin = request.GET.get('date_fin')
-    
-    # Dates par défaut
-    today = timezone.now().date()
-    if not date_debut:
-        date_debut = today - timedelta(days=30)
-    else:
-        try:
-            date_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
-        except ValueError:
-            date_debut = today - timedelta(days=30)
-    
-    if not date_fin:
-        date_fin = today
-    else:
-        try:
-            date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date()
-        except ValueError:
-            date_fin = today
-    
-    # Récupération des colis express
-    colis_express = Colis.objects.filter(
-        type_transport='express',
-        date_creation__gte=date_debut,
-        date_creation__lte=date_fin
-    ).select_related('client__user', 'lot').order_by('-date_creation')
-    
-    # Récupération des lots avec colis express
-    lots_express = Lot.objects.filter(
-        colis__type_transport='express',
-        date_creation__gte=date_debut,
-        date_creation__lte=date_fin
-    ).distinct().prefetch_related('colis_set').order_by('-date_creation')
-    
-    # Création du workbook Excel
-    wb = openpyxl.Workbook()
-    
-    # Feuille 1: Résumé Express
-    ws1 = wb.active
-    ws1.title = "Résumé Express"
-    
-    # Styles
-    header_font = Font(name='Arial', size=16, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='28A745', end_color='28A745', fill_type='solid')  # Vert pour express
-    subheader_font = Font(name='Arial', size=12, bold=True, color='2D3748')
-    subheader_fill = PatternFill(start_color='F7FAFC', end_color='F7FAFC', fill_type='solid')
-    data_font = Font(name='Arial', size=10)
-    number_font = Font(name='Arial', size=10, bold=True)
-    border = Border(
-        left=Side(border_style='thin', color='E2E8F0'),
-        right=Side(border_style='thin', color='E2E8F0'),
-        top=Side(border_style='thin', color='E2E8F0'),
-        bottom=Side(border_style='thin', color='E2E8F0')
-    )
-    
-    # En-tête
-    ws1['A1'] = 'RAPPORT EXPRESS - TS AIR CARGO'
-    ws1.merge_cells('A1:F1')
-    ws1['A1'].font = header_font
-    ws1['A1'].fill = header_fill
-    ws1['A1'].alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Statistiques générales
-    total_colis = colis_express.count()
-    valeur_totale = colis_express.aggregate(total=Sum('prix_calcule'))['total'] or 0
-    poids_total = colis_express.aggregate(total=Sum('poids'))['total'] or 0
-    
-    # Calcul du délai moyen de livraison
-    colis_livres = colis_express.filter(statut='livre')
-    delai_moyen = 0
-    if colis_livres.exists():
-        delais = []
-        for colis in colis_livres:
-            livraisons = colis.livraisons.filter(statut='livree')
-            if livraisons.exists():
-                livraison = livraisons.first()
-                if livraison.date_livraison_effective:
-                    delai = (livraison.date_livraison_effective.date() - colis.date_creation.date()).days
-                    delais.append(delai)
-        if delais:
-            delai_moyen = sum(delais) / len(delais)
-    
-    stats_data = [
-        ['Indicateur', 'Valeur'],
-        ['Total Colis Express', total_colis],
-        ['Valeur Totale (FCFA)', f"{valeur_totale:,.0f}"],
-        ['Poids Total (Kg)', f"{poids_total:,.1f}"],
-        ['Nombre de Lots', lots_express.count()],
-        ['Délai Moyen Livraison (jours)', f"{delai_moyen:.1f}"],
-        ['Taux de Livraison (%)', f"{(colis_livres.count() / total_colis * 100):.1f}" if total_colis > 0 else "0.0"],
-    ]
-    
-    for row_idx, row_data in enumerate(stats_data, start=3):
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws1.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if row_idx == 3:
-                cell.font = subheader_font
-                cell.fill = subheader_fill
-            else:
-                cell.font = data_font
-    
-    # Feuille 2: Détail des Colis Express
-    ws2 = wb.create_sheet(title="Colis Express")
-    
-    # En-têtes des colis
-    colis_headers = ['Code Suivi', 'Client', 'Description', 'Poids (Kg)', 'Valeur (FCFA)', 'Statut', 'Date Création', 'Date Livraison', 'Délai (jours)', 'Lot']
-    for col_idx, header in enumerate(colis_headers, start=1):
-        cell = ws2.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des colis
-    for row_idx, colis in enumerate(colis_express, start=2):
-        # Calcul du délai
-        delai = ""
-        date_livraison = ""
-        livraisons = colis.livraisons.filter(statut='livree')
-        if livraisons.exists():
-            livraison = livraisons.first()
-            if livraison.date_livraison_effective:
-                date_livraison = livraison.date_livraison_effective.strftime('%d/%m/%Y')
-                delai = (livraison.date_livraison_effective.date() - colis.date_creation.date()).days
-        
-        row_data = [
-            colis.code_suivi,
-            f"{colis.client.user.first_name} {colis.client.user.last_name}" if colis.client and colis.client.user else "N/A",
-            colis.description_contenu,
-            float(colis.poids) if colis.poids else 0,
-            float(colis.prix_calcule) if colis.prix_calcule else 0,
-            colis.get_statut_display(),
-            colis.date_creation.strftime('%d/%m/%Y'),
-            date_livraison if date_livraison else "Non livré",
-            delai if delai != "" else "N/A",
-            colis.lot.numero_lot if colis.lot else "Aucun"
-        ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws2.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [4, 5, 9]:  # Colonnes numériques
-                cell.font = number_font
-                if col_idx == 4:
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0'
-                cell.alignment = Alignment(horizontal='right')
-            else:
-                cell.font = data_font
-    
-    # Feuille 3: Lots Express
-    ws3 = wb.create_sheet(title="Lots Express")
-    
-    # En-têtes des lots
-    lots_headers = ['Numéro Lot', 'Nb Colis', 'Poids Total (Kg)', 'Prix Transport (FCFA)', 'Frais Douane (FCFA)', 'Statut', 'Date Création', 'Date Expédition']
-    for col_idx, header in enumerate(lots_headers, start=1):
-        cell = ws3.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des lots
-    for row_idx, lot in enumerate(lots_express, start=2):
-        nb_colis_express = lot.colis_set.filter(type_transport='express').count()
-        poids_lot = lot.colis_set.filter(type_transport='express').aggregate(total=Sum('poids'))['total'] or 0
-        
-        row_data = [
-            lot.numero_lot,
-            nb_colis_express,
-            float(poids_lot),
-            float(lot.prix_transport) if lot.prix_transport else 0,
-            float(lot.frais_douane) if hasattr(lot, 'frais_douane') and lot.frais_douane else 0,
-            lot.get_statut_display(),
-            lot.date_creation.strftime('%d/%m/%Y'),
-            lot.date_expedition.strftime('%d/%m/%Y') if lot.date_expedition else "Non expédié"
-        ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws3.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [2, 3, 4, 5]:  # Colonnes numériques
-                cell.font = number_font
-                if col_idx == 3:
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0'
-                cell.alignment = Alignment(horizontal='right')
-            else:
-                cell.font = data_font
-    
-    # Ajuster les largeurs des colonnes pour toutes les feuilles
-    for ws in [ws1, ws2, ws3]:
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-    
-    # Préparation de la réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="rapport_express_{date_debut}_{date_fin}.xlsx"'
-    
-    wb.save(response)
-    return response
+    return _export_rapport_transport_excel(request, 'express', 'Express', '#28A745')
 
 
 @agent_mali_required
@@ -4155,223 +3859,4 @@ def export_rapport_bateau_excel(request):
     """
     Exporter les rapports bateau en format Excel
     """
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
-    from datetime import datetime
-    
-    # Récupération des filtres
-    date_debut = request.GET.get('date_debut')
-    date_fin = request.GET.get('date_fin')
-    
-    # Dates par défaut
-    today = timezone.now().date()
-    if not date_debut:
-        date_debut = today - timedelta(days=30)
-    else:
-        try:
-            date_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
-        except ValueError:
-            date_debut = today - timedelta(days=30)
-    
-    if not date_fin:
-        date_fin = today
-    else:
-        try:
-            date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date()
-        except ValueError:
-            date_fin = today
-    
-    # Récupération des colis bateau
-    colis_bateau = Colis.objects.filter(
-        type_transport='bateau',
-        date_creation__gte=date_debut,
-        date_creation__lte=date_fin
-    ).select_related('client__user', 'lot').order_by('-date_creation')
-    
-    # Récupération des lots avec colis bateau
-    lots_bateau = Lot.objects.filter(
-        colis__type_transport='bateau',
-        date_creation__gte=date_debut,
-        date_creation__lte=date_fin
-    ).distinct().prefetch_related('colis_set').order_by('-date_creation')
-    
-    # Création du workbook Excel
-    wb = openpyxl.Workbook()
-    
-    # Feuille 1: Résumé Bateau
-    ws1 = wb.active
-    ws1.title = "Résumé Bateau"
-    
-    # Styles
-    header_font = Font(name='Arial', size=16, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='007BFF', end_color='007BFF', fill_type='solid')  # Bleu pour bateau
-    subheader_font = Font(name='Arial', size=12, bold=True, color='2D3748')
-    subheader_fill = PatternFill(start_color='F7FAFC', end_color='F7FAFC', fill_type='solid')
-    data_font = Font(name='Arial', size=10)
-    number_font = Font(name='Arial', size=10, bold=True)
-    border = Border(
-        left=Side(border_style='thin', color='E2E8F0'),
-        right=Side(border_style='thin', color='E2E8F0'),
-        top=Side(border_style='thin', color='E2E8F0'),
-        bottom=Side(border_style='thin', color='E2E8F0')
-    )
-    
-    # En-tête
-    ws1['A1'] = 'RAPPORT BATEAU - TS AIR CARGO'
-    ws1.merge_cells('A1:F1')
-    ws1['A1'].font = header_font
-    ws1['A1'].fill = header_fill
-    ws1['A1'].alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Statistiques générales
-    total_colis = colis_bateau.count()
-    valeur_totale = colis_bateau.aggregate(total=Sum('prix_calcule'))['total'] or 0
-    poids_total = colis_bateau.aggregate(total=Sum('poids'))['total'] or 0
-    
-    # Calcul du délai moyen de livraison
-    colis_livres = colis_bateau.filter(statut='livre')
-    delai_moyen = 0
-    if colis_livres.exists():
-        delais = []
-        for colis in colis_livres:
-            livraisons = colis.livraisons.filter(statut='livree')
-            if livraisons.exists():
-                livraison = livraisons.first()
-                if livraison.date_livraison_effective:
-                    delai = (livraison.date_livraison_effective.date() - colis.date_creation.date()).days
-                    delais.append(delai)
-        if delais:
-            delai_moyen = sum(delais) / len(delais)
-    
-    stats_data = [
-        ['Indicateur', 'Valeur'],
-        ['Total Colis Bateau', total_colis],
-        ['Valeur Totale (FCFA)', f"{valeur_totale:,.0f}"],
-        ['Poids Total (Kg)', f"{poids_total:,.1f}"],
-        ['Nombre de Lots', lots_bateau.count()],
-        ['Délai Moyen Livraison (jours)', f"{delai_moyen:.1f}"],
-        ['Taux de Livraison (%)', f"{(colis_livres.count() / total_colis * 100):.1f}" if total_colis > 0 else "0.0"],
-    ]
-    
-    for row_idx, row_data in enumerate(stats_data, start=3):
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws1.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if row_idx == 3:
-                cell.font = subheader_font
-                cell.fill = subheader_fill
-            else:
-                cell.font = data_font
-    
-    # Feuille 2: Détail des Colis Bateau
-    ws2 = wb.create_sheet(title="Colis Bateau")
-    
-    # En-têtes des colis
-    colis_headers = ['Code Suivi', 'Client', 'Description', 'Poids (Kg)', 'Valeur (FCFA)', 'Statut', 'Date Création', 'Date Livraison', 'Délai (jours)', 'Lot']
-    for col_idx, header in enumerate(colis_headers, start=1):
-        cell = ws2.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des colis
-    for row_idx, colis in enumerate(colis_bateau, start=2):
-        # Calcul du délai
-        delai = ""
-        date_livraison = ""
-        livraisons = colis.livraisons.filter(statut='livree')
-        if livraisons.exists():
-            livraison = livraisons.first()
-            if livraison.date_livraison_effective:
-                date_livraison = livraison.date_livraison_effective.strftime('%d/%m/%Y')
-                delai = (livraison.date_livraison_effective.date() - colis.date_creation.date()).days
-        
-        row_data = [
-            colis.code_suivi,
-            f"{colis.client.user.first_name} {colis.client.user.last_name}" if colis.client and colis.client.user else "N/A",
-            colis.description_contenu,
-            float(colis.poids) if colis.poids else 0,
-            float(colis.prix_calcule) if colis.prix_calcule else 0,
-            colis.get_statut_display(),
-            colis.date_creation.strftime('%d/%m/%Y'),
-            date_livraison if date_livraison else "Non livré",
-            delai if delai != "" else "N/A",
-            colis.lot.numero_lot if colis.lot else "Aucun"
-        ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws2.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [4, 5, 9]:  # Colonnes numériques
-                cell.font = number_font
-                if col_idx == 4:
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0'
-                cell.alignment = Alignment(horizontal='right')
-            else:
-                cell.font = data_font
-    
-    # Feuille 3: Lots Bateau
-    ws3 = wb.create_sheet(title="Lots Bateau")
-    
-    # En-têtes des lots
-    lots_headers = ['Numéro Lot', 'Nb Colis', 'Poids Total (Kg)', 'Prix Transport (FCFA)', 'Frais Douane (FCFA)', 'Statut', 'Date Création', 'Date Expédition']
-    for col_idx, header in enumerate(lots_headers, start=1):
-        cell = ws3.cell(row=1, column=col_idx, value=header)
-        cell.font = subheader_font
-        cell.fill = subheader_fill
-        cell.border = border
-    
-    # Données des lots
-    for row_idx, lot in enumerate(lots_bateau, start=2):
-        nb_colis_bateau = lot.colis_set.filter(type_transport='bateau').count()
-        poids_lot = lot.colis_set.filter(type_transport='bateau').aggregate(total=Sum('poids'))['total'] or 0
-        
-        row_data = [
-            lot.numero_lot,
-            nb_colis_bateau,
-            float(poids_lot),
-            float(lot.prix_transport) if lot.prix_transport else 0,
-            float(lot.frais_douane) if hasattr(lot, 'frais_douane') and lot.frais_douane else 0,
-            lot.get_statut_display(),
-            lot.date_creation.strftime('%d/%m/%Y'),
-            lot.date_expedition.strftime('%d/%m/%Y') if lot.date_expedition else "Non expédié"
-        ]
-        
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws3.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = border
-            if col_idx in [2, 3, 4, 5]:  # Colonnes numériques
-                cell.font = number_font
-                if col_idx == 3:
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.number_format = '#,##0'
-                cell.alignment = Alignment(horizontal='right')
-            else:
-                cell.font = data_font
-    
-    # Ajuster les largeurs des colonnes pour toutes les feuilles
-    for ws in [ws1, ws2, ws3]:
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-    
-    # Préparation de la réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="rapport_bateau_{date_debut}_{date_fin}.xlsx"'
-    
-    wb.save(response)
-    return response
+    return _export_rapport_transport_excel(request, 'bateau', 'Bateau', '#007BFF')
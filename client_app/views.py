@@ -3,16 +3,17 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Count, Sum, Q
+from django.db.models import Sum
 from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.core.paginator import Paginator
 import json
 
 from notifications_app.models import Notification
+from reporting_app.pagination import KeysetPaginator
+from reporting_app.search import filtre
 from django.contrib.auth import get_user_model
 from .models import Client as ClientModel
 
@@ -170,9 +171,7 @@ def mes_colis_view(request):
         
         if search_query:
             colis_queryset = colis_queryset.filter(
-                Q(numero_suivi__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(lot__numero_lot__icontains=search_query)
+                pk__in=filtre('colis', search_query, client_id=chine_client.id)
             )
         
         if date_debut:
@@ -190,21 +189,12 @@ def mes_colis_view(request):
                 pass
         
         # Pagination
-        paginator = Paginator(colis_queryset, 12)  # 12 colis par page
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        # Statistiques rapides
-        total_colis = colis_queryset.count()
-        valeur_totale = colis_queryset.aggregate(
-            total=Sum('prix_calcule')
-        )['total'] or 0.0
+        paginator = KeysetPaginator(colis_queryset, 12)  # 12 colis par page
+        page_obj = paginator.get_page(request.GET.get('cursor'))
         
     except ChineClient.DoesNotExist:
         # Client pas encore créé dans le système Chine
         page_obj = None
-        total_colis = 0
-        valeur_totale = 0.0
         statut_filter = request.GET.get('statut', '')
         search_query = request.GET.get('search', '')
         date_debut = request.GET.get('date_debut', '')
@@ -224,8 +214,6 @@ def mes_colis_view(request):
     context = {
         'page_obj': page_obj,
         'colis': page_obj.object_list if page_obj else [],
-        'total_colis': total_colis,
-        'valeur_totale': float(valeur_totale),
         'statut_filter': statut_filter,
         'search_query': search_query,
         'date_debut': date_debut,
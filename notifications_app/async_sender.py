@@ -0,0 +1,231 @@
+"""
+Envoi WhatsApp concurrent des notifications groupées (lots)
+
+Au lieu d'une tâche Celery par notification, la tâche de masse envoie elle-même
+les messages d'un lot avec aiohttp :
+
+- les requêtes sont préparées en amont (mêmes règles de routage que
+  NotificationService._send_whatsapp, API V1 ou V4) ;
+- un sémaphore par instance WaChap borne les envois simultanés
+  (WACHAP_ASYNC_CONCURRENCE) et le limiteur de débit (rate_limiter) espace
+  les requêtes ;
+- chaque résultat est appliqué dès qu'il arrive puis écrit par bulk_update,
+  y compris si l'envoi est interrompu (exception, limite de temps Celery) ;
+- aucune requête n'est émise après WACHAP_ASYNC_BUDGET secondes : les
+  notifications restantes, toujours 'en_attente', sont rendues à l'appelant.
+
+Les échecs temporaires suivent le circuit habituel (statut 'echec' et
+prochaine_tentative, relancés par retry_failed_notifications_task).
+"""
+
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+import aiohttp
+from django.conf import settings
+
+from .error_classifier import classify_wachap_error
+from .models import Notification
+from .rate_limiter import get_limiter
+from .timeout_handler import timeout_handler
+
+logger = logging.getLogger(__name__)
+
+WACHAP_ASYNC_CONCURRENCE = getattr(settings, 'WACHAP_ASYNC_CONCURRENCE', 5)  # par instance WaChap
+WACHAP_ASYNC_TIMEOUT = getattr(settings, 'WACHAP_ASYNC_TIMEOUT', 20)  # secondes par requête
+WACHAP_ASYNC_CONNECT_TIMEOUT = 5
+WACHAP_ASYNC_RETRIES = 2  # connexion impossible ou 502/503/504
+# Durée maximale d'émission, bien en deçà de CELERY_TASK_SOFT_TIME_LIMIT
+WACHAP_ASYNC_BUDGET = getattr(
+    settings, 'WACHAP_ASYNC_BUDGET', getattr(settings, 'CELERY_TASK_SOFT_TIME_LIMIT', 25 * 60) // 2
+)
+STATUTS_RELANCABLES = {502, 503, 504}
+
+EnvoiWhatsApp = namedtuple('EnvoiWhatsApp', ['notification', 'requete'])
+ResultatEnvoi = namedtuple('ResultatEnvoi', ['notification', 'succes', 'message_id', 'erreur', 'type_erreur'])
+
+
+def preparer_envoi(notification):
+    """
+    Requête HTTP d'une notification WhatsApp (sans l'émettre)
+
+    Raises:
+        ValueError: Instance non configurée ou désactivée
+    """
+    from .services import NotificationService
+    from .wachap_service import wachap_service
+
+    envoi = NotificationService._preparer_whatsapp(
+        user=notification.destinataire,
+        message=notification.message,
+        categorie=notification.categorie,
+        title=notification.titre,
+    )
+    return EnvoiWhatsApp(notification, wachap_service.preparer_envoi(**envoi))
+
+
+class BudgetEpuise(Exception):
+    """
+    Plus de temps pour émettre la requête : la notification reste en attente
+    """
+
+
+async def _tenter(session, semaphore, envoi, echeance):
+    """
+    Une tentative d'envoi ; retourne (résultat, relançable)
+
+    Raises:
+        BudgetEpuise: L'échéance serait dépassée avant l'émission
+    """
+    requete = envoi.requete
+    async with semaphore:
+        if time.monotonic() >= echeance:
+            raise BudgetEpuise()
+        # Jeton réservé sans limite d'attente : l'envoi patiente au lieu d'échouer
+        _, attente, _ = await asyncio.to_thread(get_limiter(requete['fournisseur'], requete['region']).reserver)
+        if time.monotonic() + attente >= echeance:
+            raise BudgetEpuise()
+        if attente > 0:
+            await asyncio.sleep(attente)
+        try:
+            async with session.post(requete['url'], json=requete['json'], headers=requete['headers']) as response:
+                texte = await response.text()
+                try:
+                    donnees = await response.json(content_type=None) if response.status == 200 else None
+                except ValueError:
+                    donnees = None
+                succes, message, message_id = requete['analyser'](response.status, donnees, texte)
+                type_erreur = None if succes else (
+                    'app_error' if response.status == 200 else f'http_{response.status}'
+                )
+                resultat = ResultatEnvoi(envoi.notification, succes, message_id, None if succes else message, type_erreur)
+                return resultat, response.status in STATUTS_RELANCABLES
+        except asyncio.TimeoutError:
+            # Le message a pu partir : pas de relance immédiate (doublon possible)
+            return ResultatEnvoi(envoi.notification, False, None, "Timeout lors de l'envoi WhatsApp", 'timeout'), False
+        except aiohttp.ClientConnectorError as e:
+            # Connexion impossible : la requête n'a pas été émise
+            return ResultatEnvoi(
+                envoi.notification, False, None, f"Erreur réseau WhatsApp: {type(e).__name__}: {e}", 'connection_error'
+            ), True
+        except aiohttp.ClientError as e:
+            return ResultatEnvoi(
+                envoi.notification, False, None, f"Erreur réseau WhatsApp: {type(e).__name__}: {e}", 'connection_error'
+            ), False
+
+
+async def _envoyer(session, semaphores, envoi, echeance, appliquer):
+    semaphore = semaphores[envoi.requete['instance']]
+    premiere = True
+    try:
+        for tentative in range(WACHAP_ASYNC_RETRIES + 1):
+            try:
+                resultat, relancable = await _tenter(session, semaphore, envoi, echeance)
+            except BudgetEpuise:
+                if premiere:
+                    raise
+                # Relance abandonnée : l'échec de la tentative précédente est conservé
+                break
+            premiere = False
+            if resultat.succes or not relancable or tentative == WACHAP_ASYNC_RETRIES:
+                break
+            # Attente hors sémaphore : les autres envois de l'instance continuent
+            await asyncio.sleep(timeout_handler.backoff_delay(tentative, base=1, cap=10))
+    except BudgetEpuise:
+        return
+    except Exception as e:
+        # Le message a pu partir : échec enregistré, jamais renvoyé par le repli
+        logger.error(f"❌ Envoi groupé notification {envoi.notification.id}: {type(e).__name__}: {e}")
+        resultat = ResultatEnvoi(
+            envoi.notification, False, None, f"Erreur d'envoi WhatsApp: {type(e).__name__}: {e}", 'general_error'
+        )
+    appliquer(resultat)
+
+
+async def _envoyer_tous(envois, echeance, appliquer):
+    semaphores = {}
+    for envoi in envois:
+        semaphores.setdefault(envoi.requete['instance'], asyncio.Semaphore(WACHAP_ASYNC_CONCURRENCE))
+
+    timeout = aiohttp.ClientTimeout(total=WACHAP_ASYNC_TIMEOUT, connect=WACHAP_ASYNC_CONNECT_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=WACHAP_ASYNC_CONCURRENCE * max(len(semaphores), 1))
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await asyncio.gather(
+            *(_envoyer(session, semaphores, envoi, echeance, appliquer) for envoi in envois),
+            return_exceptions=True,
+        )
+
+
+def _appliquer(resultat):
+    notification = resultat.notification
+    if resultat.succes:
+        notification.appliquer_envoi(resultat.message_id)
+        return
+    classification = classify_wachap_error(
+        error_type=resultat.type_erreur or 'general_error',
+        error_message=resultat.erreur or "Échec d'envoi",
+    )
+    notification.appliquer_echec(
+        erreur=resultat.erreur or "Échec d'envoi via le service de notification",
+        erreur_type='temporaire' if classification['should_retry'] else 'permanent',
+    )
+
+
+def envoyer_notifications_groupees(notifications, budget=None):
+    """
+    Envoie en parallèle des notifications WhatsApp en attente
+
+    Les résultats obtenus sont enregistrés même si l'envoi est interrompu ;
+    les notifications sans résultat (budget épuisé, interruption) restent
+    'en_attente' et peuvent être confiées à Celery sans risque de doublon.
+
+    Args:
+        notifications: Instances Notification enregistrées (destinataire chargé) ;
+            les autres canaux et statuts sont ignorés
+        budget: Secondes d'émission au plus (WACHAP_ASYNC_BUDGET par défaut)
+
+    Returns:
+        dict: {'envoyees': n, 'echecs': n, 'restantes': n, 'duree': secondes}
+    """
+    notifications = [
+        notification for notification in notifications
+        if notification.type_notification == 'whatsapp' and notification.statut == 'en_attente'
+    ]
+
+    debut = time.monotonic()
+    echeance = debut + (WACHAP_ASYNC_BUDGET if budget is None else budget)
+    envois = []
+    resultats = []
+
+    def appliquer(resultat):
+        _appliquer(resultat)
+        resultats.append(resultat)
+
+    try:
+        for notification in notifications:
+            try:
+                envois.append(preparer_envoi(notification))
+            except ValueError as e:
+                appliquer(ResultatEnvoi(notification, False, None, str(e), 'config_error'))
+
+        if envois:
+            asyncio.run(_envoyer_tous(envois, echeance, appliquer))
+    finally:
+        if resultats:
+            Notification.objects.bulk_update(
+                [resultat.notification for resultat in resultats], Notification.CHAMPS_RESULTAT_ENVOI, batch_size=500
+            )
+
+    envoyees = sum(1 for resultat in resultats if resultat.succes)
+    restantes = len(notifications) - len(resultats)
+    duree = time.monotonic() - debut
+    logger.info(
+        f"📤 Envoi groupé WhatsApp: {envoyees}/{len(resultats)} envoyés, {restantes} non émis "
+        f"({len({envoi.requete['instance'] for envoi in envois})} instance(s), {duree:.1f}s)"
+    )
+    return {
+        'envoyees': envoyees, 'echecs': len(resultats) - envoyees, 'restantes': restantes,
+        'duree': round(duree, 2),
+    }
@@ -0,0 +1,138 @@
+"""
+Sessions HTTP partagées pour les fournisseurs de notifications
+
+Une requests.Session par (fournisseur, région) et par processus : les
+connexions TCP/TLS vers WaChap et Orange restent ouvertes (keep-alive) et
+sont réutilisées d'un envoi à l'autre, y compris entre deux tâches Celery
+exécutées par le même worker.
+
+Après un fork (workers Celery prefork, gunicorn --preload), le processus
+enfant abandonne les sessions héritées : les sockets du parent ne doivent
+pas être partagées, elles sont recréées à la première utilisation.
+
+Usage:
+    session = get_session('wachap', 'mali')
+    response = session.post(url, json=payload, timeout=http_timeout(15))
+"""
+
+import logging
+import os
+import threading
+
+import requests
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_CONNECTIONS = getattr(settings, 'NOTIFICATION_HTTP_POOL_CONNECTIONS', 4)
+HTTP_POOL_MAXSIZE = getattr(settings, 'NOTIFICATION_HTTP_POOL_MAXSIZE', 10)
+HTTP_CONNECT_TIMEOUT = getattr(settings, 'NOTIFICATION_HTTP_CONNECT_TIMEOUT', 5)
+HTTP_MAX_RETRIES = getattr(settings, 'NOTIFICATION_HTTP_MAX_RETRIES', 2)
+
+_sessions = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def _retry():
+    """
+    Politique de relance de l'adaptateur
+
+    Les erreurs de connexion (requête jamais émise) sont relancées pour toutes
+    les méthodes ; les erreurs de lecture et les 502/503/504 seulement pour les
+    GET, afin de ne jamais dupliquer un message envoyé par POST.
+    Relances immédiates (pas de backoff ni de Retry-After) : les relances
+    espacées sont replanifiées par Celery, jamais attendues dans le worker.
+    """
+    return Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=0,
+        respect_retry_after_header=False,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+
+
+def _creer_session(fournisseur):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=_retry(),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = f'ts-air-cargo/{fournisseur}'
+    return session
+
+
+def _reinitialiser_apres_fork():
+    """
+    Oublie les sessions héritées du processus parent (sans les fermer :
+    les sockets appartiennent toujours au parent)
+    """
+    global _lock, _pid
+    _sessions.clear()
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinitialiser_apres_fork)
+
+
+def get_session(fournisseur, region='default'):
+    """
+    Session HTTP poolée du processus courant pour un fournisseur/une région
+
+    Args:
+        fournisseur: 'wachap', 'wachap_v4', 'orange_sms'
+        region: 'chine', 'mali', 'system'... ('default' si sans objet)
+
+    Returns:
+        requests.Session
+    """
+    if os.getpid() != _pid:
+        # Fork sans register_at_fork (ou avant l'import du module)
+        _reinitialiser_apres_fork()
+
+    cle = (fournisseur, region)
+    session = _sessions.get(cle)
+    if session is None:
+        with _lock:
+            session = _sessions.get(cle)
+            if session is None:
+                session = _creer_session(fournisseur)
+                _sessions[cle] = session
+                logger.debug(f"Session HTTP créée pour {fournisseur}/{region} (pid {_pid})")
+    return session
+
+
+def fermer_sessions():
+    """
+    Ferme toutes les sessions du processus courant (arrêt du worker, tests)
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def http_timeout(lecture):
+    """
+    Timeout (connexion, lecture) : la connexion échoue vite, la lecture garde
+    le délai propre à chaque appel
+    """
+    return (min(HTTP_CONNECT_TIMEOUT, lecture), lecture)
+
+
+@worker_process_shutdown.connect
+def _fermer_sessions_worker(**kwargs):
+    fermer_sessions()
@@ -0,0 +1,143 @@
+"""
+Benchmark des files de notifications : latence des OTP pendant un envoi de masse
+Usage: python manage.py benchmark_notification_queues [--bulk=500] [--otp=30] [--latence=50]
+
+Simulation en mémoire (aucun message réel, aucun broker) : des workers
+Celery à prefetch 1 sont modélisés par des threads qui consomment leurs files
+dans l'ordre FIFO, en alternant entre les files souscrites. Chaque envoi occupe
+un worker pendant --latence ms (temps de réponse du fournisseur). Les files
+sont choisies par le routage réel (notifications_app.routing).
+
+Deux configurations à capacité égale :
+- file unique : tous les workers sur une seule file (ancienne route
+  notifications_app.tasks.* -> notifications) ;
+- files par priorité : --otp-workers workers dédiés à notifications_otp,
+  les autres sur notifications + notifications_bulk.
+"""
+
+import queue
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications_app.routing import (
+    FILE_MASSE, FILE_OTP, FILE_TRANSACTIONNELLE, PRIORITE_MASSE, file_pour_priorite, route_task,
+)
+
+TACHE_OTP = 'notifications_app.tasks.send_otp_async'
+
+
+def _percentile(valeurs, rang):
+    if not valeurs:
+        return 0.0
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(rang / 100 * (len(valeurs) - 1))))]
+
+
+class _Simulation:
+    def __init__(self, workers, latence):
+        # workers : liste des files souscrites par chaque worker
+        self.files = {nom: queue.Queue() for files in workers for nom in files}
+        self.workers = workers
+        self.latence = latence
+        self.latences = {'otp': [], 'masse': []}
+        self.fin_masse = None
+        self.arret = threading.Event()
+        self.verrou = threading.Lock()
+
+    def publier(self, file, genre):
+        self.files[file].put((genre, time.monotonic()))
+
+    def _worker(self, files):
+        rang = 0
+        while not self.arret.is_set():
+            message = None
+            for decalage in range(len(files)):
+                try:
+                    message = self.files[files[(rang + decalage) % len(files)]].get_nowait()
+                    rang += decalage + 1
+                    break
+                except queue.Empty:
+                    continue
+            if message is None:
+                time.sleep(0.0005)
+                continue
+            genre, publie = message
+            debut = time.monotonic()
+            time.sleep(self.latence)  # appel fournisseur
+            with self.verrou:
+                self.latences[genre].append(debut - publie)
+                if genre == 'masse':
+                    self.fin_masse = time.monotonic()
+
+    def lancer(self):
+        self.threads = [threading.Thread(target=self._worker, args=(files,), daemon=True) for files in self.workers]
+        for thread in self.threads:
+            thread.start()
+
+    def attendre(self, total):
+        while sum(len(v) for v in self.latences.values()) < total:
+            time.sleep(0.01)
+        self.arret.set()
+        for thread in self.threads:
+            thread.join()
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence p50/p95/p99 des OTP pendant un envoi de masse (file unique vs files par priorité)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', type=int, default=500, help="Messages de l'envoi de masse (défaut: 500)")
+        parser.add_argument('--otp', type=int, default=30, help="OTP émis pendant l'envoi de masse (défaut: 30)")
+        parser.add_argument('--latence', type=int, default=50, help='Temps de réponse fournisseur en ms (défaut: 50)')
+        parser.add_argument('--workers', type=int, default=4, help='Capacité totale en workers (défaut: 4)')
+        parser.add_argument('--otp-workers', type=int, default=1, help='Workers dédiés à la file OTP (défaut: 1)')
+        parser.add_argument('--intervalle', type=int, default=100, help='Intervalle entre deux OTP en ms (défaut: 100)')
+
+    def handle(self, *args, **options):
+        file_otp = route_task(TACHE_OTP, (), {}, {})['queue']
+        file_masse = file_pour_priorite(PRIORITE_MASSE, 'colis_arrive')
+        workers = options['workers']
+        otp_workers = min(options['otp_workers'], workers - 1)
+
+        configurations = [
+            ('File unique', [[FILE_TRANSACTIONNELLE]] * workers, lambda file: FILE_TRANSACTIONNELLE),
+            (
+                'Files par priorité',
+                [[FILE_OTP]] * otp_workers + [[FILE_TRANSACTIONNELLE, FILE_MASSE]] * (workers - otp_workers),
+                lambda file: file,
+            ),
+        ]
+
+        self.stdout.write("⏱️  BENCHMARK FILES DE NOTIFICATIONS (simulation)")
+        self.stdout.write("=" * 60)
+        self.stdout.write(
+            f"Envoi de masse: {options['bulk']} messages, OTP: {options['otp']} "
+            f"(1 toutes les {options['intervalle']} ms), latence fournisseur: {options['latence']} ms, "
+            f"workers: {workers}"
+        )
+        self.stdout.write()
+
+        for libelle, souscriptions, router in configurations:
+            simulation = _Simulation(souscriptions, options['latence'] / 1000)
+            simulation.lancer()
+            debut = time.monotonic()
+
+            # Fan-out publié d'un coup (group), puis OTP arrivant pendant l'envoi
+            for _ in range(options['bulk']):
+                simulation.publier(router(file_masse), 'masse')
+            for _ in range(options['otp']):
+                simulation.publier(router(file_otp), 'otp')
+                time.sleep(options['intervalle'] / 1000)
+            simulation.attendre(options['bulk'] + options['otp'])
+
+            otp = [latence * 1000 for latence in simulation.latences['otp']]
+            self.stdout.write(f"📊 {libelle} (attente en file avant envoi)")
+            self.stdout.write(
+                f"   OTP  p50: {_percentile(otp, 50):8.1f} ms   p95: {_percentile(otp, 95):8.1f} ms   "
+                f"p99: {_percentile(otp, 99):8.1f} ms   moyenne: {statistics.mean(otp) if otp else 0:8.1f} ms"
+            )
+            self.stdout.write(f"   Envoi de masse terminé en {simulation.fin_masse - debut:.2f}s")
+            self.stdout.write()
@@ -7,7 +7,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db.models import Q
 from notifications_app.models import Notification
-from notifications_app.tasks import send_individual_notification
+from notifications_app.routing import envoyer_notification_async
 import logging
 
 logger = logging.getLogger(__name__)
@@ -110,7 +110,7 @@ class Command(BaseCommand):
                 
                 if not dry_run:
                     # Lancer la tâche Celery asynchrone
-                    send_individual_notification.delay(notification.id)
+                    envoyer_notification_async(notification)
                     stats['queued'] += 1
                     
                     if verbose:
@@ -88,6 +88,15 @@ class Command(BaseCommand):
             
             self.stdout.write()
 
+        # Limiteurs de débit
+        self.stdout.write("🚦 Limiteurs de débit:")
+        for limiteur in health.get('rate_limiters', []):
+            self.stdout.write(
+                f"   {limiteur['fournisseur']}/{limiteur['region']}: "
+                f"{limiteur['jetons']:.1f}/{limiteur['burst']:.0f} jetons ({limiteur['rate']:g}/s)"
+            )
+        self.stdout.write()
+
         if options['export_json']:
             json_output = json.dumps(health, indent=2, ensure_ascii=False)
             self.stdout.write("📄 JSON Export:")
@@ -176,15 +176,27 @@ class Notification(models.Model):
             self.date_lecture = timezone.now()
             self.save(update_fields=['statut', 'date_lecture'])
     
+    # Champs modifiés par appliquer_envoi() / appliquer_echec() (bulk_update)
+    CHAMPS_RESULTAT_ENVOI = [
+        'statut', 'date_envoi', 'message_id_externe',
+        'nombre_tentatives', 'erreur_envoi', 'prochaine_tentative',
+    ]
+    
     def marquer_comme_envoye(self, message_id=None):
         """
         Marquer la notification comme envoyée
         """
+        self.appliquer_envoi(message_id)
+        self.save(update_fields=['statut', 'date_envoi', 'message_id_externe'])
+    
+    def appliquer_envoi(self, message_id=None):
+        """
+        Renseigne le succès d'envoi sans sauvegarder (voir marquer_comme_envoye)
+        """
         self.statut = 'envoye'
         self.date_envoi = timezone.now()
         if message_id:
             self.message_id_externe = message_id
-        self.save(update_fields=['statut', 'date_envoi', 'message_id_externe'])
     
     def marquer_comme_echec(self, erreur=None, erreur_type='temporaire'):
         """
@@ -194,6 +206,13 @@ class Notification(models.Model):
             erreur: Message d'erreur
             erreur_type: 'temporaire' (retry possible) ou 'permanent' (pas de retry)
         """
+        self.appliquer_echec(erreur, erreur_type)
+        self.save(update_fields=['statut', 'nombre_tentatives', 'erreur_envoi', 'prochaine_tentative'])
+    
+    def appliquer_echec(self, erreur=None, erreur_type='temporaire'):
+        """
+        Renseigne l'échec d'envoi sans sauvegarder (voir marquer_comme_echec)
+        """
         self.nombre_tentatives += 1
         
         if erreur_type == 'permanent':
@@ -209,8 +228,6 @@ class Notification(models.Model):
         
         if erreur:
             self.erreur_envoi = erreur
-        
-        self.save(update_fields=['statut', 'nombre_tentatives', 'erreur_envoi', 'prochaine_tentative'])
     
     def annuler(self, raison=None):
         """
@@ -537,15 +554,23 @@ class NotificationTask(models.Model):
         self.started_at = timezone.now()
         self.save(update_fields=['task_status', 'started_at'])
     
-    def mark_as_completed(self, success=True, result_data=None, error_message=None):
-        """Marquer la tâche comme terminée"""
+    def mark_as_completed(self, success=True, result_data=None, error_message=None,
+                          sent_count=None, failed_count=None):
+        """Marquer la tâche comme terminée (statistiques incluses, une seule écriture)"""
         self.task_status = 'SUCCESS' if success else 'FAILURE'
         self.completed_at = timezone.now()
+        update_fields = ['task_status', 'completed_at', 'result_data', 'error_message']
         if result_data:
             self.result_data = result_data
         if error_message:
             self.error_message = error_message
-        self.save(update_fields=['task_status', 'completed_at', 'result_data', 'error_message'])
+        if sent_count is not None:
+            self.notifications_sent = sent_count
+            update_fields.append('notifications_sent')
+        if failed_count is not None:
+            self.notifications_failed = failed_count
+            update_fields.append('notifications_failed')
+        self.save(update_fields=update_fields)
     
     def update_progress(self, sent_count=None, failed_count=None):
         """Mettre à jour les statistiques de progression"""
@@ -5,6 +5,8 @@ Surveillance des envois, métriques, alertes et rapports
 
 import json
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from django.core.cache import cache
@@ -14,8 +16,14 @@ from django.utils import timezone
 from dataclasses import dataclass
 from collections import defaultdict
 
+from .redis_client import get_redis
+
 logger = logging.getLogger(__name__)
 
+METRICS_KEY = 'wachap_metrics:{instance}'  # hash des compteurs
+RESPONSE_TIMES_KEY = 'wachap_metrics:{instance}:temps'  # sorted set (score = horodatage)
+MAX_RESPONSE_TIMES = 1000
+
 
 @dataclass
 class WaChapMetrics:
@@ -134,7 +142,40 @@ class WaChapMonitor:
     
     def _update_metrics(self, instance: str, success: bool, error_type: str = None, 
                        response_time: float = None) -> None:
-        """Met à jour les métriques en cache"""
+        """
+        Met à jour les métriques : incréments atomiques Redis (hash des compteurs,
+        sorted set des temps de réponse sur une fenêtre glissante), sans relire
+        ni réécrire l'état complet
+        """
+        client = get_redis()
+        if client is None:
+            self._update_metrics_cache(instance, success, error_type, response_time)
+            return
+        
+        metrics_key = METRICS_KEY.format(instance=instance)
+        times_key = RESPONSE_TIMES_KEY.format(instance=instance)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hincrby(metrics_key, 'total_count', 1)
+            pipe.hincrby(metrics_key, 'success_count' if success else 'error_count', 1)
+            if not success and error_type:
+                pipe.hincrby(metrics_key, f'error_type:{error_type}', 1)
+            pipe.expire(metrics_key, self.cache_timeout)
+            
+            if response_time:
+                now = time.time()
+                pipe.zadd(times_key, {f"{response_time}:{uuid.uuid4().hex[:12]}": now})
+                pipe.zremrangebyscore(times_key, '-inf', now - self.cache_timeout)
+                # Garder seulement les 1000 derniers temps
+                pipe.zremrangebyrank(times_key, 0, -MAX_RESPONSE_TIMES - 1)
+                pipe.expire(times_key, self.cache_timeout)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Métriques WaChap non enregistrées ({instance}): {e}")
+    
+    def _update_metrics_cache(self, instance: str, success: bool, error_type: str = None,
+                              response_time: float = None) -> None:
+        """Repli sans Redis (un seul processus) : dictionnaire en cache"""
         cache_key = f"wachap_metrics_{instance}"
         metrics_data = cache.get(cache_key, {
             'success_count': 0,
@@ -156,12 +197,37 @@ class WaChapMonitor:
         # Ajouter temps de réponse
         if response_time:
             metrics_data['response_times'].append(response_time)
-            # Garder seulement les 1000 derniers temps pour éviter la mémoire excessive
-            if len(metrics_data['response_times']) > 1000:
-                metrics_data['response_times'] = metrics_data['response_times'][-1000:]
+            if len(metrics_data['response_times']) > MAX_RESPONSE_TIMES:
+                metrics_data['response_times'] = metrics_data['response_times'][-MAX_RESPONSE_TIMES:]
         
         cache.set(cache_key, metrics_data, timeout=self.cache_timeout)
     
+    def _read_metrics(self, instance: str) -> Dict[str, Any]:
+        """Compteurs, types d'erreurs et temps de réponse d'une instance"""
+        client = get_redis()
+        if client is None:
+            return cache.get(f"wachap_metrics_{instance}", {})
+        
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hgetall(METRICS_KEY.format(instance=instance))
+            pipe.zrange(RESPONSE_TIMES_KEY.format(instance=instance), 0, -1)
+            counters, times = pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Métriques WaChap illisibles ({instance}): {e}")
+            return {}
+        
+        return {
+            'success_count': int(counters.get('success_count', 0)),
+            'error_count': int(counters.get('error_count', 0)),
+            'total_count': int(counters.get('total_count', 0)),
+            'error_types': {
+                field.split(':', 1)[1]: int(value)
+                for field, value in counters.items() if field.startswith('error_type:')
+            },
+            'response_times': [float(member.split(':', 1)[0]) for member in times],
+        }
+    
     def get_metrics(self, instance: str = None) -> Dict[str, WaChapMetrics]:
         """Récupère les métriques actuelles"""
         if instance:
@@ -171,8 +237,7 @@ class WaChapMonitor:
         
         metrics = {}
         for inst in instances:
-            cache_key = f"wachap_metrics_{inst}"
-            data = cache.get(cache_key, {})
+            data = self._read_metrics(inst)
             
             metrics[inst] = WaChapMetrics(
                 instance=inst,
@@ -227,6 +292,10 @@ class WaChapMonitor:
             elif instance_health == 'degraded' and health['overall_status'] != 'unhealthy':
                 health['overall_status'] = 'degraded'
         
+        # Remplissage des limiteurs de débit (seau vide = envois en attente)
+        from .rate_limiter import etat_limiteurs
+        health['rate_limiters'] = etat_limiteurs()
+        
         return health
     
     def reset_metrics(self, instance: str = None) -> None:
@@ -236,8 +305,11 @@ class WaChapMonitor:
         else:
             instances = ['chine', 'mali']
         
+        client = get_redis()
         for inst in instances:
             cache.delete(f"wachap_metrics_{inst}")
+            if client is not None:
+                client.delete(METRICS_KEY.format(instance=inst), RESPONSE_TIMES_KEY.format(instance=inst))
         
         logger.info(f"📊 Métriques réinitialisées pour: {', '.join(instances)}")
     
@@ -11,6 +11,9 @@ from django.core.cache import cache
 from django.utils import timezone
 import base64
 
+from .http_sessions import get_session, http_timeout
+from .rate_limiter import DebitLimite, attendre_jeton
+
 logger = logging.getLogger(__name__)
 
 
@@ -81,11 +84,11 @@ class OrangeSMSService:
             }
             
             logger.debug(f"Demande de token OAuth2 à Orange API (sandbox={self.use_sandbox})")
-            response = requests.post(
+            response = get_session('orange_sms').post(
                 self.auth_url,
                 headers=headers,
                 data=data,
-                timeout=10
+                timeout=http_timeout(10)
             )
             
             if response.status_code == 200:
@@ -174,11 +177,13 @@ class OrangeSMSService:
             logger.info(f"Envoi SMS Orange vers {formatted_phone}")
             logger.debug(f"URL: {sms_url}")
             
-            response = requests.post(
+            attendre_jeton('orange_sms')
+
+            response = get_session('orange_sms').post(
                 sms_url,
                 headers=headers,
                 json=payload,
-                timeout=15
+                timeout=http_timeout(15)
             )
             
             if response.status_code in [200, 201]:
@@ -208,6 +213,8 @@ class OrangeSMSService:
             error_msg = "Timeout lors de l'envoi SMS Orange"
             logger.error(error_msg)
             return False, error_msg, None
+        except DebitLimite:
+            raise
         except Exception as e:
             error_msg = f"Exception lors de l'envoi SMS Orange: {str(e)}"
             logger.error(error_msg)
@@ -280,7 +287,7 @@ class OrangeSMSService:
                 'Authorization': f'Bearer {access_token}'
             }
             
-            response = requests.get(balance_url, headers=headers, timeout=10)
+            response = get_session('orange_sms').get(balance_url, headers=headers, timeout=http_timeout(10))
             
             if response.status_code == 200:
                 return response.json()
@@ -0,0 +1,235 @@
+"""
+Limiteur de débit (token bucket) des fournisseurs de notifications
+
+Un seau par (fournisseur, région) : 'rate' jetons par seconde, au plus
+'burst' jetons accumulés. Chaque requête HTTP sortante vers WaChap ou Orange
+consomme un jeton ; sans jeton disponible, l'appelant attend au lieu de
+déclencher la limitation du fournisseur (puis le circuit breaker).
+
+- Avec Redis (voir redis_client), l'état
+  est partagé par tous les workers ; la mise à jour est atomique (script Lua)
+  et utilise l'horloge du serveur Redis.
+- Sans Redis (développement, tests), chaque processus a son propre seau.
+
+Les envois prioritaires (OTP, création de compte : routing.TYPES_PRIORITAIRES)
+consomment le seau de la région REGION_PRIORITAIRE : un envoi de masse ne
+peut pas le vider ni les faire attendre.
+
+Le jeton est réservé : le solde peut devenir négatif, l'appelant dort
+simplement le temps indiqué, au plus NOTIFICATION_RATE_LIMIT_MAX_WAIT
+secondes (1 par défaut) pour ne bloquer ni un worker ni une requête web.
+Au-delà, rien n'est réservé et DebitLimite est levée : la tâche Celery se
+replanifie (send_individual_notification), un envoi synchrone passe en
+échec temporaire (NotificationService.send_notification).
+
+Configuration (settings.NOTIFICATION_RATE_LIMITS) :
+    {
+        'wachap': {'rate': 2, 'burst': 10},          # toutes régions
+        'wachap:mali': {'rate': 1, 'burst': 5},      # surcharge régionale
+        'wachap:otp': {'rate': 1, 'burst': 5},       # seau prioritaire
+        'orange_sms': {'rate': 5, 'burst': 10},
+    }
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+LIMITES_PAR_DEFAUT = {
+    'wachap': {'rate': 2, 'burst': 10},
+    'wachap_v4': {'rate': 2, 'burst': 10},
+    'wachap:otp': {'rate': 1, 'burst': 5},
+    'wachap_v4:otp': {'rate': 1, 'burst': 5},
+    'orange_sms': {'rate': 5, 'burst': 10},
+}
+REGION_PRIORITAIRE = 'otp'
+RATE_LIMIT_MAX_WAIT = getattr(settings, 'NOTIFICATION_RATE_LIMIT_MAX_WAIT', 1)
+RATE_LIMIT_KEY = 'notif_rate_limit:{fournisseur}:{region}'
+
+# KEYS[1] = seau ; ARGV = rate, burst, jetons demandés, attente max (-1 : illimitée)
+# Retourne {accordé (0/1), attente en secondes, jetons restants}
+_SCRIPT_RESERVATION = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local demandes = tonumber(ARGV[3])
+local attente_max = tonumber(ARGV[4])
+local horloge = redis.call('TIME')
+local maintenant = tonumber(horloge[1]) + tonumber(horloge[2]) / 1000000
+
+local etat = redis.call('HMGET', KEYS[1], 'jetons', 'maj')
+local jetons = tonumber(etat[1]) or burst
+local maj = tonumber(etat[2]) or maintenant
+jetons = math.min(burst, jetons + math.max(0, maintenant - maj) * rate)
+
+local attente = 0
+if jetons < demandes then
+    attente = (demandes - jetons) / rate
+end
+local accorde = 1
+if attente_max >= 0 and attente > attente_max then
+    accorde = 0
+else
+    jetons = jetons - demandes
+end
+
+redis.call('HSET', KEYS[1], 'jetons', tostring(jetons), 'maj', tostring(maintenant))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return {accorde, tostring(attente), tostring(jetons)}
+"""
+
+
+class DebitLimite(Exception):
+    """
+    Aucun jeton disponible dans le délai d'attente autorisé
+    """
+
+    def __init__(self, fournisseur, region, retry_after):
+        self.fournisseur = fournisseur
+        self.region = region
+        self.retry_after = retry_after
+        super().__init__(f"Débit {fournisseur}/{region} limité, nouvel essai dans {retry_after:.1f}s")
+
+
+def limites(fournisseur, region):
+    """
+    (rate, burst) configurés pour un fournisseur/une région
+    """
+    configuration = {**LIMITES_PAR_DEFAUT, **getattr(settings, 'NOTIFICATION_RATE_LIMITS', {})}
+    limite = configuration.get(f'{fournisseur}:{region}') or configuration.get(fournisseur) or {}
+    rate = float(limite.get('rate', 1))
+    return rate, float(limite.get('burst', max(rate, 1)))
+
+
+class TokenBucket:
+    """
+    Seau de jetons d'un fournisseur/d'une région
+    """
+
+    def __init__(self, fournisseur, region='default'):
+        self.fournisseur = fournisseur
+        self.region = region
+        self.cle = RATE_LIMIT_KEY.format(fournisseur=fournisseur, region=region)
+        self._verrou = threading.Lock()
+        self._jetons = None
+        self._maj = None
+
+    @property
+    def rate(self):
+        return limites(self.fournisseur, self.region)[0]
+
+    @property
+    def burst(self):
+        return limites(self.fournisseur, self.region)[1]
+
+    def _reserver_local(self, demandes, attente_max):
+        rate, burst = limites(self.fournisseur, self.region)
+        with self._verrou:
+            maintenant = time.monotonic()
+            jetons = burst if self._jetons is None else self._jetons
+            jetons = min(burst, jetons + max(0.0, maintenant - (self._maj or maintenant)) * rate)
+            attente = max(0.0, (demandes - jetons) / rate)
+            accorde = attente_max < 0 or attente <= attente_max
+            if accorde:
+                jetons -= demandes
+            self._jetons, self._maj = jetons, maintenant
+            return accorde, attente, jetons
+
+    def reserver(self, demandes=1, attente_max=None):
+        """
+        Réserve des jetons sans attendre
+
+        Args:
+            demandes: Nombre de jetons
+            attente_max: Refuser si l'attente dépasserait ce délai (None : jamais)
+
+        Returns:
+            tuple: (accordé, secondes à attendre avant l'envoi, jetons restants)
+        """
+        attente_max = -1 if attente_max is None else attente_max
+        client = get_redis()
+        if client is not None:
+            rate, burst = limites(self.fournisseur, self.region)
+            try:
+                accorde, attente, jetons = client.eval(
+                    _SCRIPT_RESERVATION, 1, self.cle, rate, burst, demandes, attente_max
+                )
+                return bool(int(accorde)), float(attente), float(jetons)
+            except Exception as e:
+                # Redis indisponible : ne pas bloquer les envois, limiter par processus
+                logger.warning(f"⚠️ Limiteur Redis indisponible ({self.cle}): {e}")
+        return self._reserver_local(demandes, attente_max)
+
+    def attendre(self, demandes=1, attente_max=RATE_LIMIT_MAX_WAIT):
+        """
+        Bloque jusqu'à disposer des jetons
+
+        Raises:
+            DebitLimite: L'attente dépasserait attente_max (rien n'est réservé)
+        """
+        accorde, attente, _ = self.reserver(demandes, attente_max)
+        if not accorde:
+            raise DebitLimite(self.fournisseur, self.region, attente)
+        if attente > 0:
+            logger.debug(f"⏳ Débit {self.fournisseur}/{self.region}: attente {attente:.2f}s")
+            time.sleep(attente)
+
+    def niveau(self):
+        """
+        Remplissage actuel du seau (sans consommer de jeton)
+
+        Returns:
+            dict: {'fournisseur', 'region', 'jetons', 'burst', 'rate', 'remplissage'}
+        """
+        _, _, jetons = self.reserver(demandes=0)
+        burst = self.burst
+        return {
+            'fournisseur': self.fournisseur,
+            'region': self.region,
+            'jetons': round(jetons, 2),
+            'burst': burst,
+            'rate': self.rate,
+            'remplissage': round(max(jetons, 0) / burst, 3) if burst else 0,
+        }
+
+
+_seaux = {}
+_seaux_verrou = threading.Lock()
+
+
+def get_limiter(fournisseur, region='default'):
+    """
+    Seau de jetons partagé du processus pour un fournisseur/une région
+    """
+    cle = (fournisseur, region or 'default')
+    seau = _seaux.get(cle)
+    if seau is None:
+        with _seaux_verrou:
+            seau = _seaux.setdefault(cle, TokenBucket(*cle))
+    return seau
+
+
+def attendre_jeton(fournisseur, region='default', prioritaire=False):
+    """
+    Raccourci utilisé par les services avant chaque requête sortante
+
+    Args:
+        prioritaire: Envoi prioritaire (OTP) : seau REGION_PRIORITAIRE
+    """
+    get_limiter(fournisseur, REGION_PRIORITAIRE if prioritaire else region).attendre()
+
+
+def etat_limiteurs(regions=('chine', 'mali', 'system', REGION_PRIORITAIRE)):
+    """
+    Niveau de remplissage de tous les seaux (monitoring)
+    """
+    seaux = [('wachap', region) for region in regions]
+    seaux += [('wachap_v4', region) for region in regions]
+    seaux.append(('orange_sms', 'default'))
+    return [get_limiter(fournisseur, region).niveau() for fournisseur, region in seaux]
@@ -0,0 +1,31 @@
+"""
+Client Redis partagé des notifications (limiteur de débit, métriques)
+
+URL : NOTIFICATION_REDIS_URL, sinon CACHE_REDIS_URL. Sans Redis configuré
+(développement, tests), get_redis() retourne None et chaque appelant garde
+son repli local.
+"""
+
+from django.conf import settings
+
+_redis = None
+
+
+def get_redis():
+    """
+    Client redis-py du processus (None sans Redis configuré) ; le pool de
+    connexions se recrée de lui-même après un fork
+    """
+    global _redis
+    url = (
+        getattr(settings, 'NOTIFICATION_REDIS_URL', '')
+        or getattr(settings, 'NOTIFICATION_RATE_LIMIT_REDIS_URL', '')
+        or getattr(settings, 'CACHE_REDIS_URL', '')
+    )
+    if not url:
+        return None
+    if _redis is None:
+        import redis
+
+        _redis = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2, decode_responses=True)
+    return _redis
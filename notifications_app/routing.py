@@ -0,0 +1,81 @@
+"""
+Files Celery des notifications par priorité
+
+Trois voies, chacune consommée par ses propres workers :
+
+- notifications_otp : OTP, création de compte, réinitialisation de mot de
+  passe. Voie courte, jamais bloquée derrière un envoi de masse.
+- notifications : messages transactionnels (colis créé, modifié, livré...).
+- notifications_bulk : envois de masse (lots), relances et maintenance.
+
+La voie d'un envoi dépend de la catégorie / du type de message, puis de la
+priorité enregistrée (Notification.priorite, WhatsAppMessageAttempt.priority :
+1 = haute ... 5 = basse).
+
+Workers (exemple) :
+    celery -A ts_air_cargo worker -Q notifications_otp -c 2 -n otp@%h
+    celery -A ts_air_cargo worker -Q notifications,notifications_bulk -c 4 -n notifications@%h
+"""
+
+FILE_OTP = 'notifications_otp'
+FILE_TRANSACTIONNELLE = 'notifications'
+FILE_MASSE = 'notifications_bulk'
+
+# Catégories (Notification.categorie) et types de message (WaChap) de la voie OTP
+CATEGORIES_PRIORITAIRES = {'otp', 'creation_compte', 'reinitialisation_mot_de_passe'}
+TYPES_PRIORITAIRES = {'otp', 'account'}
+
+# Priorité à partir de laquelle un envoi part dans la voie de masse
+PRIORITE_MASSE = 4
+PRIORITE_PRIORITAIRE = 1
+
+# Tâches dont la file ne dépend pas des données
+ROUTES_TACHES = {
+    'notifications_app.tasks.send_otp_async': FILE_OTP,
+    'notifications_app.tasks.send_bulk_lot_notifications': FILE_MASSE,
+    'notifications_app.tasks.send_bulk_received_colis_notifications': FILE_MASSE,
+    'notifications_app.tasks.retry_failed_notifications_task': FILE_MASSE,
+    'notifications_app.tasks.process_pending_notifications': FILE_MASSE,
+    'notifications_app.tasks.cleanup_old_notifications': FILE_MASSE,
+    'whatsapp_monitoring_app.tasks.send_bulk_whatsapp_notifications': FILE_MASSE,
+    'whatsapp_monitoring_app.tasks.process_whatsapp_retries_task': FILE_MASSE,
+}
+
+
+def file_pour_priorite(priorite, categorie=None):
+    """
+    File d'un envoi selon sa catégorie (ou type de message) et sa priorité
+    """
+    if categorie in CATEGORIES_PRIORITAIRES or categorie in TYPES_PRIORITAIRES:
+        return FILE_OTP
+    if priorite is not None and priorite >= PRIORITE_MASSE:
+        return FILE_MASSE
+    return FILE_TRANSACTIONNELLE
+
+
+def file_notification(notification):
+    """
+    File d'envoi d'une Notification
+    """
+    return file_pour_priorite(notification.priorite, notification.categorie)
+
+
+def envoyer_notification_async(notification):
+    """
+    Met en file send_individual_notification dans la voie de la notification
+    """
+    from .tasks import send_individual_notification
+
+    return send_individual_notification.apply_async((notification.id,), queue=file_notification(notification))
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Routeur Celery (CELERY_TASK_ROUTES) : une file passée à apply_async
+    reste prioritaire sur cette route
+    """
+    if name in ROUTES_TACHES:
+        return {'queue': ROUTES_TACHES[name]}
+    if name.startswith(('notifications_app.tasks.', 'whatsapp_monitoring_app.tasks.')):
+        return {'queue': FILE_TRANSACTIONNELLE}
+    return None
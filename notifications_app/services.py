@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
 from .models import Notification
+from .rate_limiter import DebitLimite
 from .wachap_service import wachap_service
 
 logger = logging.getLogger(__name__)
@@ -89,73 +90,94 @@ class NotificationService:
             
             return success
             
+        except DebitLimite as e:
+            # Pas d'attente dans la requête : reprise par retry_failed_notifications_task
+            notification.marquer_comme_echec(str(e), erreur_type='temporaire')
+            logger.warning(f"⏳ Notification {notification.id} reportée: {e}")
+            return False
         except Exception as e:
             logger.error(f"Erreur envoi notification à {user.telephone}: {str(e)}")
             return False
     
     @staticmethod
-    def _send_whatsapp(user, message, categorie=None, title=None, sender_role=None):
+    def _preparer_whatsapp(user, message, categorie=None, title=None, sender_role=None):
         """
-        Envoie un message WhatsApp via WaChap
+        Destinataire, message et routage d'un envoi WhatsApp
+        (redirection de développement, type de message, instance forcée)
+        
+        Returns:
+            dict: Arguments de wachap_service.send_message_with_type
         """
-        try:
-            # Déterminer le numéro de destination
-            dev_mode = getattr(settings, 'DEBUG', False)
-            admin_phone = getattr(settings, 'ADMIN_PHONE', '').strip()
-            test_phone = admin_phone if (dev_mode and admin_phone) else None
-            destination_phone = test_phone or user.telephone
-            
-            logger.debug(
-                "WA DEBUG _send_whatsapp: original=%s destination=%s dev=%s admin_phone_set=%s categorie=%s title=%s sender_role=%s",
-                user.telephone, destination_phone, dev_mode, bool(admin_phone), categorie, title, sender_role
-            )
+        # Déterminer le numéro de destination
+        dev_mode = getattr(settings, 'DEBUG', False)
+        admin_phone = getattr(settings, 'ADMIN_PHONE', '').strip()
+        test_phone = admin_phone if (dev_mode and admin_phone) else None
+        destination_phone = test_phone or user.telephone
+        
+        logger.debug(
+            "WA DEBUG _preparer_whatsapp: original=%s destination=%s dev=%s admin_phone_set=%s categorie=%s title=%s sender_role=%s",
+            user.telephone, destination_phone, dev_mode, bool(admin_phone), categorie, title, sender_role
+        )
 
-            # Déterminer le type de message
-            message_type = 'notification'
-            if categorie in ['creation_compte', 'reinitialisation_mot_de_passe', 'otp', 'system', 'information_systeme']:
-                if categorie in ['creation_compte', 'reinitialisation_mot_de_passe']:
-                    message_type = 'account'
-                elif categorie == 'otp':
-                    message_type = 'otp'
-                else:
-                    message_type = 'system'
-            elif title and ('OTP' in title or 'Compte' in title or 'Système' in title or 'Réinitialisation' in title or 'mot de passe' in title):
-                if 'OTP' in title: message_type = 'otp'
-                elif 'Compte' in title or 'Réinitialisation' in title or 'mot de passe' in title: message_type = 'account'
-                elif 'Système' in title: message_type = 'system'
+        # Déterminer le type de message
+        message_type = 'notification'
+        if categorie in ['creation_compte', 'reinitialisation_mot_de_passe', 'otp', 'system', 'information_systeme']:
+            if categorie in ['creation_compte', 'reinitialisation_mot_de_passe']:
+                message_type = 'account'
+            elif categorie == 'otp':
+                message_type = 'otp'
+            else:
+                message_type = 'system'
+        elif title and ('OTP' in title or 'Compte' in title or 'Système' in title or 'Réinitialisation' in title or 'mot de passe' in title):
+            if 'OTP' in title: message_type = 'otp'
+            elif 'Compte' in title or 'Réinitialisation' in title or 'mot de passe' in title: message_type = 'account'
+            elif 'Système' in title: message_type = 'system'
 
-            # Déterminer le rôle de l'expéditeur, en donnant la priorité à celui qui est passé en paramètre
-            final_sender_role = sender_role
-            if not final_sender_role:
-                final_sender_role = 'system' if message_type in ['otp', 'account', 'system'] else getattr(user, 'role', None)
+        # Déterminer le rôle de l'expéditeur, en donnant la priorité à celui qui est passé en paramètre
+        final_sender_role = sender_role
+        if not final_sender_role:
+            final_sender_role = 'system' if message_type in ['otp', 'account', 'system'] else getattr(user, 'role', None)
 
-            # Forcer l'instance selon la catégorie métier (priorité produit)
-            region_override = None
-            if categorie in {'colis_cree', 'lot_expedie', 'colis_en_transit'}:
-                region_override = 'chine'
-            elif categorie in {'colis_arrive', 'colis_livre'}:
-                region_override = 'mali'
-            
-            # Enrichir le message en mode développement pour identification
-            if test_phone and test_phone != user.telephone:
-                enriched_message = f"""[DEV] Message pour: {user.get_full_name()}
+        # Forcer l'instance selon la catégorie métier (priorité produit)
+        region_override = None
+        if categorie in {'colis_cree', 'lot_expedie', 'colis_en_transit'}:
+            region_override = 'chine'
+        elif categorie in {'colis_arrive', 'colis_livre'}:
+            region_override = 'mali'
+        
+        # Enrichir le message en mode développement pour identification
+        if test_phone and test_phone != user.telephone:
+            enriched_message = f"""[DEV] Message pour: {user.get_full_name()}
 Tél réel: {user.telephone}
 
 ---
 {message}
 ---
 TS Air Cargo - Mode Développement"""
-            else:
-                enriched_message = message
+        else:
+            enriched_message = message
+
+        return {
+            'phone': destination_phone,
+            'message': enriched_message,
+            'message_type': message_type,
+            'sender_role': final_sender_role,
+            'region': region_override,
+        }
+    
+    @staticmethod
+    def _send_whatsapp(user, message, categorie=None, title=None, sender_role=None):
+        """
+        Envoie un message WhatsApp via WaChap
+        """
+        try:
+            envoi = NotificationService._preparer_whatsapp(user, message, categorie, title, sender_role)
+            destination_phone = envoi['phone']
+            message_type = envoi['message_type']
+            final_sender_role = envoi['sender_role']
             
             # Envoyer via WaChap
-            success, result_message, message_id = wachap_service.send_message_with_type(
-                phone=destination_phone,
-                message=enriched_message,
-                message_type=message_type,
-                sender_role=final_sender_role,
-                region=region_override
-            )
+            success, result_message, message_id = wachap_service.send_message_with_type(**envoi)
             
             if success:
                 logger.info(
@@ -170,6 +192,8 @@ TS Air Cargo - Mode Développement"""
                 )
                 return False, None
                 
+        except DebitLimite:
+            raise
         except Exception as e:
             logger.error(f"Erreur WhatsApp WaChap pour {user.telephone}: {str(e)}")
             return False, None
@@ -197,6 +221,8 @@ TS Air Cargo - Mode Développement"""
             
             return success, message_id
             
+        except DebitLimite:
+            raise
         except Exception as e:
             logger.error(f"Erreur envoi SMS à {user.telephone}: {str(e)}")
             return False, str(e)
@@ -7,6 +7,8 @@ import logging
 from django.conf import settings
 from typing import Tuple, Optional
 
+from .rate_limiter import DebitLimite
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,6 +47,8 @@ class SMSService:
                 logger.error(f"Provider SMS inconnu: {provider}")
                 return False, f"Provider inconnu: {provider}"
                 
+        except DebitLimite:
+            raise
         except Exception as e:
             logger.error(f"Erreur envoi SMS vers {phone_number}: {str(e)}")
             return False, str(e)
@@ -153,6 +157,8 @@ class SMSService:
         except ImportError as e:
             logger.error(f"Module orange_sms_service non disponible: {str(e)}")
             return False, "Service Orange SMS non disponible"
+        except DebitLimite:
+            raise
         except Exception as e:
             logger.error(f"Erreur SMS Orange pour {phone_number}: {str(e)}")
             return False, str(e)
@@ -4,7 +4,8 @@ Version unifiée pour toutes les apps (agent_chine, agent_mali, admin, client)
 """
 
 import logging
-from celery import shared_task
+import math
+from celery import group, shared_task
 from django.utils import timezone
 from django.conf import settings
 from django.db import transaction
@@ -13,9 +14,59 @@ from .services import NotificationService
 from .utils import format_cfa
 from .error_classifier import classify_wachap_error
 from .alert_system import check_notification_health
+from .rate_limiter import DebitLimite
+from .timeout_handler import timeout_handler
+from .routing import PRIORITE_MASSE, envoyer_notification_async, file_notification
 
 logger = logging.getLogger(__name__)
 
+NOTIFICATION_BULK_DISPATCH = getattr(settings, 'NOTIFICATION_BULK_DISPATCH', 'async')
+NOTIFICATION_BULK_BATCH = 500  # lignes par INSERT/UPDATE groupé
+NOTIFICATION_MAX_REPLANIFICATIONS = getattr(settings, 'NOTIFICATION_MAX_REPLANIFICATIONS', 20)
+
+
+def _dispatcher_notifications(notifications):
+    """
+    Envoie les notifications créées par une tâche de masse
+
+    - 'async' : envoi concurrent depuis la tâche (aiohttp, voir async_sender) ;
+      les notifications restées sans résultat passent ensuite par 'celery'
+    - 'celery' : un group de tâches send_individual_notification publié en une fois
+      (file de masse, voir routing)
+
+    Args:
+        notifications: Instances Notification enregistrées (destinataire chargé)
+
+    Returns:
+        tuple: (envoyées ou mises en file, échecs, mode utilisé)
+    """
+    envoyees, echecs, mode = 0, 0, 'celery'
+    if NOTIFICATION_BULK_DISPATCH == 'async' and notifications:
+        from .async_sender import envoyer_notifications_groupees
+
+        mode = 'async'
+        try:
+            envoyer_notifications_groupees(notifications)
+        except Exception as e:
+            logger.error(f"❌ Envoi groupé interrompu, repli sur les tâches individuelles: {e}", exc_info=True)
+        # Résultats déjà enregistrés, y compris en cas d'interruption
+        envoyees = sum(1 for notification in notifications if notification.statut == 'envoye')
+        echecs = sum(1 for notification in notifications if notification.statut in ('echec', 'echec_permanent'))
+        # Seules les notifications sans résultat (toujours 'en_attente') passent par Celery
+        notifications = [notification for notification in notifications if notification.statut == 'en_attente']
+
+    if not notifications:
+        return envoyees, echecs, mode
+    try:
+        group(
+            send_individual_notification.s(notification.id).set(queue=file_notification(notification))
+            for notification in notifications
+        ).apply_async()
+        return envoyees + len(notifications), echecs, mode
+    except Exception as e:
+        logger.error(f"Erreur lors du lancement des tâches pour {len(notifications)} notifications: {e}")
+        return envoyees, echecs + len(notifications), mode
+
 
 @shared_task(bind=True)
 def retry_failed_notifications_task():
@@ -50,7 +101,7 @@ def retry_failed_notifications_task():
         for notification in notifications_to_retry:
             try:
                 # Lancer la tâche d'envoi individuelle
-                send_individual_notification.delay(notification.id)
+                envoyer_notification_async(notification)
                 stats['queued'] += 1
             except Exception as e:
                 stats['errors'] += 1
@@ -91,13 +142,51 @@ def check_notification_health_task():
         return {'success': False, 'error': error_msg}
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
-def send_individual_notification(self, notification_id):
+def _replanifier_notification(task, notification_id, replanifications, erreur):
+    """
+    Fournisseur saturé (DebitLimite) : l'envoi repart dans une nouvelle tâche
+    différée, avec le même nombre de tentatives d'envoi (self.request.retries)
+    et son propre compteur de replanifications
+
+    Sans file (mode eager) ou après NOTIFICATION_MAX_REPLANIFICATIONS, la
+    notification passe en échec temporaire, reprise par
+    retry_failed_notifications_task.
+    """
+    notification = Notification.objects.filter(pk=notification_id).first()
+    if notification is None:
+        return {'success': False, 'notification_id': notification_id, 'error': 'Notification introuvable'}
+
+    if task.request.is_eager or replanifications >= NOTIFICATION_MAX_REPLANIFICATIONS:
+        logger.warning(f"⏳ Notification {notification_id} reportée (échec temporaire): {erreur}")
+        notification.marquer_comme_echec(str(erreur), erreur_type='temporaire')
+        return {
+            'success': False,
+            'notification_id': notification_id,
+            'error': str(erreur),
+            'error_type': 'temporaire',
+        }
+
+    logger.info(f"⏳ Notification {notification_id} replanifiée: {erreur}")
+    send_individual_notification.apply_async(
+        (notification_id,),
+        {'replanifications': replanifications + 1},
+        countdown=math.ceil(erreur.retry_after),
+        queue=file_notification(notification),
+        retries=task.request.retries,
+    )
+    return {'success': False, 'notification_id': notification_id, 'rescheduled': True}
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+             retry_backoff=60, retry_backoff_max=900, retry_jitter=True)
+def send_individual_notification(self, notification_id, replanifications=0):
     """
     Tâche Celery pour envoyer une notification individuelle de façon asynchrone
     
     Args:
         notification_id (int): ID de la notification à envoyer
+        replanifications (int): Replanifications dues au limiteur de débit
+            (distinctes des tentatives d'envoi, voir _replanifier_notification)
         
     Returns:
         dict: Résultat de l'envoi avec succès/échec et détails
@@ -173,6 +262,8 @@ def send_individual_notification(self, notification_id):
                 'recipient': notification.destinataire.telephone
             }
             
+    except DebitLimite as e:
+        return _replanifier_notification(self, notification_id, replanifications, e)
     except Notification.DoesNotExist:
         error_msg = f"Notification {notification_id} introuvable"
         logger.error(error_msg)
@@ -195,7 +286,8 @@ def send_individual_notification(self, notification_id):
         
         # Relancer si possible
         if self.request.retries < self.max_retries:
-            raise self.retry(countdown=60 * (2 ** self.request.retries))  # Backoff exponentiel
+            # Backoff exponentiel avec part aléatoire, sans bloquer le worker
+            raise self.retry(countdown=timeout_handler.backoff_delay(self.request.retries, base=60, cap=900))
         
         return {
             'success': False,
@@ -238,18 +330,6 @@ def send_bulk_received_colis_notifications(self, colis_ids_list, notification_ty
         # Récupérer le lot depuis le premier colis (ils sont du même lot)
         lot = colis_list[0].lot
         
-        # Créer l'enregistrement de suivi de la tâche
-        task_record = NotificationTask.objects.create(
-            task_id=self.request.id,
-            task_type=f'bulk_received_{notification_type}',
-            lot_reference=lot,
-            initiated_by_id=initiated_by_id,
-            message_template=message_template or '',
-            total_notifications=len(colis_ids_list)
-        )
-        
-        task_record.mark_as_started()
-        
         clients_map = {}
         notifications_created = []
         
@@ -281,6 +361,18 @@ Votre colis {numero_suivi} du lot {numero_lot} est arrivé au Mali.
             })
             data['colis'].append(colis)
 
+        # Créer l'enregistrement de suivi de la tâche (une notification par client)
+        task_record = NotificationTask.objects.create(
+            task_id=self.request.id,
+            task_type=f'bulk_received_{notification_type}',
+            lot_reference=lot,
+            initiated_by_id=initiated_by_id,
+            message_template=message_template or '',
+            total_notifications=len(clients_map),
+            task_status='STARTED',
+            started_at=timezone.now()
+        )
+
         # Créer une notification par client pour ses colis réceptionnés
         for _, data in clients_map.items():
             client = data['client']
@@ -319,8 +411,8 @@ Votre colis {numero_suivi} du lot {numero_lot} est arrivé au Mali.
 Merci de votre confiance !
 Équipe TS Air Cargo 🚀"""
 
-            # Créer la notification en base (une par client)
-            notification = Notification.objects.create(
+            # Préparer la notification (une par client), insérée avec les autres
+            notifications_created.append(Notification(
                 destinataire=client.user,
                 type_notification='whatsapp',
                 categorie=template_info['categorie'],
@@ -329,29 +421,15 @@ Merci de votre confiance !
                 telephone_destinataire=client.user.telephone,
                 email_destinataire=client.user.email or '',
                 statut='en_attente',
+                priorite=PRIORITE_MASSE,
                 lot_reference=lot
-            )
-
-            notifications_created.append(notification.id)
-        
-        # Mettre à jour le nombre total réel
-        task_record.total_notifications = len(notifications_created)
-        task_record.save(update_fields=['total_notifications'])
-        
-        # Envoyer toutes les notifications de façon asynchrone
-        sent_count = 0
-        failed_count = 0
+            ))
         
-        for notif_id in notifications_created:
-            try:
-                send_individual_notification.delay(notif_id)
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"Erreur lors du lancement de la tâche pour notification {notif_id}: {e}")
-                failed_count += 1
+        # Enregistrer toutes les notifications en une seule insertion
+        Notification.objects.bulk_create(notifications_created, batch_size=NOTIFICATION_BULK_BATCH)
         
-        # Mettre à jour les statistiques
-        task_record.update_progress(sent_count=sent_count, failed_count=failed_count)
+        # Envoyer toutes les notifications (envoi groupé concurrent ou group Celery)
+        sent_count, failed_count, dispatch_mode = _dispatcher_notifications(notifications_created)
         
         # Marquer la tâche comme terminée
         result_data = {
@@ -360,12 +438,15 @@ Merci de votre confiance !
             'total_notifications': len(notifications_created),
             'notifications_queued': sent_count,
             'queue_failures': failed_count,
+            'dispatch_mode': dispatch_mode,
             'clients_count': len(clients_map)
         }
         
         task_record.mark_as_completed(
             success=True,
-            result_data=result_data
+            result_data=result_data,
+            sent_count=sent_count,
+            failed_count=failed_count
         )
         
         logger.info(f"Tâche de notification ciblée terminée pour {len(colis_ids_list)} colis réceptionnés: {sent_count} notifications en file d'attente")
@@ -412,18 +493,6 @@ def send_bulk_lot_notifications(self, lot_id, notification_type, message_templat
         # Récupérer le lot
         lot = Lot.objects.get(id=lot_id)
         
-        # Créer l'enregistrement de suivi de la tâche
-        task_record = NotificationTask.objects.create(
-            task_id=self.request.id,
-            task_type=f'bulk_{notification_type}',
-            lot_reference=lot,
-            initiated_by_id=initiated_by_id,
-            message_template=message_template or '',
-            total_notifications=lot.colis.count()
-        )
-        
-        task_record.mark_as_started()
-        
         # Récupérer tous les colis du lot et regrouper par client (agrégation)
         colis_list = lot.colis.select_related('client__user').all()
         clients_map = {}
@@ -496,6 +565,18 @@ Merci d'avoir choisi TS Air Cargo pour vos envois !
             })
             data['colis'].append(colis)
 
+        # Créer l'enregistrement de suivi de la tâche (une notification par client)
+        task_record = NotificationTask.objects.create(
+            task_id=self.request.id,
+            task_type=f'bulk_{notification_type}',
+            lot_reference=lot,
+            initiated_by_id=initiated_by_id,
+            message_template=message_template or '',
+            total_notifications=len(clients_map),
+            task_status='STARTED',
+            started_at=timezone.now()
+        )
+
         # Créer une notification par client en agrégeant les numéros de suivi
         for _, data in clients_map.items():
             client = data['client']
@@ -552,8 +633,8 @@ Merci d'avoir choisi TS Air Cargo pour vos envois !
 Merci de votre confiance !
 Équipe TS Air Cargo 🚀"""
 
-            # Créer la notification en base (une par client)
-            notification = Notification.objects.create(
+            # Préparer la notification (une par client), insérée avec les autres
+            notifications_created.append(Notification(
                 destinataire=client.user,
                 type_notification='whatsapp',
                 categorie=template_info['categorie'],
@@ -562,30 +643,15 @@ Merci de votre confiance !
                 telephone_destinataire=client.user.telephone,
                 email_destinataire=client.user.email or '',
                 statut='en_attente',
+                priorite=PRIORITE_MASSE,
                 lot_reference=lot
-            )
-
-            notifications_created.append(notification.id)
-        
-        # Mettre à jour le nombre total réel
-        task_record.total_notifications = len(notifications_created)
-        task_record.save(update_fields=['total_notifications'])
+            ))
         
-        # Envoyer toutes les notifications de façon asynchrone
-        sent_count = 0
-        failed_count = 0
-        
-        for notif_id in notifications_created:
-            try:
-                # Lancer la tâche d'envoi individuelle
-                send_individual_notification.delay(notif_id)
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"Erreur lors du lancement de la tâche pour notification {notif_id}: {e}")
-                failed_count += 1
+        # Enregistrer toutes les notifications en une seule insertion
+        Notification.objects.bulk_create(notifications_created, batch_size=NOTIFICATION_BULK_BATCH)
         
-        # Mettre à jour les statistiques
-        task_record.update_progress(sent_count=sent_count, failed_count=failed_count)
+        # Envoyer toutes les notifications (envoi groupé concurrent ou group Celery)
+        sent_count, failed_count, dispatch_mode = _dispatcher_notifications(notifications_created)
         
         # Marquer la tâche comme terminée
         result_data = {
@@ -594,12 +660,15 @@ Merci de votre confiance !
             'total_notifications': len(notifications_created),
             'notifications_queued': sent_count,
             'queue_failures': failed_count,
+            'dispatch_mode': dispatch_mode,
             'clients_count': len(clients_map)
         }
         
         task_record.mark_as_completed(
             success=True,
-            result_data=result_data
+            result_data=result_data,
+            sent_count=sent_count,
+            failed_count=failed_count
         )
         
         logger.info(f"Tâche de notification de masse terminée pour lot {lot.numero_lot}: {sent_count} notifications en file d'attente")
@@ -641,7 +710,7 @@ def process_pending_notifications(self):
         retry_count = 0
         for notification in retry_notifications[:50]:  # Limiter à 50 par batch
             try:
-                send_individual_notification.delay(notification.id)
+                envoyer_notification_async(notification)
                 retry_count += 1
             except Exception as e:
                 logger.error(f"Erreur relance notification {notification.id}: {e}")
@@ -765,7 +834,7 @@ Merci de votre confiance !
         )
         
         # Envoyer de façon asynchrone
-        send_individual_notification.delay(notification.id)
+        envoyer_notification_async(notification)
         
         return {
             'success': True,
@@ -809,7 +878,7 @@ def notify_colis_updated(colis_id, initiated_by_id=None):
         )
         
         # Envoyer de façon asynchrone
-        send_individual_notification.delay(notification.id)
+        envoyer_notification_async(notification)
         
         return {
             'success': True,
@@ -862,7 +931,8 @@ def notify_lot_received_mali(lot_id, agent_mali_id=None):
         }
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 30})
+@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+             retry_backoff=10, retry_backoff_max=60, retry_jitter=True)
 def send_otp_async(self, phone_number, otp_code, cache_key=None, user_id=None):
     """
     Tâche asynchrone pour envoyer un OTP via WhatsApp
@@ -1,3 +1,186 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from . import async_sender, rate_limiter
+from .models import Notification
+from .services import NotificationService
+from .tasks import _dispatcher_notifications
+
+User = get_user_model()
+
+
+class ReponseFactice:
+    status = 200
+
+    async def text(self):
+        return '{}'
+
+    async def json(self, content_type=None):
+        return {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class SessionFactice:
+    def __init__(self):
+        self.requetes = 0
+
+    def post(self, url, json=None, headers=None):
+        self.requetes += 1
+        return ReponseFactice()
+
+
+def requete(analyser):
+    return {
+        'fournisseur': 'wachap', 'region': 'default', 'instance': 'mali',
+        'url': 'https://wachap.test/send', 'json': {}, 'headers': {}, 'analyser': analyser,
+    }
+
+
+class EnvoiGroupeTests(TestCase):
+    """
+    Envoi groupé WhatsApp : résultats conservés et repli sans doublon
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            telephone='+22370000010', email='notif@example.com', password='secret', role='client',
+        )
+
+    def setUp(self):
+        self.notifications = [
+            Notification.objects.create(
+                destinataire=self.user, type_notification='whatsapp', categorie='lot_expedie',
+                titre='Lot expédié', message=f'Message {i}', telephone_destinataire=self.user.telephone,
+            )
+            for i in range(3)
+        ]
+        preparer = mock.patch.object(
+            async_sender, 'preparer_envoi',
+            side_effect=lambda n: async_sender.EnvoiWhatsApp(n, requete(lambda *args: (True, 'OK', f'wa-{n.id}'))),
+        )
+        preparer.start()
+        self.addCleanup(preparer.stop)
+
+    def test_interruption_conserve_les_envois_termines(self):
+        premiere, *autres = self.notifications
+
+        async def interrompu(envois, echeance, appliquer):
+            appliquer(async_sender.ResultatEnvoi(premiere, True, 'wa-1', None, None))
+            raise RuntimeError('limite de temps')
+
+        with mock.patch.object(async_sender, '_envoyer_tous', interrompu), \
+                mock.patch('notifications_app.tasks.NOTIFICATION_BULK_DISPATCH', 'async'), \
+                mock.patch('notifications_app.tasks.group') as group:
+            envoyees, echecs, mode = _dispatcher_notifications(self.notifications)
+
+        premiere.refresh_from_db()
+        self.assertEqual((premiere.statut, premiere.message_id_externe), ('envoye', 'wa-1'))
+        # Repli Celery uniquement pour les notifications sans résultat
+        signatures = list(group.call_args.args[0])
+        self.assertEqual([s.args[0] for s in signatures], [n.id for n in autres])
+        self.assertEqual((envoyees, echecs, mode), (3, 0, 'async'))
+
+    def test_budget_epuise_aucune_requete(self):
+        with mock.patch.object(async_sender.aiohttp, 'ClientSession', return_value=mock.MagicMock()) as session:
+            stats = async_sender.envoyer_notifications_groupees(self.notifications, budget=0)
+
+        self.assertEqual(stats['restantes'], 3)
+        self.assertFalse(session.return_value.__aenter__.return_value.post.called)
+        self.assertEqual(Notification.objects.filter(statut='en_attente').count(), 3)
+
+    def test_erreur_apres_emission_enregistree_en_echec(self):
+        def analyser(*args):
+            raise KeyError('messageId')
+
+        envoi = async_sender.EnvoiWhatsApp(self.notifications[0], requete(analyser))
+        session = SessionFactice()
+        resultats = []
+        asyncio.run(async_sender._envoyer(
+            session, {'mali': asyncio.Semaphore(1)}, envoi, float('inf'), resultats.append
+        ))
+
+        self.assertEqual(session.requetes, 1)
+        self.assertEqual(len(resultats), 1)
+        self.assertFalse(resultats[0].succes)
+        self.assertEqual(resultats[0].type_erreur, 'general_error')
+
+
+@override_settings(NOTIFICATION_RATE_LIMITS={'test': {'rate': 2, 'burst': 2}, 'test:otp': {'rate': 1, 'burst': 1}})
+class TokenBucketLocalTests(TestCase):
+    """
+    Limiteur de débit sans Redis : seau propre au processus
+    """
+
+    def setUp(self):
+        rate_limiter._seaux.clear()
+        redis = mock.patch.object(rate_limiter, 'get_redis', return_value=None)
+        redis.start()
+        self.addCleanup(redis.stop)
+
+    def test_rafale_puis_attente(self):
+        seau = rate_limiter.TokenBucket('test')
+        self.assertEqual([seau.reserver()[:2] for _ in range(2)], [(True, 0.0), (True, 0.0)])
+
+        accorde, attente, jetons = seau.reserver()
+        self.assertTrue(accorde)
+        self.assertAlmostEqual(attente, 0.5, places=1)
+        self.assertLess(jetons, 0)
+
+    def test_attente_max_ne_reserve_rien(self):
+        seau = rate_limiter.TokenBucket('test')
+        seau.reserver(demandes=2)
+        accorde, attente, _ = seau.reserver(attente_max=0.1)
+        self.assertFalse(accorde)
+        self.assertAlmostEqual(attente, 0.5, places=1)
+        # Le jeton refusé n'a pas été consommé
+        self.assertAlmostEqual(seau.reserver(attente_max=0.1)[1], 0.5, places=1)
+
+    def test_attendre_plafonne_puis_debit_limite(self):
+        seau = rate_limiter.TokenBucket('test')
+        with mock.patch.object(rate_limiter.time, 'sleep') as sleep:
+            seau.attendre(demandes=2)
+            seau.attendre()
+            seau.attendre()
+            with self.assertRaises(rate_limiter.DebitLimite) as contexte:
+                seau.attendre()
+
+        attentes = [appel.args[0] for appel in sleep.call_args_list]
+        self.assertEqual(len(attentes), 2)
+        self.assertTrue(all(attente <= rate_limiter.RATE_LIMIT_MAX_WAIT for attente in attentes))
+        self.assertAlmostEqual(contexte.exception.retry_after, 1.5, places=1)
+
+    def test_redis_indisponible(self):
+        client = mock.Mock()
+        client.eval.side_effect = ConnectionError('redis')
+        with mock.patch.object(rate_limiter, 'get_redis', return_value=client):
+            seau = rate_limiter.TokenBucket('test')
+            self.assertEqual(seau.reserver()[:2], (True, 0.0))
+        self.assertTrue(client.eval.called)
+        self.assertEqual(seau.niveau()['jetons'], 1)
+
+    def test_seau_prioritaire(self):
+        rate_limiter.attendre_jeton('test', 'mali', prioritaire=True)
+        self.assertEqual(rate_limiter.get_limiter('test', rate_limiter.REGION_PRIORITAIRE).niveau()['jetons'], 0)
+        self.assertEqual(rate_limiter.get_limiter('test', 'mali').niveau()['jetons'], 2)
+
+    def test_envoi_synchrone_reporte(self):
+        user = User.objects.create_user(
+            telephone='+22370000011', email='debit@example.com', password='secret', role='client',
+        )
+        with mock.patch.object(
+            NotificationService, '_send_whatsapp', side_effect=rate_limiter.DebitLimite('test', 'default', 3)
+        ):
+            self.assertFalse(NotificationService.send_notification(user, 'Bonjour'))
+
+        notification = Notification.objects.get(destinataire=user)
+        self.assertEqual(notification.statut, 'echec')
+        self.assertIsNotNone(notification.prochaine_tentative)
@@ -3,8 +3,9 @@ Gestionnaire de timeout et retry pour les API WaChap
 Améliore la robustesse des envois de messages
 """
 
-import time
 import logging
+import random
+import time
 import requests
 from typing import Tuple, Optional, Dict, Any
 from django.conf import settings
@@ -15,17 +16,35 @@ logger = logging.getLogger(__name__)
 class TimeoutHandler:
     """
     Gestionnaire de timeout avec retry intelligent et fallback
+
+    Aucune attente bloquante entre deux tentatives : execute_with_retry ne
+    fait qu'un essai ; les tâches Celery d'envoi replanifient la suivante
+    (retry avec le délai exponentiel et aléatoire de backoff_delay) ; hors
+    tâche (requête web), l'échec est rendu immédiatement et la notification
+    sera relancée par retry_failed_notifications.
     """
     
     def __init__(self):
-        self.max_retries = 3
         self.base_timeout = 30  # Timeout de base en secondes
         self.backoff_factor = 2  # Facteur d'augmentation du délai entre les retries
-        self.max_timeout = 60   # Timeout maximum
+        self.base_delay = 2     # Délai avant la première relance (secondes)
+        self.max_delay = 300    # Délai maximum entre deux relances
+    
+    def backoff_delay(self, attempt: int, base: float = None, cap: float = None) -> float:
+        """
+        Délai avant la relance n° attempt + 1 : exponentiel, la moitié tirée au
+        hasard pour étaler les relances des workers
+        """
+        delay = min(cap or self.max_delay, (base or self.base_delay) * (self.backoff_factor ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
         
     def execute_with_retry(self, func, *args, **kwargs) -> Tuple[bool, str, Optional[str]]:
         """
-        Exécute une fonction avec système de retry automatique
+        Exécute une seule tentative d'appel, sans attente
+
+        Les nouvelles tentatives sont replanifiées par les tâches Celery
+        d'envoi (send_individual_notification, send_otp_async :
+        retry_backoff + retry_jitter, voir backoff_delay) : aucun thread ne dort.
         
         Args:
             func: Fonction à exécuter (généralement un appel API)
@@ -34,53 +53,26 @@ class TimeoutHandler:
         Returns:
             Tuple[bool, str, Optional[str]]: (succès, message, message_id)
         """
-        last_error = None
+        timeout = self.base_timeout
+        if 'timeout' in kwargs:
+            kwargs['timeout'] = timeout
         
-        for attempt in range(self.max_retries + 1):
-            try:
-                # Calculer le timeout pour cette tentative
-                timeout = min(self.base_timeout * (self.backoff_factor ** attempt), self.max_timeout)
-                
-                logger.info(f"🔄 Tentative {attempt + 1}/{self.max_retries + 1} (timeout: {timeout}s)")
-                
-                # Exécuter la fonction avec le timeout adaptatif
-                if 'timeout' in kwargs:
-                    kwargs['timeout'] = timeout
-                
-                result = func(*args, **kwargs)
-                
-                # Si on arrive ici, c'est un succès
-                if attempt > 0:
-                    logger.info(f"✅ Succès après {attempt + 1} tentatives")
-                
-                return result
-                
-            except requests.exceptions.Timeout as e:
-                last_error = f"Timeout après {timeout}s (tentative {attempt + 1})"
-                logger.warning(f"⏱️ {last_error}")
-                
-                # Attendre avant le retry (sauf pour la dernière tentative)
-                if attempt < self.max_retries:
-                    wait_time = (attempt + 1) * 2  # 2s, 4s, 6s
-                    logger.info(f"⏳ Attente {wait_time}s avant retry...")
-                    time.sleep(wait_time)
-                    
-            except requests.exceptions.ConnectionError as e:
-                last_error = f"Erreur de connexion (tentative {attempt + 1})"
-                logger.warning(f"🔌 {last_error}")
-                
-                if attempt < self.max_retries:
-                    wait_time = (attempt + 1) * 3  # 3s, 6s, 9s
-                    time.sleep(wait_time)
-                    
-            except Exception as e:
-                last_error = f"Erreur inattendue: {str(e)}"
-                logger.error(f"❌ {last_error}")
-                break  # Pas de retry pour les autres erreurs
+        try:
+            return func(*args, **kwargs)
+            
+        except requests.exceptions.Timeout:
+            last_error = f"Timeout après {timeout}s"
+            logger.warning(f"⏱️ {last_error}")
+            
+        except requests.exceptions.ConnectionError:
+            last_error = "Erreur de connexion"
+            logger.warning(f"🔌 {last_error}")
+            
+        except Exception as e:
+            last_error = f"Erreur inattendue: {str(e)}"
+            logger.error(f"❌ {last_error}")
         
-        # Si on arrive ici, tous les retries ont échoué
-        logger.error(f"💥 Échec définitif après {self.max_retries + 1} tentatives: {last_error}")
-        return False, f"Échec après {self.max_retries + 1} tentatives - {last_error}", None
+        return False, f"Échec de l'envoi - {last_error}", None
     
     def check_service_health(self, base_url: str) -> bool:
         """
@@ -123,31 +115,41 @@ class TimeoutHandler:
 class CircuitBreaker:
     """
     Implémente un circuit breaker pour éviter les appels répétés vers un service défaillant
+
+    État partagé par tous les workers, sans lecture-modification-écriture :
+    - circuit_breaker_{service}_echecs : compteur d'échecs consécutifs (INCR) ;
+    - circuit_breaker_{service}_ouvert : présent tant que le circuit est ouvert
+      (posé par add/SET NX, expire après recovery_timeout) ;
+    - circuit_breaker_{service}_sonde : un seul appel de test à la fois
+      lorsque le circuit est à demi ouvert.
+    Chaque opération coûte un ou deux appels au cache, quel que soit le trafic.
     """
     
     def __init__(self, failure_threshold: int = 5, recovery_timeout: int = 300):
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
+        self.probe_timeout = min(60, recovery_timeout)
+    
+    @staticmethod
+    def _keys(service_key: str) -> Tuple[str, str, str]:
+        prefix = f"circuit_breaker_{service_key}"
+        return f"{prefix}_echecs", f"{prefix}_ouvert", f"{prefix}_sonde"
     
     def is_circuit_open(self, service_key: str) -> bool:
         """
         Vérifie si le circuit est ouvert pour un service
         """
-        cache_key = f"circuit_breaker_{service_key}"
-        circuit_data = cache.get(cache_key, {'failures': 0, 'last_failure': None})
+        failures_key, open_key, probe_key = self._keys(service_key)
+        state = cache.get_many([failures_key, open_key])
         
         # Si pas assez d'échecs, circuit fermé
-        if circuit_data['failures'] < self.failure_threshold:
+        if state.get(failures_key, 0) < self.failure_threshold:
             return False
-            
-        # Si timeout de récupération dépassé, essayer de fermer le circuit
-        if circuit_data['last_failure']:
-            time_since_failure = time.time() - circuit_data['last_failure']
-            if time_since_failure > self.recovery_timeout:
+        
+        if open_key not in state:
+            # Timeout de récupération dépassé : un seul appel de test passe
+            if cache.add(probe_key, True, timeout=self.probe_timeout):
                 logger.info(f"🔓 Circuit breaker: tentative de récupération pour {service_key}")
-                # Reset partiel pour permettre un test
-                circuit_data['failures'] = self.failure_threshold - 1
-                cache.set(cache_key, circuit_data, timeout=3600)
                 return False
         
         logger.warning(f"⚠️ Circuit breaker OUVERT pour {service_key}")
@@ -155,22 +157,26 @@ class CircuitBreaker:
     
     def record_success(self, service_key: str):
         """Enregistre un succès - ferme le circuit"""
-        cache_key = f"circuit_breaker_{service_key}"
-        cache.delete(cache_key)
+        cache.delete_many(self._keys(service_key))
         logger.info(f"✅ Circuit breaker fermé pour {service_key}")
     
     def record_failure(self, service_key: str):
         """Enregistre un échec"""
-        cache_key = f"circuit_breaker_{service_key}"
-        circuit_data = cache.get(cache_key, {'failures': 0, 'last_failure': None})
+        failures_key, open_key, probe_key = self._keys(service_key)
         
-        circuit_data['failures'] += 1
-        circuit_data['last_failure'] = time.time()
-        
-        cache.set(cache_key, circuit_data, timeout=3600)
+        cache.add(failures_key, 0, timeout=3600)
+        try:
+            failures = cache.incr(failures_key)
+        except ValueError:
+            # Clé expirée entre add et incr
+            cache.add(failures_key, 1, timeout=3600)
+            failures = 1
         
-        if circuit_data['failures'] >= self.failure_threshold:
-            logger.warning(f"🚨 Circuit breaker OUVERT pour {service_key} ({circuit_data['failures']} échecs)")
+        if failures >= self.failure_threshold:
+            # Ouverture (ou réouverture après un appel de test raté)
+            cache.delete(probe_key)
+            if cache.add(open_key, time.time(), timeout=self.recovery_timeout):
+                logger.warning(f"🚨 Circuit breaker OUVERT pour {service_key} ({failures} échecs)")
 
 # Instances globales
 timeout_handler = TimeoutHandler()
@@ -3,13 +3,13 @@ import logging
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
 import json
 
 from .models import Notification
 from .services import NotificationService
+from reporting_app.pagination import KeysetPaginator
 
 logger = logging.getLogger(__name__)
 
@@ -43,9 +43,8 @@ def notifications_list_view(request):
         )
     
     # Pagination
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(notifications, 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     # Statistiques
     total_notifications = Notification.objects.filter(
@@ -180,12 +179,23 @@ def notifications_count_api(request):
 def notifications_recent_api(request):
     """
     API pour récupérer les notifications récentes (5 dernières)
+    
+    Paramètres optionnels : limit (50 au plus) et cursor (next_cursor de la
+    réponse précédente) pour charger les notifications plus anciennes
     """
     try:
-        notifications = Notification.objects.filter(
-            destinataire=request.user,
-            type_notification='in_app'
-        ).select_related('colis_reference', 'lot_reference')[:5]
+        try:
+            limit = min(max(int(request.GET.get('limit', 5)), 1), 50)
+        except ValueError:
+            limit = 5
+        paginator = KeysetPaginator(
+            Notification.objects.filter(
+                destinataire=request.user,
+                type_notification='in_app'
+            ).select_related('colis_reference', 'lot_reference'),
+            limit,
+        )
+        notifications = paginator.get_page(request.GET.get('cursor'))
         
         notifications_data = []
         for notif in notifications:
@@ -202,7 +212,8 @@ def notifications_recent_api(request):
         
         return JsonResponse({
             'success': True,
-            'notifications': notifications_data
+            'notifications': notifications_data,
+            'next_cursor': notifications.next_cursor,
         })
         
     except Exception as e:
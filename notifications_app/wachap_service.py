@@ -14,6 +14,9 @@ from django.core.cache import cache
 from urllib.parse import quote
 from django.utils import timezone
 from .timeout_handler import timeout_handler, circuit_breaker
+from .http_sessions import get_session, http_timeout
+from .rate_limiter import DebitLimite, attendre_jeton
+from .routing import TYPES_PRIORITAIRES
 
 # Import pour la façade V4
 from django.conf import settings
@@ -217,7 +220,7 @@ class WaChapService:
         return clean_phone
     
     def send_message(self, phone: str, message: str, sender_role: str = None, 
-                    region: str = None) -> Tuple[bool, str, Optional[str]]:
+                    region: str = None, message_type: str = 'notification') -> Tuple[bool, str, Optional[str]]:
         """
         Envoie un message texte via WaChap avec monitoring automatique.
         Cette méthode agit comme une façade pour basculer entre l'ancienne et la nouvelle API.
@@ -230,7 +233,8 @@ class WaChapService:
                 phone=phone,
                 message=message,
                 sender_role=sender_role,
-                region=region
+                region=region,
+                message_type=message_type
             )
         # =================
         
@@ -288,11 +292,13 @@ class WaChapService:
             except Exception:
                 pass
             
-            response = requests.post(
+            attendre_jeton('wachap', region, prioritaire=message_type in TYPES_PRIORITAIRES)
+
+            response = get_session('wachap', region).post(
                 f"{self.base_url}/send",
                 json=payload,
                 headers={'Content-Type': 'application/json'},
-                timeout=15
+                timeout=http_timeout(15)
             )
             
             response_time = (timezone.now() - start_time).total_seconds() * 1000
@@ -310,36 +316,8 @@ class WaChapService:
                     logger.error(f"Erreur inattendue lors du parsing de la réponse: {str(e)}")
                     response_data = {"raw": str(response.text)[:500], "error": "parsing_error"}
 
-                success_flag = False
-                top_status = str(response_data.get('status', '')).lower().strip()
-                nested_status = ''
-                
-                if 'message' in response_data and isinstance(response_data['message'], dict):
-                    nested_status = str(response_data['message'].get('status', '')).lower().strip()
-                
-                logger.debug(f"WaChap {region} - Statuts: top={top_status}, nested={nested_status}")
-                
-                success_flag = (top_status == 'success' or 
-                              nested_status == 'success' or 
-                              'id' in response_data or 
-                              'message_id' in response_data)
-
-                message_id = None
-                try:
-                    message_id = (
-                        response_data.get('id') or
-                        response_data.get('message_id') or
-                        (response_data.get('message', {}).get('key', {}).get('id') if isinstance(response_data.get('message'), dict) else None) or
-                        (response_data.get('data', {}).get('id') if isinstance(response_data.get('data'), dict) else None)
-                    )
-                    
-                    if message_id and not success_flag:
-                        success_flag = True
-                        logger.info(f"Message considéré comme réussi grâce à la présence d'un ID: {message_id}")
-                        
-                except Exception as e:
-                    logger.error(f"Erreur lors de l'extraction de l'ID du message: {str(e)}")
-                    message_id = None
+                success_flag, message_id = self.extraire_resultat(response_data)
+                logger.debug(f"WaChap {region} - Succès: {success_flag}, ID: {message_id}")
 
                 if success_flag:
                     success_msg = f"Message envoyé via WaChap {region.title()}"
@@ -405,6 +383,8 @@ class WaChapService:
                     logger.error("Impossible d'accéder au module de monitoring")
             return False, error_msg, None
             
+        except DebitLimite:
+            raise
         except Exception as e:
             response_time = (timezone.now() - start_time).total_seconds() * 1000
             error_type = 'unexpected_error'
@@ -435,6 +415,109 @@ class WaChapService:
                     pass
             return False, error_msg, None
     
+    @staticmethod
+    def extraire_resultat(response_data: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Succès et identifiant du message d'une réponse 200 de l'API WaChap
+
+        Returns:
+            Tuple[bool, Optional[str]]: (succès, message_id)
+        """
+        top_status = str(response_data.get('status', '')).lower().strip()
+        nested_status = ''
+        if 'message' in response_data and isinstance(response_data['message'], dict):
+            nested_status = str(response_data['message'].get('status', '')).lower().strip()
+        
+        success_flag = (top_status == 'success' or 
+                        nested_status == 'success' or 
+                        'id' in response_data or 
+                        'message_id' in response_data)
+
+        message_id = None
+        try:
+            message_id = (
+                response_data.get('id') or
+                response_data.get('message_id') or
+                (response_data.get('message', {}).get('key', {}).get('id') if isinstance(response_data.get('message'), dict) else None) or
+                (response_data.get('data', {}).get('id') if isinstance(response_data.get('data'), dict) else None)
+            )
+            if message_id and not success_flag:
+                success_flag = True
+                logger.info(f"Message considéré comme réussi grâce à la présence d'un ID: {message_id}")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'extraction de l'ID du message: {str(e)}")
+            message_id = None
+
+        return success_flag, message_id
+
+    def analyser_reponse(self, status_code: int, response_data: Optional[Dict[str, Any]],
+                         texte: str = '', region: str = '') -> Tuple[bool, str, Optional[str]]:
+        """
+        Interprète la réponse HTTP d'un envoi (envoi groupé asynchrone)
+
+        Returns:
+            Tuple[bool, str, Optional[str]]: (succès, message, message_id)
+        """
+        if status_code != 200:
+            return False, f"Erreur WaChap {region.title()}: {status_code} - {texte}", None
+        if not isinstance(response_data, dict):
+            return False, f"Erreur WaChap {region.title()}: réponse invalide - {texte[:500]}", None
+        success_flag, message_id = self.extraire_resultat(response_data)
+        if success_flag:
+            return True, f"Message envoyé via WaChap {region.title()}", message_id
+        error_text = response_data.get('message') if not isinstance(response_data.get('message'), dict) else json.dumps(response_data.get('message'))
+        return False, f"Erreur WaChap {region.title()} (200/app): {error_text}", None
+
+    def preparer_envoi(self, phone: str, message: str, message_type: str = 'notification',
+                       sender_role: str = None, region: str = None) -> Dict[str, Any]:
+        """
+        Prépare la requête d'envoi d'un message texte sans l'émettre
+        (même choix d'instance que send_message_with_type, API V1 ou V4)
+
+        Returns:
+            dict: {'fournisseur', 'region', 'instance', 'url', 'json', 'headers', 'analyser'} ;
+                analyser(status_code, response_data, texte) -> (succès, message, message_id)
+
+        Raises:
+            ValueError: Instance non configurée ou désactivée
+        """
+        formatted_phone = self.format_phone_number(phone)
+        if region is None:
+            region = self.determine_instance(
+                sender_role=sender_role,
+                recipient_phone=formatted_phone,
+                message_type=message_type
+            )
+
+        if settings.USE_WACHAP_V4:
+            requete = wachap_v4_service.preparer_envoi(formatted_phone, message, sender_role, region, message_type)
+            requete['analyser'] = wachap_v4_service.analyser_reponse
+            return requete
+
+        config = self.get_config(region)
+        if not config['access_token'] or not config['instance_id']:
+            raise ValueError(f"Configuration WaChap {region.title()} incomplète")
+        if not config['active']:
+            raise ValueError(f"Instance WaChap {region.title()} désactivée")
+
+        return {
+            'fournisseur': 'wachap',
+            'region': region,
+            'instance': config['instance_id'],
+            'url': f"{self.base_url}/send",
+            'json': {
+                "number": formatted_phone.replace('+', ''),
+                "type": "text",
+                "message": message,
+                "instance_id": config['instance_id'],
+                "access_token": config['access_token']
+            },
+            'headers': {'Content-Type': 'application/json'},
+            'analyser': lambda status_code, response_data, texte='': self.analyser_reponse(
+                status_code, response_data, texte, region
+            ),
+        }
+    
     def send_message_with_type(self, phone: str, message: str, message_type: str = 'notification',
                              sender_role: str = None, region: str = None) -> Tuple[bool, str, Optional[str]]:
         """
@@ -461,7 +544,7 @@ class WaChapService:
                 message_type=message_type
             )
         
-        return self.send_message(formatted_phone, message, sender_role, region)
+        return self.send_message(formatted_phone, message, sender_role, region, message_type)
     
     def send_media(self, phone: str, message: str, media_url: str,
                    filename: str = None, sender_role: str = None, 
@@ -510,11 +593,13 @@ class WaChapService:
             if filename:
                 payload["filename"] = filename
             
-            response = requests.post(
+            attendre_jeton('wachap', region)
+
+            response = get_session('wachap', region).post(
                 f"{self.base_url}/send",
                 json=payload,
                 headers={'Content-Type': 'application/json'},
-                timeout=30
+                timeout=http_timeout(30)
             )
             
             logger.info(f"WaChap {region.title()} Media - Envoi vers {formatted_phone}: {response.status_code}")
@@ -531,6 +616,8 @@ class WaChapService:
                 logger.error(error_msg)
                 return False, error_msg, None
                 
+        except DebitLimite:
+            raise
         except Exception as e:
             error_msg = f"Erreur envoi média WaChap {region} pour {phone}: {str(e)}"
             logger.error(error_msg)
@@ -552,13 +639,13 @@ class WaChapService:
             if not config['access_token'] or not config['instance_id']:
                 return False, f"Configuration WaChap {region.title()} incomplète"
             
-            response = requests.get(
+            response = get_session('wachap', region).get(
                 f"{self.base_url}/get_qrcode",
                 params={
                     'instance_id': config['instance_id'],
                     'access_token': config['access_token']
                 },
-                timeout=30
+                timeout=http_timeout(30)
             )
             
             if response.status_code == 200:
@@ -588,7 +675,7 @@ class WaChapService:
             if not config['access_token'] or not config['instance_id']:
                 return False, f"Configuration WaChap {region.title()} incomplète"
             
-            response = requests.get(
+            response = get_session('wachap', region).get(
                 f"{self.base_url}/set_webhook",
                 params={
                     'webhook_url': webhook_url,
@@ -596,7 +683,7 @@ class WaChapService:
                     'instance_id': config['instance_id'],
                     'access_token': config['access_token']
                 },
-                timeout=30
+                timeout=http_timeout(30)
             )
             
             if response.status_code == 200:
@@ -635,13 +722,13 @@ class WaChapService:
             
             try:
                 # Test simple avec l'endpoint get_qrcode (ne nécessite pas de numéro)
-                response = requests.get(
+                response = get_session('wachap', reg).get(
                     f"{self.base_url}/get_qrcode",
                     params={
                         'instance_id': config['instance_id'],
                         'access_token': config['access_token']
                     },
-                    timeout=10
+                    timeout=http_timeout(10)
                 )
                 
                 results[reg] = {
@@ -8,7 +8,10 @@ import json
 import re
 from typing import Optional, Dict, Any, Tuple
 from django.conf import settings
-from django.utils import timezone
+
+from .http_sessions import get_session, http_timeout
+from .rate_limiter import DebitLimite, attendre_jeton
+from .routing import TYPES_PRIORITAIRES
 
 logger = logging.getLogger(__name__)
 
@@ -69,13 +72,20 @@ class WaChapV4Service:
         # Par défaut, on utilise le Mali pour les clients et autres.
         return 'mali'
 
-    def send_message(self, phone: str, message: str, sender_role: str = None, 
-                     region: str = None, message_type: str = 'notification') -> Tuple[bool, str, Optional[str]]:
+    def preparer_envoi(self, phone: str, message: str, sender_role: str = None,
+                       region: str = None, message_type: str = 'notification') -> Dict[str, Any]:
         """
-        Envoie un message texte via la nouvelle API WaChap V4.
+        Prépare la requête d'envoi d'un message texte (commune aux envois
+        synchrones et à l'envoi groupé asynchrone)
+
+        Returns:
+            dict: {'fournisseur', 'region', 'instance', 'url', 'json', 'headers'}
+
+        Raises:
+            ValueError: Configuration incomplète ou aucun compte disponible
         """
         if not self.secret_key or not self.accounts:
-            return False, "Configuration WaChap V4 incomplète.", None
+            raise ValueError("Configuration WaChap V4 incomplète.")
 
         formatted_phone = self.format_phone_number(phone)
         
@@ -105,8 +115,7 @@ class WaChapV4Service:
                     break
         
         if not account_id:
-            return False, f"Aucun accountId trouvé pour la région '{region}' et aucun fallback disponible.", None
-
+            raise ValueError(f"Aucun accountId trouvé pour la région '{region}' et aucun fallback disponible.")
 
         headers = {
             'Authorization': f'Bearer {self.secret_key}',
@@ -122,32 +131,61 @@ class WaChapV4Service:
             }
         }
 
-        start_time = timezone.now()
+        return {
+            'fournisseur': 'wachap_v4',
+            'region': fallback_region or region,
+            'instance': account_id,
+            'url': f"{self.base_url}/whatsapp/messages/send",
+            'json': payload,
+            'headers': headers,
+        }
+
+    def analyser_reponse(self, status_code: int, response_data: Optional[Dict],
+                         texte: str = '') -> Tuple[bool, str, Optional[str]]:
+        """
+        Interprète la réponse HTTP d'un envoi
+
+        Returns:
+            Tuple[bool, str, Optional[str]]: (succès, message, message_id)
+        """
+        if status_code == 200:
+            if response_data and response_data.get('success'):
+                message_id = response_data.get('messageId')
+                logger.info(f"Message V4 envoyé avec succès. ID: {message_id}")
+                return True, response_data.get('message', 'Message envoyé avec succès.'), message_id
+            error_msg = f"Erreur applicative V4: {(response_data or {}).get('message', 'Erreur inconnue')}"
+        else:
+            error_msg = f"Erreur HTTP V4 {status_code}: {texte}"
+        logger.error(error_msg)
+        return False, error_msg, None
+
+    def send_message(self, phone: str, message: str, sender_role: str = None, 
+                     region: str = None, message_type: str = 'notification') -> Tuple[bool, str, Optional[str]]:
+        """
+        Envoie un message texte via la nouvelle API WaChap V4.
+        """
+        try:
+            requete = self.preparer_envoi(phone, message, sender_role, region, message_type)
+        except ValueError as e:
+            return False, str(e), None
+
         try:
-            response = requests.post(
-                f"{self.base_url}/whatsapp/messages/send",
-                json=payload,
-                headers=headers,
-                timeout=20
+            attendre_jeton('wachap_v4', requete['region'], prioritaire=message_type in TYPES_PRIORITAIRES)
+
+            response = get_session('wachap_v4', requete['region']).post(
+                requete['url'],
+                json=requete['json'],
+                headers=requete['headers'],
+                timeout=http_timeout(20)
             )
-            response_time = (timezone.now() - start_time).total_seconds() * 1000
             
-            logger.info(f"WaChap V4 - Envoi vers {formatted_phone} via account {account_id}: {response.status_code}")
-
-            if response.status_code == 200:
-                response_data = response.json()
-                if response_data.get('success'):
-                    message_id = response_data.get('messageId')
-                    logger.info(f"Message V4 envoyé avec succès. ID: {message_id}")
-                    return True, response_data.get('message', 'Message envoyé avec succès.'), message_id
-                else:
-                    error_msg = f"Erreur applicative V4: {response_data.get('message', 'Erreur inconnue')}"
-                    logger.error(error_msg)
-                    return False, error_msg, None
-            else:
-                error_msg = f"Erreur HTTP V4 {response.status_code}: {response.text}"
-                logger.error(error_msg)
-                return False, error_msg, None
+            logger.info(
+                f"WaChap V4 - Envoi vers {requete['json']['data']['to']} via account {requete['instance']}: "
+                f"{response.status_code}"
+            )
+
+            response_data = response.json() if response.status_code == 200 else None
+            return self.analyser_reponse(response.status_code, response_data, response.text)
 
         except requests.exceptions.Timeout as te:
             error_msg = f"Timeout V4 lors de l'envoi du message: {te}"
@@ -157,6 +195,8 @@ class WaChapV4Service:
             error_msg = f"Erreur réseau V4 lors de l'envoi du message: {re}"
             logger.error(error_msg)
             return False, error_msg, None
+        except DebitLimite:
+            raise
         except Exception as e:
             error_msg = f"Erreur inattendue V4 lors de l'envoi du message: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -0,0 +1,176 @@
+"""
+Agrégations conditionnelles partagées par les tableaux de bord
+
+histogramme() remplace les séries de .filter(...).count() par un seul
+aggregate(Count('pk', filter=Q(...))) par table ; serie_temporelle()
+remplace les boucles mois par mois par un GROUP BY TruncMonth/TruncDay.
+"""
+from datetime import date, datetime, time, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, DateField, DateTimeField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth
+from django.utils import timezone
+
+MOIS_COURTS = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Jun', 'Jul', 'Aoû', 'Sep', 'Oct', 'Nov', 'Déc']
+
+
+def _condition(filtre):
+    if filtre is None or isinstance(filtre, Q):
+        return filtre
+    return Q(**filtre)
+
+
+def histogramme(queryset, champs=(), mesure=None, **compteurs):
+    """
+    Comptes par valeur de choix et compteurs nommés en une seule requête
+
+    Args:
+        queryset: Lignes à compter
+        champs: Champs ventilés par valeur. Liste de noms (les choices du
+            modèle sont utilisés) ou dict {champ: choices}
+        mesure: Champ à sommer au lieu de compter les lignes
+            (ex. 'nombre' sur DailyStats)
+        **compteurs: nom -> Q ou dict de filtres (None = toutes les lignes).
+            Une expression d'agrégat est transmise telle quelle.
+
+    Returns:
+        dict: {'total': n, 'statut': {'livre': n, ...}, <compteur>: n, ...}
+
+    Usage:
+        histogramme(Colis.objects.all(), ['statut', 'mode_paiement'],
+                    en_chine=Q(statut__in=['en_attente', 'receptionne_chine']))
+    """
+    if not isinstance(champs, dict):
+        champs = {
+            champ: queryset.model._meta.get_field(champ).choices
+            for champ in champs
+        }
+
+    def compter(filtre):
+        if mesure is None:
+            return Count('pk', filter=filtre)
+        return Coalesce(Sum(mesure, filter=filtre), Value(0))
+
+    agregats = {'total': compter(None)}
+    cles = {}
+    for champ, choix in champs.items():
+        for valeur, _ in choix or ():
+            alias = f'{champ}__{valeur}'
+            agregats[alias] = compter(Q(**{champ: valeur}))
+            cles[alias] = (champ, valeur)
+    for nom, filtre in compteurs.items():
+        if hasattr(filtre, 'resolve_expression') and not isinstance(filtre, Q):
+            agregats[nom] = filtre
+        else:
+            agregats[nom] = compter(_condition(filtre))
+
+    resultat = queryset.order_by().aggregate(**agregats)
+
+    for champ in champs:
+        resultat[champ] = {}
+    for alias, (champ, valeur) in cles.items():
+        resultat[champ][valeur] = resultat.pop(alias)
+    return resultat
+
+
+def decaler_mois(jour, nombre):
+    """
+    Premier jour du mois situé nombre mois avant/après jour
+    """
+    index = jour.year * 12 + jour.month - 1 + nombre
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def periodes(nombre, periode='mois', fin=None):
+    """
+    Débuts des N dernières périodes calendaires, de la plus ancienne à la
+    période courante (incluse)
+    """
+    fin = fin or timezone.localdate()
+    if periode == 'mois':
+        courant = fin.replace(day=1)
+        return [decaler_mois(courant, -i) for i in range(nombre - 1, -1, -1)]
+    return [fin - timedelta(days=i) for i in range(nombre - 1, -1, -1)]
+
+
+def _champ(model, chemin):
+    for nom in chemin.split('__'):
+        champ = model._meta.get_field(nom)
+        model = champ.related_model or model
+    return champ
+
+
+def _borne(jour, est_datetime):
+    if not est_datetime:
+        return jour
+    borne = datetime.combine(jour, time.min)
+    return timezone.make_aware(borne) if settings.USE_TZ else borne
+
+
+def serie_temporelle(queryset, champ_date, nombre=6, periode='mois', fin=None, **mesures):
+    """
+    Série chronologique complétée par des zéros, en une requête GROUP BY
+
+    Args:
+        queryset: Lignes à agréger (déjà filtrées)
+        champ_date: Champ date/datetime (chemin de relation accepté)
+        nombre: Nombre de périodes, la période courante comprise
+        periode: 'mois' (mois calendaires) ou 'jour'
+        fin: Jour de référence (aujourd'hui par défaut)
+        **mesures: nom -> agrégat (défaut : nombre=Count('pk', distinct=True))
+
+    Returns:
+        list: [{'periode': date, <mesure>: valeur, ...}], plus ancienne d'abord
+
+    Usage:
+        serie_temporelle(Colis.objects.all(), 'date_creation', 6,
+                         valeur=Sum('prix_calcule'))
+    """
+    mesures = mesures or {'nombre': Count('pk', distinct=True)}
+    debuts = periodes(nombre, periode, fin)
+    if periode == 'mois':
+        borne_fin, tronquer = decaler_mois(debuts[-1], 1), TruncMonth
+    else:
+        borne_fin, tronquer = debuts[-1] + timedelta(days=1), TruncDay
+    est_datetime = isinstance(_champ(queryset.model, champ_date), DateTimeField)
+
+    lignes = queryset.filter(**{
+        f'{champ_date}__gte': _borne(debuts[0], est_datetime),
+        f'{champ_date}__lt': _borne(borne_fin, est_datetime),
+    }).annotate(
+        _periode=tronquer(champ_date, output_field=DateField())
+    ).order_by().values('_periode').annotate(**mesures)
+
+    par_periode = {ligne.pop('_periode'): ligne for ligne in lignes}
+    serie = []
+    for debut in debuts:
+        ligne = par_periode.get(debut, {})
+        serie.append({
+            'periode': debut,
+            **{nom: ligne.get(nom) or 0 for nom in mesures},
+        })
+    return serie
+
+
+def compter_requetes(view_func):
+    """
+    Décorateur de vue : expose le nombre de requêtes SQL exécutées
+    dans l'en-tête X-DB-Query-Count
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        nombre = 0
+
+        def compteur(execute, sql, params, many, context):
+            nonlocal nombre
+            nombre += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(compteur):
+            response = view_func(request, *args, **kwargs)
+        response['X-DB-Query-Count'] = str(nombre)
+        return response
+    return wrapper
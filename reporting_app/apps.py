@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ReportingAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reporting_app'
+
+    def ready(self):
+        # Import des signals (maintien de DailyStats)
+        from . import signals
+        # Vérification du cache partagé (check --deploy)
+        from . import checks
@@ -0,0 +1,35 @@
+"""
+Vérifications de déploiement (manage.py check --deploy)
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Caches propres à chaque processus : gunicorn et les workers Celery ne
+# partagent ni les statistiques du tableau de bord, ni les verrous
+CACHES_LOCAUX = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def verifier_cache_partage(app_configs, **kwargs):
+    """
+    En production, le cache par défaut doit être partagé (CACHE_REDIS_URL)
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in CACHES_LOCAUX:
+        return []
+    return [
+        Error(
+            "Le cache par défaut est local au processus.",
+            hint=(
+                "Définir CACHE_REDIS_URL : statistiques du tableau de bord et verrous "
+                "de génération des rapports doivent être partagés entre gunicorn et "
+                "les workers Celery."
+            ),
+            id='reporting_app.E001',
+        )
+    ]
@@ -0,0 +1,306 @@
+"""
+Maintenance de la table DailyStats (statistiques journalières pré-agrégées)
+
+Chaque source (colis, lots, transferts, dépenses) est décrite par un
+SourceStats : champ de date, dimensions et montants. Les signaux appliquent
+des deltas atomiques (UPDATE ... SET nombre = nombre + 1) sur la ligne du
+jour concernée ; reconstruire() recalcule des jours complets par GROUP BY.
+"""
+import logging
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyStats
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+DIMENSIONS = ('statut', 'type_transport', 'mode_paiement')
+
+
+class _Etat(dict):
+    """
+    Valeurs d'un état relevé, lisibles comme les attributs de l'instance
+    """
+
+    def __getattr__(self, nom):
+        try:
+            return self[nom]
+        except KeyError:
+            raise AttributeError(nom)
+
+
+class SourceStats:
+    """
+    Description d'une source agrégée dans DailyStats
+    """
+
+    def __init__(self, nom, model_label, champ_date, dimensions, montant, montant_secondaire=None):
+        self.nom = nom
+        self.model_label = model_label
+        self.champ_date = champ_date
+        # {'statut': 'statut', 'type_transport': 'type_lot', ...}
+        self.dimensions = dimensions
+        # (champ Python, expression SQL) ou nom de champ
+        self.montant = montant
+        self.montant_secondaire = montant_secondaire
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def attnames(self):
+        """
+        Colonnes lues par empreinte() (calculées une fois)
+        """
+        if not hasattr(self, '_attnames'):
+            champs = {self.champ_date, *self.dimensions.values()}
+            for montant in (self.montant, self.montant_secondaire):
+                if isinstance(montant, str):
+                    champs.add(montant)
+                elif montant is not None:
+                    champs.update(montant[2])
+            self._attnames = tuple(self.model._meta.get_field(nom).attname for nom in champs)
+        return self._attnames
+
+    def _jour(self, valeur):
+        if valeur is None:
+            return None
+        if hasattr(valeur, 'hour'):
+            return timezone.localdate(valeur) if timezone.is_aware(valeur) else valeur.date()
+        return valeur
+
+    def _valeur(self, instance, montant):
+        if montant is None:
+            return ZERO
+        if isinstance(montant, str):
+            valeur = getattr(instance, montant)
+        else:
+            valeur = montant[0](instance)
+        return Decimal(str(valeur)) if valeur is not None else ZERO
+
+    def _expression(self, montant):
+        if montant is None:
+            return Value(ZERO)
+        if isinstance(montant, str):
+            return F(montant)
+        return montant[1]()
+
+    def etat(self, instance):
+        """
+        Valeurs brutes des colonnes suivies (attnames), None si incomplètes
+
+        Relevé à chaque chargement d'instance : une simple lecture de __dict__,
+        l'empreinte n'est calculée qu'à la sauvegarde ou à la suppression.
+        """
+        valeurs = instance.__dict__
+        # Champs différés (only/defer) : état inconnu sans requête
+        if any(attname not in valeurs for attname in self.attnames):
+            return None
+        return tuple(valeurs[attname] for attname in self.attnames)
+
+    def empreinte(self, instance):
+        """
+        (clé, nombre, montant, montant_secondaire) de l'instance, None si incomplète
+        """
+        return self.empreinte_etat(self.etat(instance))
+
+    def empreinte_etat(self, etat):
+        """
+        Empreinte calculée depuis un état relevé par etat()
+        """
+        if etat is None:
+            return None
+        instance = _Etat(zip(self.attnames, etat))
+        jour = self._jour(getattr(instance, self.champ_date))
+        if jour is None:
+            return None
+        cle = (jour,) + tuple(
+            (getattr(instance, self.dimensions[dim]) or '') if dim in self.dimensions else ''
+            for dim in DIMENSIONS
+        )
+        return cle, self._valeur(instance, self.montant), self._valeur(instance, self.montant_secondaire)
+
+    def agregats(self, jours=None):
+        """
+        Lignes DailyStats recalculées depuis la table source (une requête GROUP BY)
+        """
+        qs = self.model.objects.order_by()
+        champ = self.model._meta.get_field(self.champ_date)
+        est_datetime = champ.get_internal_type() == 'DateTimeField'
+        if jours is not None:
+            lookup = f'{self.champ_date}__date__in' if est_datetime else f'{self.champ_date}__in'
+            qs = qs.filter(**{lookup: list(jours)})
+
+        jour_expr = TruncDate(self.champ_date) if est_datetime else F(self.champ_date)
+        qs = qs.annotate(
+            _jour=jour_expr,
+            **{f'_{dim}': F(champ) for dim, champ in self.dimensions.items()}
+        ).values('_jour', *[f'_{dim}' for dim in self.dimensions]).annotate(
+            _nombre=Count('pk'),
+            _montant=Coalesce(Sum(self._expression(self.montant)), Value(ZERO)),
+            _montant_secondaire=Coalesce(Sum(self._expression(self.montant_secondaire)), Value(ZERO)),
+        )
+
+        return [
+            DailyStats(
+                jour=row['_jour'],
+                source=self.nom,
+                statut=row.get('_statut') or '',
+                type_transport=row.get('_type_transport') or '',
+                mode_paiement=row.get('_mode_paiement') or '',
+                nombre=row['_nombre'],
+                montant=row['_montant'] or ZERO,
+                montant_secondaire=row['_montant_secondaire'] or ZERO,
+            )
+            for row in qs
+            if row['_jour'] is not None
+        ]
+
+
+def _prix_effectif(colis):
+    from agent_chine_app.models import Colis
+
+    return Colis.get_prix_effectif(colis)
+
+
+def _prix_effectif_expression():
+    from agent_chine_app.models import prix_effectif_expression
+
+    return prix_effectif_expression()
+
+
+SOURCES = {
+    'colis': SourceStats(
+        'colis', 'agent_chine_app.Colis', 'date_creation',
+        {'statut': 'statut', 'type_transport': 'type_transport', 'mode_paiement': 'mode_paiement'},
+        montant='prix_calcule',
+        montant_secondaire=(
+            _prix_effectif,
+            _prix_effectif_expression,
+            ('prix_calcule', 'prix_transport_manuel'),
+        ),
+    ),
+    'lot': SourceStats(
+        'lot', 'agent_chine_app.Lot', 'date_creation',
+        {'statut': 'statut', 'type_transport': 'type_lot'},
+        montant='prix_transport',
+        montant_secondaire='frais_douane',
+    ),
+    'transfert': SourceStats(
+        'transfert', 'admin_mali_app.TransfertArgent', 'date_initiation',
+        {'statut': 'statut', 'mode_paiement': 'methode_transfert'},
+        montant='montant_fcfa',
+        montant_secondaire='frais_transfert',
+    ),
+    'depense': SourceStats(
+        'depense', 'agent_mali_app.Depense', 'date_depense',
+        {'statut': 'type_depense'},
+        montant='montant',
+    ),
+}
+
+
+def appliquer_delta(source, cle, nombre, montant, montant_secondaire):
+    """
+    Ajoute un delta à la ligne (jour, source, statut, transport, paiement)
+    """
+    jour, statut, type_transport, mode_paiement = cle
+    ligne = DailyStats.objects.filter(
+        jour=jour, source=source, statut=statut,
+        type_transport=type_transport, mode_paiement=mode_paiement,
+    )
+    delta = {
+        'nombre': F('nombre') + nombre,
+        'montant': F('montant') + montant,
+        'montant_secondaire': F('montant_secondaire') + montant_secondaire,
+    }
+    with transaction.atomic():
+        if ligne.update(**delta):
+            return
+        try:
+            with transaction.atomic():
+                DailyStats.objects.create(
+                    jour=jour, source=source, statut=statut,
+                    type_transport=type_transport, mode_paiement=mode_paiement,
+                    nombre=nombre, montant=montant, montant_secondaire=montant_secondaire,
+                )
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre transaction
+            ligne.update(**delta)
+
+
+def reconstruire(sources=None, jours=None):
+    """
+    Recalcule les lignes DailyStats depuis les tables sources
+
+    Args:
+        sources: Noms des sources (toutes par défaut)
+        jours: Jours à recalculer (tout l'historique par défaut)
+
+    Returns:
+        dict: Nombre de lignes écrites par source
+    """
+    resultat = {}
+    for nom in sources or SOURCES.keys():
+        source = SOURCES[nom]
+        lignes = source.agregats(jours)
+        with transaction.atomic():
+            anciennes = DailyStats.objects.filter(source=nom)
+            if jours is not None:
+                anciennes = anciennes.filter(jour__in=list(jours))
+            anciennes.delete()
+            DailyStats.objects.bulk_create(lignes, batch_size=1000)
+        resultat[nom] = len(lignes)
+        logger.info(f"📊 DailyStats {nom}: {len(lignes)} lignes reconstruites")
+    return resultat
+
+
+def jours_concernes(source, queryset):
+    """
+    Jours distincts couverts par un queryset de la source
+    """
+    source = SOURCES[source]
+    champ = source.model._meta.get_field(source.champ_date)
+    if champ.get_internal_type() == 'DateTimeField':
+        valeurs = queryset.order_by().annotate(_jour=TruncDate(source.champ_date)).values_list('_jour', flat=True)
+    else:
+        valeurs = queryset.order_by().values_list(source.champ_date, flat=True)
+    return set(valeurs.distinct())
+
+
+@contextmanager
+def mise_a_jour_en_masse(source, queryset):
+    """
+    Encadre un queryset.update() (qui ne déclenche pas les signaux) :
+    les jours touchés sont relevés avant la mise à jour puis reconstruits
+
+    Usage:
+        with mise_a_jour_en_masse('colis', lot.colis.all()):
+            lot.colis.update(statut='en_transit')
+    """
+    jours = jours_concernes(source, queryset)
+    yield
+    if jours:
+        transaction.on_commit(lambda: reconstruire([source], jours))
+
+
+def total(champ='nombre', **filtres):
+    """
+    Agrégat de lecture sur DailyStats (0 si aucune ligne)
+
+    Usage:
+        DailyStats.objects.filter(source='colis').aggregate(
+            livres=total(statut='livre'),
+            valeur_livres=total('montant', statut='livre'),
+        )
+    """
+    defaut = Value(0) if champ == 'nombre' else Value(ZERO)
+    return Coalesce(Sum(champ, filter=Q(**filtres) if filtres else None), defaut)
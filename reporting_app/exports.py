@@ -0,0 +1,165 @@
+"""
+Moteur d'export Excel en flux (xlsxwriter, mode constant_memory)
+
+Les lignes sont écrites au fil de l'itération des querysets : seule la ligne
+courante de chaque feuille reste en mémoire, le classeur est assemblé dans un
+fichier temporaire puis renvoyé par morceaux (FileResponse).
+
+Usage:
+    export = ExportXlsx()
+    feuille = export.feuille('Colis', COLONNES, titre='RAPPORT CARGO')
+    feuille.ajouter_lignes(lignes_depuis_queryset(...))
+    return export.reponse('rapport_cargo.xlsx')
+"""
+import logging
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime
+
+import xlsxwriter
+from django.http import FileResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_CHUNK_SIZE = 2000
+
+# format : 'texte', 'entier' (#,##0), 'decimal' (#,##0.00) ou 'date' (jj/mm/aaaa)
+Colonne = namedtuple('Colonne', ['titre', 'format', 'largeur'], defaults=['texte', 15])
+
+BORDURE = {'border': 1, 'border_color': '#E2E8F0'}
+FORMATS = {
+    'texte': {'font_name': 'Arial', 'font_size': 10, **BORDURE},
+    'entier': {'font_name': 'Arial', 'font_size': 10, 'bold': True, 'num_format': '#,##0', 'align': 'right', **BORDURE},
+    'decimal': {'font_name': 'Arial', 'font_size': 10, 'bold': True, 'num_format': '#,##0.00', 'align': 'right', **BORDURE},
+    'date': {'font_name': 'Arial', 'font_size': 10, 'num_format': 'dd/mm/yyyy', **BORDURE},
+}
+FORMAT_ENTETE = {
+    'font_name': 'Arial', 'font_size': 12, 'bold': True,
+    'font_color': '#2D3748', 'bg_color': '#F7FAFC', **BORDURE,
+}
+FORMAT_TITRE = {
+    'font_name': 'Arial', 'font_size': 16, 'bold': True, 'font_color': '#FFFFFF',
+    'align': 'center', 'valign': 'vcenter',
+}
+
+
+def lignes_depuis_queryset(queryset, transformer, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Itère un queryset (idéalement values()) par blocs et transforme chaque
+    ligne en liste de cellules
+    """
+    for ligne in queryset.iterator(chunk_size=chunk_size):
+        yield transformer(ligne)
+
+
+def _valeur(valeur):
+    if isinstance(valeur, datetime):
+        valeur = timezone.localtime(valeur) if timezone.is_aware(valeur) else valeur
+        return valeur.date()
+    if valeur is None:
+        return ''
+    if hasattr(valeur, 'as_tuple'):  # Decimal
+        return float(valeur)
+    return valeur
+
+
+class FeuilleXlsx:
+    """
+    Feuille écrite ligne par ligne (les lignes ne peuvent qu'avancer)
+    """
+
+    def __init__(self, export, worksheet, colonnes):
+        self.export = export
+        self.worksheet = worksheet
+        self.colonnes = colonnes
+        self.ligne = 0
+        self.formats = [export.format(FORMATS[colonne.format]) for colonne in colonnes]
+        for index, colonne in enumerate(colonnes):
+            worksheet.set_column(index, index, colonne.largeur)
+
+    def titre(self, texte, couleur='#FF6B35', largeur=None):
+        """
+        Bandeau de titre fusionné sur la première ligne
+        """
+        fin = (largeur or len(self.colonnes)) - 1
+        fmt = self.export.format({**FORMAT_TITRE, 'bg_color': couleur})
+        if fin > 0:
+            self.worksheet.merge_range(self.ligne, 0, self.ligne, fin, texte, fmt)
+        else:
+            self.worksheet.write(self.ligne, 0, texte, fmt)
+        self.ligne += 2
+
+    def entete(self, titres=None):
+        fmt = self.export.format(FORMAT_ENTETE)
+        titres = titres or [colonne.titre for colonne in self.colonnes]
+        self.worksheet.write_row(self.ligne, 0, titres, fmt)
+        self.ligne += 1
+
+    def ajouter(self, cellules):
+        for index, valeur in enumerate(cellules):
+            fmt = self.formats[index] if index < len(self.formats) else None
+            valeur = _valeur(valeur)
+            if isinstance(valeur, date):
+                self.worksheet.write_datetime(self.ligne, index, valeur, fmt)
+            else:
+                self.worksheet.write(self.ligne, index, valeur, fmt)
+        self.ligne += 1
+
+    def ajouter_lignes(self, lignes):
+        nombre = 0
+        for cellules in lignes:
+            self.ajouter(cellules)
+            nombre += 1
+        return nombre
+
+
+class ExportXlsx:
+    """
+    Classeur xlsxwriter en mode constant_memory, écrit dans un fichier temporaire
+    """
+
+    def __init__(self, fichier=None):
+        # TemporaryFile : supprimé automatiquement à la fermeture de la réponse
+        self.fichier = fichier or tempfile.TemporaryFile(suffix='.xlsx')
+        self.workbook = xlsxwriter.Workbook(self.fichier, {
+            'constant_memory': True,
+            'tmpdir': tempfile.gettempdir(),
+            'default_date_format': 'dd/mm/yyyy',
+        })
+        self._formats = {}
+
+    def format(self, proprietes):
+        cle = tuple(sorted(proprietes.items()))
+        if cle not in self._formats:
+            self._formats[cle] = self.workbook.add_format(proprietes)
+        return self._formats[cle]
+
+    def feuille(self, nom, colonnes, titre=None, couleur='#FF6B35', entete=True):
+        """
+        Ajoute une feuille ; écrit le bandeau de titre et la ligne d'en-tête
+        """
+        feuille = FeuilleXlsx(self, self.workbook.add_worksheet(nom[:31]), colonnes)
+        if titre:
+            feuille.titre(titre, couleur)
+        if entete:
+            feuille.entete()
+        return feuille
+
+    def fermer(self):
+        self.workbook.close()
+        self.fichier.seek(0)
+        return self.fichier
+
+    def reponse(self, nom_fichier):
+        """
+        Ferme le classeur et le renvoie en flux (StreamingHttpResponse)
+        """
+        fichier = self.fermer()
+        return FileResponse(
+            fichier,
+            as_attachment=True,
+            filename=nom_fichier,
+            content_type=XLSX_CONTENT_TYPE,
+        )
@@ -0,0 +1,248 @@
+"""
+Benchmark des index Colis / Lot / Livraison / Dépense
+Usage: python manage.py benchmark_query_indexes [--colis 1000000] [--clients 20000] [--lots 2000]
+
+Génère un jeu de données synthétique dans une transaction annulée à la fin
+(rien n'est conservé), puis affiche pour chaque requête chaude des vues le
+plan EXPLAIN et le temps d'exécution, sans puis avec les index déclarés dans
+Meta.indexes.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from agent_chine_app.models import Client, Colis, Lot
+from agent_mali_app.models import Depense, Livraison
+
+MODELES_INDEXES = (Colis, Lot, Livraison, Depense)
+TAILLE_LOT = 5000
+
+# Répartition réaliste : la plupart des colis sont livrés
+POIDS_STATUTS_COLIS = {
+    'livre': 70, 'arrive': 8, 'en_transit': 8, 'receptionne_chine': 10, 'en_attente': 3, 'perdu': 1,
+}
+POIDS_STATUTS_LOT = {'livre': 70, 'arrive': 8, 'en_transit': 8, 'expedie': 4, 'ferme': 5, 'ouvert': 5}
+
+
+@contextmanager
+def _dates_libres(*modeles):
+    """
+    Désactive auto_now_add le temps du chargement pour étaler les dates
+    """
+    champs = [modele._meta.get_field('date_creation') for modele in modeles]
+    for champ in champs:
+        champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ in champs:
+            champ.auto_now_add = True
+
+
+def _tirage(rng, poids):
+    return rng.choices(list(poids), weights=list(poids.values()))[0]
+
+
+class Command(BaseCommand):
+    help = "Compare les plans EXPLAIN des requêtes chaudes sans / avec les index (jeu synthétique, annulé)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colis', type=int, default=1000000, help='Colis générés (défaut: 1000000)')
+        parser.add_argument('--clients', type=int, default=20000, help='Clients générés (défaut: 20000)')
+        parser.add_argument('--lots', type=int, default=2000, help='Lots générés (défaut: 2000)')
+        parser.add_argument('--repetitions', type=int, default=3, help='Exécutions par requête (défaut: 3)')
+
+    def handle(self, *args, **options):
+        self.stdout.write("⏱️  BENCHMARK INDEX COLIS / LOT / LIVRAISON / DÉPENSE")
+        self.stdout.write("=" * 60)
+
+        with transaction.atomic():
+            debut = time.monotonic()
+            contexte = self._generer(options)
+            self.stdout.write(f"📦 Jeu de données généré en {time.monotonic() - debut:.1f}s")
+            self.stdout.write()
+
+            requetes = self._requetes(contexte)
+            self._modifier_index('remove')
+            sans_index = self._mesurer(requetes, options['repetitions'])
+            self._modifier_index('create')
+            avec_index = self._mesurer(requetes, options['repetitions'])
+
+            for libelle in requetes:
+                plan_avant, duree_avant = sans_index[libelle]
+                plan_apres, duree_apres = avec_index[libelle]
+                self.stdout.write(f"📊 {libelle}")
+                self.stdout.write(f"   Sans index : {duree_avant * 1000:9.1f} ms")
+                for ligne in plan_avant.splitlines():
+                    self.stdout.write(f"      {ligne}")
+                self.stdout.write(f"   Avec index : {duree_apres * 1000:9.1f} ms")
+                for ligne in plan_apres.splitlines():
+                    self.stdout.write(f"      {ligne}")
+                self.stdout.write()
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark terminé (données synthétiques annulées)'))
+
+    def _generer(self, options):
+        rng = random.Random(42)
+        User = get_user_model()
+        maintenant = timezone.now()
+        etendue = timedelta(days=3 * 365)
+
+        agents = User.objects.bulk_create([
+            User(telephone=f'+2239900{i:04d}', password='!', is_agent_mali=True)
+            for i in range(20)
+        ])
+        users = User.objects.bulk_create(
+            [
+                User(telephone=f'+2268{i:08d}', password='!')
+                for i in range(options['clients'])
+            ],
+            batch_size=TAILLE_LOT,
+        )
+
+        with _dates_libres(Client, Lot, Colis, Livraison, Depense):
+            clients = Client.objects.bulk_create(
+                [Client(user=user, adresse='Bamako', date_creation=maintenant) for user in users],
+                batch_size=TAILLE_LOT,
+            )
+            lots = Lot.objects.bulk_create(
+                [
+                    Lot(
+                        numero_lot=f'BENCH-{i:08d}',
+                        type_lot=rng.choice(['cargo', 'express', 'bateau']),
+                        statut=_tirage(rng, POIDS_STATUTS_LOT),
+                        date_creation=maintenant - etendue * (1 - i / options['lots']),
+                        date_expedition=maintenant - etendue * (1 - i / options['lots']) + timedelta(days=3),
+                    )
+                    for i in range(options['lots'])
+                ],
+                batch_size=TAILLE_LOT,
+            )
+
+            colis_livres = []
+            for debut_lot in range(0, options['colis'], TAILLE_LOT):
+                lot_colis = []
+                for i in range(debut_lot, min(debut_lot + TAILLE_LOT, options['colis'])):
+                    position = i / options['colis']
+                    statut = _tirage(rng, POIDS_STATUTS_COLIS)
+                    lot_colis.append(Colis(
+                        numero_suivi=f'BN{i:010d}',
+                        client=rng.choice(clients),
+                        lot=lots[min(int(position * len(lots)), len(lots) - 1)],
+                        type_transport=rng.choice(['cargo', 'express', 'bateau']),
+                        longueur=30, largeur=20, hauteur=10,
+                        poids=rng.randint(1, 40),
+                        prix_calcule=rng.randint(5000, 200000),
+                        mode_paiement=rng.choice(['paye_chine', 'paye_mali', 'non_paye']),
+                        statut=statut,
+                        date_creation=maintenant - etendue * (1 - position),
+                    ))
+                Colis.objects.bulk_create(lot_colis)
+                colis_livres.extend(colis for colis in lot_colis if colis.statut == 'livre' and rng.random() < 0.3)
+
+            for debut_lot in range(0, len(colis_livres), TAILLE_LOT):
+                Livraison.objects.bulk_create([
+                    Livraison(
+                        colis=colis,
+                        agent_livreur=rng.choice(agents),
+                        date_planifiee=colis.date_creation + timedelta(days=20),
+                        date_livraison_effective=colis.date_creation + timedelta(days=21),
+                        statut='livree',
+                        statut_paiement='paye' if rng.random() < 0.9 else 'en_attente',
+                        adresse_livraison='Bamako',
+                        telephone_destinataire='+22370000000',
+                        nom_destinataire='Bench',
+                        date_creation=colis.date_creation,
+                    )
+                    for colis in colis_livres[debut_lot:debut_lot + TAILLE_LOT]
+                ])
+
+            Depense.objects.bulk_create(
+                [
+                    Depense(
+                        libelle='Bench',
+                        type_depense='transport',
+                        montant=rng.randint(1000, 100000),
+                        date_depense=(maintenant - etendue * rng.random()).date(),
+                        agent=rng.choice(agents),
+                        date_creation=maintenant,
+                    )
+                    for _ in range(max(options['colis'] // 20, 1))
+                ],
+                batch_size=TAILLE_LOT,
+            )
+
+        return {
+            'lot': lots[len(lots) // 2],
+            'client': clients[len(clients) // 2],
+            'agent': agents[0],
+            'depuis': maintenant - timedelta(days=30),
+        }
+
+    def _requetes(self, contexte):
+        depuis = contexte['depuis']
+        return {
+            'Colis par statut, plus récents (listes)':
+                Colis.objects.filter(statut='arrive').order_by('-date_creation')[:50],
+            'Colis récents, sans filtre (listes paginées)':
+                Colis.objects.order_by('-date_creation')[:50],
+            "Colis d'un lot à réceptionner (recevoir_lot_view)":
+                Colis.objects.filter(lot=contexte['lot']).exclude(statut='arrive'),
+            "Colis d'un lot par statut (compteurs des vues lot)":
+                Colis.objects.filter(lot=contexte['lot'], statut='arrive').order_by(),
+            "Colis d'un client, plus récents":
+                Colis.objects.filter(client=contexte['client']).order_by('-date_creation')[:50],
+            'Colis express, plus récents (filtre de liste)':
+                Colis.objects.filter(type_transport='express').order_by('-date_creation')[:50],
+            'Colis payés au Mali, plus récents (filtre de liste)':
+                Colis.objects.filter(mode_paiement='paye_mali').order_by('-date_creation')[:50],
+            'Colis créés depuis 30 jours':
+                Colis.objects.filter(date_creation__gte=depuis),
+            'Lots reçus, dernières expéditions (dashboard Mali)':
+                Lot.objects.filter(statut__in=['arrive', 'en_transit', 'expedie']).order_by('-date_expedition')[:5],
+            'Lots ouverts, plus récents':
+                Lot.objects.filter(statut='ouvert').order_by('-date_creation'),
+            'Livraisons effectuées depuis 30 jours':
+                Livraison.objects.filter(statut='livree', date_livraison_effective__gte=depuis),
+            'Livraisons en attente de paiement':
+                Livraison.objects.filter(statut_paiement='en_attente', statut='livree'),
+            "Dépenses d'un agent, plus récentes":
+                Depense.objects.filter(agent=contexte['agent']).order_by('-date_depense')[:50],
+        }
+
+    def _modifier_index(self, operation):
+        editeur = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for modele in MODELES_INDEXES:
+                for index in modele._meta.indexes:
+                    if operation == 'create':
+                        sql = str(index.create_sql(modele, editeur))
+                    else:
+                        sql = editeur.sql_delete_index % {
+                            'table': editeur.quote_name(modele._meta.db_table),
+                            'name': editeur.quote_name(index.name),
+                        }
+                    cursor.execute(sql)
+            cursor.execute('ANALYZE')
+
+    def _mesurer(self, requetes, repetitions):
+        resultats = {}
+        for libelle, queryset in requetes.items():
+            plan = queryset.explain()
+            meilleur = None
+            for _ in range(max(repetitions, 1)):
+                debut = time.perf_counter()
+                list(queryset.values_list('pk', flat=True))
+                duree = time.perf_counter() - debut
+                meilleur = duree if meilleur is None else min(meilleur, duree)
+            resultats[libelle] = (plan, meilleur)
+        return resultats
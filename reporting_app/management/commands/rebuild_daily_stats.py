@@ -0,0 +1,45 @@
+"""
+Commande Django de reconstruction complète de la table DailyStats
+Usage: python manage.py rebuild_daily_stats [--source colis] [--depuis YYYY-MM-DD]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime, timedelta
+from django.utils import timezone
+
+from reporting_app.daily_stats import SOURCES, reconstruire
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les statistiques journalières pré-agrégées (DailyStats) depuis les tables sources'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            action='append',
+            choices=list(SOURCES.keys()),
+            help='Source à reconstruire (répétable). Par défaut: toutes',
+        )
+        parser.add_argument(
+            '--depuis',
+            type=str,
+            help='Ne reconstruire que les jours à partir de cette date (format YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        jours = None
+        if options['depuis']:
+            try:
+                debut = datetime.strptime(options['depuis'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide. Utilisez YYYY-MM-DD')
+            aujourd_hui = timezone.localdate()
+            if debut > aujourd_hui:
+                raise CommandError('La date de début est dans le futur')
+            jours = [debut + timedelta(days=i) for i in range((aujourd_hui - debut).days + 1)]
+
+        resultat = reconstruire(options['source'], jours)
+
+        for source, lignes in resultat.items():
+            self.stdout.write(f"📊 {source}: {lignes} lignes")
+        self.stdout.write(self.style.SUCCESS('✅ Statistiques journalières reconstruites'))
@@ -0,0 +1,37 @@
+"""
+Commande Django de reconstruction de l'index de recherche (SearchDocument)
+Usage: python manage.py rebuild_search_index [--type colis] [--si-vide]
+"""
+
+from django.core.management.base import BaseCommand
+
+from reporting_app.models import SearchDocument
+from reporting_app.search import CHAMPS, reconstruire
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les documents de recherche des colis et des clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            choices=list(CHAMPS.keys()),
+            help='Type de document à reconstruire (répétable). Par défaut: tous',
+        )
+        parser.add_argument(
+            '--si-vide',
+            action='store_true',
+            help="Ne rien faire si l'index contient déjà des documents (déploiement)",
+        )
+
+    def handle(self, *args, **options):
+        if options['si_vide'] and SearchDocument.objects.exists():
+            self.stdout.write("ℹ️ Index de recherche déjà construit")
+            return
+
+        resultat = reconstruire(options['type'])
+
+        for type_document, documents in resultat.items():
+            self.stdout.write(f"🔎 {type_document}: {documents} documents")
+        self.stdout.write(self.style.SUCCESS('✅ Index de recherche reconstruit'))
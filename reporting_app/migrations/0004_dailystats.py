@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_app', '0003_add_tarifs_piece'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(help_text='Jour de référence (création du colis/lot, initiation du transfert, date de la dépense)')),
+                ('source', models.CharField(choices=[('colis', 'Colis'), ('lot', 'Lots'), ('transfert', "Transferts d'argent"), ('depense', 'Dépenses')], max_length=20)),
+                ('statut', models.CharField(blank=True, help_text="Statut de l'objet (type de dépense pour les dépenses)", max_length=30)),
+                ('type_transport', models.CharField(blank=True, help_text='Type de transport (colis, lots)', max_length=20)),
+                ('mode_paiement', models.CharField(blank=True, help_text='Mode de paiement (colis) ou méthode de transfert', max_length=30)),
+                ('nombre', models.IntegerField(default=0, help_text="Nombre d'objets")),
+                ('montant', models.DecimalField(decimal_places=2, default=0, help_text='Prix calculé (colis), prix transport (lots), montant FCFA (transferts), montant (dépenses)', max_digits=16)),
+                ('montant_secondaire', models.DecimalField(decimal_places=2, default=0, help_text='Prix effectif (colis), frais de douane (lots), frais de transfert (transferts)', max_digits=16)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Statistique Journalière',
+                'verbose_name_plural': 'Statistiques Journalières',
+                'ordering': ['-jour'],
+                'indexes': [models.Index(fields=['source', 'jour'], name='reporting_a_source_1c680a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('jour', 'source', 'statut', 'type_transport', 'mode_paiement'), name='unique_daily_stats_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_app', '0004_dailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapportoperationnel',
+            name='empreinte_donnees',
+            field=models.CharField(blank=True, default='', help_text='Empreinte des données sources au moment de la génération', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='rapportoperationnel',
+            name='periode_cle',
+            field=models.CharField(blank=True, default='', help_text='Période demandée (YYYY-MM-DD, YYYY-MM ou YYYY)', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='rapportoperationnel',
+            name='type_rapport',
+            field=models.CharField(choices=[('journalier', 'Rapport Journalier'), ('hebdomadaire', 'Rapport Hebdomadaire'), ('mensuel', 'Rapport Mensuel'), ('annuel', 'Rapport Annuel'), ('financier', 'Rapport Financier'), ('synthese', 'Rapport de Synthèse')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='rapportoperationnel',
+            index=models.Index(fields=['type_rapport', 'periode_cle', 'empreinte_donnees'], name='rapport_artefact_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:09
+
+from django.db import OperationalError, migrations, models
+
+TABLE = 'reporting_app_searchdocument'
+
+# SQLite : index FTS5 (tokenizer trigram, SQLite >= 3.34) synchronisé par triggers.
+# Attention : une migration qui reconstruit la table (ALTER sous SQLite)
+# supprime les triggers, à recréer dans la même migration.
+SQL_SQLITE = [
+    f"CREATE VIRTUAL TABLE {TABLE}_fts USING fts5(contenu, content='{TABLE}', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER {TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {TABLE}_fts(rowid, contenu) VALUES (new.id, new.contenu); END",
+    f"CREATE TRIGGER {TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, contenu) VALUES ('delete', old.id, old.contenu); END",
+    f"CREATE TRIGGER {TABLE}_au AFTER UPDATE ON {TABLE} BEGIN "
+    f"INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, contenu) VALUES ('delete', old.id, old.contenu); "
+    f"INSERT INTO {TABLE}_fts(rowid, contenu) VALUES (new.id, new.contenu); END",
+]
+SQL_SQLITE_RETOUR = [
+    f"DROP TRIGGER IF EXISTS {TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {TABLE}_ai",
+    f"DROP TABLE IF EXISTS {TABLE}_fts",
+]
+
+# PostgreSQL : index GIN trigrammes (LIKE '%...%' indexé, similarité)
+SQL_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX {TABLE}_contenu_trgm ON {TABLE} USING gin (contenu gin_trgm_ops)",
+]
+SQL_POSTGRESQL_RETOUR = [
+    f"DROP INDEX IF EXISTS {TABLE}_contenu_trgm",
+]
+
+
+def creer_index_recherche(apps, schema_editor):
+    """
+    Index plein texte selon le moteur (sans index : recherche par LIKE)
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in SQL_POSTGRESQL:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(SQL_SQLITE[0])
+        except OperationalError:
+            # FTS5 ou tokenizer trigram indisponible
+            return
+        for sql in SQL_SQLITE[1:]:
+            schema_editor.execute(sql)
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in SQL_POSTGRESQL_RETOUR:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        for sql in SQL_SQLITE_RETOUR:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting_app', '0005_rapport_artefacts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_document', models.CharField(choices=[('colis', 'Colis'), ('client', 'Client')], max_length=10)),
+                ('objet_id', models.BigIntegerField(help_text='Identifiant du colis ou du client')),
+                ('client_id', models.BigIntegerField(blank=True, help_text="Client propriétaire (recherche limitée aux colis d'un client)", null=True)),
+                ('contenu', models.TextField(help_text='Texte normalisé (minuscules, sans accents) des champs recherchables')),
+                ('date_creation', models.DateTimeField(help_text="Date de création de l'objet (départage des résultats)")),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+                'indexes': [models.Index(fields=['type_document', 'client_id'], name='reporting_a_type_do_57e6ba_idx')],
+                'constraints': [models.UniqueConstraint(fields=('type_document', 'objet_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
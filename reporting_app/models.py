@@ -224,6 +224,7 @@ class RapportOperationnel(models.Model):
         ('journalier', 'Rapport Journalier'),
         ('hebdomadaire', 'Rapport Hebdomadaire'),
         ('mensuel', 'Rapport Mensuel'),
+        ('annuel', 'Rapport Annuel'),
         ('financier', 'Rapport Financier'),
         ('synthese', 'Rapport de Synthèse'),
     ]
@@ -269,12 +270,159 @@ class RapportOperationnel(models.Model):
         help_text="Rapport envoyé aux administrateurs"
     )
     
+    periode_cle = models.CharField(
+        max_length=10,
+        blank=True,
+        default='',
+        help_text="Période demandée (YYYY-MM-DD, YYYY-MM ou YYYY)"
+    )
+    
+    empreinte_donnees = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="Empreinte des données sources au moment de la génération"
+    )
+    
     date_generation = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = "Rapport Opérationnel"
         verbose_name_plural = "Rapports Opérationnels"
         ordering = ['-date_generation']
+        indexes = [
+            models.Index(fields=['type_rapport', 'periode_cle', 'empreinte_donnees'], name='rapport_artefact_idx'),
+        ]
         
     def __str__(self):
         return f"{self.titre} - {self.periode_debut} à {self.periode_fin}"
+
+
+class DailyStats(models.Model):
+    """
+    Statistiques journalières pré-agrégées alimentant les tableaux de bord
+    Une ligne par jour × source × statut × transport × mode de paiement,
+    maintenue par signaux et reconstructible (commande rebuild_daily_stats)
+    """
+    SOURCE_CHOICES = [
+        ('colis', 'Colis'),
+        ('lot', 'Lots'),
+        ('transfert', "Transferts d'argent"),
+        ('depense', 'Dépenses'),
+    ]
+    
+    jour = models.DateField(
+        help_text="Jour de référence (création du colis/lot, initiation du transfert, date de la dépense)"
+    )
+    
+    source = models.CharField(
+        max_length=20,
+        choices=SOURCE_CHOICES
+    )
+    
+    statut = models.CharField(
+        max_length=30,
+        blank=True,
+        help_text="Statut de l'objet (type de dépense pour les dépenses)"
+    )
+    
+    type_transport = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="Type de transport (colis, lots)"
+    )
+    
+    mode_paiement = models.CharField(
+        max_length=30,
+        blank=True,
+        help_text="Mode de paiement (colis) ou méthode de transfert"
+    )
+    
+    nombre = models.IntegerField(
+        default=0,
+        help_text="Nombre d'objets"
+    )
+    
+    montant = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        help_text="Prix calculé (colis), prix transport (lots), montant FCFA (transferts), montant (dépenses)"
+    )
+    
+    montant_secondaire = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        help_text="Prix effectif (colis), frais de douane (lots), frais de transfert (transferts)"
+    )
+    
+    date_modification = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Statistique Journalière"
+        verbose_name_plural = "Statistiques Journalières"
+        ordering = ['-jour']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['jour', 'source', 'statut', 'type_transport', 'mode_paiement'],
+                name='unique_daily_stats_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['source', 'jour']),
+        ]
+        
+    def __str__(self):
+        return f"{self.jour} {self.source} {self.statut} - {self.nombre}"
+
+
+class SearchDocument(models.Model):
+    """
+    Document de recherche dénormalisé (un par colis / client)
+    Texte normalisé indexé en trigrammes (pg_trgm ou FTS5), maintenu par
+    signaux et reconstructible (commande rebuild_search_index)
+    """
+    TYPE_CHOICES = [
+        ('colis', 'Colis'),
+        ('client', 'Client'),
+    ]
+    
+    type_document = models.CharField(
+        max_length=10,
+        choices=TYPE_CHOICES
+    )
+    
+    objet_id = models.BigIntegerField(
+        help_text="Identifiant du colis ou du client"
+    )
+    
+    client_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Client propriétaire (recherche limitée aux colis d'un client)"
+    )
+    
+    contenu = models.TextField(
+        help_text="Texte normalisé (minuscules, sans accents) des champs recherchables"
+    )
+    
+    date_creation = models.DateTimeField(
+        help_text="Date de création de l'objet (départage des résultats)"
+    )
+    
+    class Meta:
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['type_document', 'objet_id'],
+                name='unique_search_document'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['type_document', 'client_id']),
+        ]
+        
+    def __str__(self):
+        return f"{self.type_document} #{self.objet_id}"
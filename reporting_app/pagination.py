@@ -0,0 +1,238 @@
+"""
+Pagination par curseur (keyset) des grandes listes
+
+Paginator + get_page exécute un COUNT(*) puis un OFFSET qui parcourt toutes
+les lignes des pages précédentes. KeysetPaginator repart de la dernière ligne
+affichée : WHERE (champ, id) < (valeur, id) ORDER BY champ, id LIMIT n+1,
+servi par les index (champ) / (…, champ) quelle que soit la profondeur.
+
+- Tri sur un champ (par défaut '-date_creation'), départagé par l'id dans le
+  même sens ; un champ nullable place les NULL en fin de liste.
+- Le curseur est opaque (base64 d'un JSON [champ, sens, valeur, id]) ; un
+  curseur invalide ou d'un autre tri renvoie la première page.
+- Le total est optionnel : compter='exact' (COUNT), 'estime' (COUNT plafonné
+  à PLAFOND_COMPTE puis estimation du planificateur sous PostgreSQL) ou None.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F, Q
+
+ANNOTATION = 'cle_pagination'
+CURSEUR_FIN = 'fin'
+PLAFOND_COMPTE = 10000
+# Valeurs de sens dans le curseur : page suivante / page précédente
+APRES, AVANT = 'a', 'b'
+
+
+def _encoder(valeur):
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    return valeur
+
+
+class KeysetPage:
+    """
+    Page de résultats ; s'utilise comme une Page de Django dans les templates
+    (itération, has_next, has_previous, has_other_pages)
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return self.paginator.curseur(self.object_list[-1], APRES)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return self.paginator.curseur(self.object_list[0], AVANT)
+
+    @property
+    def last_cursor(self):
+        return CURSEUR_FIN if self.has_next_page else None
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+    @property
+    def count_is_approximate(self):
+        return self.paginator.count_is_approximate
+
+
+class KeysetPaginator:
+    """
+    Pagination par curseur d'un queryset
+
+    Args:
+        queryset: Lignes à paginer (son order_by est remplacé)
+        per_page: Lignes par page
+        ordering: Champ de tri, préfixé de '-' pour l'ordre décroissant ;
+            un chemin de relation est accepté ('user__first_name')
+        compter: None, 'exact' ou 'estime' (voir count)
+    """
+
+    def __init__(self, queryset, per_page, ordering='-date_creation', compter=None):
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.champ = ordering.lstrip('-')
+        self.descendant = ordering.startswith('-')
+        self.compter = compter
+        self.queryset = queryset
+        self._annote = queryset.annotate(**{ANNOTATION: F(self.champ)})
+        self.output_field = self._annote.query.annotations[ANNOTATION].output_field
+        self._count = None
+        self.count_is_approximate = False
+
+    # Curseurs
+
+    def curseur(self, objet, sens):
+        """
+        Curseur opaque positionné sur un objet de la page
+        """
+        valeur = getattr(objet, ANNOTATION)
+        contenu = json.dumps([self.ordering, sens, _encoder(valeur), objet.pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(contenu.encode()).decode().rstrip('=')
+
+    def _decoder(self, curseur):
+        try:
+            contenu = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+            ordering, sens, valeur, pk = json.loads(contenu)
+            if ordering != self.ordering or sens not in (APRES, AVANT):
+                return None
+            if valeur is not None:
+                valeur = self.output_field.to_python(valeur)
+            return sens, valeur, int(pk)
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    # Requêtes
+
+    def _ordre(self, inverse=False):
+        descendant = self.descendant != inverse
+        # NULLS FIRST/LAST seulement si nécessaire : sans, l'index reste utilisable
+        nulls = {}
+        if self.output_field.null:
+            nulls = {'nulls_first': True} if inverse else {'nulls_last': True}
+        cle = F(ANNOTATION).desc(**nulls) if descendant else F(ANNOTATION).asc(**nulls)
+        return [cle, '-pk' if descendant else 'pk']
+
+    def _condition(self, sens, valeur, pk):
+        # Plus loin dans l'ordre de lecture pour APRES, plus près pour AVANT
+        plus_loin = (sens == APRES) == self.descendant
+        comparaison = 'lt' if plus_loin else 'gt'
+
+        if valeur is None:
+            condition = Q(**{f'{ANNOTATION}__isnull': True, f'pk__{comparaison}': pk})
+            if sens == AVANT:
+                condition |= Q(**{f'{ANNOTATION}__isnull': False})
+            return condition
+
+        # Borne large redondante : donne une plage d'index au planificateur
+        condition = Q(**{f'{ANNOTATION}__{comparaison}e': valeur}) & (
+            Q(**{f'{ANNOTATION}__{comparaison}': valeur}) | Q(**{ANNOTATION: valeur, f'pk__{comparaison}': pk})
+        )
+        if self.output_field.null and sens == APRES:
+            condition |= Q(**{f'{ANNOTATION}__isnull': True})
+        return condition
+
+    def get_page(self, curseur=None):
+        """
+        Page désignée par un curseur (None : première page, CURSEUR_FIN : dernière)
+
+        Returns:
+            KeysetPage
+        """
+        position = None
+        if curseur == CURSEUR_FIN:
+            lignes = list(self._annote.order_by(*self._ordre(inverse=True))[:self.per_page + 1])
+            return self._page_inverse(lignes, a_suivante=False)
+        if curseur:
+            position = self._decoder(curseur)
+
+        if position is None:
+            lignes = list(self._annote.order_by(*self._ordre())[:self.per_page + 1])
+            return KeysetPage(lignes[:self.per_page], self, len(lignes) > self.per_page, False)
+
+        sens, valeur, pk = position
+        if sens == APRES:
+            qs = self._annote.filter(self._condition(sens, valeur, pk)).order_by(*self._ordre())
+            lignes = list(qs[:self.per_page + 1])
+            return KeysetPage(lignes[:self.per_page], self, len(lignes) > self.per_page, True)
+
+        qs = self._annote.filter(self._condition(sens, valeur, pk)).order_by(*self._ordre(inverse=True))
+        return self._page_inverse(list(qs[:self.per_page + 1]), a_suivante=True)
+
+    def _page_inverse(self, lignes, a_suivante):
+        a_precedente = len(lignes) > self.per_page
+        return KeysetPage(list(reversed(lignes[:self.per_page])), self, a_suivante, a_precedente)
+
+    # Total
+
+    @property
+    def count(self):
+        """
+        Nombre de lignes (None si compter=None)
+
+        'estime' compte au plus PLAFOND_COMPTE lignes ; au-delà, estimation du
+        planificateur PostgreSQL ou le plafond (count_is_approximate=True).
+        """
+        if self.compter is None:
+            return None
+        if self._count is None:
+            qs = self.queryset.order_by()
+            if self.compter == 'exact':
+                self._count = qs.count()
+            else:
+                self._count = qs[:PLAFOND_COMPTE].count()
+                if self._count >= PLAFOND_COMPTE:
+                    self.count_is_approximate = True
+                    self._count = max(self._estimation(qs) or 0, PLAFOND_COMPTE)
+        return self._count
+
+    def _estimation(self, queryset):
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
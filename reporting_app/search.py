@@ -0,0 +1,252 @@
+"""
+Recherche des colis et des clients (SearchDocument)
+
+Un document par colis / client : texte dénormalisé et normalisé (minuscules,
+sans accents) des champs recherchés par les listes — numéro de suivi, lot,
+nom, téléphone et e-mail du client, description... Les signaux le tiennent à
+jour ; rebuild_search_index le reconstruit.
+
+Index selon le moteur (migration 0006_searchdocument) :
+- PostgreSQL : GIN pg_trgm sur contenu ; LIKE '%terme%' utilise l'index,
+  classement par similarité de mots (word_similarity) ;
+- SQLite : table FTS5 (tokenizer trigram) alimentée par triggers,
+  classement bm25.
+Sans index (terme de moins de 3 caractères, FTS5 absent), repli sur LIKE.
+
+search() retourne les ids classés (liste bornée) ; pour filtrer une liste,
+filtre() retourne une sous-requête de tous les ids correspondants.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+
+TABLE_FTS = 'reporting_app_searchdocument_fts'
+TAILLE_LOT = 1000
+
+CHAMPS = {
+    'colis': (
+        'id', 'client_id', 'date_creation', 'numero_suivi', 'description', 'lot__numero_lot',
+        'client__user__first_name', 'client__user__last_name', 'client__user__telephone',
+    ),
+    'client': (
+        'id', 'date_creation', 'pays', 'adresse',
+        'user__first_name', 'user__last_name', 'user__telephone', 'user__email',
+    ),
+}
+
+_fts_disponible = {}
+
+
+def normaliser(texte):
+    """
+    Minuscules, sans accents, espaces réduits
+    """
+    texte = unicodedata.normalize('NFKD', str(texte or ''))
+    texte = ''.join(caractere for caractere in texte if not unicodedata.combining(caractere))
+    return re.sub(r'\s+', ' ', texte.lower()).strip()
+
+
+def _model(type_document):
+    from django.apps import apps
+
+    label = 'agent_chine_app.Colis' if type_document == 'colis' else 'agent_chine_app.Client'
+    return apps.get_model(label)
+
+
+@lru_cache(maxsize=1)
+def _libelles_pays():
+    return dict(_model('client')._meta.get_field('pays').choices)
+
+
+def _contenu(type_document, ligne):
+    if type_document == 'colis':
+        valeurs = [
+            ligne['numero_suivi'], ligne['lot__numero_lot'],
+            ligne['client__user__first_name'], ligne['client__user__last_name'],
+            ligne['client__user__telephone'], ligne['description'],
+        ]
+        telephone = ligne['client__user__telephone']
+    else:
+        valeurs = [
+            ligne['user__first_name'], ligne['user__last_name'], ligne['user__telephone'],
+            ligne['user__email'], ligne['pays'], _libelles_pays().get(ligne['pays']),
+            ligne['adresse'],
+        ]
+        telephone = ligne['user__telephone']
+    # Téléphone aussi sans indicatif ni séparateurs (recherche par chiffres)
+    valeurs.append(re.sub(r'\D', '', telephone or ''))
+    return normaliser(' '.join(str(valeur) for valeur in valeurs if valeur))
+
+
+def indexer(type_document, queryset=None):
+    """
+    Crée ou met à jour les documents d'un queryset de colis / clients
+
+    Returns:
+        int: Nombre de documents écrits
+    """
+    if queryset is None:
+        queryset = _model(type_document).objects.all()
+
+    total = 0
+    documents = []
+    for ligne in queryset.order_by().values(*CHAMPS[type_document]).iterator(chunk_size=TAILLE_LOT):
+        documents.append(SearchDocument(
+            type_document=type_document,
+            objet_id=ligne['id'],
+            client_id=ligne['client_id'] if type_document == 'colis' else ligne['id'],
+            contenu=_contenu(type_document, ligne),
+            date_creation=ligne['date_creation'],
+        ))
+        if len(documents) >= TAILLE_LOT:
+            total += _ecrire(documents)
+            documents = []
+    if documents:
+        total += _ecrire(documents)
+    return total
+
+
+def _ecrire(documents):
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['type_document', 'objet_id'],
+        update_fields=['client_id', 'contenu', 'date_creation'],
+    )
+    return len(documents)
+
+
+def retirer(type_document, ids):
+    """
+    Supprime les documents d'objets supprimés
+    """
+    SearchDocument.objects.filter(type_document=type_document, objet_id__in=list(ids)).delete()
+
+
+def reconstruire(types=None):
+    """
+    Reconstruit entièrement l'index (documents orphelins compris)
+
+    Returns:
+        dict: {type: nombre de documents}
+    """
+    resultat = {}
+    for type_document in types or CHAMPS:
+        ids = set(_model(type_document).objects.values_list('id', flat=True))
+        orphelins = set(
+            SearchDocument.objects.filter(type_document=type_document).values_list('objet_id', flat=True)
+        ) - ids
+        if orphelins:
+            retirer(type_document, orphelins)
+        resultat[type_document] = indexer(type_document)
+    return resultat
+
+
+def _fts_actif():
+    cle = connection.settings_dict['NAME']
+    if cle not in _fts_disponible:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE_FTS])
+            _fts_disponible[cle] = cursor.fetchone() is not None
+    return _fts_disponible[cle]
+
+
+def _requete_fts(termes):
+    return ' AND '.join('"{}"'.format(terme.replace('"', '""')) for terme in termes)
+
+
+def _utilise_fts(termes):
+    return connection.vendor == 'sqlite' and min(len(terme) for terme in termes) >= 3 and _fts_actif()
+
+
+def _search_fts(type_document, termes, limit, client_id):
+    sql = (
+        f"SELECT d.objet_id FROM {TABLE_FTS} f "
+        f"JOIN reporting_app_searchdocument d ON d.id = f.rowid "
+        f"WHERE {TABLE_FTS} MATCH %s AND d.type_document = %s"
+    )
+    params = [_requete_fts(termes), type_document]
+    if client_id is not None:
+        sql += " AND d.client_id = %s"
+        params.append(client_id)
+    sql += " ORDER BY f.rank, d.date_creation DESC"
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [ligne[0] for ligne in cursor.fetchall()]
+
+
+def _documents(type_document, termes, client_id):
+    """
+    Documents contenant tous les termes (sans classement)
+    """
+    documents = SearchDocument.objects.filter(type_document=type_document)
+    if client_id is not None:
+        documents = documents.filter(client_id=client_id)
+    if _utilise_fts(termes):
+        return documents.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {TABLE_FTS} WHERE {TABLE_FTS} MATCH %s", [_requete_fts(termes)])
+        )
+    for terme in termes:
+        documents = documents.filter(contenu__contains=terme)
+    return documents
+
+
+def filtre(type_document, texte, client_id=None):
+    """
+    Sous-requête des ids de tous les colis / clients correspondants
+
+    À utiliser dans filter(pk__in=...) : aucune limite, le filtrage reste en
+    base et les totaux calculés sur la liste filtrée sont exacts.
+
+    Returns:
+        QuerySet: objet_id des documents correspondants (vide si texte vide)
+    """
+    termes = normaliser(texte).split()
+    if not termes:
+        return SearchDocument.objects.none().values('objet_id')
+    return _documents(type_document, termes, client_id).order_by().values('objet_id')
+
+
+def search(type_document, texte, limit=50, client_id=None):
+    """
+    Recherche classée de colis ou de clients
+
+    Tous les termes doivent apparaître (sous-chaînes, sans tenir compte des
+    accents ni de la casse), dans n'importe quel champ indexé.
+
+    Args:
+        type_document: 'colis' ou 'client'
+        texte: Saisie de l'utilisateur
+        limit: Nombre maximum d'ids (None : tous)
+        client_id: Limiter aux colis de ce client
+
+    Returns:
+        list: Ids des colis / clients, du plus pertinent au moins pertinent
+    """
+    termes = normaliser(texte).split()
+    if not termes:
+        return []
+
+    if _utilise_fts(termes):
+        return _search_fts(type_document, termes, limit, client_id)
+
+    documents = _documents(type_document, termes, client_id)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        documents = documents.annotate(
+            rang=TrigramWordSimilarity(' '.join(termes), 'contenu')
+        ).order_by('-rang', '-date_creation')
+    else:
+        documents = documents.order_by('-date_creation')
+
+    ids = documents.values_list('objet_id', flat=True)
+    return list(ids[:limit] if limit else ids)
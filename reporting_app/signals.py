@@ -0,0 +1,99 @@
+"""
+Signaux de l'application Reporting
+Maintien incrémental de la table DailyStats et de l'index de recherche
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from . import search
+from .daily_stats import SOURCES, appliquer_delta, reconstruire
+
+
+def _connecter(source):
+    def memoriser(sender, instance, **kwargs):
+        # Valeurs brutes seulement : l'empreinte est calculée à la sauvegarde
+        instance._daily_stats = source.etat(instance)
+
+    def apres_sauvegarde(sender, instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        etat_avant = None if created else getattr(instance, '_daily_stats', None)
+        etat_apres = source.etat(instance)
+        instance._daily_stats = etat_apres
+
+        if etat_apres is None or etat_avant == etat_apres:
+            return
+        apres = source.empreinte_etat(etat_apres)
+        if apres is None:
+            return
+        avant = source.empreinte_etat(etat_avant)
+        if created:
+            appliquer_delta(source.nom, apres[0], 1, apres[1], apres[2])
+        elif avant is None:
+            # État précédent inconnu (champs différés) : recalcul complet du jour
+            jour = apres[0][0]
+            transaction.on_commit(lambda: reconstruire([source.nom], [jour]))
+        elif avant != apres:
+            appliquer_delta(source.nom, avant[0], -1, -avant[1], -avant[2])
+            appliquer_delta(source.nom, apres[0], 1, apres[1], apres[2])
+
+    def apres_suppression(sender, instance, **kwargs):
+        avant = source.empreinte_etat(getattr(instance, '_daily_stats', None)) or source.empreinte(instance)
+        if avant is not None:
+            appliquer_delta(source.nom, avant[0], -1, -avant[1], -avant[2])
+
+    model = source.model
+    uid = f'daily_stats_{source.nom}'
+    post_init.connect(memoriser, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(apres_sauvegarde, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(apres_suppression, sender=model, weak=False, dispatch_uid=uid)
+
+
+for _source in SOURCES.values():
+    _connecter(_source)
+
+
+# Index de recherche (SearchDocument)
+CHAMPS_RECHERCHE_USER = {'first_name', 'last_name', 'telephone', 'email'}
+
+
+def _indexer_colis(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.indexer('colis', sender.objects.filter(pk=instance.pk))
+
+
+def _retirer_colis(sender, instance, **kwargs):
+    search.retirer('colis', [instance.pk])
+
+
+def _indexer_client(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.indexer('client', sender.objects.filter(pk=instance.pk))
+
+
+def _retirer_client(sender, instance, **kwargs):
+    search.retirer('client', [instance.pk])
+
+
+def _reindexer_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Nom / téléphone / e-mail modifiés : documents du client et de ses colis
+    """
+    if raw or (update_fields is not None and not CHAMPS_RECHERCHE_USER & set(update_fields)):
+        return
+    Client = apps.get_model('agent_chine_app', 'Client')
+    Colis = apps.get_model('agent_chine_app', 'Colis')
+    clients = Client.objects.filter(user_id=instance.pk)
+    if search.indexer('client', clients):
+        search.indexer('colis', Colis.objects.filter(client__user_id=instance.pk))
+
+
+post_save.connect(_indexer_colis, sender='agent_chine_app.Colis', dispatch_uid='search_colis')
+post_delete.connect(_retirer_colis, sender='agent_chine_app.Colis', dispatch_uid='search_colis')
+post_save.connect(_indexer_client, sender='agent_chine_app.Client', dispatch_uid='search_client')
+post_delete.connect(_retirer_client, sender='agent_chine_app.Client', dispatch_uid='search_client')
+post_save.connect(_reindexer_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='search_user')
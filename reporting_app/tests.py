@@ -1,3 +1,264 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from agent_chine_app.models import Client, Colis, Lot
+from agent_chine_app.services.tariff_index import invalidate_tariff_index
+
+from . import search
+from .daily_stats import reconstruire
+from .models import DailyStats, ShippingPrice
+from .pagination import KeysetPaginator
+
+User = get_user_model()
+
+
+def creer_client(telephone, prenom, nom, adresse='Bamako', pays='ML'):
+    user = User.objects.create_user(
+        telephone=telephone, email=f'{telephone.strip("+")}@example.com', password='secret',
+        role='client', first_name=prenom, last_name=nom,
+    )
+    return Client.objects.create(user=user, adresse=adresse, pays=pays)
+
+
+class RechercheTests(TestCase):
+    """
+    Recherche normalisée et classée (reporting_app.search)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aissata = creer_client('+22376543210', 'Aïssata', 'Traoré')
+        cls.moussa = creer_client('+22365000001', 'Moussa', 'Keïta')
+        cls.keita = creer_client('+22365000002', 'Keita', 'Keita')
+        cls.lointain = creer_client(
+            '+22365000003', 'Oumar', 'Sangaré',
+            adresse='Quartier Hippodrome, rue 234, porte 12, chez la famille Keita, près du marché',
+        )
+
+    def test_accents_et_casse_ignores(self):
+        for saisie in ['aissata traore', 'AÏSSATA', 'Traore', 'traoré']:
+            self.assertIn(self.aissata.id, search.search('client', saisie), msg=saisie)
+
+    def test_telephone_avec_ou_sans_indicatif(self):
+        for saisie in ['+22376543210', '22376543210', '76543210', '7654']:
+            self.assertEqual(search.search('client', saisie), [self.aissata.id], msg=saisie)
+
+    def test_tous_les_termes_requis(self):
+        self.assertEqual(search.search('client', 'moussa keita'), [self.moussa.id])
+        self.assertEqual(search.search('client', 'moussa traore'), [])
+
+    def test_classement_par_pertinence(self):
+        resultats = search.search('client', 'keita')
+        self.assertEqual(set(resultats), {self.moussa.id, self.keita.id, self.lointain.id})
+        # Nom et prénom « Keita » avant une simple mention dans une longue adresse
+        self.assertEqual(resultats[0], self.keita.id)
+        self.assertEqual(resultats[-1], self.lointain.id)
+
+    def test_limite_et_filtre_sans_limite(self):
+        homonymes = [creer_client(f'+2236600000{i}', 'Awa', 'Diallo') for i in range(5)]
+        ids = {client.id for client in homonymes}
+
+        self.assertEqual(len(search.search('client', 'diallo', limit=2)), 2)
+        self.assertEqual(set(search.search('client', 'diallo', limit=None)), ids)
+        self.assertEqual(set(Client.objects.filter(pk__in=search.filtre('client', 'diallo'))
+                             .values_list('id', flat=True)), ids)
+        self.assertFalse(Client.objects.filter(pk__in=search.filtre('client', '   ')).exists())
+
+    def test_termes_courts_sans_index(self):
+        # Moins de 3 caractères : repli LIKE, du plus récent au plus ancien
+        self.assertEqual(search.search('client', 'ke')[:2], [self.lointain.id, self.keita.id])
+
+    def test_colis_limites_au_client(self):
+        agent = User.objects.create_user(
+            telephone='+8613800000002', email='agent-recherche@example.com', password='secret', role='agent_chine',
+        )
+        lot = Lot.objects.create(type_lot='cargo', agent_createur=agent)
+        dimensions = {'longueur': Decimal('10'), 'largeur': Decimal('10'), 'hauteur': Decimal('10'), 'poids': Decimal('1')}
+        colis_aissata = Colis.objects.create(client=self.aissata, lot=lot, description='Pièces détachées', **dimensions)
+        Colis.objects.create(client=self.moussa, lot=lot, description='Pièces détachées', **dimensions)
+
+        self.assertEqual(len(search.search('colis', 'pieces detachees')), 2)
+        self.assertEqual(
+            search.search('colis', 'pieces detachees', client_id=self.aissata.id), [colis_aissata.id]
+        )
+        self.assertEqual(search.search('colis', colis_aissata.numero_suivi.lower()), [colis_aissata.id])
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Pagination par curseur sur un tri nullable (Lot.date_expedition)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        agent = User.objects.create_user(
+            telephone='+8613800000003', email='agent-pagination@example.com', password='secret', role='agent_chine',
+        )
+        cls.lots = [Lot.objects.create(type_lot='cargo', agent_createur=agent) for _ in range(8)]
+        base = timezone.now() - timedelta(days=10)
+        # Deux dates égales (départage par l'id) et trois lots non expédiés
+        jours = [3, 1, None, 5, 1, None, 2, None]
+        for lot, jour in zip(cls.lots, jours):
+            Lot.objects.filter(pk=lot.pk).update(
+                date_expedition=base + timedelta(days=jour) if jour is not None else None
+            )
+
+    def attendu(self, ordering):
+        lots = Lot.objects.all()
+        dates = [lot for lot in lots if lot.date_expedition is not None]
+        vides = [lot for lot in lots if lot.date_expedition is None]
+        descendant = ordering.startswith('-')
+        dates.sort(key=lambda lot: (lot.date_expedition, lot.pk), reverse=descendant)
+        vides.sort(key=lambda lot: lot.pk, reverse=descendant)
+        # NULL en fin de liste dans les deux sens
+        return [lot.pk for lot in dates + vides]
+
+    def parcourir(self, ordering):
+        paginator = KeysetPaginator(Lot.objects.all(), 3, ordering=ordering)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_pages_suivantes(self):
+        for ordering in ['-date_expedition', 'date_expedition']:
+            _, pages = self.parcourir(ordering)
+            self.assertEqual([len(page) for page in pages], [3, 3, 2], msg=ordering)
+            self.assertEqual([lot.pk for page in pages for lot in page], self.attendu(ordering), msg=ordering)
+            self.assertFalse(pages[0].has_previous())
+            self.assertTrue(all(page.has_previous() for page in pages[1:]))
+
+    def test_pages_precedentes_depuis_la_fin(self):
+        for ordering in ['-date_expedition', 'date_expedition']:
+            paginator, pages = self.parcourir(ordering)
+            # Dernière page : les per_page dernières lignes, sans suivante
+            page = paginator.get_page(pages[0].last_cursor)
+            self.assertEqual([lot.pk for lot in page], self.attendu(ordering)[-3:], msg=ordering)
+            self.assertFalse(page.has_next())
+
+            retour = [page]
+            while retour[-1].has_previous():
+                retour.append(paginator.get_page(retour[-1].previous_cursor))
+            self.assertEqual([lot.pk for page in reversed(retour) for lot in page], self.attendu(ordering), msg=ordering)
+            self.assertEqual([len(page) for page in reversed(retour)], [2, 3, 3], msg=ordering)
+            self.assertTrue(all(page.has_next() for page in retour[1:]))
+
+    def test_retour_arriere_apres_une_page_suivante(self):
+        paginator, pages = self.parcourir('-date_expedition')
+        self.assertEqual(list(paginator.get_page(pages[2].previous_cursor)), list(pages[1]))
+        self.assertEqual(list(paginator.get_page(pages[1].previous_cursor)), list(pages[0]))
+
+    def test_curseur_invalide_ou_d_un_autre_tri(self):
+        paginator, pages = self.parcourir('-date_expedition')
+        autre = KeysetPaginator(Lot.objects.all(), 3, ordering='date_expedition')
+        for curseur in ['pas-un-curseur', '!!!', pages[0].next_cursor]:
+            self.assertEqual(list(autre.get_page(curseur)), list(autre.get_page()), msg=curseur)
+        self.assertEqual(list(paginator.get_page('%%%')), list(pages[0]))
+
+    def test_total(self):
+        self.assertIsNone(KeysetPaginator(Lot.objects.all(), 3).count)
+        self.assertEqual(KeysetPaginator(Lot.objects.all(), 3, compter='exact').count, len(self.lots))
+
+        estime = KeysetPaginator(Lot.objects.all(), 3, compter='estime')
+        self.assertEqual(estime.get_page().count, len(self.lots))
+        self.assertFalse(estime.count_is_approximate)
+        with mock.patch('reporting_app.pagination.PLAFOND_COMPTE', 5):
+            plafonne = KeysetPaginator(Lot.objects.all(), 3, compter='estime')
+            self.assertEqual(plafonne.count, 5)
+            self.assertTrue(plafonne.count_is_approximate)
+
+
+class DailyStatsTests(TestCase):
+    """
+    Deltas incrémentaux des signaux comparés à une reconstruction complète
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = User.objects.create_user(
+            telephone='+8613800000004', email='agent-stats@example.com', password='secret', role='agent_chine',
+        )
+        cls.client_ml = creer_client('+22370000020', 'Fanta', 'Coulibaly')
+        cls.client_sn = creer_client('+22170000021', 'Ndeye', 'Diop', adresse='Dakar', pays='SN')
+        cls.tarif = ShippingPrice.objects.create(
+            nom_tarif='Cargo', methode_calcul='par_kilo', type_transport='cargo',
+            pays_destination='ALL', prix_par_kilo=Decimal('8000'),
+        )
+
+    def setUp(self):
+        invalidate_tariff_index()
+        self.lot = Lot.objects.create(type_lot='cargo', agent_createur=self.agent, prix_transport=Decimal('20000'))
+        self.colis = [
+            self.creer_colis(self.client_ml),
+            self.creer_colis(self.client_ml, poids=Decimal('4')),
+            self.creer_colis(self.client_sn, prix_transport_manuel=Decimal('15000')),
+            self.creer_colis(self.client_sn, type_transport='express'),
+        ]
+
+    def creer_colis(self, client, **champs):
+        valeurs = {
+            'type_transport': 'cargo', 'longueur': Decimal('40'), 'largeur': Decimal('30'),
+            'hauteur': Decimal('20'), 'poids': Decimal('2.5'),
+        }
+        valeurs.update(champs)
+        return Colis.objects.create(client=client, lot=self.lot, **valeurs)
+
+    def lignes(self):
+        return set(
+            DailyStats.objects.filter(nombre__gt=0).values_list(
+                'jour', 'source', 'statut', 'type_transport', 'mode_paiement',
+                'nombre', 'montant', 'montant_secondaire',
+            )
+        )
+
+    def assertEgaleReconstruction(self):
+        incrementales = self.lignes()
+        reconstruire(['colis', 'lot'])
+        self.assertEqual(incrementales, self.lignes())
+        return incrementales
+
+    def test_creation(self):
+        lignes = self.assertEgaleReconstruction()
+        self.assertEqual(sum(ligne[5] for ligne in lignes if ligne[1] == 'colis'), len(self.colis))
+
+    def test_changement_de_statut(self):
+        for colis in self.colis[:2]:
+            colis.statut = 'livre'
+            colis.save()
+        self.lot.statut = 'ferme'
+        self.lot.save()
+        self.assertEgaleReconstruction()
+
+    def test_changement_de_date(self):
+        colis = self.colis[0]
+        colis.date_creation -= timedelta(days=3)
+        colis.save()
+        self.assertEgaleReconstruction()
+
+    def test_suppression(self):
+        self.colis[1].delete()
+        # Instance rechargée : l'état mémorisé vient de post_init
+        Colis.objects.get(pk=self.colis[2].pk).delete()
+        self.assertEgaleReconstruction()
+
+    def test_recalcul_en_masse(self):
+        from agent_chine_app.tasks import reprice_open_colis_async
+
+        ShippingPrice.objects.filter(pk=self.tarif.pk).update(prix_par_kilo=Decimal('9500'))
+        invalidate_tariff_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            reprice_open_colis_async.apply()
+
+        # bulk_update sans signal : seule la reconstruction des jours touchés suit
+        prix = self.colis[0].prix_calcule
+        self.colis[0].refresh_from_db()
+        self.assertNotEqual(self.colis[0].prix_calcule, prix)
 
-# Create your tests here.
+        lignes = self.assertEgaleReconstruction()
+        montants = sum(ligne[6] for ligne in lignes if ligne[1] == 'colis')
+        self.assertEqual(montants, sum(c.prix_calcule for c in Colis.objects.all()))
@@ -69,6 +69,13 @@ echo "📦 Mise à jour des dépendances..."
 echo "🗄️ Application des migrations..."
 "$PYTHON_BIN" manage.py migrate --noinput
 
+# Index de recherche (construit au premier déploiement, maintenu ensuite par signaux)
+"$PYTHON_BIN" manage.py rebuild_search_index --si-vide
+
+# Statistiques journalières des tableaux de bord (DailyStats) : reconstruites à chaque
+# déploiement (table vide après la migration, corrige toute dérive des deltas)
+"$PYTHON_BIN" manage.py rebuild_daily_stats
+
 # Collection des fichiers statiques
 echo "📁 Collection des fichiers statiques..."
 "$PYTHON_BIN" manage.py collectstatic --noinput --clear
@@ -50,6 +50,14 @@ case $1 in
         python manage.py shell
         ;;
     
+    "test")
+        cd /var/www/ts_air_cargo
+        source venv/bin/activate
+        echo "🧪 Tests (base configurée par DB_ENGINE, base de test dédiée)..."
+        python manage.py test --noinput "${@:2}"
+        echo "✅ Tests terminés"
+        ;;
+    
     "collect")
         cd /var/www/ts_air_cargo
         source venv/bin/activate
@@ -68,6 +76,7 @@ case $1 in
         echo "  backup   - Sauvegarde manuelle de la DB"
         echo "  migrate  - Créer et appliquer les migrations"
         echo "  shell    - Shell Django interactif"
+        echo "  test     - Lancer les tests (PostgreSQL si DB_ENGINE=postgresql)"
         echo "  collect  - Collecter les fichiers statiques"
         echo ""
         echo "Usage: ./scripts/dev-tools.sh [commande]"
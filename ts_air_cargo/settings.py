@@ -91,12 +91,48 @@ WSGI_APPLICATION = 'ts_air_cargo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite par défaut (développement). En production (gunicorn + workers Celery
+# qui écrivent en parallèle), DB_ENGINE=postgresql : SQLite verrouille toute
+# la base à chaque écriture.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    # Derrière PgBouncer en mode transaction : pas de curseurs serveur (une
+    # transaction peut changer de connexion) ni de paramètres de démarrage
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False').lower() == 'true'
+    DB_OPTIONS = {
+        'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+        'application_name': os.getenv('DB_APPLICATION_NAME', 'ts_air_cargo'),
+    }
+    if not DB_PGBOUNCER:
+        DB_OPTIONS['options'] = f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))}"
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'ts_air_cargo'),
+            'USER': os.getenv('DB_USER', 'ts_air_cargo'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '6432' if DB_PGBOUNCER else '5432'),
+            # Connexions persistantes par worker, vérifiées avant réutilisation
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            # .iterator() utilise un curseur serveur (lecture par blocs) sauf derrière PgBouncer
+            'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+            'OPTIONS': DB_OPTIONS,
+            'TEST': {
+                'NAME': os.getenv('DB_TEST_NAME', 'test_ts_air_cargo'),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -183,6 +219,12 @@ WACHAP_SYSTEM_INSTANCE_ID = os.getenv('WACHAP_SYSTEM_INSTANCE_ID', '')
 WACHAP_SYSTEM_WEBHOOK_URL = os.getenv('WACHAP_SYSTEM_WEBHOOK_URL', '')
 WACHAP_SYSTEM_ACTIVE = os.getenv('WACHAP_SYSTEM_ACTIVE', 'False').lower() == 'true'
 
+# Webhooks WaChap entrants (/whatsapp/webhooks/wachap/?token=...) : mis en file
+# dans un stream Redis puis appliqués par lots (process_webhook_stream).
+# Obligatoire : sans token, le webhook répond 503 à toutes les requêtes
+WACHAP_WEBHOOK_TOKEN = os.getenv('WACHAP_WEBHOOK_TOKEN', '')
+WACHAP_WEBHOOK_STREAM_MAXLEN = int(os.getenv('WACHAP_WEBHOOK_STREAM_MAXLEN', '100000'))
+
 # === WaChap V4 API Configuration (Nouvelle API) ===
 # Interrupteur pour activer la nouvelle API V4. Mettre à True pour l'utiliser.
 USE_WACHAP_V4 = os.getenv('USE_WACHAP_V4', 'True').lower() == 'true'
@@ -203,6 +245,24 @@ except json.JSONDecodeError:
     print("Erreur: La variable d'environnement WACHAP_V4_ACCOUNTS n'est pas un JSON valide.")
     WACHAP_V4_ACCOUNTS = {}
 
+# Envoi des notifications de masse (lots) : 'async' (aiohttp, concurrent) ou 'celery' (une tâche par message)
+NOTIFICATION_BULK_DISPATCH = os.getenv('NOTIFICATION_BULK_DISPATCH', 'async')
+WACHAP_ASYNC_CONCURRENCE = int(os.getenv('WACHAP_ASYNC_CONCURRENCE', '5'))  # envois simultanés par instance
+WACHAP_ASYNC_BUDGET = int(os.getenv('WACHAP_ASYNC_BUDGET', '600'))  # secondes d'envoi groupé, le reste part via Celery
+
+# Limiteur de débit (token bucket) par fournisseur, surcharge possible par région ('wachap:mali')
+# rate = requêtes/seconde, burst = rafale maximale
+NOTIFICATION_RATE_LIMITS = {
+    'wachap': {'rate': float(os.getenv('WACHAP_RATE_LIMIT', '2')), 'burst': int(os.getenv('WACHAP_RATE_BURST', '10'))},
+    'wachap_v4': {'rate': float(os.getenv('WACHAP_RATE_LIMIT', '2')), 'burst': int(os.getenv('WACHAP_RATE_BURST', '10'))},
+    # Seau réservé aux OTP : jamais vidé par un envoi de masse
+    'wachap:otp': {'rate': float(os.getenv('WACHAP_OTP_RATE_LIMIT', '1')), 'burst': int(os.getenv('WACHAP_OTP_RATE_BURST', '5'))},
+    'wachap_v4:otp': {'rate': float(os.getenv('WACHAP_OTP_RATE_LIMIT', '1')), 'burst': int(os.getenv('WACHAP_OTP_RATE_BURST', '5'))},
+    'orange_sms': {'rate': float(os.getenv('ORANGE_SMS_RATE_LIMIT', '5')), 'burst': int(os.getenv('ORANGE_SMS_RATE_BURST', '10'))},
+}
+NOTIFICATION_RATE_LIMIT_MAX_WAIT = float(os.getenv('NOTIFICATION_RATE_LIMIT_MAX_WAIT', '1'))  # attente max (s), au-delà : replanification
+NOTIFICATION_MAX_REPLANIFICATIONS = int(os.getenv('NOTIFICATION_MAX_REPLANIFICATIONS', '20'))  # puis échec temporaire
+
 
 
 # Admin Configuration
@@ -239,6 +299,25 @@ ORANGE_SMS_USE_SANDBOX = os.getenv('ORANGE_SMS_USE_SANDBOX', 'True').lower() ==
 # Provider SMS (pour notifications_app)
 SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'orange_mali')  # 'orange_mali', 'twilio', etc.
 
+# === CACHE CONFIGURATION ===
+# Cache partagé entre gunicorn et les workers Celery (Redis), mémoire locale sinon.
+# Obligatoire en production (DEBUG=False) : check --deploy échoue sans CACHE_REDIS_URL
+# (statistiques du tableau de bord, verrous de génération des rapports PDF)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # === CELERY CONFIGURATION ===
 # Celery Settings pour tâches asynchrones
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -250,11 +329,16 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 
 # Configuration des tâches
-CELERY_TASK_ROUTES = {
-    'agent_chine_app.tasks.create_colis_async': {'queue': 'colis_processing'},
-    'agent_chine_app.tasks.update_colis_async': {'queue': 'colis_processing'},
-    'notifications_app.tasks.*': {'queue': 'notifications'},
-}
+# Notifications : files par priorité (notifications_otp, notifications, notifications_bulk),
+# voir notifications_app/routing.py
+CELERY_TASK_ROUTES = (
+    'notifications_app.routing.route_task',
+    {
+        'agent_chine_app.tasks.create_colis_async': {'queue': 'colis_processing'},
+        'agent_chine_app.tasks.update_colis_async': {'queue': 'colis_processing'},
+        'agent_chine_app.tasks.reprice_open_colis_async': {'queue': 'colis_processing'},
+    },
+)
 
 # Limites de workers
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
@@ -271,6 +355,13 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'agent_chine_app.tasks.cleanup_old_tasks',
         'schedule': 86400.0 * 7,  # Une fois par semaine
     },
+    'refresh-dashboard-stats': {
+        'task': 'agent_chine_app.tasks.refresh_dashboard_stats',
+        'schedule': 240.0,  # Toutes les 4 minutes (fraîcheur du cache : 5 minutes)
+        'options': {
+            'expires': 200,
+        }
+    },
     'retry-failed-notifications': {
         'task': 'notifications_app.tasks.retry_failed_notifications_task',
         'schedule': 1800.0,  # Toutes les 30 minutes
@@ -279,6 +370,14 @@ CELERY_BEAT_SCHEDULE = {
             'expires': 1500,  # Expire après 25 min si non exécutée
         }
     },
+    'process-wachap-webhooks': {
+        'task': 'whatsapp_monitoring_app.tasks.process_webhook_stream',
+        'schedule': 10.0,  # Toutes les 10 secondes
+        'options': {
+            'queue': 'notifications',
+            'expires': 10,
+        }
+    },
     'check-notification-health': {
         'task': 'notifications_app.tasks.check_notification_health_task',
         'schedule': 3600.0,  # Toutes les heures
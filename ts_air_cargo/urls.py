@@ -24,6 +24,7 @@ urlpatterns = [
     path('agent-mali/', include('agent_mali_app.urls')),
     path('client/', include('client_app.urls')),
     path('notifications/', include('notifications_app.urls')),
+    path('whatsapp/', include('whatsapp_monitoring_app.urls')),
     path('reporting/', include('reporting_app.urls')),
 ]
 
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp_monitoring_app', '0002_alter_whatsappmessageattempt_region_override'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='whatsappmessageattempt',
+            index=models.Index(fields=['provider_message_id'], name='whatsapp_mo_provide_c64ba8_idx'),
+        ),
+    ]
@@ -236,6 +236,7 @@ class WhatsAppMessageAttempt(models.Model):
             models.Index(fields=['status', 'priority', 'created_at']),
             models.Index(fields=['source_app', 'status']),
             models.Index(fields=['message_type', 'status']),
+            models.Index(fields=['provider_message_id']),
         ]
     
     def __str__(self):
@@ -6,7 +6,7 @@ Utilisable par toutes les apps du projet
 import logging
 from django.utils import timezone
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from .models import WhatsAppMessageAttempt, WhatsAppWebhookLog
 from notifications_app.wachap_service import wachap_service
 
@@ -349,45 +349,83 @@ TS Air Cargo - Mode Développement"""
         Returns:
             bool: True si le webhook a été traité avec succès
         """
+        resultat = WhatsAppMonitoringService.process_webhooks([{
+            'provider_message_id': provider_message_id,
+            'webhook_type': webhook_type,
+            'status': status,
+            'raw_payload': raw_payload,
+        }])
+        return resultat is not None
+    
+    @staticmethod
+    def process_webhooks(evenements):
+        """
+        Applique un lot de webhooks en quelques requêtes
+        
+        Une requête pour retrouver les tentatives, un bulk_create des logs et
+        un bulk_update des statuts. Un statut n'est jamais ramené en arrière
+        (accusé 'delivered' reçu après 'read').
+        
+        Args:
+            evenements: dicts {provider_message_id, webhook_type, status, raw_payload}
+            
+        Returns:
+            dict: {'recus', 'appliques', 'inconnus'} ou None en cas d'erreur
+        """
+        if not evenements:
+            return {'recus': 0, 'appliques': 0, 'inconnus': 0}
+        
         try:
-            # Enregistrer le webhook
-            webhook_log = WhatsAppWebhookLog.objects.create(
-                provider_message_id=provider_message_id,
-                webhook_type=webhook_type,
-                status=status,
-                raw_payload=raw_payload
-            )
+            message_ids = {evenement['provider_message_id'] for evenement in evenements}
+            tentatives = {
+                attempt.provider_message_id: attempt
+                for attempt in WhatsAppMessageAttempt.objects.filter(provider_message_id__in=message_ids)
+            }
             
-            # Trouver la tentative correspondante
-            try:
-                attempt = WhatsAppMessageAttempt.objects.get(
-                    provider_message_id=provider_message_id
-                )
-                webhook_log.message_attempt = attempt
-                webhook_log.save()
+            maintenant = timezone.now()
+            logs = []
+            modifiees = {}
+            for evenement in evenements:
+                attempt = tentatives.get(evenement['provider_message_id'])
+                logs.append(WhatsAppWebhookLog(
+                    message_attempt=attempt,
+                    provider_message_id=evenement['provider_message_id'],
+                    webhook_type=evenement['webhook_type'],
+                    status=evenement['status'],
+                    raw_payload=evenement['raw_payload'],
+                    processed=attempt is not None,
+                    processed_at=maintenant if attempt else None,
+                ))
+                if attempt is None:
+                    continue
                 
                 # Mettre à jour le statut de la tentative selon le webhook
+                webhook_type, status = evenement['webhook_type'], evenement['status']
                 if webhook_type == 'delivery' and status == 'delivered':
-                    attempt.mark_as_delivered()
+                    if not attempt.delivered_at:
+                        attempt.delivered_at = maintenant
+                    if attempt.status != 'read':
+                        attempt.status = 'delivered'
+                    modifiees[attempt.pk] = attempt
                 elif webhook_type == 'read' and status == 'read':
                     attempt.status = 'read'
-                    attempt.save()
-                
-                webhook_log.processed = True
-                webhook_log.processed_at = timezone.now()
-                webhook_log.save()
-                
-                logger.info(f"Webhook traité: {webhook_type} pour message {provider_message_id}")
-                return True
-                
-            except WhatsAppMessageAttempt.DoesNotExist:
-                # Tentative non trouvée, mais enregistrer le webhook quand même
-                logger.warning(f"Tentative non trouvée pour message ID {provider_message_id}")
-                return True
-                
+                    modifiees[attempt.pk] = attempt
+            
+            with transaction.atomic():
+                WhatsAppWebhookLog.objects.bulk_create(logs, batch_size=500)
+                WhatsAppMessageAttempt.objects.bulk_update(
+                    modifiees.values(), ['status', 'delivered_at'], batch_size=500
+                )
+            
+            inconnus = sum(1 for log in logs if not log.processed)
+            if inconnus:
+                logger.warning(f"Tentative non trouvée pour {inconnus} webhook(s)")
+            logger.info(f"Webhooks traités: {len(logs)} reçus, {len(modifiees)} tentative(s) mise(s) à jour")
+            return {'recus': len(logs), 'appliques': len(modifiees), 'inconnus': inconnus}
+            
         except Exception as e:
             logger.error(f"Erreur traitement webhook: {str(e)}")
-            return False
+            return None
 
 
 class WhatsAppRetryTask:
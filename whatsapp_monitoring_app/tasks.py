@@ -4,11 +4,15 @@ Permet l'envoi asynchrone des notifications
 """
 
 import logging
+import os
+import socket
 from celery import shared_task
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .services import WhatsAppMonitoringService, WhatsAppRetryTask
 from .models import WhatsAppMessageAttempt
+from notifications_app.routing import PRIORITE_MASSE, file_pour_priorite
+from notifications_app.timeout_handler import timeout_handler
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -101,7 +105,8 @@ def send_whatsapp_notification_async(self, user_id, message_content, source_app,
         # Retry automatique en cas d'erreur
         if self.request.retries < self.max_retries:
             logger.info(f"🔄 Retry tâche async WhatsApp pour user {user_id} (tentative {self.request.retries + 1})")
-            raise self.retry(countdown=60 * (2 ** self.request.retries))  # Délai exponentiel
+            # Délai exponentiel avec part aléatoire
+            raise self.retry(countdown=timeout_handler.backoff_delay(self.request.retries, base=60, cap=900))
         
         return {
             'success': False,
@@ -191,6 +196,43 @@ def cleanup_old_whatsapp_attempts(days_old=30):
         }
 
 
+@shared_task
+def process_webhook_stream(batch_size=500, max_batches=20):
+    """
+    Applique les webhooks WaChap en attente dans le stream Redis, par lots
+    
+    Args:
+        batch_size: Événements par lot (un bulk_update par lot)
+        max_batches: Lots au plus par exécution (le reste attend la suivante)
+        
+    Returns:
+        dict: Événements reçus / tentatives mises à jour
+    """
+    from . import webhook_stream
+    
+    consommateur = f"{socket.gethostname()}-{os.getpid()}"
+    total = {'recus': 0, 'appliques': 0, 'inconnus': 0, 'lots': 0}
+    for _ in range(max_batches):
+        entrees = webhook_stream.lire_lot(consommateur, batch_size)
+        if not entrees:
+            break
+        resultat = WhatsAppMonitoringService.process_webhooks([evenement for _, evenement in entrees])
+        if resultat is None:
+            # Entrées non acquittées : reprises au prochain passage
+            break
+        webhook_stream.acquitter([entree_id for entree_id, _ in entrees])
+        for cle in ('recus', 'appliques', 'inconnus'):
+            total[cle] += resultat[cle]
+        total['lots'] += 1
+    
+    if total['recus']:
+        logger.info(
+            f"📬 Webhooks WaChap: {total['recus']} événements, "
+            f"{total['appliques']} tentatives mises à jour ({total['lots']} lot(s))"
+        )
+    return total
+
+
 @shared_task
 def send_bulk_whatsapp_notifications(notifications_data, source_app):
     """
@@ -215,18 +257,21 @@ def send_bulk_whatsapp_notifications(notifications_data, source_app):
         for notification_data in notifications_data:
             try:
                 # Lancer une tâche asynchrone pour chaque notification
-                send_whatsapp_notification_async.delay(
+                # Envoi de masse : voie bulk sauf priorité explicite plus haute
+                priority = notification_data.get('priority', PRIORITE_MASSE)
+                message_type = notification_data.get('message_type', 'notification')
+                send_whatsapp_notification_async.apply_async(kwargs=dict(
                     user_id=notification_data['user_id'],
                     message_content=notification_data['message_content'],
                     source_app=source_app,
-                    message_type=notification_data.get('message_type', 'notification'),
+                    message_type=message_type,
                     category=notification_data.get('category', ''),
                     title=notification_data.get('title', ''),
-                    priority=notification_data.get('priority', 3),
+                    priority=priority,
                     max_attempts=notification_data.get('max_attempts', 3),
                     region_override=notification_data.get('region_override'),
                     context_data=notification_data.get('context_data')
-                )
+                ), queue=file_pour_priorite(priority, message_type))
                 stats['processed'] += 1
                 stats['success'] += 1
                 
@@ -260,19 +305,21 @@ def send_whatsapp_async(user, message_content, source_app, **kwargs):
     Returns:
         AsyncResult: Objet Celery pour suivre la tâche
     """
-    return send_whatsapp_notification_async.delay(
+    priority = kwargs.get('priority', 3)
+    message_type = kwargs.get('message_type', 'notification')
+    return send_whatsapp_notification_async.apply_async(kwargs=dict(
         user_id=user.id,
         message_content=message_content,
         source_app=source_app,
-        message_type=kwargs.get('message_type', 'notification'),
+        message_type=message_type,
         category=kwargs.get('category', ''),
         title=kwargs.get('title', ''),
-        priority=kwargs.get('priority', 3),
+        priority=priority,
         max_attempts=kwargs.get('max_attempts', 3),
         sender_role=kwargs.get('sender_role'),
         region_override=kwargs.get('region_override'),
         context_data=kwargs.get('context_data')
-    )
+    ), queue=file_pour_priorite(priority, message_type))
 
 
 # Configuration des tâches périodiques (pour Celery Beat)
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import WhatsAppMessageAttempt, WhatsAppWebhookLog
+from .services import WhatsAppMonitoringService
+
+
+def evenement(message_id, statut):
+    return {
+        'provider_message_id': message_id,
+        'webhook_type': 'read' if statut == 'read' else 'delivery',
+        'status': statut,
+        'raw_payload': {'message_id': message_id, 'status': statut},
+    }
+
+
+class WebhooksTests(TestCase):
+    """
+    Application groupée des accusés WaChap et protection du webhook
+    """
+
+    def setUp(self):
+        self.tentatives = [
+            WhatsAppMessageAttempt.objects.create(
+                phone_number=f'+2237000003{i}', source_app='agent_mali', message_content='Colis arrivé',
+                status='sent', provider_message_id=f'wa-{i}',
+            )
+            for i in range(2)
+        ]
+        redis = mock.patch('whatsapp_monitoring_app.webhook_stream.get_redis', return_value=None)
+        redis.start()
+        self.addCleanup(redis.stop)
+
+    def test_pas_de_retour_arriere_de_lu_a_livre(self):
+        stats = WhatsAppMonitoringService.process_webhooks([
+            evenement('wa-0', 'read'),
+            evenement('wa-0', 'delivered'),
+            evenement('wa-1', 'delivered'),
+        ])
+
+        self.assertEqual(stats, {'recus': 3, 'appliques': 2, 'inconnus': 0})
+        lu, livre = (WhatsAppMessageAttempt.objects.get(pk=t.pk) for t in self.tentatives)
+        self.assertEqual(lu.status, 'read')
+        self.assertIsNotNone(lu.delivered_at)
+        self.assertEqual(livre.status, 'delivered')
+
+        # Accusé de livraison arrivé dans un lot ultérieur
+        WhatsAppMonitoringService.process_webhooks([evenement('wa-0', 'delivered')])
+        lu.refresh_from_db()
+        self.assertEqual(lu.status, 'read')
+
+    def test_identifiants_inconnus_journalises(self):
+        with self.assertLogs('whatsapp_monitoring_app.services', level='WARNING'):
+            stats = WhatsAppMonitoringService.process_webhooks([
+                evenement('wa-inconnu', 'delivered'), evenement('wa-1', 'read'),
+            ])
+
+        self.assertEqual(stats['inconnus'], 1)
+        log = WhatsAppWebhookLog.objects.get(provider_message_id='wa-inconnu')
+        self.assertFalse(log.processed)
+        self.assertIsNone(log.message_attempt)
+        self.assertTrue(WhatsAppWebhookLog.objects.get(provider_message_id='wa-1').processed)
+
+    def poster(self, **kwargs):
+        return self.client.post(
+            reverse('whatsapp_monitoring:wachap_webhook'),
+            data=json.dumps({'message_id': 'wa-1', 'status': 'delivered'}),
+            content_type='application/json', **kwargs,
+        )
+
+    @override_settings(WACHAP_WEBHOOK_TOKEN='')
+    def test_webhook_sans_token_configure(self):
+        self.assertEqual(self.poster().status_code, 503)
+        self.assertFalse(WhatsAppWebhookLog.objects.exists())
+
+    @override_settings(WACHAP_WEBHOOK_TOKEN='secret-webhook')
+    def test_webhook_token_verifie(self):
+        self.assertEqual(self.poster().status_code, 403)
+        self.assertEqual(self.poster(HTTP_X_WEBHOOK_TOKEN='mauvais').status_code, 403)
+        self.assertFalse(WhatsAppWebhookLog.objects.exists())
+
+        response = self.poster(HTTP_X_WEBHOOK_TOKEN='secret-webhook')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['received'], 1)
+        self.assertEqual(WhatsAppMessageAttempt.objects.get(provider_message_id='wa-1').status, 'delivered')
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'whatsapp_monitoring'
+
+urlpatterns = [
+    # Webhooks fournisseurs (sans authentification de session)
+    path('webhooks/wachap/', views.wachap_webhook, name='wachap_webhook'),
+]
@@ -5,8 +5,14 @@ from django.http import JsonResponse
 from django.utils import timezone
 from django.db.models import Count, Q
 from django.core.paginator import Paginator
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models import WhatsAppMessageAttempt, WhatsAppWebhookLog
 from .services import WhatsAppMonitoringService
+from . import webhook_stream
+import hmac
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -145,3 +151,35 @@ def retry_all_failed_notifications(request):
             }, status=500)
     
     return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+
+
+@csrf_exempt
+@require_POST
+def wachap_webhook(request):
+    """
+    Webhook WaChap (accusés de réception / lecture)
+    
+    L'événement est seulement ajouté au stream Redis ; la tâche
+    process_webhook_stream l'applique par lots.
+    """
+    token = getattr(settings, 'WACHAP_WEBHOOK_TOKEN', '')
+    if not token:
+        # Sans token configuré, le webhook serait ouvert à tous : refusé
+        logger.error("❌ Webhook WaChap refusé : WACHAP_WEBHOOK_TOKEN non configuré")
+        return JsonResponse({'error': 'Webhook non configuré'}, status=503)
+    
+    recu = request.headers.get('X-Webhook-Token') or request.GET.get('token') or ''
+    if not hmac.compare_digest(recu.encode(), token.encode()):
+        return JsonResponse({'error': 'Token invalide'}, status=403)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON invalide'}, status=400)
+    
+    evenements = webhook_stream.normaliser_webhook(payload)
+    if evenements and not webhook_stream.publier(evenements):
+        # Pas de Redis (développement) : application immédiate
+        WhatsAppMonitoringService.process_webhooks(evenements)
+    
+    return JsonResponse({'status': 'ok', 'received': len(evenements)})
@@ -0,0 +1,155 @@
+"""
+File d'attente des webhooks WaChap (Redis Stream)
+
+La vue webhook ne fait qu'ajouter l'événement au stream et répond 200 ;
+la tâche process_webhook_stream lit les événements par lots (groupe de
+consommateurs) et applique les statuts en une passe
+(WhatsAppMonitoringService.process_webhooks).
+
+Sans Redis configuré (voir notifications_app.redis_client), publier()
+retourne False et la vue applique l'événement immédiatement.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from notifications_app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'wachap_webhooks'
+GROUPE = 'wachap_webhooks_consumers'
+STREAM_MAXLEN = getattr(settings, 'WACHAP_WEBHOOK_STREAM_MAXLEN', 100000)
+# Entrées lues mais non acquittées (consommateur arrêté) reprises après ce délai
+DELAI_REPRISE_MS = 60000
+
+# Statut reporté -> type de webhook appliqué par process_webhooks
+TYPES_PAR_STATUT = {'delivered': 'delivery', 'read': 'read'}
+
+
+def normaliser_webhook(payload):
+    """
+    Événements d'un payload WaChap (objet ou liste d'objets)
+
+    Returns:
+        list: dicts {provider_message_id, webhook_type, status, raw_payload}
+    """
+    if isinstance(payload, list):
+        return [evenement for element in payload for evenement in normaliser_webhook(element)]
+    if not isinstance(payload, dict):
+        return []
+
+    data = payload.get('data') if isinstance(payload.get('data'), dict) else payload
+    cle = data.get('key') if isinstance(data.get('key'), dict) else {}
+    message_id = data.get('message_id') or data.get('id') or cle.get('id') or payload.get('message_id')
+    if not message_id:
+        return []
+
+    statut = str(data.get('status') or payload.get('status') or '').lower()
+    webhook_type = str(payload.get('type') or payload.get('event') or data.get('type') or 'status').lower()
+    return [{
+        'provider_message_id': str(message_id)[:100],
+        'webhook_type': TYPES_PAR_STATUT.get(statut, webhook_type)[:50],
+        'status': statut[:50],
+        'raw_payload': payload,
+    }]
+
+
+def publier(evenements):
+    """
+    Ajoute des événements au stream
+
+    Returns:
+        bool: False si Redis n'est pas disponible (rien n'a été publié)
+    """
+    client = get_redis()
+    if client is None:
+        return False
+    recu_le = timezone.now().isoformat()
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            for evenement in evenements:
+                pipe.xadd(
+                    STREAM_KEY,
+                    {
+                        'provider_message_id': evenement['provider_message_id'],
+                        'webhook_type': evenement['webhook_type'],
+                        'status': evenement['status'],
+                        'raw_payload': json.dumps(evenement['raw_payload']),
+                        'received_at': recu_le,
+                    },
+                    maxlen=STREAM_MAXLEN,
+                    approximate=True,
+                )
+            pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Stream webhooks indisponible: {e}")
+        return False
+
+
+def _decoder(champs):
+    return {
+        'provider_message_id': champs.get('provider_message_id', ''),
+        'webhook_type': champs.get('webhook_type', ''),
+        'status': champs.get('status', ''),
+        'raw_payload': json.loads(champs.get('raw_payload') or '{}'),
+    }
+
+
+def _creer_groupe(client):
+    try:
+        client.xgroup_create(STREAM_KEY, GROUPE, id='0', mkstream=True)
+    except Exception as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def lire_lot(consommateur, taille=500):
+    """
+    Prochain lot d'événements du groupe (d'abord les entrées abandonnées)
+
+    Returns:
+        list: [(id d'entrée, événement)] ; vide sans Redis ou stream vide
+    """
+    client = get_redis()
+    if client is None:
+        return []
+    _creer_groupe(client)
+
+    entrees = client.xautoclaim(
+        STREAM_KEY, GROUPE, consommateur, min_idle_time=DELAI_REPRISE_MS, start_id='0-0', count=taille
+    )[1]
+    if not entrees:
+        reponse = client.xreadgroup(GROUPE, consommateur, {STREAM_KEY: '>'}, count=taille)
+        entrees = reponse[0][1] if reponse else []
+    return [(entree_id, _decoder(champs)) for entree_id, champs in entrees if champs]
+
+
+def acquitter(entree_ids):
+    """
+    Acquitte et retire du stream les entrées appliquées
+    """
+    if not entree_ids:
+        return
+    client = get_redis()
+    with client.pipeline(transaction=False) as pipe:
+        pipe.xack(STREAM_KEY, GROUPE, *entree_ids)
+        pipe.xdel(STREAM_KEY, *entree_ids)
+        pipe.execute()
+
+
+def backlog():
+    """
+    Nombre d'événements en attente dans le stream (None sans Redis)
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        return client.xlen(STREAM_KEY)
+    except Exception:
+        return None